@@ -88,7 +88,8 @@ class SentenceAdapter:
             vocab_annotations=vocab_annotations,
             sentence_difficulty_level=difficulty_level,
             tokens=tokens,
-            word_tokens=word_tokens or None
+            word_tokens=word_tokens or None,
+            readings=tuple(tuple(item) for item in model.readings) if getattr(model, "readings", None) is not None else None,
         )
     
     @staticmethod
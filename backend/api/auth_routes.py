@@ -22,6 +22,11 @@ from backend.utils.auth import (
     create_password_reset_token,
     decode_password_reset_token
 )
+from backend.utils.principal_cache import (
+    get_cached_principal,
+    cache_principal,
+    invalidate_user,
+)
 
 
 # ==================== 依赖注入 ====================
@@ -52,85 +57,105 @@ SessionLocal = _get_session_local()
 security = HTTPBearer(auto_error=False)
 
 
-def get_current_user(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    session: Session = Depends(get_db_session)
-) -> User:
+def _credentials_exception(detail: str = "无效的认证凭据") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _resolve_token_subject(credentials: Optional[HTTPAuthorizationCredentials]) -> tuple[int, int]:
     """
-    从 JWT token 中获取当前用户
-    
-    用法：
-        @router.get("/protected")
-        def protected_route(current_user: User = Depends(get_current_user)):
-            return {"user_id": current_user.user_id}
+    校验 Bearer token 并返回 (user_id, iat)
+
+    旧 token 没有 iat 字段，统一按 0 处理（仍可参与缓存）。
     """
-    import time
-    start_time = time.time()
-    
     # 如果没有提供token，返回401错误
     if credentials is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="需要认证，请先登录",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    token = credentials.credentials
-    
-    # 解码 token
-    payload = decode_access_token(token)
+        raise _credentials_exception("需要认证，请先登录")
+
+    # 解码 token（decode_access_token 内部按 token 缓存验签结果）
+    payload = decode_access_token(credentials.credentials)
     if payload is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="无效的认证凭据",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
+        raise _credentials_exception()
+
     # 提取 user_id（从字符串转换为整数）
     user_id_str: str = payload.get("sub")
     if user_id_str is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="无效的认证凭据",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    # 转换为整数并查询用户
+        raise _credentials_exception()
+
     try:
         user_id = int(user_id_str)
     except (ValueError, TypeError):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="无效的认证凭据",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
+        raise _credentials_exception()
+
+    issued_at = payload.get("iat") or 0
+    try:
+        issued_at = int(issued_at)
+    except (ValueError, TypeError):
+        issued_at = 0
+    return user_id, issued_at
+
+
+def _load_user(session: Session, user_id: int, issued_at: int) -> User:
+    """从数据库加载用户并刷新 principal 缓存"""
+    import time
+
     # 查询用户（添加性能日志）
     query_start = time.time()
     user = session.query(User).filter(User.user_id == user_id).first()
     query_elapsed = (time.time() - query_start) * 1000
-    
+
     if query_elapsed > 100:  # 如果查询超过 100ms，记录警告
         print(f"⚠️ [Auth] get_current_user 数据库查询较慢: {query_elapsed:.2f}ms (user_id: {user_id})")
-    
+
     if user is None:
         print(f"❌ [Auth] 用户不存在: user_id={user_id}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="用户不存在",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    total_elapsed = (time.time() - start_time) * 1000
-    if total_elapsed > 100:  # 如果总耗时超过 100ms，记录警告
-        print(f"⚠️ [Auth] get_current_user 总耗时较长: {total_elapsed:.2f}ms (user_id: {user_id})")
-    
-    # 🔧 添加调试日志：记录成功认证的用户
-    print(f"✅ [Auth] 用户认证成功: user_id={user.user_id}, email={user.email}")
-    
+        invalidate_user(user_id)
+        raise _credentials_exception("用户不存在")
+
+    cache_principal(user, issued_at)
     return user
 
 
+def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    session: Session = Depends(get_db_session)
+) -> User:
+    """
+    从 JWT token 中获取当前用户
+
+    命中 principal 缓存时不查询数据库（缓存 TTL 很短，变更时会主动失效）；
+    需要读取最新余额/角色的接口请使用 get_current_user_fresh。
+    
+    用法：
+        @router.get("/protected")
+        def protected_route(current_user: User = Depends(get_current_user)):
+            return {"user_id": current_user.user_id}
+    """
+    user_id, issued_at = _resolve_token_subject(credentials)
+
+    user = get_cached_principal(session, user_id, issued_at)
+    if user is not None:
+        return user
+
+    return _load_user(session, user_id, issued_at)
+
+
+def get_current_user_fresh(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    session: Session = Depends(get_db_session)
+) -> User:
+    """
+    与 get_current_user 相同，但总是从数据库读取用户（用于余额敏感的接口）
+
+    读取结果同时写回 principal 缓存。
+    """
+    user_id, issued_at = _resolve_token_subject(credentials)
+    return _load_user(session, user_id, issued_at)
+
+
 # ==================== Pydantic 模型 ====================
 
 class RegisterRequest(BaseModel):
@@ -371,7 +396,7 @@ async def login(
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_fresh),
     session: Session = Depends(get_db_session)
 ):
     """
@@ -381,24 +406,17 @@ async def get_current_user_info(
     
     返回字段：
     - token_balance: 当前剩余 token
-    - total_tokens_used: 累计已使用 token（从 TokenLog 表统计）
+    - total_tokens_used: 累计已使用 token（从 token_usage_totals 计数表读取）
     """
     import time
-    from sqlalchemy import func
-    from database_system.business_logic.models import TokenLog
+    from backend.services.token_service import get_lifetime_token_usage
     
     start_time = time.time()
     print(f"🔍 [Auth] /api/auth/me 请求开始，user_id: {current_user.user_id}")
     
     try:
-        # 统计累计使用的 token 数量（从 TokenLog 表查询）
-        # 不需要额外字段冗余存储，运行时统计即可
-        total_tokens_used_result = (
-            session.query(func.sum(TokenLog.total_tokens))
-            .filter(TokenLog.user_id == current_user.user_id)
-            .scalar()
-        )
-        total_tokens_used = int(total_tokens_used_result) if total_tokens_used_result else 0
+        # 累计使用的 token 数量（读取 token_usage_totals 计数行，记账时同步累加）
+        total_tokens_used = get_lifetime_token_usage(session, current_user.user_id)
         
         result = UserResponse(
             user_id=current_user.user_id,
@@ -560,6 +578,7 @@ async def reset_password(
         # 更新密码
         user.password_hash = new_password_hash
         session.commit()
+        invalidate_user(user.user_id)
         
         return {
             "success": True,
@@ -612,6 +631,7 @@ async def update_user_preferences(
                 seed_presets_for_user(session, current_user.user_id, languages_list, commit=False)
 
             session.commit()
+            invalidate_user(current_user.user_id)
 
         return {
             "success": True,
@@ -698,6 +718,7 @@ async def reset_password_direct(
         # 更新密码
         user.password_hash = new_password_hash
         session.commit()
+        invalidate_user(user.user_id)
         
         print(f"✅ [ResetPasswordDirect] 密码重置成功: user_id={user.user_id}, email={user.email}")
         
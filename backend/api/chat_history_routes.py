@@ -1,8 +1,10 @@
+from datetime import datetime
 from typing import Optional, Any, Dict, List
 
 from fastapi import APIRouter, Query, Depends, HTTPException
 
 from backend.data_managers.chat_message_manager_db import ChatMessageManagerDB
+from backend.utils import cursor_pagination
 
 # 延迟导入以避免启动时初始化失败
 try:
@@ -16,6 +18,8 @@ except ImportError:
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
+CURSOR_KIND = "chat_history"
+
 # 延迟初始化 ChatMessageManagerDB（避免启动时失败）
 _chat_manager = None
 
@@ -37,7 +41,8 @@ def get_chat_history(
     text_id: Optional[int] = Query(None, description="文章 ID（可选）"),
     sentence_id: Optional[int] = Query(None, description="句子 ID（可选）"),
     limit: int = Query(100, ge=1, le=500, description="最大返回条数，默认 100，上限 500"),
-    offset: int = Query(0, ge=0, description="偏移量，用于分页"),
+    offset: int = Query(0, ge=0, description="偏移量（旧的分页方式，建议改用 cursor）"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页响应中的 next_cursor），提供时忽略 offset"),
     current_user: User = Depends(get_current_user),  # 🔒 强制认证，确保用户隔离
 ) -> Dict[str, Any]:
     """
@@ -47,7 +52,19 @@ def get_chat_history(
     - ✅ 用户隔离：只能查看自己的聊天记录
     - 按 `created_at` 升序返回（旧 → 新）
     - 可按 `text_id` / `sentence_id` 过滤
+    - 游标分页：首页不传 cursor；响应中 next_cursor 为下一页游标，has_more=false 表示没有更多
     """
+    after = None
+    if cursor:
+        try:
+            created_at, message_id = cursor_pagination.decode_cursor(cursor, CURSOR_KIND)
+            if not isinstance(created_at, str):
+                raise cursor_pagination.InvalidCursorError("invalid cursor: created_at must be a string")
+            datetime.fromisoformat(created_at)
+        except ValueError as e:  # 含 InvalidCursorError
+            raise HTTPException(status_code=400, detail=str(e))
+        after = (created_at, message_id)
+
     # 🔒 强制使用当前登录用户的 user_id（忽略任何查询参数中的 user_id）
     user_id = str(current_user.user_id)
     
@@ -63,6 +80,9 @@ def get_chat_history(
                 "count": 0,
                 "limit": limit,
                 "offset": offset,
+                "cursor": cursor,
+                "next_cursor": None,
+                "has_more": False,
             },
         }
     
@@ -71,9 +91,14 @@ def get_chat_history(
         user_id=user_id,  # ✅ 强制使用当前用户的 ID
         text_id=text_id,
         sentence_id=sentence_id,
-        limit=limit,
+        limit=limit + 1,
         offset=offset,
+        after=after,
     )
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_cursor = cursor_pagination.encode_cursor(CURSOR_KIND, messages[-1]["created_at"], messages[-1]["id"])
 
     # 规范化为前端更容易消费的字段命名
     normalized = [
@@ -99,6 +124,9 @@ def get_chat_history(
             "count": len(normalized),
             "limit": limit,
             "offset": offset,
+            "cursor": cursor,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None,
         },
     }
 
@@ -8,7 +8,8 @@ FastAPI 才会在一次请求内复用同一个 Session，否则会打开两条
 from database_system.database_manager import get_database_manager
 
 
-def get_db_session():
+def open_db_session():
+    """新建一个 Session（调用方负责关闭）；用于在请求依赖结束后仍需读库的流式响应"""
     try:
         from backend.config import ENV
         environment = ENV
@@ -16,8 +17,11 @@ def get_db_session():
         import os
         environment = os.getenv("ENV", "development")
 
-    db_manager = get_database_manager(environment)
-    session = db_manager.get_session()
+    return get_database_manager(environment).get_session()
+
+
+def get_db_session():
+    session = open_db_session()
     try:
         yield session
         session.commit()
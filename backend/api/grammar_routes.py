@@ -5,11 +5,11 @@
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import cast, String, func
+from sqlalchemy import cast, String
 from typing import List, Optional
 from pydantic import BaseModel, Field
 
-from database_system.business_logic.models import User, GrammarRule
+from database_system.business_logic.models import User, GrammarRule, normalize_language_code
 
 # 导入认证依赖
 from backend.api.auth_routes import get_current_user
@@ -17,7 +17,9 @@ from backend.api.db_deps import get_db_session
 
 # 导入数据库版本的 GrammarRuleManager
 from backend.data_managers import GrammarRuleManagerDB
-from database_system.business_logic.models import Sentence
+from backend.services import fulltext_search, knowledge_list_cache
+from backend.services.example_sentences import load_grammar_examples
+from backend.utils import cursor_pagination
 
 # 导入 DTO（用于类型提示和响应）
 from backend.data_managers.data_classes_new import (
@@ -77,24 +79,10 @@ class ApiResponse(BaseModel):
     error: Optional[str] = None
 
 
-def _dedupe_grammar_examples(examples):
-    """按 rule_id + text_id + sentence_id 去重，兼容历史重复数据。"""
-    deduped = {}
-    for ex in examples or []:
-        key = (ex.rule_id, ex.text_id, ex.sentence_id)
-        existing = deduped.get(key)
-        if existing is None:
-            deduped[key] = ex
-            continue
-
-        if not getattr(existing, "explanation_context", None) and getattr(ex, "explanation_context", None):
-            deduped[key] = ex
-
-    return list(deduped.values())
-
-
 # ==================== 创建路由器 ====================
 
+CURSOR_KIND = "grammar"
+
 router = APIRouter(
     prefix="/api/v2/grammar",
     tags=["grammar-db"],
@@ -102,74 +90,6 @@ router = APIRouter(
 )
 
 
-def _normalize_language_key(language: Optional[str]) -> Optional[str]:
-    if not language:
-        return None
-    value = str(language).strip().lower().replace("_", "-")
-    alias_to_key = {
-        "zh": "zh",
-        "zh-cn": "zh",
-        "zh-hans": "zh",
-        "中文": "zh",
-        "chinese": "zh",
-        "en": "en",
-        "en-us": "en",
-        "英文": "en",
-        "英语": "en",
-        "english": "en",
-        "de": "de",
-        "de-de": "de",
-        "德文": "de",
-        "德语": "de",
-        "german": "de",
-        "es": "es",
-        "es-es": "es",
-        "西班牙语": "es",
-        "spanish": "es",
-        "fr": "fr",
-        "fr-fr": "fr",
-        "法语": "fr",
-        "french": "fr",
-        "ja": "ja",
-        "ja-jp": "ja",
-        "日语": "ja",
-        "日文": "ja",
-        "日本語": "ja",
-        "japanese": "ja",
-        "ko": "ko",
-        "ko-kr": "ko",
-        "韩语": "ko",
-        "korean": "ko",
-        "ar": "ar",
-        "ar-sa": "ar",
-        "阿拉伯语": "ar",
-        "arabic": "ar",
-        "ru": "ru",
-        "ru-ru": "ru",
-        "俄语": "ru",
-        "russian": "ru",
-    }
-    return alias_to_key.get(value, value)
-
-
-def _language_variants(language: Optional[str]) -> List[str]:
-    key = _normalize_language_key(language)
-    if not key or key == "all":
-        return []
-    variants = {
-        "zh": ["zh", "zh-cn", "zh-hans", "中文", "chinese"],
-        "en": ["en", "en-us", "英文", "英语", "english"],
-        "de": ["de", "de-de", "德文", "德语", "german"],
-        "es": ["es", "es-es", "西班牙语", "spanish"],
-        "fr": ["fr", "fr-fr", "法语", "french"],
-        "ja": ["ja", "ja-jp", "日语", "日文", "日本語", "japanese"],
-        "ko": ["ko", "ko-kr", "韩语", "korean"],
-        "ar": ["ar", "ar-sa", "阿拉伯语", "arabic"],
-        "ru": ["ru", "ru-ru", "俄语", "russian"],
-    }
-    return [v.lower() for v in variants.get(key, [str(language).strip()])]
-
-
 # ==================== API 端点 ====================
 
 @router.get("/", summary="获取所有语法规则")
@@ -180,23 +100,37 @@ async def get_all_grammar_rules(
     language: Optional[str] = Query(default=None, description="语言过滤：中文、英文、德文"),
     learn_status: Optional[str] = Query(default=None, description="学习状态过滤：all/mastered/not_mastered"),
     text_id: Optional[int] = Query(default=None, description="文章ID过滤：只返回有该文章example的语法规则"),
+    cursor: Optional[str] = Query(default=None, description="分页游标（上一页响应中的 next_cursor），提供时忽略 skip"),
     session: Session = Depends(get_db_session),
     current_user: User = Depends(get_current_user)
 ):
     """
-    获取当前用户的所有语法规则（分页）
+    获取当前用户的所有语法规则（分页，按创建时间升序）
     
-    - **skip**: 跳过的记录数（用于分页）
+    - **skip**: 跳过的记录数（旧的 offset 分页，建议改用 cursor）
     - **limit**: 返回的最大记录数
+    - **cursor**: 游标分页，首页不传；响应中 next_cursor 为下一页游标，has_more=false 表示没有更多
     - **starred_only**: 是否只返回收藏的规则
     - **language**: 语言过滤（中文、英文、德文），None表示不过滤
     - **learn_status**: 学习状态过滤（all/mastered/not_mastered），None或'all'表示不过滤
     
     需要认证：是
     """
+    try:
+        position = cursor_pagination.decode_cursor(cursor, CURSOR_KIND) if cursor else None
+    except cursor_pagination.InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     try:
         from database_system.business_logic.models import LearnStatus
         
+        # 🔧 列表结果按用户版本号缓存：数据未变化时直接返回编码好的 JSON
+        cache_params = (language, learn_status, starred_only, text_id, skip, limit, cursor)
+        cached = knowledge_list_cache.lookup(current_user.user_id, knowledge_list_cache.KIND_GRAMMAR, cache_params)
+        if cached is not None:
+            return cached
+        cache_version = knowledge_list_cache.current_version(current_user.user_id, knowledge_list_cache.KIND_GRAMMAR)
+        
         print(f"🔍 [GrammarAPI] 查询参数: user_id={current_user.user_id}, language={language}, learn_status={learn_status}, starred_only={starred_only}, text_id={text_id}")
         
         # 查询当前用户的语法规则
@@ -206,13 +140,11 @@ async def get_all_grammar_rules(
             query = query.filter(GrammarRule.is_starred == True)
         
         # 语言过滤
+        # 别名只作用于查询参数（"德文" / "German" -> "de"），列本身存规范代码，可走 (user_id, language_code, ...) 索引
         if language and language != 'all':
-            variants = _language_variants(language)
-            if variants:
-                query = query.filter(func.lower(GrammarRule.language).in_(variants))
-            else:
-                query = query.filter(func.lower(GrammarRule.language) == str(language).strip().lower())
-            print(f"🔍 [GrammarAPI] 应用语言过滤: {language} -> {variants or [str(language).strip().lower()]}")
+            language_code = normalize_language_code(language)
+            query = query.filter(GrammarRule.language_code == language_code)
+            print(f"🔍 [GrammarAPI] 应用语言过滤: {language} -> {language_code}")
         
         # 学习状态过滤
         # 🔧 修复：SQLite 中 Enum 存储为字符串，使用枚举对象进行比较
@@ -241,7 +173,14 @@ async def get_all_grammar_rules(
             )
             print(f"🔍 [GrammarAPI] 应用文章过滤: text_id={text_id}")
         
-        rules = query.offset(skip).limit(limit).all()
+        # 按 (created_at, rule_id) 排序；有游标时从游标位置之后取，走 (user_id, [language_code,] created_at, rule_id) 索引
+        query = query.order_by(GrammarRule.created_at, GrammarRule.rule_id)
+        if position is not None:
+            query = query.filter(cursor_pagination.after(GrammarRule.created_at, GrammarRule.rule_id, position))
+        else:
+            query = query.offset(skip)
+        rows = query.limit(limit + 1).all()
+        rules, next_cursor = cursor_pagination.next_cursor(CURSOR_KIND, rows, limit, "created_at", "rule_id")
         print(f"🔍 [GrammarAPI] 查询结果: {len(rules)} 个语法规则")
         
         # 🔧 调试：打印前几个规则的 learn_status 值（用于排查过滤问题）
@@ -257,7 +196,7 @@ async def get_all_grammar_rules(
                 learn_status_value = r.learn_status.value if hasattr(r.learn_status, 'value') else str(r.learn_status)
                 print(f"🔍 [GrammarAPI] 规则 ID={r.rule_id}: learn_status={learn_status_value} (期望: {learn_status})")
         
-        return {
+        return knowledge_list_cache.store(current_user.user_id, knowledge_list_cache.KIND_GRAMMAR, cache_version, cache_params, {
             "success": True,
             "data": [
                 {
@@ -277,8 +216,11 @@ async def get_all_grammar_rules(
             ],
             "count": len(rules),
             "skip": skip,
-            "limit": limit
-        }
+            "limit": limit,
+            "cursor": cursor,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -308,29 +250,8 @@ async def get_grammar_rule(
         
         print(f"[API] Found grammar rule: {grammar_model.rule_name}")
 
-        # 为每个 example 尝试查找原句
-        examples_data = []
-        if include_examples and grammar_model.examples:
-            for ex in _dedupe_grammar_examples(grammar_model.examples):
-                original_sentence = None
-                try:
-                    if ex.text_id is not None and ex.sentence_id is not None:
-                        sentence_obj = session.query(Sentence).filter(
-                            Sentence.text_id == ex.text_id,
-                            Sentence.sentence_id == ex.sentence_id
-                        ).first()
-                        if sentence_obj:
-                            original_sentence = sentence_obj.sentence_body
-                except Exception as se:
-                    print(f"⚠️ [GrammarAPI] 获取例句原句失败: text_id={ex.text_id}, sentence_id={ex.sentence_id}, error={se}")
-
-                examples_data.append({
-                    "rule_id": ex.rule_id,
-                    "text_id": ex.text_id,
-                    "sentence_id": ex.sentence_id,
-                    "original_sentence": original_sentence,
-                    "explanation_context": ex.explanation_context,
-                })
+        # 例句及原句：一条 JOIN 查询，去重在 SQL 中完成
+        examples_data = load_grammar_examples(session, rule_id) if include_examples else []
 
         # 🔧 修复：返回前端期望的字段名（rule_name 和 rule_summary）
         return {
@@ -546,16 +467,26 @@ async def toggle_star(
 @router.get("/search/", summary="搜索语法规则")
 async def search_grammar_rules(
     keyword: str = Query(..., description="搜索关键词"),
-    session: Session = Depends(get_db_session)
+    skip: int = Query(default=0, ge=0, description="跳过的记录数"),
+    limit: int = Query(default=50, ge=1, le=200, description="返回的最大记录数"),
+    session: Session = Depends(get_db_session),
+    current_user: User = Depends(get_current_user)
 ):
     """
-    搜索语法规则（根据名称或解释）
+    搜索语法规则（根据名称或解释，按相关度排序，仅限当前用户）
     
     - **keyword**: 搜索关键词
+    - **skip**: 跳过的记录数（用于分页）
+    - **limit**: 返回的最大记录数
+    
+    需要认证：是
     """
     try:
-        grammar_manager = GrammarRuleManagerDB(session)
-        rules = grammar_manager.search_rules(keyword)
+        # 全文索引，不可用时退回 LIKE
+        result = fulltext_search.search(
+            session, fulltext_search.ENTITY_GRAMMAR, current_user.user_id, keyword, skip=skip, limit=limit
+        )
+        rules = fulltext_search.fetch_ordered(session, fulltext_search.ENTITY_GRAMMAR, result.ids)
         
         return {
             "success": True,
@@ -563,14 +494,18 @@ async def search_grammar_rules(
                 "rules": [
                     {
                         "rule_id": r.rule_id,
-                        "name": r.name,
-                        "explanation": r.explanation,
+                        "name": r.rule_name,
+                        "explanation": r.rule_summary,
                         "source": r.source,
                         "is_starred": r.is_starred
                     }
                     for r in rules
                 ],
                 "count": len(rules),
+                "total": result.total,
+                "skip": skip,
+                "limit": limit,
+                "search_mode": result.mode,
                 "keyword": keyword
             }
         }
@@ -12,8 +12,9 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
-from backend.api.auth_routes import get_current_user
+from backend.api.auth_routes import get_current_user_fresh
 from backend.api.db_deps import get_db_session
+from backend.utils.principal_cache import invalidate_user_on_commit
 from database_system.business_logic.models import User, InviteCode, TokenLedger
 
 
@@ -44,7 +45,7 @@ class RedeemInviteResponse(BaseModel):
 )
 async def redeem_invite(
     request: RedeemInviteRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: User = Depends(get_current_user_fresh),
     session: Session = Depends(get_db_session),
 ):
     """
@@ -143,6 +144,9 @@ async def redeem_invite(
     invite.redeemed_by_user_id = current_user.user_id
     invite.redeemed_at = now
 
+    # 余额已变更：事务由 get_db_session 在返回后提交，提交后再失效 principal 缓存
+    invalidate_user_on_commit(session, current_user.user_id)
+
     # 提示信息（返回给前端）
     message = f"邀请码兑换成功，获得 {grant} 个 token，当前余额为 {current_user.token_balance}"
 
@@ -3,12 +3,12 @@
 
 提供文章和句子相关的 RESTful API 接口
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import List, Optional
 from pydantic import BaseModel, Field
-from datetime import datetime
 
 from database_system.business_logic.models import (
     User,
@@ -19,11 +19,23 @@ from database_system.business_logic.models import (
 
 # 导入认证依赖
 from backend.api.auth_routes import get_current_user
-from backend.api.db_deps import get_db_session
+from backend.api.db_deps import get_db_session, open_db_session
 
 # 导入数据库版本的 OriginalTextManager
 from backend.data_managers import OriginalTextManagerDB
 from backend.data_managers.preset_articles import get_preset_difficulty_for_text
+from backend.services.article_access_tracker import pending_for_user, record_access
+from backend.services import article_payload_cache, fulltext_search
+from backend.services.article_stream import (
+    DEFAULT_SENTENCE_FIELDS,
+    MAX_LIMIT as SENTENCE_RANGE_MAX_LIMIT,
+    SENTENCE_FIELDS,
+    TOKEN_FIELDS,
+    WORD_TOKEN_FIELDS,
+    parse_fields,
+    serialize_sentence,
+    stream_sentence_page,
+)
 from backend.preprocessing.language_classification import (
     get_language_code,
     is_non_whitespace_language,
@@ -91,43 +103,7 @@ router = APIRouter(
 
 
 def _serialize_sentence_with_tokens(sentence_model, text_language: Optional[str]):
-    language_code = get_language_code(text_language) if text_language else None
-    is_non_whitespace = is_non_whitespace_language(language_code) if language_code else None
-    tokens = []
-    for t in (getattr(sentence_model, "tokens", None) or []):
-        tokens.append({
-            "token_body": t.token_body,
-            "sentence_token_id": t.sentence_token_id,
-            "token_type": (str(t.token_type).lower() if t.token_type is not None else "text"),
-            "difficulty_level": t.difficulty_level,
-            "global_token_id": getattr(t, "global_token_id", None),
-            "pos_tag": getattr(t, "pos_tag", None),
-            "lemma": getattr(t, "lemma", None),
-            "word_token_id": getattr(t, "word_token_id", None),
-            "selectable": True,
-        })
-    word_tokens = []
-    for wt in (getattr(sentence_model, "word_tokens", None) or []):
-        word_tokens.append({
-            "word_token_id": wt.word_token_id,
-            "word_body": wt.word_body,
-            "token_ids": list(wt.token_ids),
-            "pos_tag": wt.pos_tag,
-            "lemma": wt.lemma,
-            "linked_vocab_id": wt.linked_vocab_id,
-        })
-    return {
-        "sentence_id": sentence_model.sentence_id,
-        "sentence_body": sentence_model.sentence_body,
-        "difficulty_level": sentence_model.sentence_difficulty_level,
-        "grammar_annotations": list(sentence_model.grammar_annotations) if sentence_model.grammar_annotations else [],
-        "vocab_annotations": list(sentence_model.vocab_annotations) if sentence_model.vocab_annotations else [],
-        "tokens": tokens,
-        "word_tokens": word_tokens,
-        "language": text_language,
-        "language_code": language_code,
-        "is_non_whitespace": is_non_whitespace,
-    }
+    return serialize_sentence(sentence_model, text_language)
 
 
 # ==================== API 端点 ====================
@@ -182,6 +158,12 @@ async def get_all_texts(
         )
         
         results = query.all()
+
+        # 叠加尚未落库的打开时间（访问记录在后台批量写入），保持"最近打开在前"
+        pending_opened = pending_for_user(current_user.user_id)
+        if pending_opened:
+            results = [(row[0], pending_opened.get(row[0].text_id, row[1])) for row in results]
+            results.sort(key=lambda row: row[1] or row[0].created_at, reverse=True)
         
         # 为每篇文章计算句子数和token数
         texts_with_stats = []
@@ -256,8 +238,6 @@ async def record_article_access(
     需要认证：是
     """
     try:
-        from database_system.business_logic.models import UserArticleAccess
-        
         # 验证文章是否存在且属于当前用户
         text_model = session.query(OriginalText).filter(
             OriginalText.text_id == text_id,
@@ -267,33 +247,15 @@ async def record_article_access(
         if not text_model:
             raise HTTPException(status_code=404, detail=f"Text ID {text_id} not found")
         
-        # 查找或创建访问记录
-        access = session.query(UserArticleAccess).filter(
-            UserArticleAccess.user_id == current_user.user_id,
-            UserArticleAccess.text_id == text_id
-        ).first()
-        
-        if access:
-            # 更新最后打开时间
-            access.last_opened_at = datetime.now()
-            access.updated_at = datetime.now()
-        else:
-            # 创建新记录
-            access = UserArticleAccess(
-                user_id=current_user.user_id,
-                text_id=text_id,
-                last_opened_at=datetime.now()
-            )
-            session.add(access)
-        
-        session.commit()
+        # 只记入内存，由后台线程合并后批量写入
+        last_opened_at = record_access(current_user.user_id, text_id)
         
         return {
             "success": True,
             "message": "Article access recorded",
             "data": {
                 "text_id": text_id,
-                "last_opened_at": access.last_opened_at.isoformat()
+                "last_opened_at": last_opened_at.isoformat()
             }
         }
     except HTTPException:
@@ -307,6 +269,7 @@ async def record_article_access(
 async def get_text(
     text_id: int,
     include_sentences: bool = Query(default=True, description="是否包含句子列表"),
+    if_none_match: Optional[str] = Header(default=None),
     session: Session = Depends(get_db_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -316,36 +279,13 @@ async def get_text(
     - **text_id**: 文章ID
     - **include_sentences**: 是否包含句子
     
+    已完成的文章带 ETag（content_version），If-None-Match 一致时返回 304
+    
     需要认证：是
     """
     try:
         print(f"[API] Getting text {text_id}, include_sentences={include_sentences}, user_id={current_user.user_id}")
         
-        # 🔧 记录文章访问（异步，不阻塞）
-        try:
-            from database_system.business_logic.models import UserArticleAccess
-            
-            access = session.query(UserArticleAccess).filter(
-                UserArticleAccess.user_id == current_user.user_id,
-                UserArticleAccess.text_id == text_id
-            ).first()
-            
-            if access:
-                access.last_opened_at = datetime.now()
-                access.updated_at = datetime.now()
-            else:
-                access = UserArticleAccess(
-                    user_id=current_user.user_id,
-                    text_id=text_id,
-                    last_opened_at=datetime.now()
-                )
-                session.add(access)
-            session.commit()
-        except Exception as e:
-            print(f"⚠️ [API] 记录文章访问失败: {e}")
-            session.rollback()
-            # 不抛出异常，继续处理文章获取
-        
         # 先验证文章是否存在且属于当前用户
         text_model = session.query(OriginalText).filter(
             OriginalText.text_id == text_id,
@@ -355,6 +295,21 @@ async def get_text(
         if not text_model:
             print(f"[API] Text {text_id} not found for user {current_user.user_id}")
             raise HTTPException(status_code=404, detail=f"Text ID {text_id} not found")
+
+        # 🔧 记录文章访问（只写内存，后台批量落库，不阻塞读取）
+        record_access(current_user.user_id, text_id)
+
+        # 🔧 内容未变化：304 或直接返回缓存的序列化结果，不再查句子
+        variant = ("text", int(include_sentences))
+        etag = article_payload_cache.make_etag(text_model.content_version, text_model.processing_status, *variant)
+        if article_payload_cache.etag_matches(if_none_match, etag):
+            return article_payload_cache.not_modified(etag)
+        cache_key = article_payload_cache.cache_key(
+            text_id, text_model.content_version, text_model.processing_status, *variant
+        )
+        cached = article_payload_cache.get_cached_response(cache_key, etag)
+        if cached is not None:
+            return cached
         
         text_manager = OriginalTextManagerDB(session)
         text = text_manager.get_text_by_id(text_id, include_sentences=include_sentences)
@@ -439,6 +394,8 @@ async def get_text(
                             if getattr(s, "word_tokens", None)
                             else []
                         ),
+                        # 导入时预计算的读音 [[sentence_token_id, reading], ...]，前端直接使用
+                        "readings": [list(item) for item in s.readings] if s.readings is not None else None,
                         "language": text.language,
                         "language_code": language_code,
                         "is_non_whitespace": is_non_whitespace,
@@ -448,7 +405,7 @@ async def get_text(
             }
         }
         print(f"[API] Returning {len(result['data']['sentences'])} sentences")
-        return result
+        return article_payload_cache.cache_response(cache_key, etag, result)
     except HTTPException:
         raise
     except Exception as e:
@@ -512,12 +469,13 @@ async def get_text_pages(
 async def get_text_page_detail(
     text_id: int,
     page_index: int,
+    if_none_match: Optional[str] = Header(default=None),
     session: Session = Depends(get_db_session),
     current_user: User = Depends(get_current_user),
 ):
     """
     获取分页内容：
-    - completed: 返回该页 sentence 列表
+    - completed: 返回该页 sentence 列表（带 ETag，If-None-Match 一致时返回 304）
     - processing/failed: 返回状态，sentences 为空
     """
     if page_index <= 0:
@@ -539,10 +497,20 @@ async def get_text_page_detail(
     if not tasks:
         if page_index != 1:
             raise HTTPException(status_code=404, detail="page not found")
+        variant = ("page", 1)
+        etag = article_payload_cache.make_etag(text_model.content_version, text_model.processing_status, *variant)
+        if article_payload_cache.etag_matches(if_none_match, etag):
+            return article_payload_cache.not_modified(etag)
+        cache_key = article_payload_cache.cache_key(
+            text_id, text_model.content_version, text_model.processing_status, *variant
+        )
+        cached = article_payload_cache.get_cached_response(cache_key, etag)
+        if cached is not None:
+            return cached
         sentences = session.query(Sentence).filter(
             Sentence.text_id == text_id
         ).order_by(Sentence.sentence_id.asc()).all()
-        return {
+        return article_payload_cache.cache_response(cache_key, etag, {
             "success": True,
             "data": {
                 "text_id": text_id,
@@ -553,7 +521,7 @@ async def get_text_page_detail(
                 "page_status": "completed",
                 "sentences": [_serialize_sentence_with_tokens(s, text_model.language) for s in sentences],
             },
-        }
+        })
 
     task = next((t for t in tasks if t.page_index == page_index), None)
     if not task:
@@ -574,13 +542,24 @@ async def get_text_page_detail(
             },
         }
 
+    # 已完成的分页内容固定：按分页任务状态（而不是整篇的处理状态）判断能否缓存，
+    # 句子范围和总页数也放进变体，分页重跑后旧 ETag 失效
+    variant = ("page", page_index, len(tasks), task.sentence_start_id, task.sentence_end_id)
+    etag = article_payload_cache.make_etag(text_model.content_version, task.status, *variant)
+    if article_payload_cache.etag_matches(if_none_match, etag):
+        return article_payload_cache.not_modified(etag)
+    cache_key = article_payload_cache.cache_key(text_id, text_model.content_version, task.status, *variant)
+    cached = article_payload_cache.get_cached_response(cache_key, etag)
+    if cached is not None:
+        return cached
+
     sentences = session.query(Sentence).filter(
         Sentence.text_id == text_id,
         Sentence.sentence_id >= task.sentence_start_id,
         Sentence.sentence_id <= task.sentence_end_id,
     ).order_by(Sentence.sentence_id.asc()).all()
 
-    return {
+    return article_payload_cache.cache_response(cache_key, etag, {
         "success": True,
         "data": {
             "text_id": text_id,
@@ -593,7 +572,7 @@ async def get_text_page_detail(
             "sentence_start_id": task.sentence_start_id,
             "sentence_end_id": task.sentence_end_id,
         },
-    }
+    })
 
 
 @router.post("/", summary="创建新文章", status_code=201)
@@ -632,20 +611,28 @@ async def create_text(
 @router.get("/search/", summary="搜索文章")
 async def search_texts(
     keyword: str = Query(..., description="搜索关键词"),
+    skip: int = Query(default=0, ge=0, description="跳过的记录数"),
+    limit: int = Query(default=50, ge=1, le=200, description="返回的最大记录数"),
     session: Session = Depends(get_db_session),
     current_user: User = Depends(get_current_user)
 ):
     """
-    搜索文章（根据标题，仅限当前用户）
+    搜索文章（根据标题和正文，按相关度排序，仅限当前用户）
     
     - **keyword**: 搜索关键词
+    - **skip**: 跳过的记录数（用于分页）
+    - **limit**: 返回的最大记录数
+    
+    全文索引不可用时退回按标题 LIKE 匹配。
     
     需要认证：是
     """
     try:
-        text_manager = OriginalTextManagerDB(session)
         # 只搜索当前用户的文章
-        texts = text_manager.search_texts(keyword, user_id=current_user.user_id)
+        result = fulltext_search.search(
+            session, fulltext_search.ENTITY_TEXT, current_user.user_id, keyword, skip=skip, limit=limit
+        )
+        texts = fulltext_search.fetch_ordered(session, fulltext_search.ENTITY_TEXT, result.ids)
         
         return {
             "success": True,
@@ -659,6 +646,10 @@ async def search_texts(
                     for t in texts
                 ],
                 "count": len(texts),
+                "total": result.total,
+                "skip": skip,
+                "limit": limit,
+                "search_mode": result.mode,
                 "keyword": keyword
             }
         }
@@ -726,6 +717,7 @@ async def add_sentence_to_text(
 @router.get("/{text_id}/sentences", summary="获取文章的所有句子")
 async def get_text_sentences(
     text_id: int,
+    if_none_match: Optional[str] = Header(default=None),
     session: Session = Depends(get_db_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -745,6 +737,17 @@ async def get_text_sentences(
         
         if not text_model:
             raise HTTPException(status_code=404, detail=f"Text ID {text_id} not found")
+
+        variant = ("sentences",)
+        etag = article_payload_cache.make_etag(text_model.content_version, text_model.processing_status, *variant)
+        if article_payload_cache.etag_matches(if_none_match, etag):
+            return article_payload_cache.not_modified(etag)
+        cache_key = article_payload_cache.cache_key(
+            text_id, text_model.content_version, text_model.processing_status, *variant
+        )
+        cached = article_payload_cache.get_cached_response(cache_key, etag)
+        if cached is not None:
+            return cached
         
         text_manager = OriginalTextManagerDB(session)
         
@@ -756,7 +759,7 @@ async def get_text_sentences(
         # 获取句子
         sentences = text_manager.get_sentences_by_text(text_id)
         
-        return {
+        return article_payload_cache.cache_response(cache_key, etag, {
             "success": True,
             "data": {
                 "text_id": text_id,
@@ -772,13 +775,62 @@ async def get_text_sentences(
                 ],
                 "count": len(sentences)
             }
-        }
+        })
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/{text_id}/sentence-range", summary="分段流式获取文章句子（游标分页 + 字段投影）")
+async def get_text_sentence_range(
+    text_id: int,
+    cursor: int = Query(default=0, ge=0, description="从 sentence_id > cursor 的句子开始；首页传 0"),
+    limit: int = Query(default=100, ge=1, description=f"本页最多句子数（上限 {SENTENCE_RANGE_MAX_LIMIT}）"),
+    fields: Optional[str] = Query(default=None, description="句子字段，逗号分隔，如 sentence_id,sentence_body,tokens"),
+    token_fields: Optional[str] = Query(default=None, description="token 字段，如 token_body,sentence_token_id,token_type"),
+    word_token_fields: Optional[str] = Query(default=None, description="word_token 字段，如 word_token_id,word_body,token_ids"),
+    session: Session = Depends(get_db_session),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    按 sentence_id 游标分页获取句子，逐句流式输出 JSON（仅限当前用户的文章）
+
+    - 不传 fields 时输出与 GET /{text_id} 相同的完整句子结构
+    - 响应中 next_cursor 为下一页的 cursor；has_more=false 表示已到末尾
+    - 不记录文章访问（需要时前端调用 POST /{text_id}/access）
+
+    需要认证：是
+    """
+    text_model = session.query(OriginalText).filter(
+        OriginalText.text_id == text_id,
+        OriginalText.user_id == current_user.user_id,
+    ).first()
+    if not text_model:
+        raise HTTPException(status_code=404, detail=f"Text ID {text_id} not found")
+
+    try:
+        sentence_fields = parse_fields(fields, SENTENCE_FIELDS, DEFAULT_SENTENCE_FIELDS)
+        token_field_list = parse_fields(token_fields, TOKEN_FIELDS, tuple(TOKEN_FIELDS))
+        word_token_field_list = parse_fields(word_token_fields, WORD_TOKEN_FIELDS, tuple(WORD_TOKEN_FIELDS))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(
+        stream_sentence_page(
+            open_db_session,
+            text_id,
+            text_model.language,
+            cursor=cursor,
+            limit=min(limit, SENTENCE_RANGE_MAX_LIMIT),
+            fields=sentence_fields,
+            token_fields=token_field_list,
+            word_token_fields=word_token_field_list,
+        ),
+        media_type="application/json",
+    )
+
+
 @router.get("/{text_id}/sentences/{sentence_id}", summary="获取指定句子")
 async def get_sentence(
     text_id: int,
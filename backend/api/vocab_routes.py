@@ -5,11 +5,11 @@
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import cast, String, func
+from sqlalchemy import cast, String
 from typing import List, Optional
 from pydantic import BaseModel, Field
 
-from database_system.business_logic.models import User, VocabExpression, Sentence
+from database_system.business_logic.models import User, VocabExpression, normalize_language_code
 
 # 导入认证依赖
 from backend.api.auth_routes import get_current_user
@@ -17,6 +17,9 @@ from backend.api.db_deps import get_db_session
 
 # 导入数据库版本的 VocabManager
 from backend.data_managers import VocabManagerDB
+from backend.services import fulltext_search, knowledge_list_cache
+from backend.services.example_sentences import load_vocab_examples
+from backend.utils import cursor_pagination
 
 # 导入 DTO（用于类型提示和响应）
 from backend.data_managers.data_classes_new import (
@@ -79,6 +82,8 @@ class ApiResponse(BaseModel):
 
 # ==================== 创建路由器 ====================
 
+CURSOR_KIND = "vocab"
+
 router = APIRouter(
     prefix="/api/v2/vocab",
     tags=["vocab-db"],
@@ -86,74 +91,6 @@ router = APIRouter(
 )
 
 
-def _normalize_language_key(language: Optional[str]) -> Optional[str]:
-    if not language:
-        return None
-    value = str(language).strip().lower().replace("_", "-")
-    alias_to_key = {
-        "zh": "zh",
-        "zh-cn": "zh",
-        "zh-hans": "zh",
-        "中文": "zh",
-        "chinese": "zh",
-        "en": "en",
-        "en-us": "en",
-        "英文": "en",
-        "英语": "en",
-        "english": "en",
-        "de": "de",
-        "de-de": "de",
-        "德文": "de",
-        "德语": "de",
-        "german": "de",
-        "es": "es",
-        "es-es": "es",
-        "西班牙语": "es",
-        "spanish": "es",
-        "fr": "fr",
-        "fr-fr": "fr",
-        "法语": "fr",
-        "french": "fr",
-        "ja": "ja",
-        "ja-jp": "ja",
-        "日语": "ja",
-        "日文": "ja",
-        "日本語": "ja",
-        "japanese": "ja",
-        "ko": "ko",
-        "ko-kr": "ko",
-        "韩语": "ko",
-        "korean": "ko",
-        "ar": "ar",
-        "ar-sa": "ar",
-        "阿拉伯语": "ar",
-        "arabic": "ar",
-        "ru": "ru",
-        "ru-ru": "ru",
-        "俄语": "ru",
-        "russian": "ru",
-    }
-    return alias_to_key.get(value, value)
-
-
-def _language_variants(language: Optional[str]) -> List[str]:
-    key = _normalize_language_key(language)
-    if not key or key == "all":
-        return []
-    variants = {
-        "zh": ["zh", "zh-cn", "zh-hans", "中文", "chinese"],
-        "en": ["en", "en-us", "英文", "英语", "english"],
-        "de": ["de", "de-de", "德文", "德语", "german"],
-        "es": ["es", "es-es", "西班牙语", "spanish"],
-        "fr": ["fr", "fr-fr", "法语", "french"],
-        "ja": ["ja", "ja-jp", "日语", "日文", "日本語", "japanese"],
-        "ko": ["ko", "ko-kr", "韩语", "korean"],
-        "ar": ["ar", "ar-sa", "阿拉伯语", "arabic"],
-        "ru": ["ru", "ru-ru", "俄语", "russian"],
-    }
-    return [v.lower() for v in variants.get(key, [str(language).strip()])]
-
-
 # ==================== API 端点 ====================
 
 @router.get("/", summary="获取所有词汇")
@@ -164,23 +101,37 @@ async def get_all_vocabs(
     language: Optional[str] = Query(default=None, description="语言过滤：中文、英文、德文"),
     learn_status: Optional[str] = Query(default=None, description="学习状态过滤：all/mastered/not_mastered"),
     text_id: Optional[int] = Query(default=None, description="文章ID过滤：只返回有该文章example的词汇"),
+    cursor: Optional[str] = Query(default=None, description="分页游标（上一页响应中的 next_cursor），提供时忽略 skip"),
     session: Session = Depends(get_db_session),
     current_user: 'User' = Depends(get_current_user)
 ):
     """
-    获取当前用户的所有词汇（分页）
+    获取当前用户的所有词汇（分页，按创建时间升序）
     
-    - **skip**: 跳过的记录数（用于分页）
+    - **skip**: 跳过的记录数（旧的 offset 分页，建议改用 cursor）
     - **limit**: 返回的最大记录数
+    - **cursor**: 游标分页，首页不传；响应中 next_cursor 为下一页游标，has_more=false 表示没有更多
     - **starred_only**: 是否只返回收藏的词汇
     - **language**: 语言过滤（中文、英文、德文），None表示不过滤
     - **learn_status**: 学习状态过滤（all/mastered/not_mastered），None或'all'表示不过滤
     
     需要认证：是
     """
+    try:
+        position = cursor_pagination.decode_cursor(cursor, CURSOR_KIND) if cursor else None
+    except cursor_pagination.InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     try:
         from database_system.business_logic.models import VocabExpression, LearnStatus
         
+        # 🔧 列表结果按用户版本号缓存：数据未变化时直接返回编码好的 JSON
+        cache_params = (language, learn_status, starred_only, text_id, skip, limit, cursor)
+        cached = knowledge_list_cache.lookup(current_user.user_id, knowledge_list_cache.KIND_VOCAB, cache_params)
+        if cached is not None:
+            return cached
+        cache_version = knowledge_list_cache.current_version(current_user.user_id, knowledge_list_cache.KIND_VOCAB)
+        
         print(f"🔍 [VocabAPI] 查询参数: user_id={current_user.user_id}, language={language}, learn_status={learn_status}, starred_only={starred_only}, text_id={text_id}")
         
         # 查询当前用户的词汇
@@ -190,13 +141,11 @@ async def get_all_vocabs(
             query = query.filter(VocabExpression.is_starred == True)
         
         # 语言过滤
+        # 别名只作用于查询参数（"德文" / "German" -> "de"），列本身存规范代码，可走 (user_id, language_code, ...) 索引
         if language and language != 'all':
-            variants = _language_variants(language)
-            if variants:
-                query = query.filter(func.lower(VocabExpression.language).in_(variants))
-            else:
-                query = query.filter(func.lower(VocabExpression.language) == str(language).strip().lower())
-            print(f"🔍 [VocabAPI] 应用语言过滤: {language} -> {variants or [str(language).strip().lower()]}")
+            language_code = normalize_language_code(language)
+            query = query.filter(VocabExpression.language_code == language_code)
+            print(f"🔍 [VocabAPI] 应用语言过滤: {language} -> {language_code}")
         
         # 学习状态过滤
         # 🔧 修复：SQLite 中 Enum 存储为字符串，使用枚举对象进行比较
@@ -226,10 +175,17 @@ async def get_all_vocabs(
             )
             print(f"🔍 [VocabAPI] 应用文章过滤: text_id={text_id}")
         
-        vocabs = query.offset(skip).limit(limit).all()
+        # 按 (created_at, vocab_id) 排序；有游标时从游标位置之后取，走 (user_id, [language_code,] created_at, vocab_id) 索引
+        query = query.order_by(VocabExpression.created_at, VocabExpression.vocab_id)
+        if position is not None:
+            query = query.filter(cursor_pagination.after(VocabExpression.created_at, VocabExpression.vocab_id, position))
+        else:
+            query = query.offset(skip)
+        rows = query.limit(limit + 1).all()
+        vocabs, next_cursor = cursor_pagination.next_cursor(CURSOR_KIND, rows, limit, "created_at", "vocab_id")
         print(f"🔍 [VocabAPI] 查询结果: {len(vocabs)} 个词汇")
         
-        return {
+        return knowledge_list_cache.store(current_user.user_id, knowledge_list_cache.KIND_VOCAB, cache_version, cache_params, {
             "success": True,
             "data": [
                 {
@@ -247,8 +203,11 @@ async def get_all_vocabs(
             ],
             "count": len(vocabs),
             "skip": skip,
-            "limit": limit
-        }
+            "limit": limit,
+            "cursor": cursor,
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
+        })
     except Exception as e:
         import traceback
         error_detail = str(e)
@@ -286,36 +245,10 @@ async def get_vocab(
             print(f"[API] Vocab {vocab_id} not found for user {current_user.user_id}")
             raise HTTPException(status_code=404, detail=f"Vocab ID {vocab_id} not found")
         
-        print(f"[API] Found vocab: {vocab_model.vocab_body}, examples count: {len(vocab_model.examples)}")
-        if vocab_model.examples:
-            for ex in vocab_model.examples:
-                print(f"  - Example: text_id={ex.text_id}, sentence_id={ex.sentence_id}")
-        
-        # 为每个 example 尝试查找原句
-        examples_data = []
-        if include_examples and vocab_model.examples:
-            for ex in vocab_model.examples:
-                original_sentence = None
-                try:
-                    if ex.text_id is not None and ex.sentence_id is not None:
-                        sentence_obj = session.query(Sentence).filter(
-                            Sentence.text_id == ex.text_id,
-                            Sentence.sentence_id == ex.sentence_id
-                        ).first()
-                        if sentence_obj:
-                            original_sentence = sentence_obj.sentence_body
-                except Exception as se:
-                    # 不影响主流程，记录日志即可
-                    print(f"⚠️ [VocabAPI] 获取例句原句失败: text_id={ex.text_id}, sentence_id={ex.sentence_id}, error={se}")
-
-                examples_data.append({
-                    "vocab_id": ex.vocab_id,
-                    "text_id": ex.text_id,
-                    "sentence_id": ex.sentence_id,
-                    "original_sentence": original_sentence,
-                    "context_explanation": ex.context_explanation,
-                    "token_indices": ex.token_indices,
-                })
+        print(f"[API] Found vocab: {vocab_model.vocab_body}")
+
+        # 例句及原句：一条 JOIN 查询（不再逐条查询 Sentence）
+        examples_data = load_vocab_examples(session, vocab_id) if include_examples else []
 
         result = {
             "success": True,
@@ -572,23 +505,26 @@ async def toggle_star(
 @router.get("/search/", summary="搜索词汇")
 async def search_vocabs(
     keyword: str = Query(..., description="搜索关键词"),
+    skip: int = Query(default=0, ge=0, description="跳过的记录数"),
+    limit: int = Query(default=50, ge=1, le=200, description="返回的最大记录数"),
     session: Session = Depends(get_db_session),
     current_user: User = Depends(get_current_user)
 ):
     """
-    搜索词汇（根据词汇内容或解释）
+    搜索词汇（根据词汇内容或解释，按相关度排序）
     
     - **keyword**: 搜索关键词
+    - **skip**: 跳过的记录数（用于分页）
+    - **limit**: 返回的最大记录数
     
     需要认证：是
     """
     try:
-        # 搜索当前用户的词汇
-        vocabs = session.query(VocabExpression).filter(
-            VocabExpression.user_id == current_user.user_id,
-            (VocabExpression.vocab_body.like(f"%{keyword}%")) | 
-            (VocabExpression.explanation.like(f"%{keyword}%"))
-        ).all()
+        # 搜索当前用户的词汇（全文索引，不可用时退回 LIKE）
+        result = fulltext_search.search(
+            session, fulltext_search.ENTITY_VOCAB, current_user.user_id, keyword, skip=skip, limit=limit
+        )
+        vocabs = fulltext_search.fetch_ordered(session, fulltext_search.ENTITY_VOCAB, result.ids)
         
         return {
             "success": True,
@@ -604,6 +540,10 @@ async def search_vocabs(
                     for v in vocabs
                 ],
                 "count": len(vocabs),
+                "total": result.total,
+                "skip": skip,
+                "limit": limit,
+                "search_mode": result.mode,
                 "keyword": keyword
             }
         }
@@ -1,8 +1,11 @@
 import os
 import json
 import inspect
-print("✅ 当前运行文件：", __file__)
-print("✅ 当前工作目录：", os.getcwd())
+import threading
+from backend.utils.structured_logging import get_logger, lazy, level_for_message
+logger = get_logger("main_assistant")
+logger.debug("✅ 当前运行文件： %s", __file__)
+logger.debug("✅ 当前工作目录： %s", os.getcwd())
 import re
 from backend.assistants.chat_info.dialogue_history import DialogueHistory
 from backend.assistants.chat_info.session_state import SessionState, CheckRelevantDecision, GrammarSummary, VocabSummary, GrammarToAdd, VocabToAdd
@@ -14,6 +17,7 @@ from backend.assistants.sub_assistants.summarize_grammar_rule import SummarizeGr
 from backend.assistants.sub_assistants.check_if_relevant import CheckIfRelevant
 from backend.assistants.sub_assistants.answer_question import AnswerQuestionAssistant
 from backend.assistants.sub_assistants.summarize_vocab import SummarizeVocabAssistant
+from backend.assistants.sub_assistants.extract_knowledge import ExtractKnowledgeAssistant, KnowledgeExtraction
 # CompareGrammarRuleAssistant（语法相似度比较，已启用）
 from backend.assistants.sub_assistants.compare_grammar_rule import CompareGrammarRuleAssistant
 from backend.assistants.sub_assistants.grammar_example_explanation import GrammarExampleExplanationAssistant
@@ -27,9 +31,10 @@ try:
     NEW_STRUCTURE_AVAILABLE = True
 except ImportError:
     NEW_STRUCTURE_AVAILABLE = False
-    print("⚠️ 新数据结构类不可用，将使用旧结构")
+    logger.warning("⚠️ 新数据结构类不可用，将使用旧结构")
 from backend.data_managers import data_controller
 from backend.data_managers.dialogue_record import DialogueRecordBySentence
+from backend.services import preset_explanations
 # 只读能力探测适配层（不改变业务逻辑）
 from backend.assistants.adapters import CapabilityDetector, DataAdapter, GrammarRuleAdapter, VocabAdapter
 from backend.preprocessing.language_classification import (
@@ -46,6 +51,15 @@ SentenceType = Union[Sentence, NewSentence] if NEW_STRUCTURE_AVAILABLE else Sent
 # 全局开关：临时关闭语法相关能力（对比/生成规则与例句）
 DISABLE_GRAMMAR_FEATURES = True
 
+# 知识点抽取模式（按部署选择）：
+# - chain：是否相关 → 总结语法 → 总结词汇，逐个助手串行调用（默认）
+# - fused：ExtractKnowledgeAssistant 一次结构化调用完成，输出不符合 schema 时本轮退回 chain
+KNOWLEDGE_EXTRACTION_MODE = os.getenv("KNOWLEDGE_EXTRACTION_MODE", "chain").strip().lower()
+
+# 本轮知识点写库失败后的重试：重新排进该用户的后台队列，最多尝试 KNOWLEDGE_WRITE_MAX_ATTEMPTS 次（含首次）
+KNOWLEDGE_WRITE_MAX_ATTEMPTS = int(os.getenv("KNOWLEDGE_WRITE_MAX_ATTEMPTS", "4"))
+KNOWLEDGE_WRITE_RETRY_DELAY_SECONDS = float(os.getenv("KNOWLEDGE_WRITE_RETRY_DELAY_SECONDS", "5"))
+
 
 def _preview_for_log(value, max_len: int = 240) -> str:
     """Avoid dumping full model outputs / summaries into server logs."""
@@ -57,6 +71,66 @@ def _preview_for_log(value, max_len: int = 240) -> str:
     return f"{s[:max_len]}…(truncated len={len(s)})"
 
 
+def _upsert_knowledge_batch(user_id: int, batch):
+    """用独立会话单事务写入本轮知识点（upsert_knowledge 提交或整体回滚）"""
+    from database_system.database_manager import DatabaseManager
+    from backend.services.knowledge_upsert import upsert_knowledge
+
+    db_manager = DatabaseManager('development')
+    session = db_manager.get_session()
+    try:
+        return upsert_knowledge(session, user_id, batch)
+    finally:
+        session.close()
+
+
+def _describe_batch(batch) -> str:
+    return "%s grammar rules, %s vocab, %s+%s examples" % (
+        len(batch.grammar_rules), len(batch.vocabs), len(batch.grammar_examples), len(batch.vocab_examples)
+    )
+
+
+def _requeue_knowledge_batch(user_id: int, batch, attempt: int) -> None:
+    """
+    写库失败的批次延迟后重新排进该用户的后台队列（同一用户的任务串行，排在当前任务之后）。
+    次数用尽、队列已满或停机取消时记录错误：本轮知识点没有写入数据库。
+    """
+    def lost(reason):
+        logger.error("❌ [MainAssistant] 本轮知识点未能写入数据库，已丢失（%s）: user_id=%s, %s", reason, user_id, _describe_batch(batch))
+
+    if attempt >= KNOWLEDGE_WRITE_MAX_ATTEMPTS:
+        lost(f"已尝试 {attempt} 次")
+        return
+
+    def retry():
+        try:
+            result = _upsert_knowledge_batch(user_id, batch)
+        except Exception as e:
+            logger.warning("⚠️ [MainAssistant] 知识点写入重试失败（第 %s 次）: %s", attempt + 1, e)
+            _requeue_knowledge_batch(user_id, batch, attempt + 1)
+            return
+        logger.info("✅ [MainAssistant] 知识点写入重试成功（第 %s 次）: user_id=%s, 新增 %s grammar rules, %s vocab",
+                    attempt + 1, user_id, result.grammar_rules_created, result.vocabs_created)
+
+    def submit():
+        from backend.services import background_jobs
+        try:
+            background_jobs.get_executor().submit(
+                user_id,
+                retry,
+                priority=background_jobs.PRIORITY_LOW,
+                name=f"knowledge-write-retry:{user_id}:{attempt}",
+                on_cancel=lambda: lost("重试任务被取消"),
+            )
+        except background_jobs.QueueFullError as e:
+            lost(f"后台队列已满: {e}")
+
+    # 延迟提交而不是在工作线程里 sleep，等待期间不占用执行器线程
+    timer = threading.Timer(KNOWLEDGE_WRITE_RETRY_DELAY_SECONDS * attempt, submit)
+    timer.daemon = True
+    timer.start()
+
+
 class MainAssistant:
     
     def __init__(self, data_controller_instance=None, max_turns=100, session_state_instance=None):
@@ -68,6 +142,7 @@ class MainAssistant:
         self.answer_question_assistant = AnswerQuestionAssistant()
         self.summarize_grammar_rule_assistant = SummarizeGrammarRuleAssistant()
         self.summarize_vocab_rule_assistant = SummarizeVocabAssistant()
+        self.extract_knowledge_assistant = ExtractKnowledgeAssistant()
         # 语法比较功能（已启用）
         self.compare_grammar_rule_assistant = CompareGrammarRuleAssistant()
         self.grammar_example_explanation_assistant = GrammarExampleExplanationAssistant()
@@ -89,6 +164,8 @@ class MainAssistant:
         
         # 🔧 UI 语言（用于控制 AI 输出语言，如"中文"、"英文"）
         self.ui_language: Optional[str] = None
+        # 本实例的语法能力开关：None 表示沿用模块级 DISABLE_GRAMMAR_FEATURES（调用方按需覆盖，不改全局）
+        self.disable_grammar_features: Optional[bool] = None
         self.processed_articles_dir = os.path.abspath(
             os.path.join(os.path.dirname(__file__), "..", "data", "current", "articles")
         )
@@ -108,10 +185,18 @@ class MainAssistant:
         self._user_id = user_id
         self._db_session = session
 
-    def _ma_log(self, msg: str) -> None:
+    def _grammar_features_disabled(self) -> bool:
+        if self.disable_grammar_features is not None:
+            return self.disable_grammar_features
+        return DISABLE_GRAMMAR_FEATURES
+
+    def _ma_log(self, msg: str, *args, level: Optional[int] = None) -> None:
         """Prefix assistant logs with user_id (matches /api/chat server logs during beta)."""
-        uid = self._user_id
-        print(f"[user_id={uid}] [MainAssistant] {msg}")
+        if level is None:
+            level = level_for_message(msg)
+        if not logger.isEnabledFor(level):
+            return
+        logger.log(level, "[MainAssistant] " + msg, *args, extra={"user_id": self._user_id})
 
     def _detect_sentence_language(self, sentence: SentenceType) -> Tuple[Optional[str], Optional[str], bool]:
         """
@@ -163,7 +248,7 @@ class MainAssistant:
                 if re.search(r'[\u4e00-\u9fff]', sentence_body):
                     return "中文", "zh", True
             except Exception as e:
-                print(f"⚠️ [MainAssistant] 基于句子内容推断语言失败: {e}")
+                logger.warning("⚠️ [MainAssistant] 基于句子内容推断语言失败: %s", e)
         
         # 方法4: 无法判断，返回默认值（假设为空格语言）
         return None, None, False
@@ -200,7 +285,7 @@ class MainAssistant:
                         language_code = get_language_code(language)
                         return language, language_code
         except Exception as e:
-            print(f"⚠️ [MainAssistant] 获取语言信息失败: {e}")
+            logger.warning("⚠️ [MainAssistant] 获取语言信息失败: %s", e)
         
         return None, None
 
@@ -270,7 +355,7 @@ class MainAssistant:
                         word_tokens=word_tokens if word_tokens else None,
                     )
         except Exception as e:
-            print(f"⚠️ [MainAssistant] 无法从文件加载句子(word_tokens): {e}")
+            logger.warning("⚠️ [MainAssistant] 无法从文件加载句子(word_tokens): %s", e)
         return None
 
     def _ensure_sentence_has_word_tokens(self, sentence: SentenceType) -> SentenceType:
@@ -337,15 +422,15 @@ class MainAssistant:
             
             # 精确匹配
             if vocab_clean == word_body_clean:
-                print(f"✅ [WordToken匹配] vocab '{vocab}' 精确匹配到 word_token '{word_token.word_body}' (word_token_id={word_token.word_token_id})")
+                logger.debug("✅ [WordToken匹配] vocab '%s' 精确匹配到 word_token '%s' (word_token_id=%s)", vocab, word_token.word_body, word_token.word_token_id)
                 return word_token.word_token_id
             
             # 部分匹配：如果 vocab 是单个字符，检查是否属于 word token
             if len(vocab_clean) == 1 and vocab_clean in word_body_clean:
-                print(f"✅ [WordToken匹配] vocab '{vocab}' 部分匹配到 word_token '{word_token.word_body}' (word_token_id={word_token.word_token_id})")
+                logger.debug("✅ [WordToken匹配] vocab '%s' 部分匹配到 word_token '%s' (word_token_id=%s)", vocab, word_token.word_body, word_token.word_token_id)
                 return word_token.word_token_id
         
-        print(f"⚠️ [WordToken匹配] vocab '{vocab}' 未匹配到任何 word_token，将回退到字符 token 匹配")
+        logger.warning("⚠️ [WordToken匹配] vocab '%s' 未匹配到任何 word_token，将回退到字符 token 匹配", vocab)
         return None
 
     def run(self, quoted_sentence: SentenceType, user_question: str, selected_text: str = None):
@@ -370,36 +455,36 @@ class MainAssistant:
         
         # 总是打印语言检测结果（用于调试）
         if language_code:
-            print(f"🌐 [MainAssistant] 检测到语言: {language} (代码: {language_code}, 非空格语言: {is_non_whitespace})")
+            logger.info("🌐 [MainAssistant] 检测到语言: %s (代码: %s, 非空格语言: %s)", language, language_code, is_non_whitespace)
         else:
-            print(f"🌐 [MainAssistant] 无法检测语言，使用默认处理（假设为空格语言，is_non_whitespace={is_non_whitespace}）")
+            logger.info("🌐 [MainAssistant] 无法检测语言，使用默认处理（假设为空格语言，is_non_whitespace=%s）", is_non_whitespace)
         
         # 额外调试：检查句子是否有 word_tokens
         if NEW_STRUCTURE_AVAILABLE and isinstance(quoted_sentence, NewSentence):
             has_word_tokens = quoted_sentence.word_tokens is not None and len(quoted_sentence.word_tokens) > 0
-            print(f"🔍 [MainAssistant] 句子是否有 word_tokens: {has_word_tokens} (text_id={quoted_sentence.text_id})")
+            logger.debug("🔍 [MainAssistant] 句子是否有 word_tokens: %s (text_id=%s)", has_word_tokens, quoted_sentence.text_id)
         
         # 📋 使用已设置的上下文，或者从参数设置（兼容直接调用）
         # 如果 session_state 中没有上下文，说明是直接调用（非 Mock Server），需要设置
         if not self.session_state.current_sentence:
-            print("📝 [MainAssistant] Session state 为空，从参数设置上下文")
+            logger.info("📝 [MainAssistant] Session state 为空，从参数设置上下文")
             
             # 创建SelectedToken对象
             if selected_text:
                 selected_token = create_selected_token_from_text(quoted_sentence, selected_text)
                 effective_sentence_body = selected_text
-                print(f"🎯 用户选择了特定文本: '{selected_text}'")
+                logger.info("🎯 用户选择了特定文本: '%s'", selected_text)
             else:
                 selected_token = SelectedToken.from_full_sentence(quoted_sentence)
                 effective_sentence_body = quoted_sentence.sentence_body
-                print(f"📖 用户选择了整句话: '{quoted_sentence.sentence_body}'")
+                logger.info("📖 用户选择了整句话: '%s'", quoted_sentence.sentence_body)
             
             # 设置会话状态
             self.session_state.set_current_sentence(quoted_sentence)
             self.session_state.set_current_selected_token(selected_token)
             self.session_state.set_current_input(user_question)
         else:
-            print("✅ [MainAssistant] 使用 session_state 中的上下文（已由 Mock Server 设置）")
+            logger.info("✅ [MainAssistant] 使用 session_state 中的上下文（已由 Mock Server 设置）")
             # 从 session_state 读取已设置的值
             effective_sentence_body = selected_text if selected_text else (
                 self.session_state.current_selected_token.token_text 
@@ -422,7 +507,7 @@ class MainAssistant:
             fallback_token = SelectedToken.from_full_sentence(quoted_sentence)
             self.dialogue_record.add_user_message(quoted_sentence, user_question, fallback_token, user_id=user_id)
         
-        print("The question is relevant to language learning, proceeding with processing...")
+        logger.info("The question is relevant to language learning, proceeding with processing...")
         
         # 回答问题（会在内部设置 current_response）
         ai_response = self.answer_question_function(quoted_sentence, user_question, effective_sentence_body)
@@ -434,7 +519,7 @@ class MainAssistant:
         self.handle_grammar_vocab_function(quoted_sentence, user_question, ai_response, effective_sentence_body)
         self.add_new_to_data()
         
-        print("✅ 处理完成，已更新会话状态和对话历史。")
+        logger.info("✅ 处理完成，已更新会话状态和对话历史。")
         self.print_data_controller_data()
         return
 
@@ -444,8 +529,8 @@ class MainAssistant:
         """
         _names = self.data_controller.grammar_manager.get_all_rules_name()
         _vocabs = self.data_controller.vocab_manager.get_all_vocab_body()
-        print(f"📚 Grammar Rules count={len(_names)} sample={_preview_for_log(_names[:15], 200)}")
-        print(f"📖 Vocab List count={len(_vocabs)} sample={_preview_for_log(_vocabs[:20], 200)}")
+        logger.info("📚 Grammar Rules count=%s sample=%s", len(_names), _preview_for_log(_names[:15], 200))
+        logger.info("📖 Vocab List count=%s sample=%s", len(_vocabs), _preview_for_log(_vocabs[:20], 200))
         
         # 显示规则的ID顺序
         self.data_controller.grammar_manager.print_rules_order()
@@ -464,10 +549,10 @@ class MainAssistant:
             bool: 句子是否完整
         """
         if sentence and hasattr(sentence, 'text_id') and hasattr(sentence, 'sentence_id'):
-            print(f"✅ {context}: 句子数据结构完整性验证通过 - text_id:{sentence.text_id}, sentence_id:{sentence.sentence_id}")
+            logger.info("✅ %s: 句子数据结构完整性验证通过 - text_id:%s, sentence_id:%s", context, sentence.text_id, sentence.sentence_id)
             return True
         else:
-            print(f"❌ {context}: 句子数据结构完整性验证失败")
+            logger.error("❌ %s: 句子数据结构完整性验证失败", context)
             return False
 
     def check_if_topic_relevant_function(self, quoted_sentence: SentenceType, user_question: str, effective_sentence_body: str = None) -> bool:
@@ -497,12 +582,23 @@ class MainAssistant:
         # 判断用户是选择了完整句子还是特定部分
         full_sentence = quoted_sentence.sentence_body
         
+        # 预置文章的常见问题：先查离线预生成的回答，命中则不调用大模型
+        cached_answer = preset_explanations.lookup(
+            preset_explanations.KIND_ANSWER,
+            full_sentence,
+            self.ui_language,
+            target=sentence_body if sentence_body != full_sentence else "",
+            question=user_question,
+        )
+        if cached_answer is not None:
+            self._ma_log("⚡ [AnswerQuestion] 命中预生成回答，跳过 AnswerQuestionAssistant")
+            ai_response = cached_answer
         # 如果 sentence_body 不等于完整句子，说明用户选择了特定部分
-        if sentence_body != full_sentence:
+        elif sentence_body != full_sentence:
             # 用户选择了特定文本（如单词或短语）
             quoted_part = sentence_body
-            self._ma_log(f"🎯 [AnswerQuestion] 用户选择了特定文本: '{_preview_for_log(quoted_part, 120)}'")
-            self._ma_log(f"📖 [AnswerQuestion] 完整句子: '{_preview_for_log(full_sentence, 160)}'")
+            self._ma_log("🎯 [AnswerQuestion] 用户选择了特定文本: '%s'", _preview_for_log(quoted_part, 120))
+            self._ma_log("📖 [AnswerQuestion] 完整句子: '%s'", _preview_for_log(full_sentence, 160))
             ai_response = self.answer_question_assistant.run(
                 full_sentence=full_sentence,
                 user_question=user_question,
@@ -513,7 +609,7 @@ class MainAssistant:
             )
         else:
             # 用户选择了整句话
-            self._ma_log(f"📖 [AnswerQuestion] 用户选择了整句话: '{_preview_for_log(full_sentence, 160)}'")
+            self._ma_log("📖 [AnswerQuestion] 用户选择了整句话: '%s'", _preview_for_log(full_sentence, 160))
             ai_response = self.answer_question_assistant.run(
                 full_sentence=full_sentence,
                 user_question=user_question,
@@ -522,10 +618,7 @@ class MainAssistant:
                 session=self._db_session
             )
         
-        self._ma_log(
-            f"AI Response len={len(str(ai_response)) if ai_response is not None else 0} "
-            f"type={type(ai_response)}: {_preview_for_log(ai_response, 320)}"
-        )
+        self._ma_log("AI Response len=%s type=%s: %s", len(str(ai_response)) if ai_response is not None else 0, type(ai_response), _preview_for_log(ai_response, 320))
         
         # 🔧 处理 JSON 解析结果
         if isinstance(ai_response, dict):
@@ -576,6 +669,50 @@ class MainAssistant:
 
         return False
 
+    def _run_fused_extraction(self, sentence_body: str, user_question: str, ai_response: str) -> Optional[KnowledgeExtraction]:
+        """fused 模式：一次调用完成相关性判断 + 语法 / 词汇总结；失败时返回 None（本轮退回逐个助手）"""
+        # 与逐个助手流程中总结步骤使用相同的输入
+        user_input = self.session_state.current_input if self.session_state.current_input else user_question
+        ai_response_str = self.session_state.current_response if self.session_state.current_response else ai_response
+        try:
+            extraction = self.extract_knowledge_assistant.run(
+                sentence_body,
+                user_input,
+                ai_response_str,
+                language=self.ui_language or self.session_state.current_language or "中文",
+                is_non_whitespace=self.current_is_non_whitespace,
+                user_id=self._user_id, session=self._db_session
+            )
+        except Exception as e:
+            self._ma_log("⚠️ [FusedExtraction] 调用失败，退回逐个助手流程: %s", e)
+            return None
+        if extraction is None:
+            self._ma_log("⚠️ [FusedExtraction] 输出无效，退回逐个助手流程")
+        return extraction
+
+    def _cached_preset_extraction(self, quoted_sentence: SentenceType, user_question: str, ai_response: str, effective_sentence_body: str) -> Optional[KnowledgeExtraction]:
+        """回答来自预生成内容时，知识点抽取结果也用预生成的（与 fused 结果同形）；否则返回 None"""
+        full_sentence = quoted_sentence.sentence_body
+        target = effective_sentence_body if effective_sentence_body != full_sentence else ""
+        cached_answer = preset_explanations.lookup(
+            preset_explanations.KIND_ANSWER, full_sentence, self.ui_language, target=target, question=user_question
+        )
+        # 只有本轮回答就是预生成回答时，抽取结果才对得上
+        if cached_answer is None or cached_answer != ai_response:
+            return None
+        cached = preset_explanations.lookup(
+            preset_explanations.KIND_EXTRACTION, full_sentence, self.ui_language, target=target, question=user_question
+        )
+        if cached is None:
+            return None
+        try:
+            extraction = KnowledgeExtraction.model_validate_json(cached)
+        except Exception as e:
+            self._ma_log("⚠️ [PresetExplanations] 预生成的知识点抽取结果无效，改为实时抽取: %s", e)
+            return None
+        self._ma_log("⚡ [PresetExplanations] 命中预生成的知识点抽取结果，跳过相关性判断 / 总结助手")
+        return extraction
+
     def handle_grammar_vocab_function(self, quoted_sentence: SentenceType, user_question: str, ai_response: str, effective_sentence_body: str = None):
         """
         处理与语法和词汇相关的操作。
@@ -590,36 +727,46 @@ class MainAssistant:
             self.current_language_code = language_code
             self.current_is_non_whitespace = is_non_whitespace
             if language_code:
-                self._ma_log(f"🌐 [handle_grammar_vocab_function] 检测到语言: {language} (代码: {language_code}, 非空格语言: {is_non_whitespace})")
+                self._ma_log("🌐 [handle_grammar_vocab_function] 检测到语言: %s (代码: %s, 非空格语言: %s)", language, language_code, is_non_whitespace)
             else:
-                self._ma_log(f"🌐 [handle_grammar_vocab_function] 无法检测语言，使用默认处理（假设为空格语言，is_non_whitespace={is_non_whitespace}）")
+                self._ma_log("🌐 [handle_grammar_vocab_function] 无法检测语言，使用默认处理（假设为空格语言，is_non_whitespace=%s）", is_non_whitespace)
         else:
-            self._ma_log(f"🌐 [handle_grammar_vocab_function] 使用已检测的语言信息: {self.current_language} (代码: {self.current_language_code}, 非空格语言: {self.current_is_non_whitespace})")
+            self._ma_log("🌐 [handle_grammar_vocab_function] 使用已检测的语言信息: %s (代码: %s, 非空格语言: %s)", self.current_language, self.current_language_code, self.current_is_non_whitespace)
         
         # 🔧 保存 selected_token 的引用（避免在后续处理中被清空）
         saved_selected_token = self.session_state.current_selected_token
-        self._ma_log(f"🔍 [DEBUG] [handle_grammar_vocab_function] 保存 selected_token 引用: {saved_selected_token is not None}")
+        self._ma_log("🔍 [DEBUG] [handle_grammar_vocab_function] 保存 selected_token 引用: %s", saved_selected_token is not None)
         if saved_selected_token:
-            self._ma_log(f"🔍 [DEBUG] [handle_grammar_vocab_function] selected_token.token_text: '{getattr(saved_selected_token, 'token_text', None)}'")
-            self._ma_log(f"🔍 [DEBUG] [handle_grammar_vocab_function] selected_token.token_indices: {getattr(saved_selected_token, 'token_indices', None)}")
+            self._ma_log("🔍 [DEBUG] [handle_grammar_vocab_function] selected_token.token_text: '%s'", getattr(saved_selected_token, 'token_text', None))
+            self._ma_log("🔍 [DEBUG] [handle_grammar_vocab_function] selected_token.token_indices: %s", getattr(saved_selected_token, 'token_indices', None))
         
         # 如果没有提供effective_sentence_body，使用完整句子
         if effective_sentence_body is None:
             effective_sentence_body = quoted_sentence.sentence_body
             
+        # fused 模式：一次调用拿到相关性判断 + 语法点 + 词汇；失败（None）时走下面的逐个助手流程
+        fused: Optional[KnowledgeExtraction] = self._cached_preset_extraction(quoted_sentence, user_question, ai_response, effective_sentence_body)
+        if fused is None and KNOWLEDGE_EXTRACTION_MODE == "fused":
+            fused = self._run_fused_extraction(effective_sentence_body, user_question, ai_response)
+
         # 检查是否与语法相关
-        if DISABLE_GRAMMAR_FEATURES:
+        if self._grammar_features_disabled():
             self._ma_log("⏸️ Grammar features are DISABLED (skip relevance/summarize/compare/generation)")
             grammar_relevant_response = {"is_grammar_relevant": False}
+        elif fused is not None:
+            grammar_relevant_response = {"is_grammar_relevant": fused.is_grammar_relevant}
         else:
             grammar_relevant_response = self.check_if_grammar_relavent_assistant.run(
                 effective_sentence_body, user_question, ai_response,
                 user_id=self._user_id, session=self._db_session
             )
-        vocab_relevant_response = self.check_if_vocab_relevant_assistant.run(
-            effective_sentence_body, user_question, ai_response,
-            user_id=self._user_id, session=self._db_session
-        )
+        if fused is not None:
+            vocab_relevant_response = {"is_vocab_relevant": fused.is_vocab_relevant}
+        else:
+            vocab_relevant_response = self.check_if_vocab_relevant_assistant.run(
+                effective_sentence_body, user_question, ai_response,
+                user_id=self._user_id, session=self._db_session
+            )
         
         # 确保响应是字典类型
         if isinstance(grammar_relevant_response, str):
@@ -632,8 +779,8 @@ class MainAssistant:
             vocab=vocab_relevant_response.get("is_vocab_relevant", False)
         )
 
-        if (not DISABLE_GRAMMAR_FEATURES) and self.session_state.check_relevant_decision and self.session_state.check_relevant_decision.grammar:
-            print("✅ 语法相关，开始总结语法规则。")
+        if (not self._grammar_features_disabled()) and self.session_state.check_relevant_decision and self.session_state.check_relevant_decision.grammar:
+            logger.info("✅ 语法相关，开始总结语法规则。")
             # 确保所有参数都不为 None
             sentence_body = effective_sentence_body
             user_input = self.session_state.current_input if self.session_state.current_input else user_question
@@ -641,14 +788,17 @@ class MainAssistant:
             
             # 🔧 使用 UI 语言而不是文章语言
             output_language = self.ui_language or self.session_state.current_language or "中文"
-            grammar_summary = self.summarize_grammar_rule_assistant.run(
-                sentence_body,
-                user_input,
-                ai_response_str,
-                language=output_language,
-                user_id=self._user_id, session=self._db_session
-            )
-            print(f"✅ [DEBUG] summarize_grammar_rule 输出: {_preview_for_log(grammar_summary, 400)}")
+            if fused is not None:
+                grammar_summary = fused.grammar_summary()
+            else:
+                grammar_summary = self.summarize_grammar_rule_assistant.run(
+                    sentence_body,
+                    user_input,
+                    ai_response_str,
+                    language=output_language,
+                    user_id=self._user_id, session=self._db_session
+                )
+            logger.debug("✅ [DEBUG] summarize_grammar_rule 输出: %s", lazy(lambda: _preview_for_log(grammar_summary, 400)))
             
             # 处理新的格式：display_name + canonical
             def process_new_format_grammar(grammar_dict: dict):
@@ -661,10 +811,10 @@ class MainAssistant:
                 
                 # 验证必要字段
                 if not display_name or not canonical_category or not canonical_subtype:
-                    print(f"⚠️ [DEBUG] 新格式语法规则缺少必要字段: display_name={display_name}, category={canonical_category}, subtype={canonical_subtype}")
+                    logger.warning("⚠️ [DEBUG] 新格式语法规则缺少必要字段: display_name=%s, category=%s, subtype=%s", display_name, canonical_category, canonical_subtype)
                     return False
                 
-                print(f"✅ [DEBUG] 检测到新格式语法规则: display_name={display_name}, category={canonical_category}, subtype={canonical_subtype}")
+                logger.debug("✅ [DEBUG] 检测到新格式语法规则: display_name=%s, category=%s, subtype=%s", display_name, canonical_category, canonical_subtype)
                 
                 # 🔧 1. 先生成 canonical_key（用于查重）
                 # 🔧 获取文章的实际语言（从数据库），而不是 session_state.current_language（可能是 UI 语言）
@@ -686,18 +836,18 @@ class MainAssistant:
                             ).first()
                             if text_model:
                                 article_language = text_model.language
-                                print(f"🔍 [DEBUG] 从数据库获取文章language用于生成canonical_key: {article_language} (text_id={current_sentence.text_id})")
+                                logger.debug("🔍 [DEBUG] 从数据库获取文章language用于生成canonical_key: %s (text_id=%s)", article_language, current_sentence.text_id)
                             else:
-                                print(f"⚠️ [DEBUG] 文章不存在，无法获取language: text_id={current_sentence.text_id}, user_id={user_id}")
+                                logger.warning("⚠️ [DEBUG] 文章不存在，无法获取language: text_id=%s, user_id=%s", current_sentence.text_id, user_id)
                         finally:
                             session.close()
                     except Exception as e:
-                        print(f"⚠️ [DEBUG] 获取文章language失败: {e}")
+                        logger.warning("⚠️ [DEBUG] 获取文章language失败: %s", e)
                 
                 # 如果无法从数据库获取，使用默认值
                 if not article_language:
                     article_language = "中文"
-                    print(f"⚠️ [DEBUG] 无法获取文章language，使用默认值: {article_language}")
+                    logger.warning("⚠️ [DEBUG] 无法获取文章language，使用默认值: %s", article_language)
                 
                 try:
                     canonical_key = generate_canonical_key(
@@ -705,15 +855,15 @@ class MainAssistant:
                         category=canonical_category,
                         subtype=canonical_subtype
                     )
-                    print(f"✅ [DEBUG] 生成 canonical_key: {canonical_key} (使用文章language: {article_language})")
+                    logger.debug("✅ [DEBUG] 生成 canonical_key: %s (使用文章language: %s)", canonical_key, article_language)
                 except Exception as e:
-                    print(f"❌ [DEBUG] 生成 canonical_key 失败: {e}")
+                    logger.error("❌ [DEBUG] 生成 canonical_key 失败: %s", e)
                     canonical_key = None
                 
                 # 如果 canonical_key 生成失败，使用组合 key 作为 fallback
                 if not canonical_key:
                     canonical_key = f"{canonical_category}::{canonical_subtype}"
-                    print(f"⚠️ [DEBUG] canonical_key 生成失败，使用 fallback: {canonical_key}")
+                    logger.warning("⚠️ [DEBUG] canonical_key 生成失败，使用 fallback: %s", canonical_key)
                 
                 # 🔧 2. 添加到 GrammarSummary（使用新格式）
                 # 注意：rule_summary 将在查重后生成（只有新语法才需要）
@@ -723,7 +873,7 @@ class MainAssistant:
                     canonical_function=canonical_function or "",
                     canonical_key=canonical_key
                 )
-                print(f"✅ [DEBUG] 添加新格式语法总结: display_name={display_name}, canonical_key={canonical_key}")
+                logger.debug("✅ [DEBUG] 添加新格式语法总结: display_name=%s, canonical_key=%s", display_name, canonical_key)
                 
                 # 临时存储 display_name（用于后续添加到数据库）
                 # rule_summary 将在查重后生成
@@ -735,7 +885,7 @@ class MainAssistant:
                     'display_name': display_name,
                     'rule_summary': None  # 将在查重后生成
                 }
-                print(f"🔍 [DEBUG] 临时存储语法元数据: key={metadata_key}, display_name={display_name}")
+                logger.debug("🔍 [DEBUG] 临时存储语法元数据: key=%s, display_name=%s", metadata_key, display_name)
                 
                 return True
             
@@ -747,14 +897,16 @@ class MainAssistant:
             elif isinstance(grammar_summary, list) and len(grammar_summary) > 0:
                 # 列表格式（支持多个语法知识点）
                 grammar_list = grammar_summary
-                print(f"✅ [DEBUG] 检测到多个语法知识点: {len(grammar_list)} 个")
+                logger.debug("✅ [DEBUG] 检测到多个语法知识点: %s 个", len(grammar_list))
+            elif isinstance(grammar_summary, list):
+                logger.info("ℹ️ [DEBUG] 没有新的语法规则")
             elif isinstance(grammar_summary, str):
                 if grammar_summary.strip() == "":
-                    print(f"⚠️ [DEBUG] AI 返回空字符串，表示没有新的语法规则")
+                    logger.warning("⚠️ [DEBUG] AI 返回空字符串，表示没有新的语法规则")
                 else:
-                    print(f"⚠️ [DEBUG] AI 返回字符串（非空）: {_preview_for_log(grammar_summary, 400)}")
+                    logger.warning("⚠️ [DEBUG] AI 返回字符串（非空）: %s", _preview_for_log(grammar_summary, 400))
             else:
-                print(f"⚠️ [DEBUG] grammar_summary 类型未知: {type(grammar_summary)}, 值: {_preview_for_log(grammar_summary, 400)}")
+                logger.warning("⚠️ [DEBUG] grammar_summary 类型未知: %s, 值: %s", type(grammar_summary), _preview_for_log(grammar_summary, 400))
             
             # 处理每个语法知识点
             for grammar_item in grammar_list:
@@ -767,27 +919,30 @@ class MainAssistant:
                         grammar_name = grammar_item.get("grammar_rule_name", "Unknown")
                         grammar_explanation = grammar_item.get("grammar_rule_summary", "No explanation provided")
                         if grammar_name and grammar_name != "Unknown" and grammar_explanation and grammar_explanation != "No explanation provided":
-                            print(f"⚠️ [DEBUG] 检测到旧格式语法规则，已弃用: {grammar_name}")
+                            logger.warning("⚠️ [DEBUG] 检测到旧格式语法规则，已弃用: %s", grammar_name)
                         else:
-                            print(f"⚠️ [DEBUG] 语法总结为空或无效: name={grammar_name}, explanation={grammar_explanation}")
+                            logger.warning("⚠️ [DEBUG] 语法总结为空或无效: name=%s, explanation=%s", grammar_name, grammar_explanation)
                 else:
-                    print(f"⚠️ [DEBUG] 语法规则格式不支持: {type(grammar_item)}, 值: {_preview_for_log(grammar_item, 400)}")
+                    logger.warning("⚠️ [DEBUG] 语法规则格式不支持: %s, 值: %s", type(grammar_item), _preview_for_log(grammar_item, 400))
 
         # 检查是否与词汇相关
         if self.session_state.check_relevant_decision and self.session_state.check_relevant_decision.vocab:
-            print("✅ 词汇相关，开始总结词汇。")
+            logger.info("✅ 词汇相关，开始总结词汇。")
             # 确保所有参数都不为 None
             sentence_body = effective_sentence_body
             user_input = self.session_state.current_input if self.session_state.current_input else user_question
             ai_response_str = self.session_state.current_response if self.session_state.current_response else ai_response
             
-            raw_vocab_summary = self.summarize_vocab_rule_assistant.run(
-                sentence_body,
-                user_input,
-                ai_response_str,
-                is_non_whitespace=self.current_is_non_whitespace,
-                user_id=self._user_id, session=self._db_session
-            )
+            if fused is not None:
+                raw_vocab_summary = fused.vocab_summary()
+            else:
+                raw_vocab_summary = self.summarize_vocab_rule_assistant.run(
+                    sentence_body,
+                    user_input,
+                    ai_response_str,
+                    is_non_whitespace=self.current_is_non_whitespace,
+                    user_id=self._user_id, session=self._db_session
+                )
 
             # 🔧 修复：避免跨多轮累积过多 vocab，总是只针对当前轮的词汇进行处理
             # 支持两种返回形式：单个 dict 或 list[dict]
@@ -819,7 +974,7 @@ class MainAssistant:
             # 🔧 如果 summarizer 完全没有返回任何 vocab，但当前 clearly 有选中的 token，
             # 则回退为：直接把当前选中的单词当作本轮的唯一 vocab
             if not vocab_items and current_token_text:
-                print(f"🆕 [DEBUG] summarizer 未返回 vocab，回退使用当前选中单词: '{current_token_text}'")
+                logger.debug("🆕 [DEBUG] summarizer 未返回 vocab，回退使用当前选中单词: '%s'", current_token_text)
                 vocab_items = [{"vocab": current_token_text}]
 
             filtered_items = []
@@ -851,13 +1006,13 @@ class MainAssistant:
                 self.session_state.add_vocab_summary(vocab_str)
 
         # 语法处理：检查相似度，为现有规则添加例句或添加新规则
-        if DISABLE_GRAMMAR_FEATURES:
-            print("⏸️ [MainAssistant] Grammar compare/new-rule flow disabled — skipping grammar pipeline")
+        if self._grammar_features_disabled():
+            logger.info("⏸️ [MainAssistant] Grammar compare/new-rule flow disabled — skipping grammar pipeline")
             current_grammar_rules = []
             new_grammar_summaries = []
             article_language = None
         else:
-            print("🔍 处理语法规则：检查相似度...")
+            logger.debug("🔍 处理语法规则：检查相似度...")
             
             # 🔧 获取当前文章的language字段
             current_sentence = self.session_state.current_sentence if self.session_state.current_sentence else quoted_sentence
@@ -877,13 +1032,13 @@ class MainAssistant:
                         ).first()
                         if text_model:
                             article_language = text_model.language
-                            print(f"🔍 [DEBUG] 获取文章language: {article_language} (text_id={current_sentence.text_id})")
+                            logger.debug("🔍 [DEBUG] 获取文章language: %s (text_id=%s)", article_language, current_sentence.text_id)
                         else:
-                            print(f"⚠️ [DEBUG] 文章不存在: text_id={current_sentence.text_id}, user_id={user_id}")
+                            logger.warning("⚠️ [DEBUG] 文章不存在: text_id=%s, user_id=%s", current_sentence.text_id, user_id)
                     finally:
                         session.close()
                 except Exception as e:
-                    print(f"⚠️ [DEBUG] 获取文章language失败: {e}")
+                    logger.warning("⚠️ [DEBUG] 获取文章language失败: %s", e)
             
             # 🔧 获取所有现有语法规则（包含language信息），而不是只获取名称
             current_grammar_rules = []
@@ -901,9 +1056,9 @@ class MainAssistant:
                         # 🔧 如果文章有语言，只获取相同语言的规则
                         if article_language:
                             query = query.filter(GrammarRule.language == article_language)
-                            print(f"📚 只获取相同语言的语法规则 (user_id={user_id}, language={article_language})")
+                            logger.info("📚 只获取相同语言的语法规则 (user_id=%s, language=%s)", user_id, article_language)
                         else:
-                            print(f"📚 文章无语言信息，获取所有语言的语法规则 (user_id={user_id})")
+                            logger.info("📚 文章无语言信息，获取所有语言的语法规则 (user_id=%s)", user_id)
                         
                         grammar_models = query.all()
                         # 构建规则字典：{name, rule_id, language, canonical_key}
@@ -914,11 +1069,11 @@ class MainAssistant:
                                 'language': rule_model.language,
                                 'canonical_key': rule_model.canonical_key  # 新增：包含 canonical_key
                             })
-                        print(f"📚 当前已有 {len(current_grammar_rules)} 个语法规则（包含language和canonical_key信息，user_id={user_id}）")
+                        logger.info("📚 当前已有 %s 个语法规则（包含language和canonical_key信息，user_id=%s）", len(current_grammar_rules), user_id)
                     finally:
                         session.close()
                 except Exception as e:
-                    print(f"⚠️ [DEBUG] 从数据库获取语法规则失败: {e}")
+                    logger.warning("⚠️ [DEBUG] 从数据库获取语法规则失败: %s", e)
                     import traceback
                     traceback.print_exc()
                     # 回退到文件系统管理器
@@ -929,12 +1084,12 @@ class MainAssistant:
                 current_grammar_rule_names = self.data_controller.grammar_manager.get_all_rules_name()
                 current_grammar_rules = [{'name': name, 'rule_id': None, 'language': None} for name in current_grammar_rule_names]
             
-            print(f"📚 现有语法规则列表: {[r['name'] for r in current_grammar_rules]}")
+            logger.info("📚 现有语法规则列表: %s", [r['name'] for r in current_grammar_rules])
             new_grammar_summaries = []
         
         # 🔧 查重逻辑：基于 canonical_key 进行对比
         # 🔧 同时检查 grammar_to_add 和已有语法列表，避免重复添加
-        print("🔍 开始语法规则查重（基于 canonical_key）...")
+        logger.debug("🔍 开始语法规则查重（基于 canonical_key）...")
         
         # 构建待查重的语法列表（包括已有语法和 grammar_to_add）
         all_existing_grammars = []
@@ -963,16 +1118,16 @@ class MainAssistant:
                         'source': 'grammar_to_add'  # 标记来源
                     })
         
-        print(f"🔍 [DEBUG] 查重列表包含: {len(all_existing_grammars)} 个语法规则（已有: {len([g for g in all_existing_grammars if g['source'] == 'existing'])}, grammar_to_add: {len([g for g in all_existing_grammars if g['source'] == 'grammar_to_add'])})")
+        logger.debug("🔍 [DEBUG] 查重列表包含: %s 个语法规则（已有: %s, grammar_to_add: %s)", len(all_existing_grammars), lazy(lambda: len([g for g in all_existing_grammars if g['source'] == 'existing'])), lazy(lambda: len([g for g in all_existing_grammars if g['source'] == 'grammar_to_add'])))
         
         for result in self.session_state.summarized_results:
             if isinstance(result, GrammarSummary):
                 # 新格式：使用 canonical_key 进行查重
                 new_canonical_key = result.canonical_key
-                print(f"🔍 检查语法规则: canonical_key={new_canonical_key} (文章language: {article_language})")
+                logger.debug("🔍 检查语法规则: canonical_key=%s (文章language: %s)", new_canonical_key, article_language)
                 
                 if not new_canonical_key:
-                    print(f"⚠️ [DEBUG] 新语法规则的 canonical_key 为空，跳过查重，直接添加为新规则")
+                    logger.warning("⚠️ [DEBUG] 新语法规则的 canonical_key 为空，跳过查重，直接添加为新规则")
                     new_grammar_summaries.append(result)
                     continue
                 
@@ -992,12 +1147,12 @@ class MainAssistant:
                     # 🔧 语言过滤：只对比相同语言的语法规则
                     if article_language and existing_rule_language:
                         if article_language != existing_rule_language:
-                            print(f"🔍 [DEBUG] 跳过不同语言的语法规则: '{existing_rule_name}' (language={existing_rule_language}, source={existing_source}) vs 文章language={article_language}")
+                            logger.debug("🔍 [DEBUG] 跳过不同语言的语法规则: '%s' (language=%s, source=%s) vs 文章language=%s", existing_rule_name, existing_rule_language, existing_source, article_language)
                             continue
                     
                     # 🔧 查重逻辑：如果 canonical_key 一致，则判断为"当前语法已存在"
                     if existing_canonical_key == new_canonical_key:
-                        print(f"✅ [DEBUG] 找到相同 canonical_key 的语法规则: '{existing_rule_name}' (rule_id={existing_rule_id}, source={existing_source}, canonical_key={existing_canonical_key})")
+                        logger.debug("✅ [DEBUG] 找到相同 canonical_key 的语法规则: '%s' (rule_id=%s, source=%s, canonical_key=%s)", existing_rule_name, existing_rule_id, existing_source, existing_canonical_key)
                         found_existing = True
                         break
                 
@@ -1005,7 +1160,7 @@ class MainAssistant:
                     # 🔧 当前语法已存在（在已有语法或 grammar_to_add 中），不加入新语法
                     if existing_source == 'existing' and existing_rule_id:
                         # 如果是在已有语法中找到，进入添加句子为 grammar example 流程
-                        print(f"✅ 语法规则已存在 (canonical_key={new_canonical_key})，将添加为 grammar example，不创建新规则")
+                        logger.debug("✅ 语法规则已存在 (canonical_key=%s)，将添加为 grammar example，不创建新规则", new_canonical_key)
                         
                         # 为现有语法规则添加新例句
                         current_sentence = self.session_state.current_sentence if self.session_state.current_sentence else sentence_body
@@ -1013,10 +1168,10 @@ class MainAssistant:
                             # 验证句子完整性
                             if hasattr(current_sentence, 'text_id') and hasattr(current_sentence, 'sentence_id'):
                                 self._ensure_sentence_integrity(current_sentence, "现有语法 Example 调用")
-                                print(f"🔍 [DEBUG] 调用grammar_example_explanation_assistant for '{existing_rule_name}' (rule_id={existing_rule_id})")
+                                logger.debug("🔍 [DEBUG] 调用grammar_example_explanation_assistant for '%s' (rule_id=%s)", existing_rule_name, existing_rule_id)
                                 # 🔧 使用 UI 语言而不是文章语言
                                 output_language = self.ui_language or self.session_state.current_language or "中文"
-                                print(f"🔍 [DEBUG] 输出语言: {output_language} (UI语言: {self.ui_language}, 文章语言: {self.session_state.current_language})")
+                                logger.debug("🔍 [DEBUG] 输出语言: %s (UI语言: %s, 文章语言: %s)", output_language, self.ui_language, self.session_state.current_language)
                                 
                                 # 获取 display_name 用于 grammar_example_explanation
                                 display_name = ""
@@ -1030,7 +1185,7 @@ class MainAssistant:
                                     language=output_language,
                                     user_id=self._user_id, session=self._db_session
                                 )
-                                print(f"🔍 [DEBUG] example_explanation原始结果: {_preview_for_log(example_explanation_raw, 360)}")
+                                logger.debug("🔍 [DEBUG] example_explanation原始结果: %s", lazy(lambda: _preview_for_log(example_explanation_raw, 360)))
                                 
                                 # 🔧 解析 JSON 字符串，提取 explanation 字段
                                 example_explanation = None
@@ -1043,29 +1198,29 @@ class MainAssistant:
                                         else:
                                             example_explanation = example_explanation_raw
                                     except Exception as e:
-                                        print(f"⚠️ [DEBUG] 解析 grammar example_explanation JSON 失败: {e}，使用原始字符串")
+                                        logger.warning("⚠️ [DEBUG] 解析 grammar example_explanation JSON 失败: %s，使用原始字符串", e)
                                         example_explanation = example_explanation_raw
                                 elif isinstance(example_explanation_raw, dict) and "explanation" in example_explanation_raw:
                                     example_explanation = example_explanation_raw["explanation"]
                                 else:
                                     example_explanation = str(example_explanation_raw) if example_explanation_raw else None
                                 
-                                print(f"🔍 [DEBUG] example_explanation解析后: {_preview_for_log(example_explanation, 360)}")
+                                logger.debug("🔍 [DEBUG] example_explanation解析后: %s", lazy(lambda: _preview_for_log(example_explanation, 360)))
                                 
                                 try:
-                                    print(f"🔍 [DEBUG] 尝试添加现有语法的grammar_example: text_id={current_sentence.text_id}, sentence_id={current_sentence.sentence_id}, rule_id={existing_rule_id}")
-                                    print(f"🔍 [DEBUG] explanation_context: {_preview_for_log(example_explanation, 360)}")
+                                    logger.debug("🔍 [DEBUG] 尝试添加现有语法的grammar_example: text_id=%s, sentence_id=%s, rule_id=%s", current_sentence.text_id, current_sentence.sentence_id, existing_rule_id)
+                                    logger.debug("🔍 [DEBUG] explanation_context: %s", lazy(lambda: _preview_for_log(example_explanation, 360)))
                                     
                                     # 🔧 为现有语法创建grammar notation（在add_grammar_example之前）
-                                    print(f"🔍 [DEBUG] ========== 开始为现有语法创建grammar notation ==========")
-                                    print(f"🔍 [DEBUG] 当前句子信息: text_id={current_sentence.text_id}, sentence_id={current_sentence.sentence_id}")
-                                    print(f"🔍 [DEBUG] 现有语法规则ID: {existing_rule_id}")
-                                    print(f"🔍 [DEBUG] 现有语法规则名称: {existing_rule_name}")
+                                    logger.debug("🔍 [DEBUG] ========== 开始为现有语法创建grammar notation ==========")
+                                    logger.debug("🔍 [DEBUG] 当前句子信息: text_id=%s, sentence_id=%s", current_sentence.text_id, current_sentence.sentence_id)
+                                    logger.debug("🔍 [DEBUG] 现有语法规则ID: %s", existing_rule_id)
+                                    logger.debug("🔍 [DEBUG] 现有语法规则名称: %s", existing_rule_name)
                                     
                                     # 获取 token_indices（从 session_state 中的 selected_token）
                                     token_indices = self._get_token_indices_from_selection(current_sentence)
-                                    print(f"🔍 [DEBUG] 提取的token_indices: {token_indices}")
-                                    print(f"🔍 [DEBUG] token_indices类型: {type(token_indices)}")
+                                    logger.debug("🔍 [DEBUG] 提取的token_indices: %s", token_indices)
+                                    logger.debug("🔍 [DEBUG] token_indices类型: %s", type(token_indices))
                                     
                                     # 获取 user_id（用于 notation，需要转换为字符串）
                                     user_id_for_notation = getattr(self.session_state, 'user_id', None)
@@ -1078,13 +1233,13 @@ class MainAssistant:
                                     # 调用 unified_notation_manager 创建 grammar notation
                                     from backend.data_managers.unified_notation_manager import get_unified_notation_manager
                                     notation_manager = get_unified_notation_manager(use_database=True, use_legacy_compatibility=True)
-                                    print(f"🔍 [DEBUG] 调用mark_notation参数:")
-                                    print(f"  - notation_type: grammar")
-                                    print(f"  - user_id: {user_id_for_notation}")
-                                    print(f"  - text_id: {current_sentence.text_id}")
-                                    print(f"  - sentence_id: {current_sentence.sentence_id}")
-                                    print(f"  - grammar_id: {existing_rule_id}")
-                                    print(f"  - marked_token_ids: {token_indices}")
+                                    logger.debug("🔍 [DEBUG] 调用mark_notation参数:")
+                                    logger.debug("  - notation_type: grammar")
+                                    logger.debug("  - user_id: %s", user_id_for_notation)
+                                    logger.debug("  - text_id: %s", current_sentence.text_id)
+                                    logger.debug("  - sentence_id: %s", current_sentence.sentence_id)
+                                    logger.debug("  - grammar_id: %s", existing_rule_id)
+                                    logger.debug("  - marked_token_ids: %s", token_indices)
                                     
                                     success = notation_manager.mark_notation(
                                         notation_type="grammar",
@@ -1095,8 +1250,8 @@ class MainAssistant:
                                         marked_token_ids=token_indices
                                     )
                                     
-                                    print(f"🔍 [DEBUG] mark_notation返回结果: {success}")
-                                    print(f"🔍 [DEBUG] 结果类型: {type(success)}")
+                                    logger.debug("🔍 [DEBUG] mark_notation返回结果: %s", success)
+                                    logger.debug("🔍 [DEBUG] 结果类型: %s", type(success))
                                     
                                     if success:
                                         # 🔧 使用实际的 user_id（整数）而不是字符串
@@ -1110,17 +1265,17 @@ class MainAssistant:
                                         )
                                         # 🔧 记录已有语法知识点的 notation（用于 toast）
                                         display_name_for_toast = display_name or existing_rule_name
-                                        print(f"🔍 [DEBUG] 准备记录已有语法知识点到 existing_grammar_notations: grammar_id={existing_rule_id}, display_name={display_name_for_toast}, user_id={actual_user_id}")
+                                        logger.debug("🔍 [DEBUG] 准备记录已有语法知识点到 existing_grammar_notations: grammar_id=%s, display_name=%s, user_id=%s", existing_rule_id, display_name_for_toast, actual_user_id)
                                         self.session_state.add_existing_grammar_notation(
                                             grammar_id=existing_rule_id,
                                             display_name=display_name_for_toast,
                                             user_id=actual_user_id
                                         )
-                                        print(f"✅ [DEBUG] 成功创建grammar notation并添加到session_state（已有知识点）")
-                                        print(f"🔍 [DEBUG] 当前 existing_grammar_notations 数量: {len(self.session_state.existing_grammar_notations)}")
-                                        print(f"🔍 [DEBUG] existing_grammar_notations 内容: {self.session_state.existing_grammar_notations}")
+                                        logger.debug("✅ [DEBUG] 成功创建grammar notation并添加到session_state（已有知识点）")
+                                        logger.debug("🔍 [DEBUG] 当前 existing_grammar_notations 数量: %s", len(self.session_state.existing_grammar_notations))
+                                        logger.debug("🔍 [DEBUG] existing_grammar_notations 内容: %s", self.session_state.existing_grammar_notations)
                                     else:
-                                        print(f"⚠️ [DEBUG] mark_notation返回False，但继续执行")
+                                        logger.warning("⚠️ [DEBUG] mark_notation返回False，但继续执行")
                                     
                                     # 添加 grammar example
                                     # 🔧 使用数据库管理器添加 grammar example（如果使用数据库）
@@ -1139,7 +1294,7 @@ class MainAssistant:
                                                     OriginalText.user_id == user_id
                                                 ).first()
                                                 if not text_model:
-                                                    print(f"⚠️ [DEBUG] 跳过添加grammar_example，因为text_id={current_sentence.text_id}不存在或不属于用户{user_id}")
+                                                    logger.warning("⚠️ [DEBUG] 跳过添加grammar_example，因为text_id=%s不存在或不属于用户%s", current_sentence.text_id, user_id)
                                                 else:
                                                     grammar_db_manager = GrammarRuleManagerDB(session)
                                                     grammar_db_manager.add_grammar_example(
@@ -1148,22 +1303,22 @@ class MainAssistant:
                                                         sentence_id=current_sentence.sentence_id,
                                                         explanation_context=example_explanation
                                                     )
-                                                    print(f"✅ [DEBUG] 现有语法的grammar_example已添加到数据库: rule_id={existing_rule_id}, text_id={current_sentence.text_id}, sentence_id={current_sentence.sentence_id}")
+                                                    logger.debug("✅ [DEBUG] 现有语法的grammar_example已添加到数据库: rule_id=%s, text_id=%s, sentence_id=%s", existing_rule_id, current_sentence.text_id, current_sentence.sentence_id)
                                             finally:
                                                 session.close()
                                         except Exception as e:
-                                            print(f"❌ [DEBUG] 使用数据库管理器创建grammar_example失败: {e}")
+                                            logger.error("❌ [DEBUG] 使用数据库管理器创建grammar_example失败: %s", e)
                                             import traceback
                                             traceback.print_exc()
                                             # 回退到文件系统管理器
-                                            print(f"⚠️ [DEBUG] 回退到文件系统管理器")
+                                            logger.warning("⚠️ [DEBUG] 回退到文件系统管理器")
                                             self.data_controller.add_grammar_example(
                                                 rule_id=existing_rule_id,
                                                 text_id=current_sentence.text_id,
                                                 sentence_id=current_sentence.sentence_id,
                                                 explanation_context=example_explanation
                                             )
-                                            print(f"✅ [DEBUG] 现有语法的grammar_example添加成功（文件系统）")
+                                            logger.debug("✅ [DEBUG] 现有语法的grammar_example添加成功（文件系统）")
                                     else:
                                         # 没有user_id，使用文件系统管理器
                                         self.data_controller.add_grammar_example(
@@ -1172,29 +1327,29 @@ class MainAssistant:
                                             sentence_id=current_sentence.sentence_id,
                                             explanation_context=example_explanation
                                         )
-                                        print(f"✅ [DEBUG] 现有语法的grammar_example添加成功（文件系统）")
-                                    print(f"✅ [DEBUG] 成功为现有语法规则添加grammar_example: rule_id={existing_rule_id}")
+                                        logger.debug("✅ [DEBUG] 现有语法的grammar_example添加成功（文件系统）")
+                                    logger.debug("✅ [DEBUG] 成功为现有语法规则添加grammar_example: rule_id=%s", existing_rule_id)
                                 except Exception as e:
-                                    print(f"❌ [DEBUG] 添加grammar_example失败: {e}")
+                                    logger.error("❌ [DEBUG] 添加grammar_example失败: %s", e)
                                     import traceback
                                     traceback.print_exc()
                             else:
-                                print(f"⚠️ [DEBUG] 无法添加grammar example: current_sentence={current_sentence}, existing_rule_id={existing_rule_id}")
+                                logger.warning("⚠️ [DEBUG] 无法添加grammar example: current_sentence=%s, existing_rule_id=%s", current_sentence, existing_rule_id)
                     else:
                         # 如果是在 grammar_to_add 中找到，说明同一轮对话中已经准备添加，跳过
-                        print(f"✅ 语法规则已在 grammar_to_add 中 (canonical_key={new_canonical_key})，跳过重复添加")
+                        logger.debug("✅ 语法规则已在 grammar_to_add 中 (canonical_key=%s)，跳过重复添加", new_canonical_key)
                     
                     # 不添加到 new_grammar_summaries
                     continue
                 else:
                     # 🔧 canonical_key 不一致，进入添加新语法规则流程
-                    print(f"🆕 新语法知识点：canonical_key='{new_canonical_key}'，将添加为新规则 (继承文章language: {article_language})")
+                    logger.debug("🆕 新语法知识点：canonical_key='%s'，将添加为新规则 (继承文章language: %s)", new_canonical_key, article_language)
                     new_grammar_summaries.append(result)
         
         # 将新语法添加到 grammar_to_add（只有查重通过的新语法才会到这里）
-        if not DISABLE_GRAMMAR_FEATURES:
+        if not self._grammar_features_disabled():
             if len(new_grammar_summaries) > MAX_KNOWLEDGE_ITEMS_PER_CHAT:
-                print(f"⚠️ [MainAssistant] 新语法候选过多，仅保留前 {MAX_KNOWLEDGE_ITEMS_PER_CHAT} 个")
+                logger.warning("⚠️ [MainAssistant] 新语法候选过多，仅保留前 %s 个", MAX_KNOWLEDGE_ITEMS_PER_CHAT)
                 new_grammar_summaries = new_grammar_summaries[:MAX_KNOWLEDGE_ITEMS_PER_CHAT]
             for grammar in new_grammar_summaries:
                 if isinstance(grammar, GrammarSummary):
@@ -1213,16 +1368,16 @@ class MainAssistant:
                             metadata = self.session_state._grammar_metadata.get(fallback_key, {})
                         display_name = metadata.get('display_name', '')
                         rule_summary = metadata.get('rule_summary', None)  # 可能是 None，表示还未生成
-                        print(f"🔍 [DEBUG] 从临时存储获取元数据: canonical_key={canonical_key}, display_name={display_name}, rule_summary={'已生成' if rule_summary else '未生成'}...")
+                        logger.debug("🔍 [DEBUG] 从临时存储获取元数据: canonical_key=%s, display_name=%s, rule_summary=%s...", canonical_key, display_name, '已生成' if rule_summary else '未生成')
                     
                     if not display_name:
                         # 如果没有找到，使用默认值
                         display_name = f"{grammar.canonical_category}::{grammar.canonical_subtype}"
-                        print(f"⚠️ [DEBUG] 未找到 display_name，使用默认值: {display_name}")
+                        logger.warning("⚠️ [DEBUG] 未找到 display_name，使用默认值: %s", display_name)
                     
                     # 🔧 如果 rule_summary 还未生成，现在生成（只有新语法才需要）
                     if not rule_summary:
-                        print(f"🔍 [DEBUG] rule_summary 未生成，现在调用 grammar_explanation_assistant 生成...")
+                        logger.debug("🔍 [DEBUG] rule_summary 未生成，现在调用 grammar_explanation_assistant 生成...")
                         # 获取用户引用的句子
                         sentence_body = effective_sentence_body
                         # 构建 grammar_dict 用于 grammar_explanation_assistant
@@ -1252,30 +1407,40 @@ class MainAssistant:
                                     ).first()
                                     if text_model:
                                         learning_language = text_model.language
-                                        print(f"🔍 [DEBUG] 从数据库获取文章language用于grammar_explanation: {learning_language} (text_id={current_sentence.text_id})")
+                                        logger.debug("🔍 [DEBUG] 从数据库获取文章language用于grammar_explanation: %s (text_id=%s)", learning_language, current_sentence.text_id)
                                 finally:
                                     session.close()
                             except Exception as e:
-                                print(f"⚠️ [DEBUG] 获取文章language失败: {e}")
+                                logger.warning("⚠️ [DEBUG] 获取文章language失败: %s", e)
                         
                         # 如果无法从数据库获取，使用默认值
                         if not learning_language:
                             learning_language = self.session_state.current_language or "中文"
-                            print(f"⚠️ [DEBUG] 无法获取文章language，使用默认值: {learning_language}")
+                            logger.warning("⚠️ [DEBUG] 无法获取文章language，使用默认值: %s", learning_language)
                         
                         # 获取输出语言（UI语言）
                         output_language = self.ui_language or self.session_state.current_language or "中文"
-                        print(f"🔍 [DEBUG] 学习语言: {learning_language}, 输出语言: {output_language}")
+                        logger.debug("🔍 [DEBUG] 学习语言: %s, 输出语言: %s", learning_language, output_language)
                         try:
-                            explanation_result = self.grammar_explanation_assistant.run(
-                                quoted_sentence=sentence_body,
-                                grammar_summary=grammar_dict,
-                                language=output_language,  # 输出语言（UI语言）
-                                learning_language=learning_language,  # 用户正在学习的语言（文章语言）
-                                user_id=self._user_id,
-                                session=self._db_session
+                            cached_explanation = preset_explanations.lookup(
+                                preset_explanations.KIND_GRAMMAR,
+                                getattr(self.session_state.current_sentence, "sentence_body", None) or sentence_body,
+                                output_language,
+                                target=preset_explanations.grammar_target(grammar.canonical_category, grammar.canonical_subtype),
                             )
-                            print(f"🔍 [DEBUG] grammar_explanation 结果: {type(explanation_result)}, 值: {explanation_result}")
+                            if cached_explanation is not None:
+                                logger.debug("⚡ [PresetExplanations] 命中预生成语法解释: %s", canonical_key)
+                                explanation_result = {"grammar_explanation": cached_explanation}
+                            else:
+                                explanation_result = self.grammar_explanation_assistant.run(
+                                    quoted_sentence=sentence_body,
+                                    grammar_summary=grammar_dict,
+                                    language=output_language,  # 输出语言（UI语言）
+                                    learning_language=learning_language,  # 用户正在学习的语言（文章语言）
+                                    user_id=self._user_id,
+                                    session=self._db_session
+                                )
+                            logger.debug("🔍 [DEBUG] grammar_explanation 结果: %s, 值: %s", type(explanation_result), explanation_result)
                             
                             # 解析解释结果
                             if isinstance(explanation_result, dict):
@@ -1289,26 +1454,26 @@ class MainAssistant:
                                     rule_summary = explanation_result
                             
                             if not rule_summary:
-                                print(f"⚠️ [DEBUG] grammar_explanation 返回空，使用默认解释")
+                                logger.warning("⚠️ [DEBUG] grammar_explanation 返回空，使用默认解释")
                                 rule_summary = f"{display_name}的语法规则"
                             
-                            print(f"✅ [DEBUG] 语法规则解释生成成功: {rule_summary[:50]}...")
+                            logger.debug("✅ [DEBUG] 语法规则解释生成成功: %s...", rule_summary[:50])
                             
                             # 更新临时存储中的 rule_summary
                             if hasattr(self.session_state, '_grammar_metadata') and self.session_state._grammar_metadata:
                                 if canonical_key in self.session_state._grammar_metadata:
                                     self.session_state._grammar_metadata[canonical_key]['rule_summary'] = rule_summary
                         except Exception as e:
-                            print(f"❌ [DEBUG] grammar_explanation 调用失败: {e}")
+                            logger.error("❌ [DEBUG] grammar_explanation 调用失败: %s", e)
                             import traceback
                             traceback.print_exc()
                             rule_summary = f"{display_name}的语法规则"
                     
                     if not rule_summary:
                         rule_summary = f"{display_name}的语法规则"
-                        print(f"⚠️ [DEBUG] 未找到 rule_summary，使用默认值: {rule_summary}")
+                        logger.warning("⚠️ [DEBUG] 未找到 rule_summary，使用默认值: %s", rule_summary)
                     
-                    print(f"🆕 添加新语法: display_name={display_name}, canonical_key={canonical_key}")
+                    logger.debug("🆕 添加新语法: display_name=%s, canonical_key=%s", display_name, canonical_key)
                     self.session_state.add_grammar_to_add(
                         canonical_category=grammar.canonical_category,
                         canonical_subtype=grammar.canonical_subtype,
@@ -1319,7 +1484,7 @@ class MainAssistant:
                     )
                 else:
                     # 旧格式兼容（向后兼容）
-                    print(f"🆕 添加新语法（旧格式）: {grammar.grammar_rule_name}")
+                    logger.debug("🆕 添加新语法（旧格式）: %s", grammar.grammar_rule_name)
                     self.session_state.add_grammar_to_add(
                         canonical_category="",
                         canonical_subtype="",
@@ -1329,13 +1494,13 @@ class MainAssistant:
                         rule_summary=grammar.grammar_rule_summary
                     )
 
-        print("grammar to add：", self.session_state.grammar_to_add)
+        logger.info("grammar to add： %s", self.session_state.grammar_to_add)
         #add to data
         
         # 调试信息：打印summarized_results的内容
-        print("🔍 [DEBUG] summarized_results 内容:")
+        logger.debug("🔍 [DEBUG] summarized_results 内容:")
         for i, result in enumerate(self.session_state.summarized_results):
-            print(f"  {i}: {type(result)} - {result}")
+            logger.debug("  %s: %s - %s", i, type(result), result)
         
         # 🔧 修复：优先使用数据库管理器获取当前用户的词汇列表
         user_id = getattr(self.session_state, 'user_id', None)
@@ -1356,71 +1521,71 @@ class MainAssistant:
                     # 🔧 如果文章有语言，只获取相同语言的词汇
                     if article_language:
                         query = query.filter(VocabExpression.language == article_language)
-                        print(f"🔍 [DEBUG] 只获取相同语言的词汇 (user_id={user_id}, language={article_language})")
+                        logger.debug("🔍 [DEBUG] 只获取相同语言的词汇 (user_id=%s, language=%s)", user_id, article_language)
                     else:
-                        print(f"🔍 [DEBUG] 文章无语言信息，获取所有语言的词汇 (user_id={user_id})")
+                        logger.debug("🔍 [DEBUG] 文章无语言信息，获取所有语言的词汇 (user_id=%s)", user_id)
                     
                     vocab_models = query.all()
                     current_vocab_list = [vocab.vocab_body for vocab in vocab_models]
                     vocab_id_map = {vocab.vocab_body: vocab.vocab_id for vocab in vocab_models}
-                    print(f"🔍 [DEBUG] 从数据库获取当前用户词汇列表 (user_id={user_id}): {len(current_vocab_list)} 个词汇")
+                    logger.debug("🔍 [DEBUG] 从数据库获取当前用户词汇列表 (user_id=%s): %s 个词汇", user_id, len(current_vocab_list))
                 finally:
                     session.close()
             except Exception as e:
-                print(f"⚠️ [DEBUG] 使用数据库管理器获取词汇列表失败: {e}")
+                logger.warning("⚠️ [DEBUG] 使用数据库管理器获取词汇列表失败: %s", e)
                 import traceback
                 traceback.print_exc()
                 # 回退到文件系统管理器
                 current_vocab_list = self.data_controller.vocab_manager.get_all_vocab_body()
-                print(f"🔍 [DEBUG] 回退到文件系统管理器，获取词汇列表: {len(current_vocab_list)} 个词汇")
+                logger.debug("🔍 [DEBUG] 回退到文件系统管理器，获取词汇列表: %s 个词汇", len(current_vocab_list))
         else:
             # 没有 user_id，使用文件系统管理器
             current_vocab_list = self.data_controller.vocab_manager.get_all_vocab_body()
-            print(f"🔍 [DEBUG] 当前词汇列表 (文件系统): {len(current_vocab_list)} 个词汇")
+            logger.debug("🔍 [DEBUG] 当前词汇列表 (文件系统): %s 个词汇", len(current_vocab_list))
         
-        print(f"🔍 [DEBUG] 当前词汇列表: {current_vocab_list}")
+        logger.debug("🔍 [DEBUG] 当前词汇列表: %s", current_vocab_list)
         
         new_vocab = []
         for result in self.session_state.summarized_results:
-            print(f"🔍 [DEBUG] 处理结果: {type(result)} - {result}")
-            print(f"🔍 [DEBUG] isinstance(result, VocabSummary): {isinstance(result, VocabSummary)}")
-            print(f"🔍 [DEBUG] result.__class__.__name__: {result.__class__.__name__}")
-            print(f"🔍 [DEBUG] VocabSummary.__name__: {VocabSummary.__name__}")
+            logger.debug("🔍 [DEBUG] 处理结果: %s - %s", type(result), result)
+            logger.debug("🔍 [DEBUG] isinstance(result, VocabSummary): %s", isinstance(result, VocabSummary))
+            logger.debug("🔍 [DEBUG] result.__class__.__name__: %s", result.__class__.__name__)
+            logger.debug("🔍 [DEBUG] VocabSummary.__name__: %s", VocabSummary.__name__)
             has_similar = False
             
             # 使用更宽松的检查方式
             if hasattr(result, 'vocab') and result.__class__.__name__ == 'VocabSummary':
-                print(f"🔍 [DEBUG] 找到VocabSummary: {result.vocab}")
+                logger.debug("🔍 [DEBUG] 找到VocabSummary: %s", result.vocab)
                 for vocab in current_vocab_list:
                     compare_result = self.fuzzy_match_expressions(vocab, result.vocab)
-                    print(f"🔍 [DEBUG] 比较 '{vocab}' 与 '{result.vocab}': {compare_result}")
+                    logger.debug("🔍 [DEBUG] 比较 '%s' 与 '%s': %s", vocab, result.vocab, compare_result)
                     if compare_result:
-                        print(f"✅ 词汇 '{vocab}' 与现有词汇 '{result.vocab}' 相似")
+                        logger.debug("✅ 词汇 '%s' 与现有词汇 '%s' 相似", vocab, result.vocab)
                         has_similar = True
                         # 🔧 修复：优先使用数据库管理器的 vocab_id_map，否则回退到文件系统管理器
                         if vocab in vocab_id_map:
                             existing_vocab_id = vocab_id_map[vocab]
-                            print(f"🔍 [DEBUG] 从数据库获取 vocab_id: {existing_vocab_id} (vocab='{vocab}')")
+                            logger.debug("🔍 [DEBUG] 从数据库获取 vocab_id: %s (vocab='%s')", existing_vocab_id, vocab)
                         else:
                             existing_vocab_id = self.data_controller.vocab_manager.get_id_by_vocab_body(vocab)
-                            print(f"🔍 [DEBUG] 从文件系统获取 vocab_id: {existing_vocab_id} (vocab='{vocab}')")
+                            logger.debug("🔍 [DEBUG] 从文件系统获取 vocab_id: %s (vocab='%s')", existing_vocab_id, vocab)
                         current_sentence = self.session_state.current_sentence if self.session_state.current_sentence else quoted_sentence
                         # 验证句子完整性
                         self._ensure_sentence_integrity(current_sentence, "Vocab Explanation 调用")
                         # 为上下文解释优先使用“用户实际选择的词形”，避免因词形差异导致的"不在句中"提示
                         selected_token = self.session_state.current_selected_token
                         vocab_for_context = getattr(selected_token, 'token_text', None) or vocab
-                        print(f"🔍 [DEBUG] 调用vocab_example_explanation_assistant for '{vocab_for_context}' (base='{vocab}')")
+                        logger.debug("🔍 [DEBUG] 调用vocab_example_explanation_assistant for '%s' (base='%s')", vocab_for_context, vocab)
                         # 🔧 使用 UI 语言而不是文章语言
                         output_language = self.ui_language or self.session_state.current_language or "中文"
-                        print(f"🔍 [DEBUG] 输出语言: {output_language} (UI语言: {self.ui_language}, 文章语言: {self.session_state.current_language})")
+                        logger.debug("🔍 [DEBUG] 输出语言: %s (UI语言: %s, 文章语言: %s)", output_language, self.ui_language, self.session_state.current_language)
                         example_explanation_raw = self.vocab_example_explanation_assistant.run(
                             sentence=current_sentence,
                             vocab=vocab_for_context,
                             language=output_language,
                             user_id=self._user_id, session=self._db_session
                         )
-                        print(f"🔍 [DEBUG] example_explanation原始结果: {_preview_for_log(example_explanation_raw, 360)}")
+                        logger.debug("🔍 [DEBUG] example_explanation原始结果: %s", lazy(lambda: _preview_for_log(example_explanation_raw, 360)))
                         
                         # 🔧 解析 JSON 字符串，提取 explanation 字段
                         example_explanation = None
@@ -1433,25 +1598,25 @@ class MainAssistant:
                                 else:
                                     example_explanation = example_explanation_raw
                             except Exception as e:
-                                print(f"⚠️ [DEBUG] 解析 example_explanation JSON 失败: {e}，使用原始字符串")
+                                logger.warning("⚠️ [DEBUG] 解析 example_explanation JSON 失败: %s，使用原始字符串", e)
                                 example_explanation = example_explanation_raw
                         elif isinstance(example_explanation_raw, dict) and "explanation" in example_explanation_raw:
                             example_explanation = example_explanation_raw["explanation"]
                         else:
                             example_explanation = str(example_explanation_raw) if example_explanation_raw else None
                         
-                        print(f"🔍 [DEBUG] example_explanation解析后: {_preview_for_log(example_explanation, 360)}")
+                        logger.debug("🔍 [DEBUG] example_explanation解析后: %s", lazy(lambda: _preview_for_log(example_explanation, 360)))
                         
                         # 检查text_id是否存在，如果不存在则跳过添加example
                         try:
                             # 🔧 获取 token_indices（优先使用保存的 selected_token，如果不存在则从 session_state 获取）
                             # 临时恢复 selected_token（如果它被清空了）
                             if not self.session_state.current_selected_token and saved_selected_token:
-                                print(f"🔍 [DEBUG] 临时恢复 selected_token（在 handle_grammar_vocab_function 中）")
+                                logger.debug("🔍 [DEBUG] 临时恢复 selected_token（在 handle_grammar_vocab_function 中）")
                                 self.session_state.set_current_selected_token(saved_selected_token)
                             
                             token_indices = self._get_token_indices_from_selection(current_sentence)
-                            print(f"🔍 [DEBUG] 尝试添加现有词汇的vocab_example: text_id={current_sentence.text_id}, sentence_id={current_sentence.sentence_id}, vocab_id={existing_vocab_id}, token_indices={token_indices}")
+                            logger.debug("🔍 [DEBUG] 尝试添加现有词汇的vocab_example: text_id=%s, sentence_id=%s, vocab_id=%s, token_indices=%s", current_sentence.text_id, current_sentence.sentence_id, existing_vocab_id, token_indices)
                             
                             # 🔧 修复：如果使用数据库管理器获取了 vocab_id，也应该使用数据库管理器添加 example
                             if user_id and vocab in vocab_id_map:
@@ -1464,7 +1629,7 @@ class MainAssistant:
                                         vocab_db_manager = VocabManagerDB(session)
                                         # 🔧 确保 token_indices 是列表格式
                                         final_token_indices = token_indices if isinstance(token_indices, list) else (list(token_indices) if token_indices else [])
-                                        print(f"🔍 [DEBUG] 最终存储的 token_indices: {final_token_indices}")
+                                        logger.debug("🔍 [DEBUG] 最终存储的 token_indices: %s", final_token_indices)
                                         vocab_db_manager.add_vocab_example(
                                             vocab_id=existing_vocab_id,
                                             text_id=current_sentence.text_id,
@@ -1472,15 +1637,15 @@ class MainAssistant:
                                             context_explanation=example_explanation,
                                             token_indices=final_token_indices
                                         )
-                                        print(f"✅ [DEBUG] 现有词汇的vocab_example已添加到数据库: vocab_id={existing_vocab_id}, text_id={current_sentence.text_id}, sentence_id={current_sentence.sentence_id}, token_indices={final_token_indices}")
+                                        logger.debug("✅ [DEBUG] 现有词汇的vocab_example已添加到数据库: vocab_id=%s, text_id=%s, sentence_id=%s, token_indices=%s", existing_vocab_id, current_sentence.text_id, current_sentence.sentence_id, final_token_indices)
                                     finally:
                                         session.close()
                                 except Exception as e:
-                                    print(f"❌ [DEBUG] 使用数据库管理器添加vocab_example失败: {e}")
+                                    logger.error("❌ [DEBUG] 使用数据库管理器添加vocab_example失败: %s", e)
                                     import traceback
                                     traceback.print_exc()
                                     # 回退到文件系统管理器
-                                    print(f"⚠️ [DEBUG] 回退到文件系统管理器")
+                                    logger.warning("⚠️ [DEBUG] 回退到文件系统管理器")
                                     self.data_controller.add_vocab_example(
                                         vocab_id=existing_vocab_id,
                                         text_id=current_sentence.text_id,
@@ -1488,7 +1653,7 @@ class MainAssistant:
                                         context_explanation=example_explanation,
                                         token_indices=token_indices
                                     )
-                                    print(f"✅ [DEBUG] 现有词汇的vocab_example添加成功（文件系统）")
+                                    logger.debug("✅ [DEBUG] 现有词汇的vocab_example添加成功（文件系统）")
                             else:
                                 # 没有 user_id 或不在 vocab_id_map 中，使用文件系统管理器
                                 self.data_controller.add_vocab_example(
@@ -1498,7 +1663,7 @@ class MainAssistant:
                                     context_explanation=example_explanation,
                                     token_indices=token_indices
                                 )
-                                print(f"✅ [DEBUG] 现有词汇的vocab_example添加成功（文件系统）")
+                                logger.debug("✅ [DEBUG] 现有词汇的vocab_example添加成功（文件系统）")
 
                             # 🔧 新增：为现有词汇创建 vocab notation（用于前端实时显示绿色下划线）
                             try:
@@ -1530,7 +1695,7 @@ class MainAssistant:
                                                 finally:
                                                     session.close()
                                         except Exception as e:
-                                            print(f"⚠️ [DEBUG] 无法获取词汇名称: {e}")
+                                            logger.warning("⚠️ [DEBUG] 无法获取词汇名称: %s", e)
                                     
                                     if vocab_body:
                                         # 🌐 优先尝试匹配 word token（仅用于非空格语言）
@@ -1551,7 +1716,7 @@ class MainAssistant:
                                                         # 🔧 使用 word_token 的所有 token_ids（用于显示完整下划线）
                                                         token_indices = list(wt.token_ids)  # 更新 token_indices 为所有字符 token 的 IDs
                                                         token_id = wt.token_ids[0]  # 使用第一个字符 token 的 ID（用于向后兼容）
-                                                        print(f"✅ [DEBUG] 匹配到 word_token '{wt.word_body}'，使用所有 token_ids: {token_indices} (word_token_id={word_token_id})")
+                                                        logger.debug("✅ [DEBUG] 匹配到 word_token '%s'，使用所有 token_ids: %s (word_token_id=%s)", wt.word_body, token_indices, word_token_id)
                                                         break
                                         else:
                                             # 未匹配到 word token，回退到字符 token 匹配（现有逻辑）
@@ -1561,7 +1726,7 @@ class MainAssistant:
                                                 return text.strip(string.punctuation + '。，！？；：""''（）【】《》、')
                                             
                                             vocab_clean = strip_punctuation(vocab_body_lower)
-                                            print(f"🔍 [DEBUG] 尝试从句子中查找匹配的token（现有词汇），vocab='{vocab_body}' (清理后='{vocab_clean}')")
+                                            logger.debug("🔍 [DEBUG] 尝试从句子中查找匹配的token（现有词汇），vocab='%s' (清理后='%s')", vocab_body, vocab_clean)
                                             
                                             for token in current_sentence.tokens:
                                                 if hasattr(token, 'token_type') and token.token_type == 'text':
@@ -1569,14 +1734,14 @@ class MainAssistant:
                                                         token_clean = strip_punctuation(token.token_body.lower())
                                                         if token_clean == vocab_clean and token.sentence_token_id is not None:
                                                             token_id = token.sentence_token_id
-                                                            print(f"✅ [DEBUG] 在句子中找到匹配的token（现有词汇）: '{token.token_body}' → sentence_token_id={token_id}")
+                                                            logger.debug("✅ [DEBUG] 在句子中找到匹配的token（现有词汇）: '%s' → sentence_token_id=%s", token.token_body, token_id)
                                                             break
                                 
                                 current_sentence = self._ensure_sentence_has_word_tokens(current_sentence)
 
                                 # 获取user_id（优先使用session_state中的user_id）
                                 user_id_for_notation = getattr(self.session_state, 'user_id', None) or "default_user"
-                                print(f"🔍 [DEBUG] 创建vocab notation: text_id={current_sentence.text_id}, sentence_id={current_sentence.sentence_id}, token_id={token_id}, word_token_id={word_token_id}, vocab_id={existing_vocab_id}, user_id={user_id_for_notation}")
+                                logger.debug("🔍 [DEBUG] 创建vocab notation: text_id=%s, sentence_id=%s, token_id=%s, word_token_id=%s, vocab_id=%s, user_id=%s", current_sentence.text_id, current_sentence.sentence_id, token_id, word_token_id, existing_vocab_id, user_id_for_notation)
                                 
                                 if token_id is not None:
                                     v_ok = notation_manager.mark_notation(
@@ -1588,7 +1753,7 @@ class MainAssistant:
                                         vocab_id=existing_vocab_id,
                                         word_token_id=word_token_id  # 新增：传递 word_token_id
                                     )
-                                    print(f"✅ [DEBUG] vocab_notation创建结果: {v_ok}")
+                                    logger.debug("✅ [DEBUG] vocab_notation创建结果: %s", v_ok)
                                     if v_ok:
                                         # 记录到 session_state
                                         # 🔧 使用实际的 user_id（整数）而不是字符串
@@ -1602,58 +1767,58 @@ class MainAssistant:
                                         )
                                         # 🔧 记录已有词汇知识点的 notation（用于 toast）
                                         vocab_body = getattr(result, 'vocab', None) or vocab
-                                        print(f"🔍 [DEBUG] 准备记录已有词汇知识点到 existing_vocab_notations: vocab_id={existing_vocab_id}, vocab_body={vocab_body}, user_id={actual_user_id}")
+                                        logger.debug("🔍 [DEBUG] 准备记录已有词汇知识点到 existing_vocab_notations: vocab_id=%s, vocab_body=%s, user_id=%s", existing_vocab_id, vocab_body, actual_user_id)
                                         self.session_state.add_existing_vocab_notation(
                                             vocab_id=existing_vocab_id,
                                             vocab_body=vocab_body,
                                             user_id=actual_user_id
                                         )
-                                        print(f"✅ [DEBUG] 成功创建vocab notation并添加到session_state（已有知识点）")
-                                        print(f"🔍 [DEBUG] 当前 existing_vocab_notations 数量: {len(self.session_state.existing_vocab_notations)}")
-                                        print(f"🔍 [DEBUG] existing_vocab_notations 内容: {self.session_state.existing_vocab_notations}")
+                                        logger.debug("✅ [DEBUG] 成功创建vocab notation并添加到session_state（已有知识点）")
+                                        logger.debug("🔍 [DEBUG] 当前 existing_vocab_notations 数量: %s", len(self.session_state.existing_vocab_notations))
+                                        logger.debug("🔍 [DEBUG] existing_vocab_notations 内容: %s", self.session_state.existing_vocab_notations)
                                 else:
-                                    print("⚠️ [DEBUG] 无法创建vocab notation：token_id为空（已尝试从句子中查找但未找到匹配的token）")
+                                    logger.warning("⚠️ [DEBUG] 无法创建vocab notation：token_id为空（已尝试从句子中查找但未找到匹配的token）")
                             except Exception as vn_err:
-                                print(f"❌ [DEBUG] 创建vocab_notation时发生错误: {vn_err}")
+                                logger.error("❌ [DEBUG] 创建vocab_notation时发生错误: %s", vn_err)
                                 import traceback
                                 traceback.print_exc()
                         except ValueError as e:
-                            print(f"⚠️ [DEBUG] 跳过添加现有词汇的vocab_example，因为: {e}")
-                            print(f"🔍 [DEBUG] 句子信息: text_id={current_sentence.text_id}, sentence_id={current_sentence.sentence_id}")
+                            logger.warning("⚠️ [DEBUG] 跳过添加现有词汇的vocab_example，因为: %s", e)
+                            logger.debug("🔍 [DEBUG] 句子信息: text_id=%s, sentence_id=%s", current_sentence.text_id, current_sentence.sentence_id)
                         except Exception as e:
-                            print(f"❌ [DEBUG] 添加现有词汇的vocab_example时发生错误: {e}")
+                            logger.error("❌ [DEBUG] 添加现有词汇的vocab_example时发生错误: %s", e)
                         break
                 if not has_similar:
-                    print(f"🆕 新词汇知识点：'{result.vocab}'，将添加到已有规则中")
+                    logger.debug("🆕 新词汇知识点：'%s'，将添加到已有规则中", result.vocab)
                     new_vocab.append(result)
             else:
-                print(f"🔍 [DEBUG] 跳过非VocabSummary结果: {type(result)}")
+                logger.debug("🔍 [DEBUG] 跳过非VocabSummary结果: %s", type(result))
         
-        print("新单词列表：", new_vocab) 
+        logger.info("新单词列表： %s", new_vocab) 
         remaining_vocab_slots = max(0, MAX_KNOWLEDGE_ITEMS_PER_CHAT - len(self.session_state.grammar_to_add))
         if len(new_vocab) > remaining_vocab_slots:
-            print(f"⚠️ [MainAssistant] 新词汇候选过多，仅保留前 {remaining_vocab_slots} 个")
+            logger.warning("⚠️ [MainAssistant] 新词汇候选过多，仅保留前 %s 个", remaining_vocab_slots)
             new_vocab = new_vocab[:remaining_vocab_slots]
         for vocab in new_vocab:
-            print(f"🔍 [DEBUG] 添加新词汇到vocab_to_add: {vocab.vocab}")
+            logger.debug("🔍 [DEBUG] 添加新词汇到vocab_to_add: %s", vocab.vocab)
             self.session_state.add_vocab_to_add(vocab=vocab.vocab)
         
-        print(f"🔍 [DEBUG] 最终vocab_to_add: {self.session_state.vocab_to_add}")
+        logger.debug("🔍 [DEBUG] 最终vocab_to_add: %s", self.session_state.vocab_to_add)
 
     def add_new_to_data(self):
         """
         将新语法和词汇添加到数据管理器中。
         """
         self._ma_log("========== 开始执行 add_new_to_data ==========")
-        self._ma_log(f"🔍 [DEBUG] grammar_to_add 长度: {len(self.session_state.grammar_to_add) if self.session_state.grammar_to_add else 0}")
-        self._ma_log(f"🔍 [DEBUG] vocab_to_add 长度: {len(self.session_state.vocab_to_add) if self.session_state.vocab_to_add else 0}")
+        self._ma_log("🔍 [DEBUG] grammar_to_add 长度: %s", len(self.session_state.grammar_to_add) if self.session_state.grammar_to_add else 0)
+        self._ma_log("🔍 [DEBUG] vocab_to_add 长度: %s", len(self.session_state.vocab_to_add) if self.session_state.vocab_to_add else 0)
         
         # 🔧 保存 selected_token 的引用（避免在后续处理中被清空）
         saved_selected_token = self.session_state.current_selected_token
-        self._ma_log(f"🔍 [DEBUG] 保存 selected_token 引用: {saved_selected_token is not None}")
+        self._ma_log("🔍 [DEBUG] 保存 selected_token 引用: %s", saved_selected_token is not None)
         if saved_selected_token:
-            self._ma_log(f"🔍 [DEBUG] selected_token.token_text: '{getattr(saved_selected_token, 'token_text', None)}'")
-            self._ma_log(f"🔍 [DEBUG] selected_token.token_indices: {getattr(saved_selected_token, 'token_indices', None)}")
+            self._ma_log("🔍 [DEBUG] selected_token.token_text: '%s'", getattr(saved_selected_token, 'token_text', None))
+            self._ma_log("🔍 [DEBUG] selected_token.token_indices: %s", getattr(saved_selected_token, 'token_indices', None))
         
         # 🔧 获取当前文章的language字段
         current_sentence = self.session_state.current_sentence
@@ -1673,88 +1838,75 @@ class MainAssistant:
                     ).first()
                     if text_model:
                         article_language = text_model.language
-                        print(f"🔍 [DEBUG] 获取文章language: {article_language} (text_id={current_sentence.text_id})")
+                        logger.debug("🔍 [DEBUG] 获取文章language: %s (text_id=%s)", article_language, current_sentence.text_id)
                     else:
-                        print(f"⚠️ [DEBUG] 文章不存在: text_id={current_sentence.text_id}, user_id={user_id}")
+                        logger.warning("⚠️ [DEBUG] 文章不存在: text_id=%s, user_id=%s", current_sentence.text_id, user_id)
                 finally:
                     session.close()
             except Exception as e:
-                print(f"⚠️ [DEBUG] 获取文章language失败: {e}")
+                logger.warning("⚠️ [DEBUG] 获取文章language失败: %s", e)
+        
+        # 🔧 有 user_id 时本轮的新语法 / 新词汇及其例句、notation 先收集进一个批次，
+        # 处理完后由 _write_knowledge_batch 单事务写入，每轮知识点只写一次
+        from backend.services.knowledge_upsert import (
+            KnowledgeBatch,
+            GrammarRuleUpsert,
+            VocabUpsert,
+            GrammarExampleUpsert,
+            VocabExampleUpsert,
+            GrammarNotationUpsert,
+            VocabNotationUpsert,
+        )
+        knowledge_batch = KnowledgeBatch() if user_id else None
         
-        if DISABLE_GRAMMAR_FEATURES:
-            print("⏸️ [MainAssistant] Grammar add/new-example disabled — skip grammar_to_add processing")
+        if self._grammar_features_disabled():
+            logger.info("⏸️ [MainAssistant] Grammar add/new-example disabled — skip grammar_to_add processing")
         elif self.session_state.grammar_to_add:
-            print(f"🔍 [DEBUG] 处理grammar_to_add: {len(self.session_state.grammar_to_add)} 个语法规则")
+            logger.debug("🔍 [DEBUG] 处理grammar_to_add: %s 个语法规则", len(self.session_state.grammar_to_add))
             for grammar in self.session_state.grammar_to_add:
-                print(f"🔍 [DEBUG] 处理新语法: display_name={grammar.display_name}, canonical_key={grammar.canonical_key}")
+                logger.debug("🔍 [DEBUG] 处理新语法: display_name=%s, canonical_key=%s", grammar.display_name, grammar.canonical_key)
                 
-                # 🔧 直接使用数据库管理器创建语法规则（传递language参数和canonical字段）
+                # 🔧 有 user_id 时只收集进本轮批次，循环结束后与例句、notation 一起单事务写入
                 grammar_rule_id = None
-                if user_id:
-                    try:
-                        from database_system.database_manager import DatabaseManager
-                        from backend.data_managers import GrammarRuleManagerDB
-                        db_manager = DatabaseManager('development')
-                        session = db_manager.get_session()
-                        try:
-                            grammar_db_manager = GrammarRuleManagerDB(session)
-                            grammar_dto = grammar_db_manager.add_new_rule(
-                                name=grammar.display_name,  # 使用 display_name 作为 rule_name
-                                explanation=grammar.rule_summary,  # 使用 rule_summary 作为 explanation
-                                source="qa",
-                                is_starred=False,
-                                user_id=user_id,
-                                language=article_language,  # 🔧 传递文章的language字段
-                                display_name=grammar.display_name,  # 新增：传递 display_name
-                                canonical_category=grammar.canonical_category,  # 新增：传递 canonical 字段
-                                canonical_subtype=grammar.canonical_subtype,
-                                canonical_function=grammar.canonical_function,
-                                canonical_key=grammar.canonical_key
-                            )
-                            grammar_rule_id = grammar_dto.rule_id
-                            print(f"✅ [DEBUG] 新语法规则已添加到数据库: rule_id={grammar_rule_id}, language={article_language}, canonical_key={grammar.canonical_key}")
-                        finally:
-                            session.close()
-                    except Exception as e:
-                        print(f"❌ [DEBUG] 使用数据库管理器创建语法规则失败: {e}")
-                        import traceback
-                        traceback.print_exc()
-                        # 回退到文件系统管理器
-                        print(f"⚠️ [DEBUG] 回退到文件系统管理器")
-                        grammar_rule_id = self.data_controller.add_new_grammar_rule(
-                            rule_name=grammar.display_name,
-                            rule_explanation=grammar.rule_summary
-                        )
+                if knowledge_batch is not None:
+                    knowledge_batch.grammar_rules.append(GrammarRuleUpsert(
+                        rule_name=grammar.display_name,  # 使用 display_name 作为 rule_name
+                        rule_summary=grammar.rule_summary or '',  # 使用 rule_summary 作为 explanation
+                        language=article_language,  # 🔧 传递文章的language字段
+                        display_name=grammar.display_name,
+                        canonical_category=grammar.canonical_category,
+                        canonical_subtype=grammar.canonical_subtype,
+                        canonical_function=grammar.canonical_function,
+                        canonical_key=grammar.canonical_key,
+                    ))
+                    logger.debug("✅ [DEBUG] 新语法规则已加入本轮批次: %s, language=%s, canonical_key=%s", grammar.display_name, article_language, grammar.canonical_key)
                 else:
                     # 没有user_id，使用文件系统管理器
                     grammar_rule_id = self.data_controller.add_new_grammar_rule(
                         rule_name=grammar.display_name,
                         rule_explanation=grammar.rule_summary
                     )
-                    print(f"✅ [DEBUG] 新语法规则已添加到文件系统: rule_id={grammar_rule_id}")
-                
-                if grammar_rule_id is None:
-                    print(f"❌ [DEBUG] 无法获取grammar_rule_id，跳过添加例句")
-                    continue
-                
-                print(f"✅ [DEBUG] 新语法规则已添加: rule_id={grammar_rule_id}")
+                    logger.debug("✅ [DEBUG] 新语法规则已添加到文件系统: rule_id=%s", grammar_rule_id)
+                    if grammar_rule_id is None:
+                        logger.error("❌ [DEBUG] 无法获取grammar_rule_id，跳过添加例句")
+                        continue
                 
                 # 为这个语法规则生成例句
                 current_sentence = self.session_state.current_sentence
                 if current_sentence:
                     # 验证句子完整性
                     self._ensure_sentence_integrity(current_sentence, "新语法 Explanation 调用")
-                    print(f"🔍 [DEBUG] 调用grammar_example_explanation_assistant for '{grammar.display_name}'")
+                    logger.debug("🔍 [DEBUG] 调用grammar_example_explanation_assistant for '%s'", grammar.display_name)
                     # 🔧 使用 UI 语言而不是文章语言
                     output_language = self.ui_language or self.session_state.current_language or "中文"
-                    print(f"🔍 [DEBUG] 输出语言: {output_language} (UI语言: {self.ui_language}, 文章语言: {self.session_state.current_language})")
+                    logger.debug("🔍 [DEBUG] 输出语言: %s (UI语言: %s, 文章语言: %s)", output_language, self.ui_language, self.session_state.current_language)
                     example_explanation_raw = self.grammar_example_explanation_assistant.run(
                         sentence=current_sentence,
                         grammar=grammar.display_name,  # 使用 display_name
                         language=output_language,
                         user_id=self._user_id, session=self._db_session
                     )
-                    print(f"🔍 [DEBUG] grammar_example_explanation原始结果: {_preview_for_log(example_explanation_raw, 360)}")
+                    logger.debug("🔍 [DEBUG] grammar_example_explanation原始结果: %s", lazy(lambda: _preview_for_log(example_explanation_raw, 360)))
                     
                     # 🔧 解析 JSON 字符串，提取 explanation 字段
                     example_explanation = None
@@ -1767,70 +1919,26 @@ class MainAssistant:
                             else:
                                 example_explanation = example_explanation_raw
                         except Exception as e:
-                            print(f"⚠️ [DEBUG] 解析 grammar example_explanation JSON 失败: {e}，使用原始字符串")
+                            logger.warning("⚠️ [DEBUG] 解析 grammar example_explanation JSON 失败: %s，使用原始字符串", e)
                             example_explanation = example_explanation_raw
                     elif isinstance(example_explanation_raw, dict) and "explanation" in example_explanation_raw:
                         example_explanation = example_explanation_raw["explanation"]
                     else:
                         example_explanation = str(example_explanation_raw) if example_explanation_raw else None
                     
-                    print(f"🔍 [DEBUG] grammar_example_explanation解析后: {_preview_for_log(example_explanation, 360)}")
+                    logger.debug("🔍 [DEBUG] grammar_example_explanation解析后: %s", lazy(lambda: _preview_for_log(example_explanation, 360)))
                     
                     # 添加语法例句
                     try:
-                        # 🔧 直接使用创建时获取的grammar_rule_id
-                        
-                        print(f"🔍 [DEBUG] 尝试添加grammar_example: text_id={current_sentence.text_id}, sentence_id={current_sentence.sentence_id}, rule_id={grammar_rule_id}")
-                        # 🔧 修复：如果使用数据库管理器创建了 grammar，也应该使用数据库管理器创建 example
-                        user_id = getattr(self.session_state, 'user_id', None)
-                        if user_id:
-                            try:
-                                from database_system.database_manager import DatabaseManager
-                                from backend.data_managers import GrammarRuleManagerDB
-                                from database_system.business_logic.models import OriginalText
-                                db_manager = DatabaseManager('development')
-                                session = db_manager.get_session()
-                                try:
-                                    # 🔧 先检查text_id是否存在于数据库中且属于当前用户
-                                    text_model = session.query(OriginalText).filter(
-                                        OriginalText.text_id == current_sentence.text_id,
-                                        OriginalText.user_id == user_id
-                                    ).first()
-                                    if not text_model:
-                                        print(f"⚠️ [DEBUG] 跳过添加grammar_example，因为text_id={current_sentence.text_id}不存在或不属于用户{user_id}")
-                                        continue
-                                    
-                                    # 🔧 如果grammar_rule_id还没有获取，说明创建失败，跳过
-                                    if grammar_rule_id is None:
-                                        print(f"❌ [DEBUG] 无法获取grammar_rule_id，跳过添加例句")
-                                        continue
-                                    
-                                    grammar_db_manager = GrammarRuleManagerDB(session)
-                                    grammar_db_manager.add_grammar_example(
-                                        rule_id=grammar_rule_id,
-                                        text_id=current_sentence.text_id,
-                                        sentence_id=current_sentence.sentence_id,
-                                        explanation_context=example_explanation
-                                    )
-                                    print(f"✅ [DEBUG] grammar_example已添加到数据库: rule_id={grammar_rule_id}, text_id={current_sentence.text_id}, sentence_id={current_sentence.sentence_id}")
-                                finally:
-                                    session.close()
-                            except Exception as e:
-                                print(f"❌ [DEBUG] 使用数据库管理器创建grammar_example失败: {e}")
-                                import traceback
-                                traceback.print_exc()
-                                # 回退到文件系统管理器
-                                print(f"⚠️ [DEBUG] 回退到文件系统管理器")
-                                if grammar_rule_id in self.data_controller.grammar_manager.grammar_bundles:
-                                    self.data_controller.add_grammar_example(
-                                        rule_id=grammar_rule_id,
-                                        text_id=current_sentence.text_id,
-                                        sentence_id=current_sentence.sentence_id,
-                                        explanation_context=example_explanation
-                                    )
-                                    print(f"✅ [DEBUG] grammar_example添加成功（文件系统）")
-                                else:
-                                    print(f"⚠️ [DEBUG] rule_id={grammar_rule_id} 不在 global_dc 中，跳过添加到文件系统")
+                        logger.debug("🔍 [DEBUG] 尝试添加grammar_example: text_id=%s, sentence_id=%s, rule='%s'", current_sentence.text_id, current_sentence.sentence_id, grammar.display_name)
+                        if knowledge_batch is not None:
+                            # 句子是否存在、文章是否属于当前用户由 upsert_knowledge 统一校验
+                            knowledge_batch.grammar_examples.append(GrammarExampleUpsert(
+                                rule_name=grammar.display_name,
+                                text_id=current_sentence.text_id,
+                                sentence_id=current_sentence.sentence_id,
+                                explanation_context=example_explanation,
+                            ))
                         else:
                             # 没有user_id，使用文件系统管理器
                             self.data_controller.add_grammar_example(
@@ -1839,36 +1947,47 @@ class MainAssistant:
                                 sentence_id=current_sentence.sentence_id,
                                 explanation_context=example_explanation
                             )
-                            print(f"✅ [DEBUG] grammar_example添加成功（文件系统）")
+                            logger.debug("✅ [DEBUG] grammar_example添加成功（文件系统）")
                         
                         # 🔧 新增：创建grammar notation
                         try:
-                            print(f"🔍 [DEBUG] ========== 开始创建新语法的grammar notation ==========")
-                            print(f"🔍 [DEBUG] 当前句子信息: text_id={current_sentence.text_id}, sentence_id={current_sentence.sentence_id}")
-                            print(f"🔍 [DEBUG] 语法规则ID: {grammar_rule_id}")
-                            print(f"🔍 [DEBUG] 语法规则名称: {grammar.display_name}")
+                            logger.debug("🔍 [DEBUG] ========== 开始创建新语法的grammar notation ==========")
+                            logger.debug("🔍 [DEBUG] 当前句子信息: text_id=%s, sentence_id=%s", current_sentence.text_id, current_sentence.sentence_id)
+                            logger.debug("🔍 [DEBUG] 语法规则ID: %s", grammar_rule_id)
+                            logger.debug("🔍 [DEBUG] 语法规则名称: %s", grammar.display_name)
                             
                             # 获取 token_indices（从 session_state 中的 selected_token）
                             token_indices = self._get_token_indices_from_selection(current_sentence)
-                            print(f"🔍 [DEBUG] 提取的token_indices: {token_indices}")
-                            print(f"🔍 [DEBUG] token_indices类型: {type(token_indices)}")
-                            print(f"🔍 [DEBUG] token_indices长度: {len(token_indices) if token_indices else 0}")
+                            logger.debug("🔍 [DEBUG] 提取的token_indices: %s", token_indices)
+                            logger.debug("🔍 [DEBUG] token_indices类型: %s", type(token_indices))
+                            logger.debug("🔍 [DEBUG] token_indices长度: %s", len(token_indices) if token_indices else 0)
                             
+                            if knowledge_batch is not None:
+                                # grammar_id 在批次写入后按规则名解析，写入成功后再记录到 session_state
+                                knowledge_batch.grammar_notations.append(GrammarNotationUpsert(
+                                    text_id=current_sentence.text_id,
+                                    sentence_id=current_sentence.sentence_id,
+                                    rule_name=grammar.display_name,
+                                    marked_token_ids=list(token_indices or []),
+                                ))
+                                logger.debug("✅ [DEBUG] grammar_notation已加入本轮批次")
+                                continue
+
                             # 使用unified_notation_manager创建grammar notation（使用数据库）
                             from backend.data_managers.unified_notation_manager import get_unified_notation_manager
                             notation_manager = get_unified_notation_manager(use_database=True, use_legacy_compatibility=True)
-                            print(f"🔍 [DEBUG] notation_manager创建成功: {type(notation_manager)}")
+                            logger.debug("🔍 [DEBUG] notation_manager创建成功: %s", type(notation_manager))
                             
                             # 获取user_id（优先使用session_state中的user_id）
                             user_id_for_notation = getattr(self.session_state, 'user_id', None) or "default_user"
                             
-                            print(f"🔍 [DEBUG] 调用mark_notation参数:")
-                            print(f"  - notation_type: grammar")
-                            print(f"  - user_id: {user_id_for_notation}")
-                            print(f"  - text_id: {current_sentence.text_id}")
-                            print(f"  - sentence_id: {current_sentence.sentence_id}")
-                            print(f"  - grammar_id: {grammar_rule_id}")
-                            print(f"  - marked_token_ids: {token_indices}")
+                            logger.debug("🔍 [DEBUG] 调用mark_notation参数:")
+                            logger.debug("  - notation_type: grammar")
+                            logger.debug("  - user_id: %s", user_id_for_notation)
+                            logger.debug("  - text_id: %s", current_sentence.text_id)
+                            logger.debug("  - sentence_id: %s", current_sentence.sentence_id)
+                            logger.debug("  - grammar_id: %s", grammar_rule_id)
+                            logger.debug("  - marked_token_ids: %s", token_indices)
                             
                             success = notation_manager.mark_notation(
                                 notation_type="grammar",
@@ -1879,11 +1998,11 @@ class MainAssistant:
                                 marked_token_ids=token_indices
                             )
                             
-                            print(f"🔍 [DEBUG] mark_notation返回结果: {success}")
-                            print(f"🔍 [DEBUG] 结果类型: {type(success)}")
+                            logger.debug("🔍 [DEBUG] mark_notation返回结果: %s", success)
+                            logger.debug("🔍 [DEBUG] 结果类型: %s", type(success))
                             
                             if success:
-                                print(f"✅ [DEBUG] grammar_notation创建成功")
+                                logger.debug("✅ [DEBUG] grammar_notation创建成功")
                                 # 记录到 session_state 以便返回给前端
                                 # 🔧 使用实际的 user_id（整数）而不是字符串
                                 actual_user_id = getattr(self.session_state, 'user_id', None)
@@ -1894,45 +2013,55 @@ class MainAssistant:
                                     marked_token_ids=token_indices,
                                     user_id=actual_user_id
                                 )
-                                print(f"🔍 [DEBUG] ========== 新语法grammar notation创建完成 ==========")
+                                logger.debug("🔍 [DEBUG] ========== 新语法grammar notation创建完成 ==========")
                             else:
-                                print(f"❌ [DEBUG] grammar_notation创建失败")
-                                print(f"🔍 [DEBUG] ========== 新语法grammar notation创建失败 ==========")
+                                logger.error("❌ [DEBUG] grammar_notation创建失败")
+                                logger.debug("🔍 [DEBUG] ========== 新语法grammar notation创建失败 ==========")
                         except Exception as notation_error:
-                            print(f"❌ [DEBUG] 创建grammar_notation时发生错误: {notation_error}")
-                            print(f"❌ [DEBUG] 错误类型: {type(notation_error)}")
+                            logger.error("❌ [DEBUG] 创建grammar_notation时发生错误: %s", notation_error)
+                            logger.error("❌ [DEBUG] 错误类型: %s", type(notation_error))
                             import traceback
-                            print(f"❌ [DEBUG] 错误堆栈: {traceback.format_exc()}")
-                            print(f"🔍 [DEBUG] ========== 新语法grammar notation创建异常 ==========")
+                            logger.error("❌ [DEBUG] 错误堆栈: %s", traceback.format_exc())
+                            logger.debug("🔍 [DEBUG] ========== 新语法grammar notation创建异常 ==========")
                             
                     except ValueError as e:
-                        print(f"⚠️ [DEBUG] 跳过添加grammar_example，因为: {e}")
-                        print(f"🔍 [DEBUG] 句子信息: text_id={current_sentence.text_id}, sentence_id={current_sentence.sentence_id}")
+                        logger.warning("⚠️ [DEBUG] 跳过添加grammar_example，因为: %s", e)
+                        logger.debug("🔍 [DEBUG] 句子信息: text_id=%s, sentence_id=%s", current_sentence.text_id, current_sentence.sentence_id)
                     except Exception as e:
-                        print(f"❌ [DEBUG] 添加grammar_example时发生错误: {e}")
+                        logger.error("❌ [DEBUG] 添加grammar_example时发生错误: %s", e)
         else:
-            print("🔍 [DEBUG] grammar_to_add为空，跳过新语法处理")
+            logger.debug("🔍 [DEBUG] grammar_to_add为空，跳过新语法处理")
 
         if self.session_state.vocab_to_add:
-            print(f"🔍 [DEBUG] 处理vocab_to_add: {len(self.session_state.vocab_to_add)} 个词汇")
+            logger.debug("🔍 [DEBUG] 处理vocab_to_add: %s 个词汇", len(self.session_state.vocab_to_add))
             for vocab in self.session_state.vocab_to_add:
-                print(f"🔍 [DEBUG] 处理新词汇: {vocab.vocab}")
+                logger.debug("🔍 [DEBUG] 处理新词汇: %s", vocab.vocab)
                 # 生成词汇解释
                 current_sentence = self.session_state.current_sentence
                 if current_sentence:
                     # 验证句子完整性
                     self._ensure_sentence_integrity(current_sentence, "新词汇 Explanation 调用")
-                    print(f"🔍 [DEBUG] 调用vocab_explanation_assistant for '{vocab.vocab}'")
+                    logger.debug("🔍 [DEBUG] 调用vocab_explanation_assistant for '%s'", vocab.vocab)
                     # 🔧 使用 UI 语言而不是文章语言
                     output_language = self.ui_language or self.session_state.current_language or "中文"
-                    print(f"🔍 [DEBUG] 输出语言: {output_language} (UI语言: {self.ui_language}, 文章语言: {self.session_state.current_language})")
-                    vocab_explanation = self.vocab_explanation_assistant.run(
-                        sentence=current_sentence,
-                        vocab=vocab.vocab,
-                        language=output_language,
-                        user_id=self._user_id, session=self._db_session
+                    logger.debug("🔍 [DEBUG] 输出语言: %s (UI语言: %s, 文章语言: %s)", output_language, self.ui_language, self.session_state.current_language)
+                    cached_explanation = preset_explanations.lookup(
+                        preset_explanations.KIND_VOCAB,
+                        getattr(current_sentence, "sentence_body", None),
+                        output_language,
+                        target=vocab.vocab,
                     )
-                    print(f"🔍 [DEBUG] vocab_explanation结果: {vocab_explanation}")
+                    if cached_explanation is not None:
+                        logger.debug("⚡ [PresetExplanations] 命中预生成词汇解释: %s", vocab.vocab)
+                        vocab_explanation = {"explanation": cached_explanation}
+                    else:
+                        vocab_explanation = self.vocab_explanation_assistant.run(
+                            sentence=current_sentence,
+                            vocab=vocab.vocab,
+                            language=output_language,
+                            user_id=self._user_id, session=self._db_session
+                        )
+                    logger.debug("🔍 [DEBUG] vocab_explanation结果: %s", vocab_explanation)
                     # 解析JSON响应
                     if isinstance(vocab_explanation, dict):
                         # 如果已经是字典，直接提取 explanation 字段
@@ -1963,54 +2092,35 @@ class MainAssistant:
                 else:
                     explanation_text = "No explanation provided"
                 
-                print(f"🔍 [DEBUG] 添加新词汇到数据库: {vocab.vocab}")
-                # 🔧 直接使用数据库管理器创建词汇（传递language参数）
+                # 🔧 有 user_id 时只收集进本轮批次，循环结束后与例句、notation 一起单事务写入
                 vocab_id = None
-                if user_id:
-                    try:
-                        from database_system.database_manager import DatabaseManager
-                        from backend.data_managers import VocabManagerDB
-                        db_manager = DatabaseManager('development')
-                        session = db_manager.get_session()
-                        try:
-                            vocab_db_manager = VocabManagerDB(session)
-                            vocab_dto = vocab_db_manager.add_new_vocab(
-                                vocab_body=vocab.vocab,
-                                explanation=explanation_text,
-                                source="qa",
-                                is_starred=False,
-                                user_id=user_id,
-                                language=article_language  # 🔧 传递文章的language字段
-                            )
-                            vocab_id = vocab_dto.vocab_id
-                            print(f"✅ [DEBUG] 新词汇已添加到数据库: vocab_id={vocab_id}, language={article_language}")
-                        finally:
-                            session.close()
-                    except Exception as e:
-                        print(f"❌ [DEBUG] 使用数据库管理器创建词汇失败: {e}")
-                        # 回退到文件系统管理器
-                        print(f"⚠️ [DEBUG] 回退到文件系统管理器")
-                        vocab_id = self.data_controller.add_new_vocab(vocab_body=vocab.vocab, explanation=explanation_text)
+                if knowledge_batch is not None:
+                    knowledge_batch.vocabs.append(VocabUpsert(
+                        vocab_body=vocab.vocab,
+                        explanation=explanation_text,
+                        language=article_language,  # 🔧 传递文章的language字段
+                    ))
+                    logger.debug("✅ [DEBUG] 新词汇已加入本轮批次: %s, language=%s", vocab.vocab, article_language)
                 else:
                     # 没有user_id，使用文件系统管理器
                     vocab_id = self.data_controller.add_new_vocab(vocab_body=vocab.vocab, explanation=explanation_text)
-                    print(f"✅ [DEBUG] 新词汇已添加到文件系统: vocab_id={vocab_id}")
+                    logger.debug("✅ [DEBUG] 新词汇已添加到文件系统: vocab_id=%s", vocab_id)
                 
                 # 生成词汇例句解释
                 if current_sentence:
                     # 为上下文解释优先使用“用户实际选择的词形”
                     selected_token = self.session_state.current_selected_token
                     vocab_for_context = getattr(selected_token, 'token_text', None) or vocab.vocab
-                    print(f"🔍 [DEBUG] 调用vocab_example_explanation_assistant for '{vocab_for_context}' (base='{vocab.vocab}')")
+                    logger.debug("🔍 [DEBUG] 调用vocab_example_explanation_assistant for '%s' (base='%s')", vocab_for_context, vocab.vocab)
                     # 🔧 使用 UI 语言而不是文章语言
                     output_language = self.ui_language or self.session_state.current_language or "中文"
-                    print(f"🔍 [DEBUG] 输出语言: {output_language} (UI语言: {self.ui_language}, 文章语言: {self.session_state.current_language})")
+                    logger.debug("🔍 [DEBUG] 输出语言: %s (UI语言: %s, 文章语言: %s)", output_language, self.ui_language, self.session_state.current_language)
                     example_explanation_raw = self.vocab_example_explanation_assistant.run(
                         sentence=current_sentence,
                         vocab=vocab_for_context,
                         language=output_language
                     )
-                    print(f"🔍 [DEBUG] example_explanation原始结果: {_preview_for_log(example_explanation_raw, 360)}")
+                    logger.debug("🔍 [DEBUG] example_explanation原始结果: %s", lazy(lambda: _preview_for_log(example_explanation_raw, 360)))
                     
                     # 🔧 解析 JSON 字符串，提取 explanation 字段
                     example_explanation = None
@@ -2023,91 +2133,36 @@ class MainAssistant:
                             else:
                                 example_explanation = example_explanation_raw
                         except Exception as e:
-                            print(f"⚠️ [DEBUG] 解析 example_explanation JSON 失败: {e}，使用原始字符串")
+                            logger.warning("⚠️ [DEBUG] 解析 example_explanation JSON 失败: %s，使用原始字符串", e)
                             example_explanation = example_explanation_raw
                     elif isinstance(example_explanation_raw, dict) and "explanation" in example_explanation_raw:
                         example_explanation = example_explanation_raw["explanation"]
                     else:
                         example_explanation = str(example_explanation_raw) if example_explanation_raw else None
                     
-                    print(f"🔍 [DEBUG] example_explanation解析后: {_preview_for_log(example_explanation, 360)}")
+                    logger.debug("🔍 [DEBUG] example_explanation解析后: %s", lazy(lambda: _preview_for_log(example_explanation, 360)))
                     
-                    # 检查text_id是否存在，如果不存在则跳过添加example
                     try:
-                        # 🔧 先检查text_id是否存在于数据库中且属于当前用户
-                        user_id = getattr(self.session_state, 'user_id', None)
-                        if user_id:
-                            from database_system.database_manager import DatabaseManager
-                            from database_system.business_logic.models import OriginalText
-                            db_manager = DatabaseManager('development')
-                            session = db_manager.get_session()
-                            try:
-                                text_model = session.query(OriginalText).filter(
-                                    OriginalText.text_id == current_sentence.text_id,
-                                    OriginalText.user_id == user_id
-                                ).first()
-                                if not text_model:
-                                    print(f"⚠️ [DEBUG] 跳过添加vocab_example，因为text_id={current_sentence.text_id}不存在或不属于用户{user_id}")
-                                    print(f"🔍 [DEBUG] 句子信息: text_id={current_sentence.text_id}, sentence_id={current_sentence.sentence_id}")
-                                    continue
-                            finally:
-                                session.close()
-                        
-                        # 🔧 如果vocab_id还没有获取，说明创建失败，跳过
-                        if vocab_id is None:
-                            print(f"❌ [DEBUG] 无法获取vocab_id，跳过添加例句")
-                            continue
-                        
                         # 🔧 获取 token_indices（优先使用保存的 selected_token，如果不存在则从 session_state 获取）
                         # 临时恢复 selected_token（如果它被清空了）
                         if not self.session_state.current_selected_token and saved_selected_token:
-                            print(f"🔍 [DEBUG] 临时恢复 selected_token（在 add_new_to_data 中）")
+                            logger.debug("🔍 [DEBUG] 临时恢复 selected_token（在 add_new_to_data 中）")
                             self.session_state.set_current_selected_token(saved_selected_token)
                         
                         token_indices = self._get_token_indices_from_selection(current_sentence)
-                        print(f"🔍 [DEBUG] 尝试添加vocab_example: text_id={current_sentence.text_id}, sentence_id={current_sentence.sentence_id}, vocab_id={vocab_id}, token_indices={token_indices}")
-                        print(f"🔍 [DEBUG] token_indices 类型: {type(token_indices)}, 值: {token_indices}")
+                        # 🔧 确保 token_indices 是列表格式
+                        token_indices = token_indices if isinstance(token_indices, list) else (list(token_indices) if token_indices else [])
+                        logger.debug("🔍 [DEBUG] 尝试添加vocab_example: text_id=%s, sentence_id=%s, vocab='%s', token_indices=%s", current_sentence.text_id, current_sentence.sentence_id, vocab.vocab, token_indices)
                         
-                        # 🔧 修复：如果使用数据库管理器创建了 vocab，也应该使用数据库管理器创建 example
-                        if user_id:
-                            try:
-                                from database_system.database_manager import DatabaseManager
-                                from backend.data_managers import VocabManagerDB
-                                db_manager = DatabaseManager('development')
-                                session = db_manager.get_session()
-                                try:
-                                    vocab_db_manager = VocabManagerDB(session)
-                                    # 🔧 确保 token_indices 是列表格式
-                                    final_token_indices = token_indices if isinstance(token_indices, list) else (list(token_indices) if token_indices else [])
-                                    print(f"🔍 [DEBUG] 最终存储的 token_indices: {final_token_indices}")
-                                    vocab_db_manager.add_vocab_example(
-                                        vocab_id=vocab_id,
-                                        text_id=current_sentence.text_id,
-                                        sentence_id=current_sentence.sentence_id,
-                                        context_explanation=example_explanation,
-                                        token_indices=final_token_indices
-                                    )
-                                    print(f"✅ [DEBUG] vocab_example 已添加到数据库: vocab_id={vocab_id}, text_id={current_sentence.text_id}, sentence_id={current_sentence.sentence_id}, token_indices={final_token_indices}")
-                                finally:
-                                    session.close()
-                            except Exception as e:
-                                print(f"❌ [DEBUG] 使用数据库管理器创建vocab_example失败: {e}")
-                                import traceback
-                                traceback.print_exc()
-                                # 回退到文件系统管理器
-                                print(f"⚠️ [DEBUG] 回退到文件系统管理器")
-                                # 🔧 注意：如果 vocab 在数据库中，但不在 global_dc 中，这里会失败
-                                # 所以需要先检查 vocab_id 是否在 global_dc 中
-                                if vocab_id in self.data_controller.vocab_manager.vocab_bundles:
-                                    self.data_controller.add_vocab_example(
-                                        vocab_id=vocab_id,
-                                        text_id=current_sentence.text_id,
-                                        sentence_id=current_sentence.sentence_id,
-                                        context_explanation=example_explanation,
-                                        token_indices=token_indices
-                                    )
-                                else:
-                                    print(f"⚠️ [DEBUG] vocab_id={vocab_id} 不在 global_dc 中，跳过添加到文件系统")
+                        if knowledge_batch is not None:
+                            # 句子是否存在、文章是否属于当前用户由 upsert_knowledge 统一校验
+                            knowledge_batch.vocab_examples.append(VocabExampleUpsert(
+                                vocab_body=vocab.vocab,
+                                text_id=current_sentence.text_id,
+                                sentence_id=current_sentence.sentence_id,
+                                context_explanation=example_explanation,
+                                token_indices=list(token_indices),
+                            ))
                         else:
                             # 没有user_id，使用文件系统管理器
                             self.data_controller.add_vocab_example(
@@ -2117,16 +2172,14 @@ class MainAssistant:
                                 context_explanation=example_explanation,
                                 token_indices=token_indices
                             )
-                        print(f"✅ [DEBUG] vocab_example添加成功")
+                        logger.debug("✅ [DEBUG] vocab_example添加成功")
 
                         # 🔧 新增：为新词汇创建 vocab notation（用于前端实时显示绿色下划线，使用数据库）
                         try:
-                            from backend.data_managers.unified_notation_manager import get_unified_notation_manager
-                            notation_manager = get_unified_notation_manager(use_database=True, use_legacy_compatibility=True)
                             # 🔧 确保使用和 vocab_example 相同的 token_indices
                             token_id = token_indices[0] if isinstance(token_indices, list) and len(token_indices) > 0 else None
                             word_token_id = None  # 新增：用于存储匹配到的 word_token_id
-                            print(f"🔍 [DEBUG] 创建 vocab notation 使用的 token_id: {token_id} (来自 token_indices={token_indices})")
+                            logger.debug("🔍 [DEBUG] 创建 vocab notation 使用的 token_id: %s (来自 token_indices=%s)", token_id, token_indices)
                             
                             # 🌐 优先尝试匹配 word token（仅用于非空格语言）
                             # 即使 token_id 不为空，也要检查是否应该使用 word_token
@@ -2140,14 +2193,14 @@ class MainAssistant:
                                 # 找到对应的 word token，获取其所有字符 token 的 sentence_token_id
                                 if NEW_STRUCTURE_AVAILABLE and isinstance(current_sentence, NewSentence):
                                     if current_sentence.word_tokens is None:
-                                        print(f"⚠️ [DEBUG] word_token_id={word_token_id} 但 current_sentence.word_tokens 为 None，跳过 word token 迭代")
+                                        logger.warning("⚠️ [DEBUG] word_token_id=%s 但 current_sentence.word_tokens 为 None，跳过 word token 迭代", word_token_id)
                                     else:
                                         for wt in current_sentence.word_tokens:
                                             if wt.word_token_id == word_token_id and hasattr(wt, 'token_ids') and wt.token_ids:
                                                 # 🔧 使用 word_token 的所有 token_ids 作为 token_indices（用于显示完整下划线）
                                                 token_indices = list(wt.token_ids)  # 使用所有字符 token 的 IDs
                                                 token_id = wt.token_ids[0]  # 使用第一个字符 token 的 ID（用于向后兼容）
-                                                print(f"✅ [DEBUG] 匹配到 word_token '{wt.word_body}'，使用所有 token_ids: {token_indices} (word_token_id={word_token_id})")
+                                                logger.debug("✅ [DEBUG] 匹配到 word_token '%s'，使用所有 token_ids: %s (word_token_id=%s)", wt.word_body, token_indices, word_token_id)
                                                 break
                             else:
                                 # 未匹配到 word token，如果 token_id 为空，尝试从句子中查找匹配的 token
@@ -2159,7 +2212,7 @@ class MainAssistant:
                                         return text.strip(string.punctuation + '。，！？；：""''（）【】《》、')
                                     
                                     vocab_clean = strip_punctuation(vocab_body_lower)
-                                    print(f"🔍 [DEBUG] 尝试从句子中查找匹配的token，vocab='{vocab.vocab}' (清理后='{vocab_clean}')")
+                                    logger.debug("🔍 [DEBUG] 尝试从句子中查找匹配的token，vocab='%s' (清理后='%s')", vocab.vocab, vocab_clean)
                                     
                                     for token in current_sentence.tokens:
                                         if hasattr(token, 'token_type') and token.token_type == 'text':
@@ -2167,15 +2220,26 @@ class MainAssistant:
                                                 token_clean = strip_punctuation(token.token_body.lower())
                                                 if token_clean == vocab_clean and token.sentence_token_id is not None:
                                                     token_id = token.sentence_token_id
-                                                    print(f"✅ [DEBUG] 在句子中找到匹配的token: '{token.token_body}' → sentence_token_id={token_id}")
+                                                    logger.debug("✅ [DEBUG] 在句子中找到匹配的token: '%s' → sentence_token_id=%s", token.token_body, token_id)
                                                     break
                             
                             # 获取user_id（优先使用session_state中的user_id）
                             current_sentence = self._ensure_sentence_has_word_tokens(current_sentence)
                             user_id_for_notation = getattr(self.session_state, 'user_id', None) or "default_user"
-                            print(f"🔍 [DEBUG] 创建新词汇的vocab notation: text_id={current_sentence.text_id}, sentence_id={current_sentence.sentence_id}, token_id={token_id}, word_token_id={word_token_id}, vocab_id={vocab_id}, user_id={user_id_for_notation}")
-                            
-                            if token_id is not None:
+                            logger.debug("🔍 [DEBUG] 创建新词汇的vocab notation: text_id=%s, sentence_id=%s, token_id=%s, word_token_id=%s, vocab='%s', user_id=%s", current_sentence.text_id, current_sentence.sentence_id, token_id, word_token_id, vocab.vocab, user_id_for_notation)
+
+                            if token_id is not None and knowledge_batch is not None:
+                                # vocab_id 在批次写入后按 vocab_body 解析，写入成功后再记录到 session_state
+                                knowledge_batch.vocab_notations.append(VocabNotationUpsert(
+                                    text_id=current_sentence.text_id,
+                                    sentence_id=current_sentence.sentence_id,
+                                    token_id=token_id,
+                                    vocab_body=vocab.vocab,
+                                    word_token_id=word_token_id,
+                                ))
+                            elif token_id is not None:
+                                from backend.data_managers.unified_notation_manager import get_unified_notation_manager
+                                notation_manager = get_unified_notation_manager(use_database=True, use_legacy_compatibility=True)
                                 v_ok = notation_manager.mark_notation(
                                     notation_type="vocab",
                                     user_id=user_id_for_notation,
@@ -2185,7 +2249,7 @@ class MainAssistant:
                                     vocab_id=vocab_id,
                                     word_token_id=word_token_id  # 新增：传递 word_token_id
                                 )
-                                print(f"✅ [DEBUG] 新词汇 vocab_notation创建结果: {v_ok}")
+                                logger.debug("✅ [DEBUG] 新词汇 vocab_notation创建结果: %s", v_ok)
                                 if v_ok:
                                     # 记录到 session_state
                                     # 🔧 使用实际的 user_id（整数）而不是字符串
@@ -2198,18 +2262,67 @@ class MainAssistant:
                                         user_id=actual_user_id
                                     )
                             else:
-                                print("⚠️ [DEBUG] 无法创建新词汇 vocab notation：token_id为空（已尝试从句子中查找但未找到匹配的token）")
+                                logger.warning("⚠️ [DEBUG] 无法创建新词汇 vocab notation：token_id为空（已尝试从句子中查找但未找到匹配的token）")
                         except Exception as vn_err:
-                            print(f"❌ [DEBUG] 创建新词汇 vocab_notation时发生错误: {vn_err}")
+                            logger.error("❌ [DEBUG] 创建新词汇 vocab_notation时发生错误: %s", vn_err)
                             import traceback
                             traceback.print_exc()
                     except ValueError as e:
-                        print(f"⚠️ [DEBUG] 跳过添加vocab_example，因为: {e}")
-                        print(f"🔍 [DEBUG] 句子信息: text_id={current_sentence.text_id}, sentence_id={current_sentence.sentence_id}")
+                        logger.warning("⚠️ [DEBUG] 跳过添加vocab_example，因为: %s", e)
+                        logger.debug("🔍 [DEBUG] 句子信息: text_id=%s, sentence_id=%s", current_sentence.text_id, current_sentence.sentence_id)
                     except Exception as e:
-                        print(f"❌ [DEBUG] 添加vocab_example时发生错误: {e}")
+                        logger.error("❌ [DEBUG] 添加vocab_example时发生错误: %s", e)
         else:
-            print("🔍 [DEBUG] vocab_to_add为空，跳过新词汇处理")
+            logger.debug("🔍 [DEBUG] vocab_to_add为空，跳过新词汇处理")
+
+        if knowledge_batch is not None and not knowledge_batch.is_empty():
+            self._write_knowledge_batch(user_id, knowledge_batch)
+
+    def _write_knowledge_batch(self, user_id: int, batch) -> None:
+        """
+        单事务写入 add_new_to_data 收集的本轮知识点（upsert_knowledge），
+        再按返回的 rule_id / vocab_id 记录本轮新建的 notation。
+        写入失败时把批次重新排进后台队列重试（notation 不再回传给本轮的前端）。
+        """
+        try:
+            result = _upsert_knowledge_batch(user_id, batch)
+        except Exception as e:
+            logger.error("❌ [MainAssistant] 本轮知识点写入数据库失败，稍后重试: %s", e)
+            _requeue_knowledge_batch(user_id, batch, attempt=1)
+            return
+
+        logger.info(
+            "✅ [MainAssistant] 本轮知识点已写入数据库: %s grammar rules（新增 %s）, %s vocab（新增 %s）, 新增例句 %s+%s",
+            len(result.rule_ids), result.grammar_rules_created,
+            len(result.vocab_ids), result.vocabs_created,
+            result.grammar_examples_added, result.vocab_examples_added,
+        )
+        if result.skipped:
+            logger.warning("⚠️ [MainAssistant] %s 条例句 / notation 被跳过（句子不存在、不属于当前用户或无法解析 id）", result.skipped)
+
+        # 记录到 session_state 以便返回给前端（引用的句子不存在或不属于当前用户时 upsert 已跳过，这里同样不记录）
+        for notation in batch.grammar_notations:
+            grammar_id = result.rule_ids.get(notation.rule_name)
+            if grammar_id is None or (notation.text_id, notation.sentence_id) not in result.valid_sentences:
+                continue
+            self.session_state.add_created_grammar_notation(
+                text_id=notation.text_id,
+                sentence_id=notation.sentence_id,
+                grammar_id=grammar_id,
+                marked_token_ids=notation.marked_token_ids,
+                user_id=user_id
+            )
+        for notation in batch.vocab_notations:
+            vocab_id = result.vocab_ids.get(notation.vocab_body)
+            if vocab_id is None or (notation.text_id, notation.sentence_id) not in result.valid_sentences:
+                continue
+            self.session_state.add_created_vocab_notation(
+                text_id=notation.text_id,
+                sentence_id=notation.sentence_id,
+                token_id=notation.token_id,
+                vocab_id=vocab_id,
+                user_id=user_id
+            )
 
     def _get_token_indices_from_selection(self, sentence: SentenceType) -> list:
         """
@@ -2221,49 +2334,49 @@ class MainAssistant:
         Returns:
             list[int]: sentence_token_id 列表（如 [3, 4, 5]）
         """
-        print(f"🔍 [TokenIndices] ========== 开始提取token_indices ==========")
+        logger.debug("🔍 [TokenIndices] ========== 开始提取token_indices ==========")
         token_indices = []
         
         # 从 session_state 获取选中的 token
         selected_token = self.session_state.current_selected_token
-        print(f"🔍 [TokenIndices] selected_token存在: {selected_token is not None}")
+        logger.debug("🔍 [TokenIndices] selected_token存在: %s", selected_token is not None)
         if not selected_token:
-            print("⚠️ [TokenIndices] 没有选中的 token，返回空列表")
+            logger.warning("⚠️ [TokenIndices] 没有选中的 token，返回空列表")
             return []
 
-        print(f"🔍 [TokenIndices] selected_token类型: {type(selected_token)}")
-        print(f"🔍 [TokenIndices] selected_token属性: {dir(selected_token)}")
+        logger.debug("🔍 [TokenIndices] selected_token类型: %s", type(selected_token))
+        logger.debug("🔍 [TokenIndices] selected_token属性: %s", lazy(lambda: dir(selected_token)))
         if hasattr(selected_token, 'token_text'):
-            print(f"🔍 [TokenIndices] selected_token.token_text: '{selected_token.token_text}'")
+            logger.debug("🔍 [TokenIndices] selected_token.token_text: '%s'", selected_token.token_text)
         if hasattr(selected_token, 'token_indices'):
-            print(f"🔍 [TokenIndices] selected_token.token_indices: {selected_token.token_indices}")
+            logger.debug("🔍 [TokenIndices] selected_token.token_indices: %s", selected_token.token_indices)
 
         # 1) 优先使用 session 中已存在的 token_indices（来自前端/MockServer），且不是整句 [-1]
         if hasattr(selected_token, 'token_indices') and isinstance(selected_token.token_indices, list):
-            print(f"🔍 [TokenIndices] 发现token_indices属性: {selected_token.token_indices}")
+            logger.debug("🔍 [TokenIndices] 发现token_indices属性: %s", selected_token.token_indices)
             incoming_indices = [int(i) for i in selected_token.token_indices if isinstance(i, (int, float, str)) and str(i).lstrip('-').isdigit()]
-            print(f"🔍 [TokenIndices] 处理后的incoming_indices: {incoming_indices}")
+            logger.debug("🔍 [TokenIndices] 处理后的incoming_indices: %s", incoming_indices)
             if incoming_indices and not (len(incoming_indices) == 1 and incoming_indices[0] == -1):
-                print(f"✅ [TokenIndices] 使用 session_state.token_indices: {incoming_indices}")
-                print(f"🔍 [TokenIndices] ========== 使用session token_indices完成 ==========")
+                logger.info("✅ [TokenIndices] 使用 session_state.token_indices: %s", incoming_indices)
+                logger.debug("🔍 [TokenIndices] ========== 使用session token_indices完成 ==========")
                 return incoming_indices
             else:
-                print(f"🔍 [TokenIndices] incoming_indices为空或为整句标记[-1]，继续查找")
+                logger.debug("🔍 [TokenIndices] incoming_indices为空或为整句标记[-1]，继续查找")
         
         # 检查句子是否有 tokens 列表（新数据结构）
-        print(f"🔍 [TokenIndices] 句子有tokens属性: {hasattr(sentence, 'tokens')}")
+        logger.debug("🔍 [TokenIndices] 句子有tokens属性: %s", hasattr(sentence, 'tokens'))
         if hasattr(sentence, 'tokens'):
-            print(f"🔍 [TokenIndices] sentence.tokens存在: {sentence.tokens is not None}")
-            print(f"🔍 [TokenIndices] sentence.tokens长度: {len(sentence.tokens) if sentence.tokens else 0}")
+            logger.debug("🔍 [TokenIndices] sentence.tokens存在: %s", sentence.tokens is not None)
+            logger.debug("🔍 [TokenIndices] sentence.tokens长度: %s", len(sentence.tokens) if sentence.tokens else 0)
         
         if not hasattr(sentence, 'tokens') or not sentence.tokens:
-            print("⚠️ [TokenIndices] 句子没有 tokens 列表，返回空列表")
-            print(f"🔍 [TokenIndices] ========== 句子无tokens完成 ==========")
+            logger.warning("⚠️ [TokenIndices] 句子没有 tokens 列表，返回空列表")
+            logger.debug("🔍 [TokenIndices] ========== 句子无tokens完成 ==========")
             return []
         
         # 获取选中的文本
         selected_text = selected_token.token_text
-        print(f"🔍 [TokenIndices] 查找选中文本: '{selected_text}'")
+        logger.debug("🔍 [TokenIndices] 查找选中文本: '%s'", selected_text)
         
         # 辅助函数：去除标点符号
         import string
@@ -2271,38 +2384,38 @@ class MainAssistant:
             return text.strip(string.punctuation + '。，！？；：""''（）【】《》、')
         
         selected_clean = strip_punctuation(selected_text)
-        print(f"🔍 [TokenIndices] 清理后的选中文本: '{selected_clean}'")
+        logger.debug("🔍 [TokenIndices] 清理后的选中文本: '%s'", selected_clean)
         
         # 2) 回退：根据选中文本在句子的 tokens 中查找匹配的 token
-        print(f"🔍 [TokenIndices] 开始遍历句子tokens:")
+        logger.debug("🔍 [TokenIndices] 开始遍历句子tokens:")
         for i, token in enumerate(sentence.tokens):
-            print(f"  Token {i}: {token}")
+            logger.debug("  Token %s: %s", i, token)
             if hasattr(token, 'token_type'):
-                print(f"    - token_type: {token.token_type}")
+                logger.debug("    - token_type: %s", token.token_type)
             if hasattr(token, 'token_body'):
-                print(f"    - token_body: '{token.token_body}'")
+                logger.debug("    - token_body: '%s'", token.token_body)
             if hasattr(token, 'sentence_token_id'):
-                print(f"    - sentence_token_id: {token.sentence_token_id}")
+                logger.debug("    - sentence_token_id: %s", token.sentence_token_id)
                 
             if token.token_type == 'text':  # 只考虑文本 token
                 token_clean = strip_punctuation(token.token_body)
-                print(f"    - 清理后的token_body: '{token_clean}'")
-                print(f"    - 比较: '{token_clean.lower()}' == '{selected_clean.lower()}' ? {token_clean.lower() == selected_clean.lower()}")
+                logger.debug("    - 清理后的token_body: '%s'", token_clean)
+                logger.debug("    - 比较: '%s' == '%s' ? %s", token_clean.lower(), selected_clean.lower(), token_clean.lower() == selected_clean.lower())
                 if token_clean.lower() == selected_clean.lower():
                     if token.sentence_token_id is not None:
                         token_indices.append(token.sentence_token_id)
-                        print(f"  ✅ 找到匹配 token: '{token.token_body}' → sentence_token_id={token.sentence_token_id}")
+                        logger.debug("  ✅ 找到匹配 token: '%s' → sentence_token_id=%s", token.token_body, token.sentence_token_id)
                     else:
-                        print(f"  ⚠️ 找到匹配token但sentence_token_id为None: '{token.token_body}'")
+                        logger.warning("  ⚠️ 找到匹配token但sentence_token_id为None: '%s'", token.token_body)
                 else:
-                    print(f"  ❌ 不匹配: '{token.token_body}'")
+                    logger.error("  ❌ 不匹配: '%s'", token.token_body)
         
         if not token_indices:
-            print(f"⚠️ [TokenIndices] 未找到匹配的 token，返回空列表")
+            logger.warning("⚠️ [TokenIndices] 未找到匹配的 token，返回空列表")
         else:
-            print(f"✅ [TokenIndices] 提取到 token_indices: {token_indices}")
+            logger.info("✅ [TokenIndices] 提取到 token_indices: %s", token_indices)
         
-        print(f"🔍 [TokenIndices] ========== token_indices提取完成 ==========")
+        logger.debug("🔍 [TokenIndices] ========== token_indices提取完成 ==========")
         return token_indices
     
     def _log_sentence_capabilities(self, sentence: SentenceType):
@@ -2313,22 +2426,22 @@ class MainAssistant:
             else:
                 caps = CapabilityDetector.detect_sentence_capabilities(sentence)
                 self._capabilities_cache[sentence] = caps
-            print(f"🔍 Sentence capabilities: has_tokens={caps.get('has_tokens')}, token_count={caps.get('token_count')}, has_difficulty_level={caps.get('has_difficulty_level')}")
+            logger.debug("🔍 Sentence capabilities: has_tokens=%s, token_count=%s, has_difficulty_level=%s", caps.get('has_tokens'), caps.get('token_count'), caps.get('has_difficulty_level'))
             # 若具备 tokens，演示性打印前若干 token 文本（不参与逻辑）
             if caps.get('has_tokens'):
                 tokens = DataAdapter.get_tokens(sentence) or []
                 preview = ", ".join([getattr(t, 'token_body', str(t)) for t in tokens[:10]])
-                print(f"   ⤷ tokens preview: {preview}")
+                logger.info("   ⤷ tokens preview: %s", preview)
         except Exception as e:
-            print(f"[Warn] capability logging failed: {e}")
+            logger.info("[Warn] capability logging failed: %s", e)
 
 if __name__ == "__main__":
-    print("✅ 启动语言学习助手。默认引用句如下：")
+    logger.info("✅ 启动语言学习助手。默认引用句如下：")
     test_sentence_str = (
         "Wikipedia is a free content online encyclopedia website in 344 languages of the world in which 342 languages are currently active and 14 are closed. "
 )
-    print("引用句（Quoted Sentence）:")
-    print(test_sentence_str)
+    logger.info("引用句（Quoted Sentence）:")
+    logger.info("%s", test_sentence_str)
     test_sentence = Sentence(
         text_id=0,
         sentence_id=0,
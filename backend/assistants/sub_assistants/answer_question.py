@@ -78,10 +78,11 @@ class AnswerQuestionAssistant(SubAssistant):
             question_language=question_language,
             target_output_language=target_output_language,
         )
+        # 语言要求追加在末尾：prompt 开头的任务说明对每次请求逐字节相同，可命中前缀缓存
         final_prompt = (
+            f"{final_prompt}\n"
             f"【本轮唯一允许的回答语言】{target_output_language}\n"
-            f"【硬性要求】回答正文只能使用{target_output_language}。如果输出了其它解释语言，视为错误。\n\n"
-            f"{final_prompt}"
+            f"【硬性要求】回答正文只能使用{target_output_language}。如果输出了其它解释语言，视为错误。\n"
         )
         
         # 🔧 记录最终 prompt 的长度
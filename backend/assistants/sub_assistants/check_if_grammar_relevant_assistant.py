@@ -1,7 +1,10 @@
 from backend.assistants.sub_assistants.sub_assistant import SubAssistant
+from backend.assistants.sub_assistants.output_schemas import GrammarRelevance
 from backend.assistants.sub_assistants.prompt import check_if_grammar_relevant_sys_prompt, check_if_grammar_relevant_template
 
 class CheckIfGrammarRelevantAssistant(SubAssistant):
+    output_schema = GrammarRelevance
+
     def __init__(self):
         super().__init__(
             sys_prompt=check_if_grammar_relevant_sys_prompt,
@@ -1,8 +1,11 @@
 from backend.assistants.sub_assistants.sub_assistant import SubAssistant
+from backend.assistants.sub_assistants.output_schemas import TopicRelevance
 from backend.assistants.sub_assistants.prompt import check_if_relevant_template,check_if_relevant_sys_prompt
 from typing import Optional
 
 class CheckIfRelevant(SubAssistant):
+    output_schema = TopicRelevance
+
     def __init__(self):
         super().__init__(
             sys_prompt=check_if_relevant_sys_prompt,
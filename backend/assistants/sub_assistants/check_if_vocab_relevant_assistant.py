@@ -1,7 +1,10 @@
 from backend.assistants.sub_assistants.sub_assistant import SubAssistant
+from backend.assistants.sub_assistants.output_schemas import VocabRelevance
 from backend.assistants.sub_assistants.prompt import check_if_vocab_relevant_sys_prompt, check_if_vocab_relevant_template
 
 class CheckIfVocabRelevantAssistant(SubAssistant):
+    output_schema = VocabRelevance
+
     def __init__(self):
         super().__init__(
             sys_prompt=check_if_vocab_relevant_sys_prompt,
@@ -1,9 +1,12 @@
 from backend.assistants.sub_assistants.sub_assistant import SubAssistant
+from backend.assistants.sub_assistants.output_schemas import GrammarSimilarity
 from backend.assistants.sub_assistants.prompt import compare_grammar_rule_sys_prompt, compare_grammar_rule_template
 from typing import Optional
 from backend.assistants.utility import parse_json_from_text
 
 class CompareGrammarRuleAssistant(SubAssistant):
+    output_schema = GrammarSimilarity
+
     def __init__(self):
         super().__init__(
             sys_prompt=compare_grammar_rule_sys_prompt,
@@ -0,0 +1,70 @@
+from typing import Optional
+
+from backend.assistants.sub_assistants.sub_assistant import SubAssistant
+from backend.assistants.sub_assistants.output_schemas import KnowledgeExtraction
+from backend.assistants.sub_assistants.prompt_assembly import render
+from backend.assistants.sub_assistants.extract_knowledge_prompt import (
+    GRAMMAR_CATEGORIES,
+    extract_knowledge_sys_prompt,
+    extract_knowledge_sys_prompt_tail,
+    extract_knowledge_template,
+    extract_knowledge_vocab_rules,
+    extract_knowledge_non_space_vocab_rules,
+)
+
+
+class ExtractKnowledgeAssistant(SubAssistant):
+    """
+    一次调用同时输出：是否语法 / 词汇相关、语法点、词汇
+    （替代 CheckIfGrammarRelevant → CheckIfVocabRelevant → SummarizeGrammarRule → SummarizeVocab 的串行调用）
+
+    输出不符合 schema 时返回 None，由调用方退回到逐个助手的流程。
+    """
+
+    output_schema = KnowledgeExtraction
+
+    def __init__(self):
+        super().__init__(
+            sys_prompt=extract_knowledge_sys_prompt,
+            max_tokens=500,
+            parse_json=True
+        )
+
+    def build_prompt(self, quoted_sentence: str, user_question: str, ai_response: str) -> str:
+        return extract_knowledge_template.format(
+            quoted_sentence=quoted_sentence,
+            user_question=user_question,
+            ai_response=ai_response
+        )
+
+    def run(
+        self,
+        quoted_sentence: str,
+        user_question: str,
+        ai_response: str,
+        language: Optional[str] = None,
+        is_non_whitespace: bool = False,
+        verbose: bool = False,
+        **kwargs
+    ) -> Optional[KnowledgeExtraction]:
+        # 正文只随空格 / 非空格语言变化；display_name 的输出语言放在末尾
+        original_sys_prompt = self.sys_prompt
+        self.sys_prompt = render(
+            extract_knowledge_sys_prompt,
+            categories=", ".join(GRAMMAR_CATEGORIES),
+            vocab_rules=extract_knowledge_non_space_vocab_rules if is_non_whitespace else extract_knowledge_vocab_rules,
+        )
+        self.sys_prompt_tail = render(extract_knowledge_sys_prompt_tail, language=language or "中文")
+        try:
+            super().run(quoted_sentence, user_question, ai_response, verbose=verbose, **kwargs)
+        finally:
+            self.sys_prompt = original_sys_prompt
+            self.sys_prompt_tail = ""
+
+        extraction = self.last_result
+        if extraction is not None:
+            print(
+                f"✅ [ExtractKnowledge] grammar={extraction.is_grammar_relevant}({len(extraction.grammar)}) "
+                f"vocab={extraction.is_vocab_relevant}({len(extraction.vocab)})"
+            )
+        return extraction
@@ -0,0 +1,83 @@
+"""
+一次调用完成知识点抽取（fused 模式）的 prompt
+
+合并了以下四个助手的判断规则，输出一个 JSON 对象：
+- CheckIfGrammarRelevantAssistant / CheckIfVocabRelevantAssistant：是否语法 / 词汇相关
+- SummarizeGrammarRuleAssistant：语法点（display_name + canonical）
+- SummarizeVocabAssistant：词汇（词典标准形式）
+"""
+
+# 与 summarize_grammar_prompt 中的 category 列表保持一致
+GRAMMAR_CATEGORIES = (
+    "clause",
+    "phrase",
+    "word_form",
+    "tense_aspect",
+    "voice",
+    "mood",
+    "modality",
+    "comparison",
+    "sentence_structure",
+    "agreement",
+    "information_structure",
+    "discourse",
+)
+
+extract_knowledge_sys_prompt = """
+你是一个语言学习系统中的知识点抽取模块。
+用户正在阅读一篇文章，会引用其中的句子提问；你会看到用户引用的句子、用户的提问、以及 AI 给出的回答。
+请一次性完成以下三项工作，并只输出一个 JSON 对象。
+
+【一、判断问题类型】
+- is_grammar_relevant：用户的问题**明确提到了某个句子结构或语法现象**（如“为什么用被动语态？”“them 指谁？”）时为 true
+- is_vocab_relevant：用户的问题**明确提到了某个词、词组或表达**（如“gave up 是什么意思？”）时为 true
+- 模糊、宽泛的理解困惑（如“我没懂这句”“什么意思？”），且没有提到具体的词、结构或语法现象：两者都为 false
+
+【二、语法点（仅当 is_grammar_relevant 为 true，否则输出空数组）】
+识别用户在这一轮实际接触到的核心语法结构，一句话可能有多个。每个语法点：
+- display_name：请使用末尾【输出语言】指定的语言输出；面向学习者、简洁、不超过 20 字；不含内部字段名、引导词或语言名称
+  （允许“定语从句”“被动语态”；不允许“clause.relative_clause”“which 引导的定语从句”）
+- canonical.category：只能从以下列表中选择：{categories}
+- canonical.subtype：该 category 下的结构子类型，用英语 snake_case；停留在结构类别，
+  不含具体引导词、助动词、形态变化或语言名称（如 relative_clause，而不是 which_relative_clause）
+- canonical.function：该结构在句中的语法作用，用英语（如 modify_noun、act_as_object），不确定时为 null
+
+【三、词汇（仅当 is_vocab_relevant 为 true，否则输出空数组）】
+{vocab_rules}
+- 只总结当前这一轮对话中学到的新词汇；用户在问前文中已学过的词时输出空数组
+- 不要解释含义，只输出词汇本身
+
+【输出格式】
+只输出合法 JSON，不要使用 Markdown 代码块：
+{{"is_grammar_relevant": false, "is_vocab_relevant": true, "grammar": [], "vocab": [{{"vocab": "give up"}}]}}
+
+语法点示例：
+{{"display_name": "被动语态", "canonical": {{"category": "voice", "subtype": "passive_voice", "function": null}}}}
+"""
+
+# display_name 的输出语言随请求变化，放在 system prompt 末尾
+extract_knowledge_sys_prompt_tail = """
+【输出语言】
+{language}
+"""
+
+# 空格语言（英文 / 德文等）的词汇规则，对应 summarize_vocab_sys_prompt
+extract_knowledge_vocab_rules = """- 对单词：返回词典标准形式（小写、不变格、原形）；动词使用不带 to 的不定式
+- 对常用表达法或短语：保留原始结构但使用标准书写形式，不完整语境可用 "..." 表示（如 "... in a nutshell"）"""
+
+# 无空格语言（中文 / 日文等）的词汇规则，对应 summarize_non_space_vocab_sys_prompt
+extract_knowledge_non_space_vocab_rules = """- 不要把单个汉字当作词汇输出，除非它在现代汉语中常作为独立词使用（如“大、吃、快”）
+- 只输出原句中出现的词；用户问的单字属于句中更大的词时（如“整”→“整体”），输出完整词
+- 优先输出词汇本体，不输出“动词+宾语”或语境临时组合的短语（如“改良空间”只输出“改良”）
+- 只有高固定度、拆开会失真的表达（如“无论如何”）才整体输出"""
+
+extract_knowledge_template = """
+这是用户引用的句子：
+{quoted_sentence}
+
+这是用户的提问：
+{user_question}
+
+这是 AI 给出的回答：
+{ai_response}
+"""
@@ -1,5 +1,10 @@
 from backend.assistants.sub_assistants.sub_assistant import SubAssistant
-from backend.assistants.sub_assistants.prompt import grammar_example_explanation_sys_prompt,grammar_example_explanation_template
+from backend.assistants.sub_assistants.prompt import (
+    grammar_example_explanation_sys_prompt,
+    grammar_example_explanation_sys_prompt_tail,
+    grammar_example_explanation_template,
+)
+from backend.assistants.sub_assistants.prompt_assembly import render
 from typing import Optional, Union
 from backend.data_managers.data_classes import Sentence
 from backend.data_managers.data_classes_new import Sentence as NewSentence
@@ -7,7 +12,7 @@ from backend.data_managers.data_classes_new import Sentence as NewSentence
 class GrammarExampleExplanationAssistant(SubAssistant):
     def __init__(self):
         super().__init__(
-            sys_prompt=grammar_example_explanation_sys_prompt,
+            sys_prompt=render(grammar_example_explanation_sys_prompt),
             max_tokens=4000,  # 🔧 增加到 4000，避免 context_explanation 被截断（中文解释可能较长）
             parse_json=False
         )
@@ -37,15 +42,12 @@ class GrammarExampleExplanationAssistant(SubAssistant):
         :param sentence: 句子对象
         :param language: 输出语言（如"中文"、"英文"等）
         """
-        # 格式化 system prompt，添加语言信息
-        original_sys_prompt = self.sys_prompt
-        self.sys_prompt = grammar_example_explanation_sys_prompt.format(
-            language=language or "中文"
-        )
+        # 语言信息放在 system prompt 末尾，正文保持不变（前缀可被缓存）
+        self.sys_prompt_tail = render(grammar_example_explanation_sys_prompt_tail, language=language or "中文")
         try:
             result = super().run(grammar, sentence, language=language, **kwargs)
         finally:
-            # 恢复原始 sys_prompt，避免影响后续调用
-            self.sys_prompt = original_sys_prompt
+            # 清空本次的尾部，避免影响后续调用
+            self.sys_prompt_tail = ""
         return result
     
\ No newline at end of file
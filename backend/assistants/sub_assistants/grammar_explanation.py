@@ -1,6 +1,11 @@
 from typing import Optional
 from backend.assistants.sub_assistants.sub_assistant import SubAssistant
-from backend.assistants.sub_assistants.prompt import grammar_explanation_sys_prompt, grammar_explanation_template
+from backend.assistants.sub_assistants.prompt import (
+    grammar_explanation_sys_prompt,
+    grammar_explanation_sys_prompt_tail,
+    grammar_explanation_template,
+)
+from backend.assistants.sub_assistants.prompt_assembly import render
 
 
 class GrammarExplanationAssistant(SubAssistant):
@@ -13,7 +18,7 @@ class GrammarExplanationAssistant(SubAssistant):
     
     def __init__(self):
         super().__init__(
-            sys_prompt=grammar_explanation_sys_prompt,
+            sys_prompt=render(grammar_explanation_sys_prompt),
             max_tokens=2000,
             parse_json=True
         )
@@ -67,11 +72,11 @@ class GrammarExplanationAssistant(SubAssistant):
         返回:
             dict: {"grammar_explanation": "..."} 或原始字符串
         """
-        # 格式化 system prompt，添加语言信息
-        original_sys_prompt = self.sys_prompt
+        # 语言信息放在 system prompt 末尾，正文保持不变（前缀可被缓存）
         output_language = language or "中文"
         learning_lang = learning_language or output_language
-        self.sys_prompt = grammar_explanation_sys_prompt.format(
+        self.sys_prompt_tail = render(
+            grammar_explanation_sys_prompt_tail,
             learning_language=learning_lang,
             output_language=output_language
         )
@@ -79,7 +84,7 @@ class GrammarExplanationAssistant(SubAssistant):
         try:
             result = super().run(quoted_sentence, grammar_summary, verbose=verbose, **kwargs)
         finally:
-            # 恢复原始 sys_prompt，避免影响后续调用
-            self.sys_prompt = original_sys_prompt
+            # 清空本次的尾部，避免影响后续调用
+            self.sys_prompt_tail = ""
         return result
 
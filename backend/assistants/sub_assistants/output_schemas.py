@@ -0,0 +1,139 @@
+"""
+子助手的结构化输出 schema
+
+SubAssistant 子类设置 output_schema 后：
+- 请求 JSON mode（response_format={"type": "json_object"}），system prompt 末尾追加 json_instruction
+- 用 model_validate_json 直接从模型输出的字符串解析为类型化对象（pydantic-core 解析，不经过 json.loads + dict）
+- run() 仍返回 to_legacy() 的 dict / list，调用方无需修改；需要类型化结果时用 run_typed()
+
+JSON mode 只允许顶层为对象，原来返回数组或空字符串的助手统一改为 {"items": [...]}；
+mode="before" 的校验器仍接受旧格式（单个对象 / 数组 / ""），模型偶尔不按信封输出时不必重试。
+"""
+from typing import Any, ClassVar, List, Literal, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+
+from backend.assistants.sub_assistants.extract_knowledge_prompt import GRAMMAR_CATEGORIES
+
+
+class StructuredOutput(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    # 追加到 system prompt 末尾的输出格式说明（JSON mode 要求 prompt 中出现 "JSON"）
+    json_instruction: ClassVar[str] = "\n请只输出一个合法的 JSON 对象。"
+
+    def to_legacy(self) -> Any:
+        """转换为未使用 schema 时 run() 的返回格式"""
+        return self.model_dump()
+
+
+# ==================== 相关性判断 ====================
+
+class TopicRelevance(StructuredOutput):
+    is_relevant: bool
+
+
+class GrammarRelevance(StructuredOutput):
+    is_grammar_relevant: bool
+
+
+class VocabRelevance(StructuredOutput):
+    is_vocab_relevant: bool
+
+
+class GrammarSimilarity(StructuredOutput):
+    is_similar: bool
+    similarity_score: float = Field(default=0.0, ge=0.0, le=1.0)
+
+
+# ==================== 语法 / 词汇总结 ====================
+
+def _wrap_items(data: Any, item_key: str) -> Any:
+    """把旧格式（单个对象 / 数组 / "" / {"result": null}）统一成 {"items": [...]}"""
+    if data is None or data == "":
+        return {"items": []}
+    if isinstance(data, list):
+        return {"items": data}
+    if isinstance(data, dict):
+        if "items" in data:
+            return {"items": data["items"] or []}
+        if item_key in data:
+            return {"items": [data]}
+        if "result" in data and not data["result"]:
+            return {"items": []}
+    return data
+
+
+class CanonicalGrammar(BaseModel):
+    category: Literal[GRAMMAR_CATEGORIES]
+    subtype: str = Field(..., min_length=1, max_length=80)
+    function: Optional[str] = None
+
+
+class GrammarPoint(BaseModel):
+    display_name: str = Field(..., min_length=1, max_length=40)
+    canonical: CanonicalGrammar
+
+
+class VocabItem(BaseModel):
+    vocab: str = Field(..., min_length=1, max_length=100)
+
+    @field_validator("vocab")
+    @classmethod
+    def _strip(cls, value: str) -> str:
+        value = value.strip()
+        if not value:
+            raise ValueError("vocab must not be blank")
+        return value
+
+
+class GrammarSummaryOutput(StructuredOutput):
+    items: List[GrammarPoint] = Field(default_factory=list)
+
+    json_instruction: ClassVar[str] = (
+        '\n请只输出一个 JSON 对象，把语法知识点放在 items 数组中：'
+        '{"items": [{"display_name": "...", "canonical": {"category": "...", "subtype": "...", "function": null}}]}；'
+        '没有明确语法结构时输出 {"items": []}。'
+    )
+
+    @model_validator(mode="before")
+    @classmethod
+    def _accept_legacy(cls, data: Any) -> Any:
+        return _wrap_items(data, "display_name")
+
+    def to_legacy(self) -> list:
+        return [item.model_dump() for item in self.items]
+
+
+class VocabSummaryOutput(StructuredOutput):
+    items: List[VocabItem] = Field(default_factory=list)
+
+    json_instruction: ClassVar[str] = (
+        '\n请只输出一个 JSON 对象，把词汇放在 items 数组中：{"items": [{"vocab": "..."}]}；'
+        '没有学到新词汇时输出 {"items": []}。'
+    )
+
+    @model_validator(mode="before")
+    @classmethod
+    def _accept_legacy(cls, data: Any) -> Any:
+        return _wrap_items(data, "vocab")
+
+    def to_legacy(self) -> list:
+        return [item.model_dump() for item in self.items]
+
+
+# ==================== 一次调用的知识点抽取（fused 模式） ====================
+
+class KnowledgeExtraction(StructuredOutput):
+    is_grammar_relevant: bool
+    is_vocab_relevant: bool
+    grammar: List[GrammarPoint] = Field(default_factory=list)
+    vocab: List[VocabItem] = Field(default_factory=list)
+
+    def grammar_summary(self) -> list:
+        """与 SummarizeGrammarRuleAssistant 的返回值兼容（list[dict]）"""
+        return [g.model_dump() for g in self.grammar] if self.is_grammar_relevant else []
+
+    def vocab_summary(self) -> list:
+        """与 SummarizeVocabAssistant 的返回值兼容（list[{"vocab": ...}]）"""
+        return [v.model_dump() for v in self.vocab] if self.is_vocab_relevant else []
@@ -205,16 +205,13 @@ answer_question_sys_prompt = """
 {{"answer": "你的回答内容"}}
 """
 
+# 固定的任务说明在前，本轮内容与语言提示在后（前缀对 provider 缓存保持不变）
 answer_question_template = """
 TASK:
 Answer the user's language-learning question about the quoted text.
 
-TARGET_OUTPUT_LANGUAGE: {target_output_language}
-UI_LANGUAGE: {ui_language}
-QUESTION_LANGUAGE: {question_language}
-
 LANGUAGE_RULES:
-1. The explanation in `answer` must be written only in {target_output_language}.
+1. The explanation in `answer` must be written only in TARGET_OUTPUT_LANGUAGE (given at the end).
 2. Do not switch to another explanation language.
 3. You may keep the original quoted word or sentence in its original language when necessary.
 
@@ -229,6 +226,10 @@ FULL_SENTENCE:
 
 CONTEXT:
 {context_info}
+
+TARGET_OUTPUT_LANGUAGE: {target_output_language}
+UI_LANGUAGE: {ui_language}
+QUESTION_LANGUAGE: {question_language}
 """
 
 summarize_vocab_sys_prompt = """
@@ -394,13 +395,19 @@ English:
 - "被字句 → 被 + 动作执行者；'被打了' = 承受动作；强调受动"
 
 【语言要求】
-- 必须使用{language}输出
+- 必须使用末尾【输出语言】指定的语言输出
 - 不得输出其他语言
 
 请只返回如下 JSON：
 {{"explanation": "..." }}
 """
 
+# 按请求变化的部分放在 system prompt 末尾（见 prompt_assembly）
+grammar_example_explanation_sys_prompt_tail = """
+【输出语言】
+{language}
+"""
+
 grammar_example_explanation_template = """
 这是用户引用的句子：
 {quoted_sentence}
@@ -448,16 +455,21 @@ vocab_example_explanation_sys_prompt = """
 - 不得列举多个意思
 - 不得添加无关说明
 
-【输出语言】（必须遵守）
-- 你必须使用 **{output_language}** 撰写 JSON 中 `explanation` 字段内的**全部**说明文字（含含义、词性/语法标签、句中位置说明、括号内释义等）。
-- 不得因为示例里有中文就默认用中文输出；**以 {output_language} 为准**。
-- 若 {output_language} 为 English / 英文 / en：**整段 explanation 必须为英文**，标签与批注也须全英文，不得出现中文字符。
-- 若 {output_language} 为中文 / 简体中文 / zh：可用中文撰写说明；仍勿无故混用其他语言。
+【输出语言】（必须遵守，具体语言见末尾【输出语言】）
+- 你必须使用输出语言撰写 JSON 中 `explanation` 字段内的**全部**说明文字（含含义、词性/语法标签、句中位置说明、括号内释义等）。
+- 不得因为示例里有中文就默认用中文输出；**以输出语言为准**。
+- 若输出语言为 English / 英文 / en：**整段 explanation 必须为英文**，标签与批注也须全英文，不得出现中文字符。
+- 若输出语言为中文 / 简体中文 / zh：可用中文撰写说明；仍勿无故混用其他语言。
 
 请只返回如下 JSON：
 {{"explanation": "你的解释内容"}}
 """
 
+vocab_example_explanation_sys_prompt_tail = """
+【输出语言】
+{output_language}
+"""
+
 vocab_example_explanation_template = """
 这是用户引用的句子：
 {quoted_sentence}
@@ -470,10 +482,10 @@ vocab_explanation_sys_prompt = """
 你需要根据用户引用的句子和词汇，给出一个详细而准确的词汇解释。
 
 请注意：
-- **重要**：整个 explanation 必须只使用 {language} 作为说明语言。
-- 标题、标签、注释文字都必须使用 {language}；不要混入其他说明语言。
+- **重要**：整个 explanation 必须只使用末尾【输出语言】指定的语言作为说明语言。
+- 标题、标签、注释文字都必须使用输出语言；不要混入其他说明语言。
 - 不要输出任何“可选提示”类前缀，也不要在标题前添加括号说明。
-- 可以保留待解释词本身、词组本身、固定搭配本身的原文形式；但解释文字必须是 {language}。
+- 可以保留待解释词本身、词组本身、固定搭配本身的原文形式；但解释文字必须是输出语言。
 - 可以参考句子中的语境来判断词义，但不要提及当前句子，也不要解释句子。
 - 如果一个词有多个常见意思，可以编号列出；如果没有，就只写一个意思。
 
@@ -513,13 +525,13 @@ vocab_explanation_sys_prompt = """
 ---
 
 【标题规则】
-- 若 {language} 为 English / 英文 / en，则标题只能使用：
+- 若输出语言为 English / 英文 / en，则标题只能使用：
 Word features:
 Rare sense:
 Collocations:
 Grammar notes:
 
-- 若 {language} 为 中文 / 简体中文 / zh，则标题只能使用：
+- 若输出语言为 中文 / 简体中文 / zh，则标题只能使用：
 词汇特征：
 少见义：
 搭配：
@@ -556,6 +568,11 @@ Grammar notes:
 {{"explanation": "你的解释内容"}}
 """
 
+vocab_explanation_sys_prompt_tail = """
+【输出语言】
+{language}
+"""
+
 vocab_explanation_template = """
 这是用户引用的句子：
 {quoted_sentence}
@@ -621,9 +638,7 @@ check_word_segment_sys_prompt = f"""
 
 grammar_explanation_sys_prompt = """
 你是一个语言学习助手，负责生成“扫一眼就懂”的语法说明。
-
-用户学习语言：{learning_language}
-输出语言：{output_language}
+用户学习语言与输出语言见末尾【本次语言】。
 
 【核心目标】
 - 帮助用户理解“这一句话为什么这样写”
@@ -649,10 +664,10 @@ grammar_explanation_sys_prompt = """
 - 必须具体，不能抽象
 
 2. 例句（+翻译）
-- 只给1句，使用 {learning_language}
+- 只给1句，使用用户学习语言
 - 句子必须简单、典型，不要用原句！
 - 关键结构用 **加粗**
-- 下一行提供自然翻译（{output_language}）
+- 下一行提供自然翻译（使用输出语言）
 
 3. 句子映射（必须有）
 - 用“👉”开头
@@ -696,8 +711,8 @@ grammar_explanation_sys_prompt = """
 ---
 
 【语言一致性】
-- 例句必须使用 {learning_language}
-- 翻译使用 {output_language}
+- 例句必须使用用户学习语言
+- 翻译使用输出语言
 - 不允许混用其他语言示例
 
 ---
@@ -705,6 +720,12 @@ grammar_explanation_sys_prompt = """
 请只返回 JSON：
 {{"grammar_explanation": "..."}}
 """
+
+grammar_explanation_sys_prompt_tail = """
+【本次语言】
+用户学习语言：{learning_language}
+输出语言：{output_language}
+"""
 grammar_explanation_template = """
 这是用户引用的原句（仅供参考，不要引用其中的具体内容）：
 {quoted_sentence}
@@ -0,0 +1,115 @@
+"""
+子助手 prompt 组装（对 provider 前缀缓存友好）
+
+DeepSeek / OpenAI 会缓存请求开头相同的部分（按前缀逐段匹配），命中部分按更低价格计费、
+首 token 更快。前缀中只要出现一个随请求变化的字节，之后的部分就都无法命中。
+
+组装规则：
+- system prompt = 固定正文 + 输出格式说明（json_instruction） + 本次请求的尾部
+  - 固定正文不含任何按请求变化的内容，同一助手（及空格 / 非空格语言变体）逐字节相同
+  - 输出语言、学习语言等参数统一放在 *_sys_prompt_tail 模板里，追加在最后
+- user prompt 中固定的任务说明放前面，引用句子、提问、语言提示等放后面
+
+render() 按 (模板, 参数) 缓存渲染结果，同一参数每次返回同一个字符串。
+
+统计：
+- 每次调用从 usage 读取命中缓存的 prompt tokens：
+  DeepSeek 为 prompt_cache_hit_tokens，OpenAI 为 prompt_tokens_details.cached_tokens
+- 按助手汇总调用次数、prompt tokens、命中 tokens、命中率，以及出现过的不同前缀个数
+  （同一助手前缀个数持续增长说明固定正文里混进了变化的内容）
+"""
+import hashlib
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Dict, Optional
+
+
+@lru_cache(maxsize=512)
+def _render(template: str, params: tuple) -> str:
+    return template.format(**dict(params))
+
+
+def render(template: str, **params: Any) -> str:
+    """渲染 prompt 模板（参数相同则返回同一个字符串）"""
+    return _render(template, tuple(sorted(params.items())))
+
+
+def assemble_system_prompt(body: str, json_instruction: str = "", tail: str = "") -> str:
+    """固定正文 + 输出格式说明在前，本次请求的尾部在后"""
+    return body + json_instruction + tail
+
+
+def extract_cache_hit_tokens(usage: Any) -> Optional[int]:
+    """从 response.usage 读取命中前缀缓存的 prompt tokens；provider 未返回时为 None"""
+    if usage is None:
+        return None
+    hit = getattr(usage, "prompt_cache_hit_tokens", None)
+    if hit is None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        hit = getattr(details, "cached_tokens", None) if details is not None else None
+    return int(hit) if hit is not None else None
+
+
+# ==================== 按助手统计 ====================
+
+# 每个助手最多记录的前缀指纹个数（防止前缀不稳定时无限增长）
+_MAX_PREFIXES_PER_ASSISTANT = 32
+
+_stats: Dict[str, Dict[str, Any]] = {}
+_stats_lock = Lock()
+
+
+def prefix_fingerprint(prefix: str) -> str:
+    return hashlib.sha1(prefix.encode("utf-8")).hexdigest()[:12]
+
+
+def record_usage(
+    assistant_name: str,
+    prefix: str,
+    prompt_tokens: int,
+    cache_hit_tokens: Optional[int],
+) -> None:
+    """记录一次调用的前缀指纹与缓存命中情况"""
+    fingerprint = prefix_fingerprint(prefix)
+    with _stats_lock:
+        stats = _stats.setdefault(assistant_name, {
+            "calls": 0,
+            "prompt_tokens": 0,
+            "cache_hit_tokens": 0,
+            "calls_without_cache_info": 0,
+            "prefix_chars": len(prefix),
+            "prefixes": set(),
+        })
+        stats["calls"] += 1
+        stats["prompt_tokens"] += int(prompt_tokens or 0)
+        if cache_hit_tokens is None:
+            stats["calls_without_cache_info"] += 1
+        else:
+            stats["cache_hit_tokens"] += cache_hit_tokens
+        stats["prefix_chars"] = len(prefix)
+        if len(stats["prefixes"]) < _MAX_PREFIXES_PER_ASSISTANT:
+            stats["prefixes"].add(fingerprint)
+
+
+def get_stats() -> Dict[str, Any]:
+    """各助手的前缀缓存命中率与前缀稳定性"""
+    with _stats_lock:
+        result = {}
+        for name, stats in sorted(_stats.items()):
+            prompt_tokens = stats["prompt_tokens"]
+            result[name] = {
+                "calls": stats["calls"],
+                "prompt_tokens": prompt_tokens,
+                "cache_hit_tokens": stats["cache_hit_tokens"],
+                "cache_hit_rate": round(stats["cache_hit_tokens"] / prompt_tokens, 4) if prompt_tokens else None,
+                "calls_without_cache_info": stats["calls_without_cache_info"],
+                "prefix_chars": stats["prefix_chars"],
+                "distinct_prefixes": len(stats["prefixes"]),
+            }
+        return result
+
+
+def clear_stats() -> None:
+    """清空统计（测试 / 调试用）"""
+    with _stats_lock:
+        _stats.clear()
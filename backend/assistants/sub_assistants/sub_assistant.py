@@ -1,11 +1,59 @@
+import os
 import time
+from threading import Lock
 from openai import OpenAI
 from openai import APIConnectionError, APITimeoutError
 import httpx
-from typing import Optional
+from pydantic import ValidationError
+from typing import Any, Dict, Optional, Type
 from sqlalchemy.orm import Session
 #, Sentence, GrammarRule, GrammarExample, GrammarBundle, VocabExpression, VocabExpressionExample
 from backend.assistants.utility import parse_json_from_text
+from backend.assistants.sub_assistants.output_schemas import StructuredOutput
+from backend.assistants.sub_assistants import prompt_assembly
+from backend.services import chat_trace
+from backend.utils.structured_logging import get_logger
+
+logger = get_logger("sub_assistant")
+
+# 声明了 output_schema 的子助手是否向 API 请求 JSON mode（设为 0 可在不支持的模型上关闭）
+JSON_MODE_ENABLED = os.getenv("SUB_ASSISTANT_JSON_MODE", "1").strip().lower() not in ("0", "false", "no")
+
+# 解析统计（按子助手类名）：
+# - schema_fast: model_validate_json 直接解析成功
+# - schema_fallback: 直接解析失败，经 parse_json_from_text 清洗后校验成功
+# - schema_failed: 两种方式都不符合 schema
+# - legacy_ok / legacy_failed: 未声明 schema 的子助手（parse_json_from_text）
+# - retries: 因空内容或解析失败而重新调用 API 的次数
+_PARSE_COUNTERS = ("schema_fast", "schema_fallback", "schema_failed", "legacy_ok", "legacy_failed", "retries")
+_parse_stats: Dict[str, Dict[str, float]] = {}
+_parse_stats_lock = Lock()
+
+
+def _record_parse(assistant_name: str, outcome: str, elapsed_ms: float = 0.0) -> None:
+    with _parse_stats_lock:
+        stats = _parse_stats.setdefault(
+            assistant_name, {**{name: 0 for name in _PARSE_COUNTERS}, "parse_ms_total": 0.0, "parse_ms_max": 0.0}
+        )
+        stats[outcome] += 1
+        if outcome != "retries":
+            stats["parse_ms_total"] += elapsed_ms
+            stats["parse_ms_max"] = max(stats["parse_ms_max"], elapsed_ms)
+
+
+def get_parse_stats() -> Dict[str, Any]:
+    """各子助手的解析次数、重试率、平均 / 最大解析耗时"""
+    with _parse_stats_lock:
+        result = {}
+        for name, stats in _parse_stats.items():
+            parses = sum(stats[c] for c in _PARSE_COUNTERS if c != "retries")
+            result[name] = {
+                **{c: int(stats[c]) for c in _PARSE_COUNTERS},
+                "parse_ms_avg": round(stats["parse_ms_total"] / parses, 3) if parses else None,
+                "parse_ms_max": round(stats["parse_ms_max"], 3),
+                "retry_rate": round(stats["retries"] / parses, 4) if parses else None,
+            }
+        return result
 
 
 def _log_text_preview(label: str, value, max_len: int = 220) -> None:
@@ -21,25 +69,40 @@ def _log_text_preview(label: str, value, max_len: int = 220) -> None:
 
 
 class SubAssistant:
+    # 子类声明输出 schema 后：请求 JSON mode，并直接解析为类型化结果（见 output_schemas）
+    output_schema: Optional[Type[StructuredOutput]] = None
+
     def __init__(self, sys_prompt, max_tokens, parse_json):
-        # 从统一配置模块导入 API Key
+        # 从统一配置模块导入 API Key 与服务地址
         try:
-            from backend.config import OPENAI_API_KEY
+            from backend.config import OPENAI_API_KEY, LLM_BASE_URL, DEFAULT_LLM_BASE_URL
             api_key = OPENAI_API_KEY
         except ImportError:
             # 如果导入失败，直接从环境变量读取（向后兼容）
-            import os
             api_key = os.getenv("OPENAI_API_KEY")
+            DEFAULT_LLM_BASE_URL = "https://api.deepseek.com"
+            LLM_BASE_URL = os.getenv("LLM_BASE_URL", DEFAULT_LLM_BASE_URL).rstrip("/")
         
         if not api_key:
             raise ValueError("⚠️ OPENAI_API_KEY 环境变量未设置！请在 .env 文件中设置 OPENAI_API_KEY")
-        self.client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com")
+        # 指向本地 stub 时带上助手类名，stub 据此回放该助手录制的响应
+        default_headers = None
+        if LLM_BASE_URL != DEFAULT_LLM_BASE_URL:
+            default_headers = {"X-Assistant-Name": self.__class__.__name__}
+        self.client = OpenAI(api_key=api_key, base_url=LLM_BASE_URL, default_headers=default_headers)
+        # 固定正文（不含按请求变化的内容，作为可被 provider 缓存的前缀）
         self.sys_prompt = sys_prompt
+        # 本次请求的 system prompt 尾部（输出语言等），由子类在 run() 中设置、结束后清空
+        self.sys_prompt_tail = ""
         self.max_tokens = max_tokens
         self.parse_json = parse_json
         self.model = "deepseek-chat"
         self.max_retries = 3
         self.retry_backoff_seconds = 2
+        # 最近一次调用的 token 用量（prompt / completion / total），供对比脚本等读取
+        self.last_usage: Optional[dict] = None
+        # 最近一次调用的类型化结果（仅声明了 output_schema 时；解析失败为 None）
+        self.last_result: Optional[StructuredOutput] = None
 
     def run(
         self, 
@@ -49,116 +112,218 @@ class SubAssistant:
         session: Optional[Session] = None,
         **kwargs
     ) -> dict |list[dict] | str:
+        self.last_result = None
         user_prompt = self.build_prompt(*args, **kwargs)
         if verbose:
             _log_text_preview("🧾 [SubAssistant] user prompt", user_prompt, max_len=400)
     
+        request_options = {}
+        json_instruction = ""
+        if self.output_schema is not None:
+            json_instruction = self.output_schema.json_instruction
+            if JSON_MODE_ENABLED:
+                request_options["response_format"] = {"type": "json_object"}
+        cacheable_prefix = prompt_assembly.assemble_system_prompt(self.sys_prompt, json_instruction)
+        sys_prompt = prompt_assembly.assemble_system_prompt(self.sys_prompt, json_instruction, self.sys_prompt_tail)
         messages = [
-            {"role": "system", "content": self.sys_prompt},
+            {"role": "system", "content": sys_prompt},
             {"role": "user", "content": user_prompt}
         ]
+        assistant_name = self.__class__.__name__
 
-        last_error = None
-        for attempt in range(1, self.max_retries + 1):
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    max_tokens=self.max_tokens
-                )
+        with chat_trace.llm_span(session, assistant_name, self.model) as span:
+            last_error = None
+            for attempt in range(1, self.max_retries + 1):
+                span.set("llm.attempts", attempt)
+                span.set("llm.retries", attempt - 1)
+                try:
+                    network_started = time.perf_counter()
+                    response = self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        max_tokens=self.max_tokens,
+                        **request_options
+                    )
+                    span.add("llm.network_ms", round((time.perf_counter() - network_started) * 1000, 2))
                 
-                # ⚠️ 重要：在 API 调用成功后，立即记录 token 使用并扣减
-                # 必须在处理响应内容之前完成，确保即使后续处理失败，token 也已正确扣减
-                if user_id is not None and session is not None:
-                    try:
-                        # 从 response.usage 中读取真实 token 使用量
-                        usage = response.usage
-                        if usage:
-                            total_tokens = usage.total_tokens
-                            prompt_tokens = usage.prompt_tokens
-                            completion_tokens = usage.completion_tokens
-                            
-                            # 调用 token 服务记录使用并扣减
-                            from backend.services.token_service import record_token_usage
-                            # 🔧 获取当前 SubAssistant 的类名（用于详细统计）
-                            assistant_name = self.__class__.__name__
-                            token_result = record_token_usage(
-                                session=session,
-                                user_id=user_id,
-                                total_tokens=total_tokens,
-                                prompt_tokens=prompt_tokens,
-                                completion_tokens=completion_tokens,
-                                model_name=self.model,
-                                assistant_name=assistant_name
-                            )
-                            
-                            # 提交事务（确保 token 扣减和日志记录已保存）
-                            session.commit()
+                    usage = getattr(response, "usage", None)
+                    cache_hit_tokens = prompt_assembly.extract_cache_hit_tokens(usage)
+                    self.last_usage = {
+                        "prompt_tokens": usage.prompt_tokens,
+                        "completion_tokens": usage.completion_tokens,
+                        "total_tokens": usage.total_tokens,
+                        "prompt_cache_hit_tokens": cache_hit_tokens,
+                    } if usage else None
+                    if usage:
+                        prompt_assembly.record_usage(assistant_name, cacheable_prefix, usage.prompt_tokens, cache_hit_tokens)
+                        span.add("llm.prompt_tokens", usage.prompt_tokens)
+                        span.add("llm.completion_tokens", usage.completion_tokens)
+                        span.add("llm.total_tokens", usage.total_tokens)
+                        span.add("llm.prompt_cache_hit_tokens", cache_hit_tokens or 0)
+
+                    # ⚠️ 重要：在 API 调用成功后，立即记录 token 使用并扣减
+                    # 必须在处理响应内容之前完成，确保即使后续处理失败，token 也已正确扣减
+                    if user_id is not None and session is not None:
+                        accounting_started = time.perf_counter()
+                        try:
+                            # 从 response.usage 中读取真实 token 使用量
+                            usage = response.usage
+                            if usage:
+                                total_tokens = usage.total_tokens
+                                prompt_tokens = usage.prompt_tokens
+                                completion_tokens = usage.completion_tokens
                             
-                            # 📊 后端日志输出（用于调试和排查成本异常）
-                            print(f"💰 [Token Usage] user_id={user_id} | model={self.model} | "
-                                  f"prompt_tokens={prompt_tokens} | completion_tokens={completion_tokens} | "
-                                  f"total_tokens={total_tokens} | balance_after={token_result['token_balance_after']}")
-                        else:
-                            print(f"⚠️ [Token Usage] API 响应中未包含 usage 信息，跳过 token 扣减")
-                    except Exception as token_error:
-                        # Token 记录失败不应该影响 API 响应，但需要记录错误
-                        print(f"❌ [Token Usage] 记录 token 使用失败: {token_error}")
-                        import traceback
-                        traceback.print_exc()
-                        # 回滚 token 相关的事务
-                        session.rollback()
+                                # 调用 token 服务记录使用并扣减
+                                from backend.services.token_service import record_token_usage, get_usage_buffer
+                                # 🔧 获取当前 SubAssistant 的类名（用于详细统计）
+                                assistant_name = self.__class__.__name__
+                                usage_buffer = get_usage_buffer(session)
+                                if usage_buffer is not None and usage_buffer.user_id == user_id:
+                                    # 本轮启用了缓冲记账：先记到内存，整轮结束后一次性落库
+                                    usage_buffer.add(
+                                        total_tokens=total_tokens,
+                                        prompt_tokens=prompt_tokens,
+                                        completion_tokens=completion_tokens,
+                                        model_name=self.model,
+                                        assistant_name=assistant_name,
+                                        prompt_cache_hit_tokens=cache_hit_tokens
+                                    )
+                                    logger.debug(
+                                        "💰 [Token Usage] user_id=%s | model=%s | prompt_tokens=%s (cache_hit=%s) | "
+                                        "completion_tokens=%s | total_tokens=%s | buffered turn=%s",
+                                        user_id, self.model, prompt_tokens, cache_hit_tokens,
+                                        completion_tokens, total_tokens, usage_buffer.turn_id,
+                                    )
+                                else:
+                                    token_result = record_token_usage(
+                                        session=session,
+                                        user_id=user_id,
+                                        total_tokens=total_tokens,
+                                        prompt_tokens=prompt_tokens,
+                                        completion_tokens=completion_tokens,
+                                        model_name=self.model,
+                                        assistant_name=assistant_name,
+                                        prompt_cache_hit_tokens=cache_hit_tokens
+                                    )
+                                
+                                    # 提交事务（确保 token 扣减和日志记录已保存）
+                                    session.commit()
+                                
+                                    # 📊 后端日志输出（用于调试和排查成本异常）
+                                    print(f"💰 [Token Usage] user_id={user_id} | model={self.model} | "
+                                          f"prompt_tokens={prompt_tokens} (cache_hit={cache_hit_tokens}) | "
+                                          f"completion_tokens={completion_tokens} | "
+                                          f"total_tokens={total_tokens} | balance_after={token_result['token_balance_after']}")
+                            else:
+                                print(f"⚠️ [Token Usage] API 响应中未包含 usage 信息，跳过 token 扣减")
+                        except Exception as token_error:
+                            # Token 记录失败不应该影响 API 响应，但需要记录错误
+                            print(f"❌ [Token Usage] 记录 token 使用失败: {token_error}")
+                            import traceback
+                            traceback.print_exc()
+                            # 回滚 token 相关的事务
+                            session.rollback()
+                        finally:
+                            span.add("llm.accounting_ms", round((time.perf_counter() - accounting_started) * 1000, 2))
                 
-                raw_content = response.choices[0].message.content
-                _rc_len = len(raw_content) if raw_content else 0
-                _rc_prev = (raw_content or "")[:200]
-                print(
-                    f"🔍 [SubAssistant] 响应 len={_rc_len} "
-                    f"preview={repr(_rc_prev)}{'…' if _rc_len > 200 else ''}"
-                )
-
-                content = raw_content.strip() if raw_content else ""
+                    raw_content = response.choices[0].message.content
+                    _rc_len = len(raw_content) if raw_content else 0
+                    _rc_prev = (raw_content or "")[:200]
+                    print(
+                        f"🔍 [SubAssistant] 响应 len={_rc_len} "
+                        f"preview={repr(_rc_prev)}{'…' if _rc_len > 200 else ''}"
+                    )
+
+                    content = raw_content.strip() if raw_content else ""
                 
-                if verbose:
-                    _log_text_preview("📬 [SubAssistant] raw response", content, max_len=400)
+                    if verbose:
+                        _log_text_preview("📬 [SubAssistant] raw response", content, max_len=400)
                 
-                # 🔧 检查返回内容是否为空
-                if not content:
-                    print(f"⚠️ [SubAssistant] AI 返回内容为空（第{attempt}次尝试）")
-                    if attempt < self.max_retries:
-                        print(f"🔄 [SubAssistant] 将进行第 {attempt + 1} 次重试...")
-                        continue  # 继续重试循环
-                    else:
-                        print(f"❌ [SubAssistant] AI 返回空内容，已重试 {self.max_retries} 次，返回空字符串")
-                        return content  # 返回空字符串
+                    # 🔧 检查返回内容是否为空
+                    if not content:
+                        print(f"⚠️ [SubAssistant] AI 返回内容为空（第{attempt}次尝试）")
+                        if attempt < self.max_retries:
+                            print(f"🔄 [SubAssistant] 将进行第 {attempt + 1} 次重试...")
+                            _record_parse(assistant_name, "retries")
+                            continue  # 继续重试循环
+                        else:
+                            print(f"❌ [SubAssistant] AI 返回空内容，已重试 {self.max_retries} 次，返回空字符串")
+                            return content  # 返回空字符串
                 
-                if self.parse_json:
-                    _log_text_preview("🔍 [SubAssistant] JSON 输入", content, max_len=220)
-                    parsed = parse_json_from_text(content)
-                    _log_text_preview(f"🔍 [SubAssistant] JSON 解析结果 type={type(parsed)}", parsed, max_len=300)
-                    if parsed is None:
-                        # 🔧 JSON 解析失败，返回原始文本（而不是 None）
-                        _log_text_preview("⚠️ [SubAssistant] JSON 解析失败，原始内容", content[:500] if content else "", max_len=120)
-                        if not content:
-                            # 如果是空内容且 JSON 解析失败，尝试重试
+                    if self.output_schema is not None:
+                        parse_started = time.perf_counter()
+                        typed = self._parse_structured(content, assistant_name)
+                        span.add("llm.parse_ms", round((time.perf_counter() - parse_started) * 1000, 3))
+                        if typed is None:
                             if attempt < self.max_retries:
-                                print(f"🔄 [SubAssistant] 内容为空且JSON解析失败，将进行第 {attempt + 1} 次重试...")
+                                print(f"🔄 [SubAssistant] 输出不符合 schema，将进行第 {attempt + 1} 次重试...")
+                                _record_parse(assistant_name, "retries")
                                 continue
-                        _log_text_preview("🔍 [SubAssistant] 返回原始内容", content, max_len=300)
-                        return content
-                    return parsed
-                return content
-            except (APIConnectionError, APITimeoutError, httpx.ConnectError, httpx.ReadTimeout, httpx.WriteTimeout) as error:
-                last_error = error
-                if attempt < self.max_retries:
-                    wait = self.retry_backoff_seconds * attempt
-                    print(f"⚠️ OpenAI连接失败（第{attempt}次），{wait}s 后重试... 错误: {error}")
-                    time.sleep(wait)
-                else:
-                    print(f"❌ OpenAI连接多次失败，已重试 {self.max_retries} 次。")
-                    raise
-        # 如果循环结束仍未返回，抛出最后的错误
-        raise last_error if last_error else RuntimeError("未知错误：OpenAI调用重试后仍失败")
+                            _log_text_preview("❌ [SubAssistant] 输出不符合 schema，返回原始内容", content, max_len=300)
+                            return content
+                        self.last_result = typed
+                        return typed.to_legacy()
+
+                    if self.parse_json:
+                        _log_text_preview("🔍 [SubAssistant] JSON 输入", content, max_len=220)
+                        parse_started = time.perf_counter()
+                        parsed = parse_json_from_text(content)
+                        parse_ms = (time.perf_counter() - parse_started) * 1000
+                        _record_parse(assistant_name, "legacy_ok" if parsed is not None else "legacy_failed", parse_ms)
+                        span.add("llm.parse_ms", round(parse_ms, 3))
+                        _log_text_preview(f"🔍 [SubAssistant] JSON 解析结果 type={type(parsed)}", parsed, max_len=300)
+                        if parsed is None:
+                            # 🔧 JSON 解析失败，返回原始文本（而不是 None）
+                            _log_text_preview("⚠️ [SubAssistant] JSON 解析失败，原始内容", content[:500] if content else "", max_len=120)
+                            if not content:
+                                # 如果是空内容且 JSON 解析失败，尝试重试
+                                if attempt < self.max_retries:
+                                    print(f"🔄 [SubAssistant] 内容为空且JSON解析失败，将进行第 {attempt + 1} 次重试...")
+                                    continue
+                            _log_text_preview("🔍 [SubAssistant] 返回原始内容", content, max_len=300)
+                            return content
+                        return parsed
+                    return content
+                except (APIConnectionError, APITimeoutError, httpx.ConnectError, httpx.ReadTimeout, httpx.WriteTimeout) as error:
+                    last_error = error
+                    if attempt < self.max_retries:
+                        wait = self.retry_backoff_seconds * attempt
+                        print(f"⚠️ OpenAI连接失败（第{attempt}次），{wait}s 后重试... 错误: {error}")
+                        span.add("llm.backoff_ms", wait * 1000)
+                        time.sleep(wait)
+                    else:
+                        print(f"❌ OpenAI连接多次失败，已重试 {self.max_retries} 次。")
+                        raise
+            # 如果循环结束仍未返回，抛出最后的错误
+            raise last_error if last_error else RuntimeError("未知错误：OpenAI调用重试后仍失败")
+
+    def run_typed(self, *args, **kwargs) -> Optional[StructuredOutput]:
+        """与 run() 相同，但返回类型化结果（需声明 output_schema；不符合 schema 时为 None）"""
+        if self.output_schema is None:
+            raise TypeError(f"{self.__class__.__name__} 没有声明 output_schema")
+        self.run(*args, **kwargs)
+        return self.last_result
+
+    def _parse_structured(self, content: str, assistant_name: str) -> Optional[StructuredOutput]:
+        """先用 model_validate_json 直接解析；失败时用 parse_json_from_text 清洗（代码块等）后再校验"""
+        parse_started = time.perf_counter()
+        try:
+            typed = self.output_schema.model_validate_json(content)
+            _record_parse(assistant_name, "schema_fast", (time.perf_counter() - parse_started) * 1000)
+            return typed
+        except ValidationError as fast_error:
+            first_error = fast_error
+        parsed = parse_json_from_text(content)
+        if parsed is not None:
+            try:
+                typed = self.output_schema.model_validate(parsed)
+                _record_parse(assistant_name, "schema_fallback", (time.perf_counter() - parse_started) * 1000)
+                return typed
+            except ValidationError as fallback_error:
+                first_error = fallback_error
+        _record_parse(assistant_name, "schema_failed", (time.perf_counter() - parse_started) * 1000)
+        print(f"⚠️ [SubAssistant] {assistant_name} 输出不符合 schema: {first_error.error_count()} 处错误，{str(first_error)[:300]}")
+        return None
 
     def build_prompt(self, *args, **kwargs) -> str:
         """
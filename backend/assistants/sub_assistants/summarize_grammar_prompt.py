@@ -36,7 +36,7 @@ summarize_grammar_rule_sys_prompt = """
 
 
 1.display_name 规则
-- 重要：请使用 {language} 语言输出你的总结
+- 重要：请使用末尾【输出语言】指定的语言输出你的总结
 - 面向学习者，自然语言
 - 简洁、教学友好
 - 不超过 20 字
@@ -165,4 +165,10 @@ The book was written by him.
 
 输出：
 {{"display_name":"被动语态","canonical":{{"category":"voice","subtype":"passive_voice","function":null}}}}
-"""
\ No newline at end of file
+"""
+
+# 按请求变化的部分放在 system prompt 末尾（见 prompt_assembly）
+summarize_grammar_rule_sys_prompt_tail = """
+【输出语言】
+{language}
+"""
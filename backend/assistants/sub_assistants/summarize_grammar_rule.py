@@ -1,14 +1,20 @@
 from typing import Optional
 from backend.assistants.sub_assistants.sub_assistant import SubAssistant
+from backend.assistants.sub_assistants.output_schemas import GrammarSummaryOutput
 from backend.assistants.utility import parse_json_from_text
 from backend.assistants.sub_assistants.prompt import summarize_grammar_rule_template
-from backend.assistants.sub_assistants.summarize_grammar_prompt import summarize_grammar_rule_sys_prompt
+from backend.assistants.sub_assistants.summarize_grammar_prompt import (
+    summarize_grammar_rule_sys_prompt,
+    summarize_grammar_rule_sys_prompt_tail,
+)
+from backend.assistants.sub_assistants.prompt_assembly import render
 
 class SummarizeGrammarRuleAssistant(SubAssistant):
+    output_schema = GrammarSummaryOutput
 
     def __init__(self):
         super().__init__(
-            sys_prompt=summarize_grammar_rule_sys_prompt,
+            sys_prompt=render(summarize_grammar_rule_sys_prompt),
             max_tokens=300,
             parse_json=True
         )
@@ -43,20 +49,16 @@ class SummarizeGrammarRuleAssistant(SubAssistant):
         verbose: bool = False,
         **kwargs
     ) -> list[dict] | str:
-        # 格式化 system prompt，添加语言信息
-        original_sys_prompt = self.sys_prompt
-        formatted_language = language or "中文"
-        self.sys_prompt = summarize_grammar_rule_sys_prompt.format(
-            language=formatted_language
-        )
+        # 语言信息放在 system prompt 末尾，正文保持不变（前缀可被缓存）
+        self.sys_prompt_tail = render(summarize_grammar_rule_sys_prompt_tail, language=language or "中文")
         
         try:
             result = super().run(quoted_sentence, user_question, ai_response, dialogue_context, verbose=verbose, **kwargs)
             # 只打印输出结果，不打印 prompt
             print(f"✅ [SummarizeGrammarRule] 输出结果: {result}")
         finally:
-            # 恢复原始 sys_prompt，避免影响后续调用
-            self.sys_prompt = original_sys_prompt
+            # 清空本次的尾部，避免影响后续调用
+            self.sys_prompt_tail = ""
         return result
 
 """"
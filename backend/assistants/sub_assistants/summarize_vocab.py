@@ -1,4 +1,5 @@
 from backend.assistants.sub_assistants.sub_assistant import SubAssistant
+from backend.assistants.sub_assistants.output_schemas import VocabSummaryOutput
 from backend.assistants.sub_assistants.prompt import (
     summarize_vocab_template, 
     summarize_vocab_sys_prompt,
@@ -8,6 +9,8 @@ from typing import Optional
 from backend.assistants.utility import parse_json_from_text
 
 class SummarizeVocabAssistant(SubAssistant):
+    output_schema = VocabSummaryOutput
+
     def __init__(self):
         super().__init__(
             sys_prompt=summarize_vocab_sys_prompt,  # 默认使用空格语言的 prompt
@@ -49,6 +49,11 @@ DATABASE_URL = os.getenv("DATABASE_URL")  # 如果未设置，将使用配置文
 
 # ==================== 可选的环境变量 ====================
 
+# LLM 服务地址（OpenAI 兼容接口）
+# 压测 / 离线开发时指向本地 stub（backend/scripts/llm_stub_server.py），例如 http://127.0.0.1:8899
+DEFAULT_LLM_BASE_URL = "https://api.deepseek.com"
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", DEFAULT_LLM_BASE_URL).rstrip("/")
+
 # 其他配置可以在这里添加
 # DEBUG = os.getenv("DEBUG", "false").lower() == "true"
 
@@ -1,34 +1,94 @@
 #!/usr/bin/env python3
 """
 Asked Tokens 数据管理器
-支持 JSON 文件和 SQLite 数据库两种存储方式
+支持 JSON 文件和数据库两种存储方式
 使用 text_id + sentence_id + sentence_token_id 作为唯一标识
+
+数据库模式：
+- 使用共享的 SQLAlchemy engine（get_database_manager）和 asked_tokens 表，
+  按 (user_id, text_id) 索引查询，不再扫描所有用户的 JSON 文件
+- 每篇文章的查询结果按 (user_id, text_id) 缓存，mark/unmark 时失效；
+  TTL 兜底多进程之间的失效（其他进程的写入最多延迟 ASKED_TOKENS_CACHE_TTL_SECONDS 可见）
+- 历史 JSON 数据用 migrate_asked_tokens_json_to_db.py 一次性导入
 """
 
 import json
 import os
-import sqlite3
-from typing import Set, List, Optional
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Set, List, Optional, Tuple, FrozenSet
 from dataclasses import asdict
 
+from sqlalchemy.exc import IntegrityError
+
 # 从 data_classes_new 导入 AskedToken
 from .data_classes_new import AskedToken
 
 
+ASKED_TOKENS_CACHE_TTL_SECONDS = float(os.getenv("ASKED_TOKENS_CACHE_TTL", "60"))
+ASKED_TOKENS_CACHE_MAX_SIZE = 2048
+
+# (user_id, text_id) -> (token 键集合, 写入时间戳)
+_article_cache: "OrderedDict[Tuple[int, int], Tuple[FrozenSet[str], float]]" = OrderedDict()
+_article_cache_lock = Lock()
+
+
+def _cache_get(user_id: int, text_id: int) -> Optional[FrozenSet[str]]:
+    if ASKED_TOKENS_CACHE_TTL_SECONDS <= 0:
+        return None
+    key = (user_id, text_id)
+    with _article_cache_lock:
+        entry = _article_cache.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[1] > ASKED_TOKENS_CACHE_TTL_SECONDS:
+            del _article_cache[key]
+            return None
+        _article_cache.move_to_end(key)
+        return entry[0]
+
+
+def _cache_put(user_id: int, text_id: int, keys: FrozenSet[str]) -> None:
+    if ASKED_TOKENS_CACHE_TTL_SECONDS <= 0:
+        return
+    key = (user_id, text_id)
+    with _article_cache_lock:
+        _article_cache[key] = (keys, time.time())
+        _article_cache.move_to_end(key)
+        while len(_article_cache) > ASKED_TOKENS_CACHE_MAX_SIZE:
+            _article_cache.popitem(last=False)
+
+
+def invalidate_article_cache(user_id, text_id) -> None:
+    """mark / unmark 后失效某用户某篇文章的缓存"""
+    try:
+        key = (int(user_id), int(text_id))
+    except (TypeError, ValueError):
+        return
+    with _article_cache_lock:
+        _article_cache.pop(key, None)
+
+
+def _get_db_session():
+    from database_system.database_manager import get_database_manager
+    try:
+        from backend.config import ENV
+        environment = ENV
+    except ImportError:
+        environment = os.getenv("ENV", "development")
+    return get_database_manager(environment).get_session()
+
+
 class AskedTokensManager:
     """Asked Tokens 数据管理器"""
     
-    def __init__(self, use_database: bool = True, db_path: str = None, json_dir: str = None):
+    def __init__(self, use_database: bool = True, json_dir: str = None):
         self.use_database = use_database
         
         if use_database:
-            # SQLite 数据库模式
-            if db_path is None:
-                current_dir = os.path.dirname(os.path.dirname(__file__))
-                db_path = os.path.join(current_dir, "database_system", "data_storage", "data", "language_learning.db")
-            
-            self.db_path = db_path
-            self._init_database()
+            # 数据库模式：asked_tokens 表由 Base.metadata.create_all / 迁移脚本创建
+            print("[INFO] [AskedTokens] 使用数据库模式（asked_tokens 表）")
         else:
             # JSON 文件模式
             if json_dir is None:
@@ -39,26 +99,6 @@ class AskedTokensManager:
             os.makedirs(self.json_dir, exist_ok=True)
             print(f"[INFO] [AskedTokens] JSON 目录: {self.json_dir}")
     
-    def _init_database(self):
-        """初始化数据库表"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS asked_tokens (
-                        user_id TEXT NOT NULL,
-                        text_id INTEGER NOT NULL,
-                        sentence_id INTEGER NOT NULL,
-                        sentence_token_id INTEGER NOT NULL,
-                        PRIMARY KEY (user_id, text_id, sentence_id, sentence_token_id)
-                    )
-                """)
-                conn.commit()
-                print("[OK] [AskedTokens] Database table initialized")
-        except Exception as e:
-            print(f"[ERROR] [AskedTokens] Database initialization failed: {e}")
-            raise
-    
     def _get_json_file_path(self, user_id: str) -> str:
         """获取用户的 JSON 文件路径"""
         return os.path.join(self.json_dir, f"{user_id}.json")
@@ -105,27 +145,30 @@ class AskedTokensManager:
             return False
     
     def _mark_asked_database(self, asked_token: AskedToken) -> bool:
-        """数据库模式：标记已提问"""
+        """数据库模式：标记已提问（已存在视为成功）"""
+        from database_system.business_logic.crud.asked_token_crud import AskedTokenCRUD
+
+        user_id = int(asked_token.user_id)
+        text_id = int(asked_token.text_id)
+        sentence_id = int(asked_token.sentence_id)
+        sentence_token_id = int(asked_token.sentence_token_id) if asked_token.sentence_token_id is not None else None
+        session = _get_db_session()
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT OR REPLACE INTO asked_tokens 
-                    (user_id, text_id, sentence_id, sentence_token_id, type)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (
-                    asked_token.user_id,
-                    asked_token.text_id,
-                    asked_token.sentence_id,
-                    asked_token.sentence_token_id,
-                    asked_token.type
-                ))
-                conn.commit()
-                print(f"✅ [AskedTokens] Marked as asked in database: {asked_token.text_id}:{asked_token.sentence_id}:{asked_token.sentence_token_id} (type={asked_token.type})")
-                return True
+            crud = AskedTokenCRUD(session)
+            if crud.get(user_id, text_id, sentence_id, sentence_token_id, asked_token.type) is None:
+                crud.create(user_id, text_id, sentence_id, sentence_token_id, asked_token.type)
+            return True
+        except IntegrityError:
+            # 并发重复标记命中唯一约束
+            session.rollback()
+            return True
         except Exception as e:
+            session.rollback()
             print(f"❌ [AskedTokens] Database mark failed: {e}")
             return False
+        finally:
+            session.close()
+            invalidate_article_cache(user_id, text_id)
     
     def _mark_asked_json(self, asked_token: AskedToken) -> bool:
         """JSON 文件模式：标记已提问"""
@@ -182,34 +225,41 @@ class AskedTokensManager:
         
         try:
             if self.use_database:
-                return self._get_asked_tokens_database(user_id, text_id)
+                return set(self._get_asked_tokens_database(user_id, text_id))
             else:
                 return self._get_asked_tokens_json_all_users(text_id)  # 修改：获取所有用户的数据
         except Exception as e:
             print(f"❌ [AskedTokens] Failed to get asked tokens: {e}")
             return set()
     
-    def _get_asked_tokens_database(self, user_id: str, text_id: int) -> Set[str]:
-        """数据库模式：获取已提问的 token 键"""
+    def _get_asked_tokens_database(self, user_id: str, text_id: int) -> FrozenSet[str]:
+        """数据库模式：获取已提问的 token 键（走 (user_id, text_id) 索引，结果按文章缓存）"""
+        from database_system.business_logic.models import AskedToken as AskedTokenModel, AskedTokenType
+
+        user_id = int(user_id)
+        text_id = int(text_id)
+        cached = _cache_get(user_id, text_id)
+        if cached is not None:
+            return cached
+
+        session = _get_db_session()
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT text_id, sentence_id, sentence_token_id
-                    FROM asked_tokens 
-                    WHERE text_id = ? AND type = 'token' AND sentence_token_id IS NOT NULL
-                """, (text_id,))  # 只获取token类型的记录
-                
-                keys = set()
-                for row in cursor.fetchall():
-                    t_id, s_id, st_id = row
-                    keys.add(f"{t_id}:{s_id}:{st_id}")
-                
-                # Debug logging removed for performance
-                return keys
-        except Exception as e:
-            print(f"❌ [AskedTokens] Database query failed: {e}")
-            return set()
+            rows = session.query(
+                AskedTokenModel.text_id,
+                AskedTokenModel.sentence_id,
+                AskedTokenModel.sentence_token_id,
+            ).filter(
+                AskedTokenModel.user_id == user_id,
+                AskedTokenModel.text_id == text_id,
+                AskedTokenModel.type == AskedTokenType.TOKEN,  # 只获取token类型的记录
+                AskedTokenModel.sentence_token_id.isnot(None),
+            ).all()
+        finally:
+            session.close()
+
+        keys = frozenset(f"{t_id}:{s_id}:{st_id}" for t_id, s_id, st_id in rows)
+        _cache_put(user_id, text_id, keys)
+        return keys
     
     def _get_asked_tokens_json_all_users(self, text_id: int) -> Set[str]:
         """JSON 文件模式：获取所有用户在指定文章下已提问的 token 键"""
@@ -287,26 +337,31 @@ class AskedTokensManager:
             return False
     
     def _unmark_asked_database(self, user_id: str, token_key: str) -> bool:
-        """数据库模式：取消标记"""
+        """数据库模式：取消标记（只删除当前用户的记录）"""
+        from database_system.business_logic.models import AskedToken as AskedTokenModel
+
+        # token_key 格式：text_id:sentence_id:sentence_token_id
+        parts = token_key.split(":")
+        text_id, sentence_id, sentence_token_id = int(parts[0]), int(parts[1]), int(parts[2])
+        user_id = int(user_id)
+
+        session = _get_db_session()
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # token_key 格式：text_id:sentence_id:sentence_token_id
-                parts = token_key.split(":")
-                text_id, sentence_id, sentence_token_id = int(parts[0]), int(parts[1]), int(parts[2])
-                
-                cursor.execute("""
-                    DELETE FROM asked_tokens 
-                    WHERE text_id = ? AND sentence_id = ? AND sentence_token_id = ?
-                """, (text_id, sentence_id, sentence_token_id))  # 修改：移除 user_id 过滤
-                
-                conn.commit()
-                print(f"✅ [AskedTokens] Token unmarked in database: {token_key}")
-                return True
+            session.query(AskedTokenModel).filter(
+                AskedTokenModel.user_id == user_id,
+                AskedTokenModel.text_id == text_id,
+                AskedTokenModel.sentence_id == sentence_id,
+                AskedTokenModel.sentence_token_id == sentence_token_id,
+            ).delete(synchronize_session=False)
+            session.commit()
+            return True
         except Exception as e:
+            session.rollback()
             print(f"❌ [AskedTokens] Database unmark failed: {e}")
             return False
+        finally:
+            session.close()
+            invalidate_article_cache(user_id, text_id)
     
     def _unmark_asked_json(self, user_id: str, token_key: str) -> bool:
         """JSON 文件模式：取消标记"""
@@ -389,14 +444,12 @@ class AskedTokensManager:
         # 检查是否有 sentence 类型的标注
         try:
             if self.use_database:
-                with sqlite3.connect(self.db_path) as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                        SELECT COUNT(*) FROM asked_tokens 
-                        WHERE user_id = ? AND text_id = ? AND sentence_id = ? AND type = 'sentence'
-                    """, (user_id, text_id, sentence_id))
-                    count = cursor.fetchone()[0]
-                    return count > 0
+                from database_system.business_logic.crud.asked_token_crud import AskedTokenCRUD
+                session = _get_db_session()
+                try:
+                    return AskedTokenCRUD(session).get(int(user_id), text_id, sentence_id, type="sentence") is not None
+                finally:
+                    session.close()
             else:
                 file_path = self._get_json_file_path(user_id)
                 if not os.path.exists(file_path):
@@ -416,19 +469,22 @@ class AskedTokensManager:
             return False
 
 
-# 全局实例（支持配置切换）
+# 全局实例（JSON / 数据库各一个）
 _asked_tokens_manager = None
+_asked_tokens_manager_db = None
 
 def get_asked_tokens_manager(use_database: bool = False) -> AskedTokensManager:
     """
     获取 AskedTokensManager 实例
-    
-    🔧 注意：asked_tokens 现在是 legacy 系统，默认只使用 JSON 文件，不使用数据库
-    即使传入 use_database=True，也会强制使用 JSON 模式
+
+    - use_database=True：asked_tokens 表（/api/user/asked-tokens 使用）
+    - use_database=False：legacy JSON 文件（mock server / 统一标注管理器的兼容路径）
     """
-    global _asked_tokens_manager
-    # 🔧 强制使用 JSON 模式，因为 asked_tokens 是 legacy 系统
-    use_database = False
+    global _asked_tokens_manager, _asked_tokens_manager_db
+    if use_database:
+        if _asked_tokens_manager_db is None:
+            _asked_tokens_manager_db = AskedTokensManager(use_database=True)
+        return _asked_tokens_manager_db
     if _asked_tokens_manager is None:
-        _asked_tokens_manager = AskedTokensManager(use_database=use_database)
+        _asked_tokens_manager = AskedTokensManager(use_database=False)
     return _asked_tokens_manager
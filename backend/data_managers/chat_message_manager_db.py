@@ -14,13 +14,15 @@ import json
 import threading
 from dataclasses import asdict, is_dataclass
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from sqlalchemy import (
-    Table, Column, Integer, String, Text, MetaData, 
-    select, insert, and_
+    Table, Column, Integer, String, Text, DateTime, Index, MetaData, 
+    select, insert, and_, inspect
 )
 
+from backend.utils import cursor_pagination
+
 # 导入配置和数据库管理器
 try:
     from backend.config import ENV
@@ -48,7 +50,10 @@ class ChatMessageManagerDB:
     - quote_sentence_id INTEGER
     - quote_text       TEXT
     - selected_token_json TEXT
-    - created_at       TEXT (ISO 时间字符串)
+    - created_at       TIMESTAMP (UTC，不带时区)
+  
+  索引 (user_id, text_id, created_at, id) / (user_id, created_at, id) 支撑按时间升序的游标分页。
+  旧库的 created_at 为 TEXT（ISO 时间字符串）：未执行 migrate_add_keyset_pagination.py 前按旧类型读写。
   """
 
   def __init__(self, environment: Optional[str] = None) -> None:
@@ -68,6 +73,7 @@ class ChatMessageManagerDB:
     self.db_manager = DatabaseManager(self.environment)
     self.engine = self.db_manager.get_engine()
     self._is_postgres = self._check_is_postgres()
+    self._legacy_created_at = self._check_legacy_created_at()
     
     # 定义表结构（使用 SQLAlchemy Core）
     self.metadata = MetaData()
@@ -83,7 +89,9 @@ class ChatMessageManagerDB:
       Column('quote_sentence_id', Integer, nullable=True),
       Column('quote_text', Text, nullable=True),
       Column('selected_token_json', Text, nullable=True),
-      Column('created_at', String(255), nullable=False),
+      Column('created_at', String(255) if self._legacy_created_at else DateTime, nullable=False),
+      Index('idx_chat_messages_user_text_created', 'user_id', 'text_id', 'created_at', 'id'),
+      Index('idx_chat_messages_user_created', 'user_id', 'created_at', 'id'),
     )
     
     # 确保表存在
@@ -100,6 +108,41 @@ class ChatMessageManagerDB:
       database_url.startswith('postgres://')
     )
 
+  def _check_legacy_created_at(self) -> bool:
+    """已有的 chat_messages 表 created_at 是否仍为字符串列（未迁移）"""
+    try:
+      inspector = inspect(self.engine)
+      if 'chat_messages' not in inspector.get_table_names():
+        return False
+      for column in inspector.get_columns('chat_messages'):
+        if column['name'] == 'created_at':
+          python_type = getattr(column['type'], 'python_type', None)
+          if python_type is str:
+            print("⚠️ [ChatMessageManagerDB] chat_messages.created_at 仍为字符串列，请执行 migrate_add_keyset_pagination.py")
+            return True
+          return False
+    except Exception as e:
+      print(f"⚠️ [ChatMessageManagerDB] 检查 created_at 类型失败: {e}")
+    return False
+
+  def _to_column_value(self, value: Any) -> Any:
+    """把时间（datetime 或 ISO 字符串）转换为 created_at 列的存储形式"""
+    if isinstance(value, str):
+      value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+      value = value.replace(tzinfo=timezone.utc)
+    value = value.astimezone(timezone.utc)
+    return value.isoformat() if self._legacy_created_at else value.replace(tzinfo=None)
+
+  @staticmethod
+  def _format_created_at(value: Any) -> Any:
+    """对外统一返回带时区的 ISO 字符串（与旧的存储格式一致）"""
+    if isinstance(value, datetime):
+      if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+      return value.isoformat()
+    return value
+
   def _init_table(self) -> None:
     """确保 chat_messages 表存在（使用 SQLAlchemy 创建表）"""
     try:
@@ -128,7 +171,7 @@ class ChatMessageManagerDB:
     selected_token:
       - 可以是 dict / dataclass / 其他对象（将被 json.dumps）。
     """
-    created_at = datetime.now(timezone.utc).isoformat()
+    created_at = self._to_column_value(datetime.now(timezone.utc))
 
     if selected_token is None:
       selected_token_json = None
@@ -167,10 +210,14 @@ class ChatMessageManagerDB:
     sentence_id: Optional[int] = None,
     limit: int = 100,
     offset: int = 0,
+    after: Optional[Tuple[Any, int]] = None,
   ) -> List[Dict[str, Any]]:
     """
-    读取消息列表，按 created_at 升序返回（旧→新）。
+    读取消息列表，按 (created_at, id) 升序返回（旧→新）。
     后续用于跨设备聊天记录展示。
+
+    after:
+      - 游标位置 (created_at, id)：只返回排在其后的消息，此时忽略 offset。
     """
     # 使用 SQLAlchemy Core 构建查询
     stmt = select(
@@ -195,13 +242,18 @@ class ChatMessageManagerDB:
     if sentence_id is not None:
       conditions.append(self._table.c.sentence_id == sentence_id)
 
+    if after is not None:
+      conditions.append(cursor_pagination.after(
+        self._table.c.created_at, self._table.c.id, (self._to_column_value(after[0]), after[1])
+      ))
+
     if conditions:
       stmt = stmt.where(and_(*conditions))
 
-    # 排序和分页
-    # 注意：SQLite 和 PostgreSQL 对字符串时间排序的处理不同
-    # 这里直接按 created_at 字符串排序（ISO 格式字符串可以正确排序）
-    stmt = stmt.order_by(self._table.c.created_at.asc()).limit(limit).offset(offset)
+    # 排序和分页：(created_at, id) 与复合索引顺序一致，游标翻页不需要跳过前面的行
+    stmt = stmt.order_by(self._table.c.created_at.asc(), self._table.c.id.asc()).limit(limit)
+    if after is None and offset:
+      stmt = stmt.offset(offset)
 
     # 执行查询
     with self.engine.connect() as conn:
@@ -226,7 +278,7 @@ class ChatMessageManagerDB:
           "quote_sentence_id": row.quote_sentence_id,
           "quote_text": row.quote_text,
           "selected_token": selected,
-          "created_at": row.created_at,
+          "created_at": self._format_created_at(row.created_at),
         }
       )
 
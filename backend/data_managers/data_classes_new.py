@@ -48,6 +48,7 @@ class Sentence:
     sentence_difficulty_level: Optional[Literal["easy", "hard"]] = None
     tokens: tuple[Token, ...] = ()
     word_tokens: Optional[tuple[WordToken, ...]] = None   # 新增：仅用于非空格语言（中文、日文等）
+    readings: Optional[tuple] = None   # 导入时预计算的 token 读音：((sentence_token_id, reading), ...)
 
 @dataclass
 class OriginalText:
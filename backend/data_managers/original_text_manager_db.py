@@ -40,6 +40,7 @@ from backend.data_managers.data_classes_new import (
 )
 from backend.adapters.text_adapter import TextAdapter, SentenceAdapter
 from database_system.business_logic.managers import TextManager as DBTextManager
+from database_system.business_logic.models import OriginalText as TextModel, new_content_version
 
 
 class OriginalTextManager:
@@ -61,6 +62,12 @@ class OriginalTextManager:
         """
         self.session = session
         self.db_manager = DBTextManager(session)
+
+    def _bump_content_version(self, text_id: int):
+        """文章内容（句子 / 标注 / 标题）变化时换新 content_version，随本次 commit 一起写入"""
+        self.session.query(TextModel).filter(TextModel.text_id == text_id).update(
+            {TextModel.content_version: new_content_version()}
+        )
     
     def add_text(self, text_title: str, user_id: int = None, language: str = None, processing_status: str = 'completed') -> TextDTO:
         """
@@ -167,7 +174,8 @@ class OriginalTextManager:
     def add_sentence_to_text(self, text_id: int, sentence_text: str,
                             difficulty_level: Optional[str] = None,
                             sentence_id: Optional[int] = None,
-                            auto_commit: bool = True) -> SentenceDTO:
+                            auto_commit: bool = True,
+                            readings: Optional[list] = None) -> SentenceDTO:
         """
         为文章添加句子
         
@@ -175,6 +183,7 @@ class OriginalTextManager:
             text_id: 文章ID
             sentence_text: 句子内容
             difficulty_level: 难度等级（"easy" 或 "hard"），可选
+            readings: 导入时预计算的 token 读音 [[sentence_token_id, reading], ...]，可选
             
         返回:
             SentenceDTO: 新创建的句子
@@ -195,12 +204,14 @@ class OriginalTextManager:
             difficulty_level = difficulty_level.upper()
         
         # 创建句子
+        self._bump_content_version(text_id)
         sentence_model = self.db_manager.create_sentence(
             text_id=text_id,
             sentence_id=sentence_id,
             sentence_body=sentence_text,
             difficulty_level=difficulty_level,
             auto_commit=auto_commit,
+            readings=readings,
         )
         
         return SentenceAdapter.model_to_dto(sentence_model)
@@ -321,6 +332,7 @@ class OriginalTextManager:
                 
                 # 更新数据库
                 sentence_model.vocab_annotations = vocab_annotations
+                self._bump_content_version(text_id)
                 self.session.commit()
     
     def add_grammar_example_to_sentence(self, text_id: int, sentence_id: int, rule_id: int):
@@ -346,6 +358,7 @@ class OriginalTextManager:
                 
                 # 更新数据库
                 sentence_model.grammar_annotations = grammar_annotations
+                self._bump_content_version(text_id)
                 self.session.commit()
     
     def get_text_stats(self, user_id: int = None) -> dict:
@@ -399,6 +412,7 @@ class OriginalTextManager:
         使用示例:
             text = text_manager.update_text(1, text_title="新标题")
         """
+        self._bump_content_version(text_id)
         text_model = self.db_manager.update_text(text_id, text_title, language, processing_status)
         if not text_model:
             return None
@@ -21,6 +21,7 @@ from database_system.business_logic.models import (
     Token,
     TokenType,
     WordToken,
+    new_content_version,
 )
 from backend.data_managers import OriginalTextManagerDB
 from backend.preprocessing.language_classification import (
@@ -250,6 +251,7 @@ def _repair_existing_preset_text_if_needed(
 
     # 中文/日文：旧版预置导入可能只有字符 Token、没有 WordToken —— 清空后重跑分词
     if lc in ("zh", "ja") and _needs_word_token_backfill(session, text.text_id):
+        text.content_version = new_content_version()
         try:
             _clear_tokens_for_text(session, text.text_id)
             _generate_tokens_for_text(
@@ -270,6 +272,7 @@ def _repair_existing_preset_text_if_needed(
         text.processing_status = 'completed'
         return
 
+    text.content_version = new_content_version()
     try:
         _generate_tokens_for_text(
             session=session,
@@ -462,6 +465,22 @@ def preset_title_language_pairs() -> Set[Tuple[str, str]]:
     return pairs
 
 
+def preset_sentence_bodies(preset: Dict[str, Any]) -> List[str]:
+    """
+    预置文章 JSON 中的句子正文（与 seed_presets_for_user 导入时的取法一致：
+    sentences 可为字符串或含 sentence / text / sentence_body 的字典，去掉首尾空白与空句）。
+    """
+    bodies: List[str] = []
+    for raw in preset.get('sentences') or []:
+        if isinstance(raw, dict):
+            sentence_body = raw.get('sentence') or raw.get('text') or raw.get('sentence_body')
+        else:
+            sentence_body = str(raw)
+        if sentence_body and sentence_body.strip():
+            bodies.append(sentence_body.strip())
+    return bodies
+
+
 def backfill_word_tokens_missing_word_level(
     session: Session,
     *,
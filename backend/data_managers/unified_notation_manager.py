@@ -45,9 +45,10 @@ class UnifiedNotationManager:
         self.grammar_manager = get_grammar_notation_manager(use_database=use_database)
         
         # 如果需要向后兼容，也初始化 AskedTokensManager
-        # 🔧 asked_tokens 现在是 legacy 系统，只使用 JSON 文件，不使用数据库
+        # 🔧 asked_tokens 统一写数据库（/api/user/asked-tokens 只读 asked_tokens 表，并按文章缓存、写入时失效）；
+        # 写 JSON 文件的标记不会出现在文章视图里
         if use_legacy_compatibility:
-            self.asked_tokens_manager = get_asked_tokens_manager(use_database=False)
+            self.asked_tokens_manager = get_asked_tokens_manager(use_database=True)
         
         print(f"[INFO] [UnifiedNotation] Initialized with database={use_database}, legacy={use_legacy_compatibility}")
     
@@ -295,17 +296,23 @@ class UnifiedNotationManager:
                 return True
             
             # 获取现有的 AskedToken 数据
-            if self.use_database:
-                # 从数据库获取
-                import sqlite3
-                with sqlite3.connect(self.asked_tokens_manager.db_path) as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                        SELECT user_id, text_id, sentence_id, sentence_token_id, type, vocab_id, grammar_id
-                        FROM asked_tokens 
-                        WHERE user_id = ?
-                    """, (user_id,))
-                    asked_tokens = cursor.fetchall()
+            if self.asked_tokens_manager.use_database:
+                # 从数据库获取（asked_tokens 表不记录 vocab_id / grammar_id）
+                from database_system.business_logic.models import AskedToken as AskedTokenModel
+                try:
+                    from .asked_tokens_manager import _get_db_session
+                except ImportError:
+                    from asked_tokens_manager import _get_db_session
+                session = _get_db_session()
+                try:
+                    rows = session.query(AskedTokenModel).filter(AskedTokenModel.user_id == int(user_id)).all()
+                    asked_tokens = [
+                        (row.user_id, row.text_id, row.sentence_id, row.sentence_token_id,
+                         getattr(row.type, "value", row.type), None, None)
+                        for row in rows
+                    ]
+                finally:
+                    session.close()
             else:
                 # 从 JSON 文件获取
                 import json
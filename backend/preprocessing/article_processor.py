@@ -102,6 +102,12 @@ def process_article(
         }
         
         sentences.append(sentence_data)
+
+    # 步骤2.5: 中文 / 日文预计算 token 读音（拼音 / 假名），随句子一起入库
+    if language_code in ("zh", "ja"):
+        from backend.services.reading_annotation import enrich_sentences
+        enriched = enrich_sentences(sentences, language_code)
+        print(f"\n步骤2.5: 预计算读音 {enriched}/{len(sentences)} 个句子")
     
     # 步骤3: 创建最终结果
     print("\n步骤3: 创建结构化数据对象...")
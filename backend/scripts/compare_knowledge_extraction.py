@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+知识点抽取 A/B 对比：chain（逐个助手串行调用）vs fused（ExtractKnowledgeAssistant 一次调用）
+
+对同一批对话分别跑两种模式，统计：
+- 调用次数、token（prompt / 其中命中前缀缓存 / completion / total）、耗时（平均 / p50 / p95）
+- 一致性：语法 / 词汇相关性判断的一致率；词汇集合、语法点 (category, subtype) 集合的 Jaccard 相似度
+- fused 输出不符合 schema（线上会退回 chain）的次数
+
+只对比"抽取"这一步：之后的查重、解释、例句生成两种模式完全相同，不在对比范围内。
+会真实调用模型并消耗 token，需要配置 OPENAI_API_KEY。
+
+用例文件为 JSONL，每行一个对象：
+  {"quoted_sentence": "...", "user_question": "...", "ai_response": "...",
+   "language": "中文", "is_non_whitespace": false}
+（language 为 display_name 的输出语言，可省略；不传 --cases 时使用内置的几条示例）
+
+用法（在项目根目录执行）:
+  python backend/scripts/compare_knowledge_extraction.py
+  python backend/scripts/compare_knowledge_extraction.py --cases cases.jsonl --output report.json
+  python backend/scripts/compare_knowledge_extraction.py --skip-grammar   # 与 DISABLE_GRAMMAR_FEATURES=True 的线上流程一致
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+os.chdir(REPO_ROOT)
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+BACKEND_DIR = os.path.join(REPO_ROOT, "backend")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+SAMPLE_CASES = [
+    {
+        "quoted_sentence": "She finally gave up smoking after years of trying.",
+        "user_question": "gave up 是什么意思？",
+        "ai_response": "gave up 是 give up 的过去式，意思是“放弃、戒掉”，这里指她终于戒烟了。",
+    },
+    {
+        "quoted_sentence": "The bridge was built by Roman engineers nearly two thousand years ago.",
+        "user_question": "为什么这里用 was built？",
+        "ai_response": "这是被动语态（be + 过去分词），强调桥被建造这一动作的承受者，而不是建造者。",
+    },
+    {
+        "quoted_sentence": "Das Buch, das ich gestern gekauft habe, ist sehr spannend.",
+        "user_question": "我没看懂这句话",
+        "ai_response": "这句话的意思是：我昨天买的那本书非常精彩。",
+    },
+    {
+        "quoted_sentence": "尽管困难重重，他们还是按时完成了项目。",
+        "user_question": "“重重”在这里是什么意思？",
+        "ai_response": "“困难重重”指困难很多、一层又一层。“重重”在这里读 chóng chóng，表示层层叠叠、很多。",
+        "is_non_whitespace": True,
+    },
+]
+
+
+def _load_cases(path: str | None) -> list[dict]:
+    if not path:
+        return SAMPLE_CASES
+    cases = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            case = json.loads(line)
+            for key in ("quoted_sentence", "user_question", "ai_response"):
+                if not case.get(key):
+                    raise ValueError(f"{path}:{line_no} 缺少字段 {key}")
+            cases.append(case)
+    return cases
+
+
+class _Meter:
+    """累计一种模式下一条用例的调用次数、token 和耗时"""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.prompt_cache_hit_tokens = 0
+        self.completion_tokens = 0
+        self.total_tokens = 0
+        self.started = time.perf_counter()
+
+    def call(self, assistant, *args, **kwargs):
+        result = assistant.run(*args, **kwargs)
+        self.calls += 1
+        usage = assistant.last_usage or {}
+        self.prompt_tokens += usage.get("prompt_tokens", 0)
+        self.prompt_cache_hit_tokens += usage.get("prompt_cache_hit_tokens") or 0
+        self.completion_tokens += usage.get("completion_tokens", 0)
+        self.total_tokens += usage.get("total_tokens", 0)
+        return result
+
+    def finish(self, grammar_relevant: bool, vocab_relevant: bool, grammar: list, vocab: list, **extra) -> dict:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "prompt_cache_hit_tokens": self.prompt_cache_hit_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "latency_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "grammar_relevant": grammar_relevant,
+            "vocab_relevant": vocab_relevant,
+            "grammar": sorted(grammar),
+            "vocab": sorted(vocab),
+            **extra,
+        }
+
+
+def _vocab_keys(items) -> set[str]:
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list):
+        return set()
+    return {str(i.get("vocab", "")).strip().lower() for i in items if isinstance(i, dict) and i.get("vocab")}
+
+
+def _grammar_keys(items) -> set[str]:
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list):
+        return set()
+    keys = set()
+    for item in items:
+        canonical = item.get("canonical") if isinstance(item, dict) else None
+        if isinstance(canonical, dict) and canonical.get("category") and canonical.get("subtype"):
+            keys.add(f"{canonical['category']}::{canonical['subtype']}")
+    return keys
+
+
+def run_chain(assistants: dict, case: dict, include_grammar: bool) -> dict:
+    meter = _Meter()
+    args = (case["quoted_sentence"], case["user_question"], case["ai_response"])
+    grammar_relevant = False
+    if include_grammar:
+        response = meter.call(assistants["check_grammar"], *args)
+        grammar_relevant = isinstance(response, dict) and bool(response.get("is_grammar_relevant"))
+    response = meter.call(assistants["check_vocab"], *args)
+    vocab_relevant = isinstance(response, dict) and bool(response.get("is_vocab_relevant"))
+
+    grammar = set()
+    if grammar_relevant:
+        grammar = _grammar_keys(meter.call(assistants["summarize_grammar"], *args, language=case.get("language")))
+    vocab = set()
+    if vocab_relevant:
+        vocab = _vocab_keys(meter.call(
+            assistants["summarize_vocab"], *args, is_non_whitespace=bool(case.get("is_non_whitespace"))
+        ))
+    return meter.finish(grammar_relevant, vocab_relevant, grammar, vocab)
+
+
+def run_fused(assistants: dict, case: dict, include_grammar: bool) -> dict:
+    meter = _Meter()
+    extraction = meter.call(
+        assistants["extract"],
+        case["quoted_sentence"], case["user_question"], case["ai_response"],
+        language=case.get("language"),
+        is_non_whitespace=bool(case.get("is_non_whitespace")),
+    )
+    if extraction is None:
+        return meter.finish(False, False, set(), set(), schema_valid=False)
+    grammar_relevant = include_grammar and extraction.is_grammar_relevant
+    grammar = _grammar_keys(extraction.grammar_summary()) if grammar_relevant else set()
+    vocab = _vocab_keys(extraction.vocab_summary())
+    return meter.finish(grammar_relevant, extraction.is_vocab_relevant, grammar, vocab, schema_valid=True)
+
+
+def _jaccard(a: list, b: list) -> float:
+    a, b = set(a), set(b)
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _summarize(rows: list[dict], mode: str) -> dict:
+    results = [row[mode] for row in rows]
+    latencies = [r["latency_ms"] for r in results]
+    return {
+        "calls": sum(r["calls"] for r in results),
+        "prompt_tokens": sum(r["prompt_tokens"] for r in results),
+        "prompt_cache_hit_tokens": sum(r["prompt_cache_hit_tokens"] for r in results),
+        "completion_tokens": sum(r["completion_tokens"] for r in results),
+        "total_tokens": sum(r["total_tokens"] for r in results),
+        "latency_ms_mean": round(statistics.mean(latencies), 1),
+        "latency_ms_p50": _percentile(latencies, 50),
+        "latency_ms_p95": _percentile(latencies, 95),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="A/B compare chained vs fused knowledge extraction.")
+    parser.add_argument("--cases", help="JSONL file with quoted_sentence / user_question / ai_response per line.")
+    parser.add_argument("--output", help="Write the full per-case report as JSON.")
+    parser.add_argument(
+        "--skip-grammar",
+        action="store_true",
+        help="Skip grammar relevance / summarization (mirrors DISABLE_GRAMMAR_FEATURES=True).",
+    )
+    args = parser.parse_args()
+
+    from backend.assistants.sub_assistants.check_if_grammar_relevant_assistant import CheckIfGrammarRelevantAssistant
+    from backend.assistants.sub_assistants.check_if_vocab_relevant_assistant import CheckIfVocabRelevantAssistant
+    from backend.assistants.sub_assistants.summarize_grammar_rule import SummarizeGrammarRuleAssistant
+    from backend.assistants.sub_assistants.summarize_vocab import SummarizeVocabAssistant
+    from backend.assistants.sub_assistants.extract_knowledge import ExtractKnowledgeAssistant
+
+    assistants = {
+        "check_grammar": CheckIfGrammarRelevantAssistant(),
+        "check_vocab": CheckIfVocabRelevantAssistant(),
+        "summarize_grammar": SummarizeGrammarRuleAssistant(),
+        "summarize_vocab": SummarizeVocabAssistant(),
+        "extract": ExtractKnowledgeAssistant(),
+    }
+    include_grammar = not args.skip_grammar
+    cases = _load_cases(args.cases)
+
+    rows = []
+    for index, case in enumerate(cases, 1):
+        print(f"\n===== [{index}/{len(cases)}] {case['user_question'][:60]} =====")
+        # 交替先后顺序，避免网络预热 / 服务端缓存只让其中一种模式受益
+        if index % 2:
+            chain = run_chain(assistants, case, include_grammar)
+            fused = run_fused(assistants, case, include_grammar)
+        else:
+            fused = run_fused(assistants, case, include_grammar)
+            chain = run_chain(assistants, case, include_grammar)
+        row = {
+            "case": case,
+            "chain": chain,
+            "fused": fused,
+            "agreement": {
+                "grammar_relevant": chain["grammar_relevant"] == fused["grammar_relevant"],
+                "vocab_relevant": chain["vocab_relevant"] == fused["vocab_relevant"],
+                "grammar_jaccard": round(_jaccard(chain["grammar"], fused["grammar"]), 3),
+                "vocab_jaccard": round(_jaccard(chain["vocab"], fused["vocab"]), 3),
+            },
+        }
+        rows.append(row)
+        print(f"  chain: calls={chain['calls']} tokens={chain['total_tokens']} {chain['latency_ms']}ms "
+              f"grammar={chain['grammar']} vocab={chain['vocab']}")
+        print(f"  fused: calls={fused['calls']} tokens={fused['total_tokens']} {fused['latency_ms']}ms "
+              f"grammar={fused['grammar']} vocab={fused['vocab']} schema_valid={fused['schema_valid']}")
+
+    summary = {
+        "cases": len(rows),
+        "include_grammar": include_grammar,
+        "chain": _summarize(rows, "chain"),
+        "fused": _summarize(rows, "fused"),
+        "fused_schema_failures": sum(1 for row in rows if not row["fused"]["schema_valid"]),
+        "agreement": {
+            "grammar_relevant_rate": round(sum(r["agreement"]["grammar_relevant"] for r in rows) / len(rows), 3),
+            "vocab_relevant_rate": round(sum(r["agreement"]["vocab_relevant"] for r in rows) / len(rows), 3),
+            "grammar_jaccard_mean": round(statistics.mean(r["agreement"]["grammar_jaccard"] for r in rows), 3),
+            "vocab_jaccard_mean": round(statistics.mean(r["agreement"]["vocab_jaccard"] for r in rows), 3),
+        },
+    }
+    print("\n===== 汇总 =====")
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "rows": rows}, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 详细报告已写入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+本地 OpenAI 兼容 LLM stub（离线开发 / 压测用，不消耗 DeepSeek token）
+
+- 实现 POST /chat/completions（及 /v1/chat/completions），按请求头 X-Assistant-Name
+  （SubAssistant 在 LLM_BASE_URL 指向非默认地址时自动带上）回放该助手的录制响应，按顺序轮换
+- 每个助手可单独配置延迟分布、错误率；支持 stream=true（SSE 分块，stream_options.include_usage 时附带用量）
+- usage：录制中带了就用录制值，否则按字符数估算；模拟 DeepSeek 前缀缓存——同一 system prompt
+  第二次出现起返回 prompt_cache_hit_tokens（按 64 token 取整）
+- GET /stub/stats 返回各助手的调用次数、错误次数、下发的 token 总数（压测脚本用来核对 token 账本）；
+  POST /stub/reset 清零
+
+配置文件（默认 backend/scripts/llm_stub_responses.json）：
+  {
+    "defaults":   {"latency_ms": {"dist": "lognormal", "median": 600, "sigma": 0.35},
+                   "error_rate": 0.0, "error_status": 500,
+                   "stream_chunk_chars": 12, "stream_chunk_delay_ms": 15},
+    "assistants": {"AnswerQuestionAssistant": {"latency_ms": {...}, "error_rate": 0.01,
+                                               "responses": [{"content": "...", "usage": {...}}]}},
+    "fallback":   {"content": "{}"}
+  }
+  延迟分布：fixed(value) / uniform(low, high) / normal(mean, sd) / lognormal(median, sigma)，单位毫秒
+
+录制模式：转发到真实服务（使用请求自带的 Authorization），把响应按助手类名追加到 --record-to 文件，
+之后可直接作为 --config 回放。
+
+用法（在项目根目录执行）:
+  python backend/scripts/llm_stub_server.py --port 8899
+  python backend/scripts/llm_stub_server.py --latency lognormal:1200:0.5 --error-rate 0.02
+  python backend/scripts/llm_stub_server.py --record-upstream https://api.deepseek.com --record-to recorded.json
+
+  后端指向 stub（OPENAI_API_KEY 任意非空值即可）:
+  LLM_BASE_URL=http://127.0.0.1:8899 OPENAI_API_KEY=stub python -m uvicorn main:app --port 8000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import time
+import uuid
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_stub_responses.json")
+UNKNOWN_ASSISTANT = "(unknown)"
+# DeepSeek 前缀缓存以 64 token 为单位
+CACHE_UNIT_TOKENS = 64
+
+
+# ==================== 配置 ====================
+
+def parse_latency(spec: str) -> Dict[str, Any]:
+    """命令行延迟写法：fixed:300 / uniform:200:800 / normal:500:100 / lognormal:600:0.35"""
+    parts = spec.split(":")
+    dist, values = parts[0], [float(v) for v in parts[1:]]
+    keys = {
+        "fixed": ("value",),
+        "uniform": ("low", "high"),
+        "normal": ("mean", "sd"),
+        "lognormal": ("median", "sigma"),
+    }.get(dist)
+    if keys is None or len(values) != len(keys):
+        raise ValueError(f"无法解析延迟分布: {spec!r}")
+    return {"dist": dist, **dict(zip(keys, values))}
+
+
+def sample_latency_ms(spec: Optional[Dict[str, Any]], rng: random.Random) -> float:
+    if not spec:
+        return 0.0
+    dist = spec.get("dist", "fixed")
+    if dist == "fixed":
+        value = spec.get("value", 0)
+    elif dist == "uniform":
+        value = rng.uniform(spec["low"], spec["high"])
+    elif dist == "normal":
+        value = rng.gauss(spec["mean"], spec["sd"])
+    elif dist == "lognormal":
+        value = spec["median"] * math.exp(rng.gauss(0, spec["sigma"]))
+    else:
+        raise ValueError(f"未知的延迟分布: {dist}")
+    return max(0.0, float(value))
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算：非 ASCII 字符（中日韩）约 1 token / 字，ASCII 约 4 字符 / token"""
+    if not text:
+        return 0
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + math.ceil((len(text) - non_ascii) / 4)
+
+
+class StubState:
+    """配置、回放游标、前缀缓存模拟与统计（请求在事件循环中处理，统计另加锁供录制线程使用）"""
+
+    def __init__(self, config: Dict[str, Any], seed: Optional[int] = None):
+        self.defaults: Dict[str, Any] = config.get("defaults", {})
+        self.assistants: Dict[str, Dict[str, Any]] = config.get("assistants", {})
+        self.fallback: Dict[str, Any] = config.get("fallback", {"content": "{}"})
+        self.rng = random.Random(seed)
+        self._cursors: Dict[str, int] = {}
+        self._seen_prefixes: set = set()
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = Lock()
+        self.started_at = time.time()
+
+    def option(self, assistant: str, key: str, default: Any = None) -> Any:
+        return self.assistants.get(assistant, {}).get(key, self.defaults.get(key, default))
+
+    def next_response(self, assistant: str) -> Dict[str, Any]:
+        responses: List[Dict[str, Any]] = self.assistants.get(assistant, {}).get("responses") or []
+        if not responses:
+            return self.fallback
+        with self._lock:
+            index = self._cursors.get(assistant, 0)
+            self._cursors[assistant] = index + 1
+        return responses[index % len(responses)]
+
+    def build_usage(self, messages: List[Dict[str, Any]], content: str, recorded: Optional[Dict[str, Any]]) -> Dict[str, int]:
+        recorded = recorded or {}
+        prompt_text = "".join(str(m.get("content") or "") for m in messages)
+        prompt_tokens = int(recorded.get("prompt_tokens") or estimate_tokens(prompt_text))
+        completion_tokens = int(recorded.get("completion_tokens") or estimate_tokens(content))
+
+        system_prompt = next((str(m.get("content") or "") for m in messages if m.get("role") == "system"), "")
+        cache_hit = 0
+        if system_prompt:
+            with self._lock:
+                seen = system_prompt in self._seen_prefixes
+                self._seen_prefixes.add(system_prompt)
+            if seen:
+                cache_hit = min(prompt_tokens, estimate_tokens(system_prompt) // CACHE_UNIT_TOKENS * CACHE_UNIT_TOKENS)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_cache_hit_tokens": cache_hit,
+            "prompt_cache_miss_tokens": prompt_tokens - cache_hit,
+        }
+
+    def record(self, assistant: str, latency_ms: float, usage: Optional[Dict[str, int]] = None, error: bool = False) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(assistant, {
+                "calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                "total_tokens": 0, "prompt_cache_hit_tokens": 0, "latency_ms_total": 0.0,
+            })
+            stats["calls"] += 1
+            stats["latency_ms_total"] += latency_ms
+            if error:
+                stats["errors"] += 1
+            elif usage:
+                for key in ("prompt_tokens", "completion_tokens", "total_tokens", "prompt_cache_hit_tokens"):
+                    stats[key] += usage.get(key, 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            assistants = {
+                name: {
+                    **{k: int(v) for k, v in stats.items() if k != "latency_ms_total"},
+                    "latency_ms_avg": round(stats["latency_ms_total"] / stats["calls"], 1) if stats["calls"] else None,
+                }
+                for name, stats in sorted(self._stats.items())
+            }
+        totals = {
+            key: sum(a[key] for a in assistants.values())
+            for key in ("calls", "errors", "prompt_tokens", "completion_tokens", "total_tokens", "prompt_cache_hit_tokens")
+        }
+        return {"uptime_seconds": round(time.time() - self.started_at, 1), "totals": totals, "assistants": assistants}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self._cursors.clear()
+            self._seen_prefixes.clear()
+
+
+# ==================== 响应构造 ====================
+
+def _completion_payload(completion_id: str, model: str, content: str, usage: Dict[str, int]) -> Dict[str, Any]:
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": usage,
+    }
+
+
+def _chunk(completion_id: str, model: str, delta: Dict[str, Any], finish_reason: Optional[str] = None,
+           usage: Optional[Dict[str, int]] = None) -> str:
+    payload: Dict[str, Any] = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [] if usage is not None else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    if usage is not None:
+        payload["usage"] = usage
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+async def _stream_body(state: StubState, assistant: str, completion_id: str, model: str, content: str,
+                       usage: Dict[str, int], include_usage: bool):
+    chunk_chars = max(1, int(state.option(assistant, "stream_chunk_chars", 12)))
+    chunk_delay = float(state.option(assistant, "stream_chunk_delay_ms", 15)) / 1000
+    yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+    for start in range(0, len(content), chunk_chars):
+        if chunk_delay:
+            await asyncio.sleep(chunk_delay)
+        yield _chunk(completion_id, model, {"content": content[start:start + chunk_chars]})
+    yield _chunk(completion_id, model, {}, finish_reason="stop")
+    if include_usage:
+        yield _chunk(completion_id, model, {}, usage=usage)
+    yield "data: [DONE]\n\n"
+
+
+def _error_response(status: int, message: str) -> JSONResponse:
+    error_type = "rate_limit_error" if status == 429 else "server_error"
+    return JSONResponse(status_code=status, content={"error": {"message": message, "type": error_type, "code": status}})
+
+
+# ==================== 录制 ====================
+
+class Recorder:
+    """转发到真实服务，并把响应按助手类名追加到文件（格式与配置文件相同）"""
+
+    def __init__(self, upstream: str, path: str):
+        import httpx
+
+        self.upstream = upstream.rstrip("/")
+        self.path = path
+        self.client = httpx.AsyncClient(timeout=120)
+        self._lock = asyncio.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.data = json.load(f)
+        else:
+            self.data = {"assistants": {}}
+
+    async def forward(self, body: Dict[str, Any], authorization: Optional[str]) -> Dict[str, Any]:
+        upstream_body = {k: v for k, v in body.items() if k not in ("stream", "stream_options")}
+        response = await self.client.post(
+            f"{self.upstream}/chat/completions",
+            json=upstream_body,
+            headers={"Authorization": authorization or ""},
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def save(self, assistant: str, content: str, usage: Dict[str, Any]) -> None:
+        async with self._lock:
+            entry = self.data.setdefault("assistants", {}).setdefault(assistant, {"responses": []})
+            entry.setdefault("responses", []).append({
+                "content": content,
+                "usage": {k: usage.get(k) for k in ("prompt_tokens", "completion_tokens") if usage.get(k) is not None},
+            })
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+# ==================== 应用 ====================
+
+def create_app(state: StubState, recorder: Optional[Recorder] = None) -> FastAPI:
+    app = FastAPI(title="LLM stub")
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        assistant = request.headers.get("x-assistant-name") or UNKNOWN_ASSISTANT
+        model = body.get("model") or "deepseek-chat"
+        messages = body.get("messages") or []
+        started = time.perf_counter()
+
+        await asyncio.sleep(sample_latency_ms(state.option(assistant, "latency_ms"), state.rng) / 1000)
+
+        error_rate = float(state.option(assistant, "error_rate", 0.0) or 0.0)
+        if error_rate and state.rng.random() < error_rate:
+            status = int(state.option(assistant, "error_status", 500))
+            state.record(assistant, (time.perf_counter() - started) * 1000, error=True)
+            return _error_response(status, f"stub injected error for {assistant}")
+
+        if recorder is not None:
+            try:
+                upstream = await recorder.forward(body, request.headers.get("authorization"))
+            except Exception as e:
+                state.record(assistant, (time.perf_counter() - started) * 1000, error=True)
+                return _error_response(502, f"upstream error: {e}")
+            content = upstream["choices"][0]["message"].get("content") or ""
+            usage = upstream.get("usage") or state.build_usage(messages, content, None)
+            await recorder.save(assistant, content, usage)
+        else:
+            recorded = state.next_response(assistant)
+            content = recorded.get("content", "")
+            usage = state.build_usage(messages, content, recorded.get("usage"))
+
+        state.record(assistant, (time.perf_counter() - started) * 1000, usage=usage)
+        completion_id = f"chatcmpl-stub-{uuid.uuid4().hex[:16]}"
+        if body.get("stream"):
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            return StreamingResponse(
+                _stream_body(state, assistant, completion_id, model, content, usage, include_usage),
+                media_type="text/event-stream",
+            )
+        return JSONResponse(_completion_payload(completion_id, model, content, usage))
+
+    app.add_api_route("/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/v1/chat/completions", chat_completions, methods=["POST"])
+
+    @app.get("/stub/stats")
+    async def stub_stats():
+        return state.snapshot()
+
+    @app.post("/stub/reset")
+    async def stub_reset():
+        state.reset()
+        return {"success": True}
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OpenAI-compatible LLM stub that replays recorded responses per assistant.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--config", default=DEFAULT_CONFIG_PATH, help="Responses / latency config JSON.")
+    parser.add_argument("--latency", help="Override default latency, e.g. lognormal:600:0.35 or fixed:0.")
+    parser.add_argument("--error-rate", type=float, help="Override default error rate (0..1).")
+    parser.add_argument("--error-status", type=int, help="HTTP status for injected errors (500 / 429 / 503).")
+    parser.add_argument("--seed", type=int, help="Random seed for latency / error sampling.")
+    parser.add_argument("--record-upstream", help="Forward to this upstream base URL and record responses.")
+    parser.add_argument("--record-to", help="File to append recorded responses to (required with --record-upstream).")
+    args = parser.parse_args()
+
+    with open(args.config, encoding="utf-8") as f:
+        config = json.load(f)
+    defaults = config.setdefault("defaults", {})
+    if args.latency:
+        defaults["latency_ms"] = parse_latency(args.latency)
+    if args.error_rate is not None:
+        defaults["error_rate"] = args.error_rate
+    if args.error_status is not None:
+        defaults["error_status"] = args.error_status
+
+    recorder = None
+    if args.record_upstream:
+        if not args.record_to:
+            parser.error("--record-to is required with --record-upstream")
+        recorder = Recorder(args.record_upstream, args.record_to)
+        # 录制时不额外注入延迟 / 错误
+        config["defaults"] = {**defaults, "latency_ms": None, "error_rate": 0.0}
+        config["assistants"] = {}
+
+    state = StubState(config, seed=args.seed)
+    app = create_app(state, recorder)
+
+    import uvicorn
+
+    mode = f"录制 → {args.record_upstream}（写入 {args.record_to}）" if recorder else f"回放 {args.config}"
+    print(f"🤖 [LLM Stub] http://{args.host}:{args.port}  {mode}")
+    print(f"   后端设置 LLM_BASE_URL=http://{args.host}:{args.port} 即可使用")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+/api/chat 压测：N 个虚拟用户并发提问，统计延迟分位、每接口 SQL 语句数，并核对 token 账本
+
+每个虚拟用户每轮：
+  1. POST /api/session/update_context（选中句子 + 提问）
+  2. POST /api/chat（带 x-sandbox-test: 1，非 production 环境下跳过限流）
+  3. 轮询 GET /api/chat/pending-knowledge，直到后台流程发布知识点事件或超时
+
+报告：
+- 各接口 p50 / p95 / p99 / max 延迟与状态码分布；chat 发出到收到知识点事件的端到端延迟
+- 每个接口的平均 SQL 语句数（读取 /api/debug/db-queries，后端需以 DB_QUERY_STATS=1 启动）
+- token 账本核对（每个压测用户，只看本次压测新增的记录）：
+  TokenLog 合计 == -TokenLedger(ai_usage) 合计 == 余额减少量 == TokenUsageTotal 增量，
+  且每条 TokenLog 恰好对应一条账本记录；再与 stub 的 /stub/stats 下发 token 总数对比
+
+注意：
+- 压测用户直接写库创建（角色 admin：跳过每小时 token 预算与余额检查），余额充足；--cleanup 删除
+- 会话上下文（session_state）是进程级全局的：并发时 update_context 与 chat 之间可能被其他用户覆盖，
+  此时后台知识点事件会发到别的文章上，表现为 pending-knowledge 超时。只关心账本与延迟时可忽略；
+  需要严格对应时用 --serialize-context（update_context + chat 串行，吞吐明显下降）
+- 必须与后端使用同一个数据库：本地 SQLite 路径相对于后端工作目录（默认 frontend/my-web-ui/backend），
+  云数据库通过 DATABASE_URL 指定
+
+用法（在项目根目录执行）:
+  # 1. 启动 LLM stub
+  python backend/scripts/llm_stub_server.py --port 8899
+  # 2. 启动后端并指向 stub
+  cd frontend/my-web-ui/backend && \\
+    LLM_BASE_URL=http://127.0.0.1:8899 OPENAI_API_KEY=stub DB_QUERY_STATS=1 python -m uvicorn main:app --port 8000
+  # 3. 压测
+  python backend/scripts/load_test_chat.py --users 20 --turns 5
+  python backend/scripts/load_test_chat.py --users 50 --turns 3 --output report.json --cleanup
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+BACKEND_DIR = os.path.join(REPO_ROOT, "backend")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+DEFAULT_SERVER_CWD = os.path.join(REPO_ROOT, "frontend", "my-web-ui", "backend")
+
+import httpx
+
+LOAD_TEST_EMAIL_TEMPLATE = "loadtest-{index}@loadtest.invalid"
+LOAD_TEST_TEXT_TITLE = "[load test] chat"
+LOAD_TEST_BALANCE = 10 ** 9
+
+# 与 llm_stub_responses.json 中的词汇回放对应
+SCENARIOS = [
+    ("She finally gave up smoking after years of trying.", "gave up 是什么意思？"),
+    ("We are looking forward to seeing you next week.", "look forward to 后面为什么接 seeing？"),
+    ("Despite the rain, they carried on with the match.", "carried on 在这里怎么理解？"),
+]
+
+
+# ==================== 准备数据 ====================
+
+def _db_session(server_cwd: str):
+    """与后端相同的数据库（SQLite 路径相对于后端工作目录）"""
+    os.chdir(server_cwd)
+    from backend.config import ENV
+    from database_system.database_manager import DatabaseManager
+
+    return DatabaseManager(ENV).get_session()
+
+
+def prepare_users(session, count: int) -> List[Dict[str, Any]]:
+    """创建或复用压测用户（admin）、每人一篇带 SCENARIOS 句子的文章，并签发 JWT"""
+    from backend.utils.auth import create_access_token, hash_password
+    from database_system.business_logic.models import OriginalText, Sentence, User
+
+    users = []
+    for index in range(count):
+        email = LOAD_TEST_EMAIL_TEMPLATE.format(index=index)
+        user = session.query(User).filter(User.email == email).first()
+        if user is None:
+            user = User(email=email, password_hash=hash_password(f"loadtest-{index}"), role="admin")
+            session.add(user)
+            session.flush()
+        user.role = "admin"
+        user.token_balance = LOAD_TEST_BALANCE
+
+        text = (
+            session.query(OriginalText)
+            .filter(OriginalText.user_id == user.user_id, OriginalText.text_title == LOAD_TEST_TEXT_TITLE)
+            .first()
+        )
+        if text is None:
+            text = OriginalText(user_id=user.user_id, text_title=LOAD_TEST_TEXT_TITLE, language="英文")
+            session.add(text)
+            session.flush()
+            session.add_all([
+                Sentence(text_id=text.text_id, sentence_id=sentence_id, sentence_body=body, paragraph_id=1)
+                for sentence_id, (body, _) in enumerate(SCENARIOS, start=1)
+            ])
+        users.append({
+            "user_id": user.user_id,
+            "text_id": text.text_id,
+            "token": create_access_token(data={"sub": str(user.user_id)}),
+        })
+    session.commit()
+    return users
+
+
+def cleanup_users(session) -> int:
+    """删除压测用户及其文章（其余关联数据依赖外键 ON DELETE CASCADE）"""
+    from database_system.business_logic.models import OriginalText, Sentence, User
+
+    user_ids = [
+        user_id for (user_id,) in
+        session.query(User.user_id).filter(User.email.like(LOAD_TEST_EMAIL_TEMPLATE.format(index="%")))
+    ]
+    if not user_ids:
+        return 0
+    text_ids = session.query(OriginalText.text_id).filter(OriginalText.user_id.in_(user_ids))
+    session.query(Sentence).filter(Sentence.text_id.in_(text_ids)).delete(synchronize_session=False)
+    session.query(OriginalText).filter(OriginalText.user_id.in_(user_ids)).delete(synchronize_session=False)
+    session.query(User).filter(User.user_id.in_(user_ids)).delete(synchronize_session=False)
+    session.commit()
+    return len(user_ids)
+
+
+def ledger_snapshot(session, user_ids: List[int]) -> Dict[str, Any]:
+    """压测前的基线：各表当前最大 id、用户余额与累计用量"""
+    from sqlalchemy import func
+
+    from database_system.business_logic.models import TokenLedger, TokenLog, TokenUsageTotal, User
+
+    session.expire_all()
+    totals = {
+        row.user_id: int(row.total_tokens or 0)
+        for row in session.query(TokenUsageTotal).filter(TokenUsageTotal.user_id.in_(user_ids))
+    }
+    return {
+        "max_log_id": session.query(func.max(TokenLog.id)).scalar() or 0,
+        "max_ledger_id": session.query(func.max(TokenLedger.id)).scalar() or 0,
+        "balances": {
+            row.user_id: int(row.token_balance or 0)
+            for row in session.query(User).filter(User.user_id.in_(user_ids))
+        },
+        "usage_totals": {user_id: totals.get(user_id, 0) for user_id in user_ids},
+    }
+
+
+def verify_ledger(session, user_ids: List[int], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """核对本次压测新增的 TokenLog / TokenLedger / 余额 / TokenUsageTotal 是否一致"""
+    from database_system.business_logic.models import TokenLedger, TokenLog
+
+    after = ledger_snapshot(session, user_ids)
+    logs = session.query(TokenLog).filter(TokenLog.id > baseline["max_log_id"], TokenLog.user_id.in_(user_ids)).all()
+    ledgers = (
+        session.query(TokenLedger)
+        .filter(
+            TokenLedger.id > baseline["max_ledger_id"],
+            TokenLedger.user_id.in_(user_ids),
+            TokenLedger.reason == "ai_usage",
+        )
+        .all()
+    )
+
+    log_tokens: Dict[int, int] = defaultdict(int)
+    ledger_tokens: Dict[int, int] = defaultdict(int)
+    for log in logs:
+        log_tokens[log.user_id] += log.total_tokens
+    for entry in ledgers:
+        ledger_tokens[entry.user_id] += -entry.delta
+
+    ref_counts = Counter(entry.ref_id for entry in ledgers)
+    orphan_logs = [log.id for log in logs if ref_counts.get(f"token_log_{log.id}", 0) != 1]
+    log_refs = {f"token_log_{log.id}" for log in logs}
+    orphan_ledgers = [entry.id for entry in ledgers if entry.ref_id not in log_refs]
+
+    mismatched_users = []
+    for user_id in user_ids:
+        row = {
+            "user_id": user_id,
+            "token_log": log_tokens.get(user_id, 0),
+            "ledger": ledger_tokens.get(user_id, 0),
+            "balance_decrease": baseline["balances"].get(user_id, 0) - after["balances"].get(user_id, 0),
+            "usage_total_increase": after["usage_totals"].get(user_id, 0) - baseline["usage_totals"].get(user_id, 0),
+        }
+        if len({row["token_log"], row["ledger"], row["balance_decrease"], row["usage_total_increase"]}) != 1:
+            mismatched_users.append(row)
+
+    return {
+        "calls": len(logs),
+        "ledger_entries": len(ledgers),
+        "total_tokens": sum(log_tokens.values()),
+        "prompt_cache_hit_tokens": sum(log.prompt_cache_hit_tokens or 0 for log in logs),
+        "logs_without_exactly_one_ledger_entry": orphan_logs[:20],
+        "ledger_entries_without_log": orphan_ledgers[:20],
+        "mismatched_users": mismatched_users[:20],
+        "ok": not orphan_logs and not orphan_ledgers and not mismatched_users,
+    }
+
+
+# ==================== 压测 ====================
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return round(ordered[index], 1)
+
+
+def latency_summary(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    latencies = [s["ms"] for s in samples]
+    return {
+        "count": len(samples),
+        "status": dict(Counter(str(s["status"]) for s in samples)),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": round(max(latencies), 1) if latencies else None,
+    }
+
+
+def sentence_payload(user: Dict[str, Any], sentence_id: int, body: str, question: str) -> Dict[str, Any]:
+    words = body.rstrip(".").split()
+    tokens = []
+    for word in words:
+        tokens.append({"token_body": word, "token_type": "text", "sentence_token_id": len(tokens) + 1})
+        tokens.append({"token_body": " ", "token_type": "space", "sentence_token_id": len(tokens) + 1})
+    tokens[-1] = {"token_body": ".", "token_type": "punctuation", "sentence_token_id": len(tokens)}
+    return {
+        "current_input": question,
+        "sentence": {
+            "text_id": user["text_id"],
+            "sentence_id": sentence_id,
+            "sentence_body": body,
+            "tokens": tokens,
+            "language": "英文",
+        },
+        "token": None,
+    }
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client
+        self.args = args
+        self.samples: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.knowledge_ms: List[float] = []
+        self.knowledge_timeouts = 0
+        self.errors: Counter = Counter()
+        self.context_lock = asyncio.Lock() if args.serialize_context else None
+
+    async def _request(self, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            status: Any = response.status_code
+        except httpx.HTTPError as e:
+            response, status = None, type(e).__name__
+        self.samples[name].append({"ms": (time.perf_counter() - started) * 1000, "status": status})
+        return response
+
+    async def _ask(self, user: Dict[str, Any], headers: Dict[str, str], turn: int) -> Optional[float]:
+        sentence_id = turn % len(SCENARIOS) + 1
+        body, question = SCENARIOS[sentence_id - 1]
+        await self._request(
+            "update_context", "POST", "/api/session/update_context",
+            json=sentence_payload(user, sentence_id, body, question), headers=headers,
+        )
+        sent_at = time.perf_counter()
+        response = await self._request(
+            "chat", "POST", "/api/chat",
+            json={"user_question": question, "ui_language": "中文"},
+            headers={**headers, "x-sandbox-test": "1"},
+        )
+        if response is None or response.status_code != 200 or not response.json().get("success"):
+            detail = response.text[:120] if response is not None else "no response"
+            self.errors[f"chat: {detail}"] += 1
+            return None
+        return sent_at
+
+    async def virtual_user(self, user: Dict[str, Any]) -> None:
+        headers = {"Authorization": f"Bearer {user['token']}"}
+        for turn in range(self.args.turns):
+            if self.context_lock is not None:
+                async with self.context_lock:
+                    sent_at = await self._ask(user, headers, turn)
+            else:
+                sent_at = await self._ask(user, headers, turn)
+            if sent_at is None:
+                continue
+
+            deadline = sent_at + self.args.knowledge_timeout
+            while time.perf_counter() < deadline:
+                response = await self._request(
+                    "pending_knowledge", "GET", "/api/chat/pending-knowledge",
+                    params={"user_id": user["user_id"], "text_id": user["text_id"]}, headers=headers,
+                )
+                data = (response.json().get("data") or {}) if response is not None and response.status_code == 200 else {}
+                if data.get("event_id"):
+                    self.knowledge_ms.append((time.perf_counter() - sent_at) * 1000)
+                    break
+                await asyncio.sleep(self.args.poll_interval)
+            else:
+                self.knowledge_timeouts += 1
+
+            if self.args.think_time:
+                await asyncio.sleep(self.args.think_time)
+
+    def report(self, wall_seconds: float) -> Dict[str, Any]:
+        chat_count = len(self.samples.get("chat", []))
+        return {
+            "users": self.args.users,
+            "turns": self.args.turns,
+            "wall_seconds": round(wall_seconds, 1),
+            "chat_per_second": round(chat_count / wall_seconds, 2) if wall_seconds else None,
+            "endpoints": {name: latency_summary(samples) for name, samples in sorted(self.samples.items())},
+            "knowledge_event": {
+                **latency_summary([{"ms": ms, "status": "event"} for ms in self.knowledge_ms]),
+                "timeouts": self.knowledge_timeouts,
+            },
+            "errors": dict(self.errors.most_common(10)),
+        }
+
+
+async def fetch_json(client: httpx.AsyncClient, method: str, url: str) -> Optional[Dict[str, Any]]:
+    try:
+        response = await client.request(method, url)
+        response.raise_for_status()
+        return response.json()
+    except (httpx.HTTPError, ValueError):
+        return None
+
+
+async def wait_for_ledger(session, user_ids: List[int], baseline: Dict[str, Any], settle_seconds: float) -> None:
+    """等待后台流程的 token 缓冲区落库：TokenLog 条数连续两次不变即认为已稳定"""
+    from sqlalchemy import func
+
+    from database_system.business_logic.models import TokenLog
+
+    deadline = time.time() + settle_seconds
+    last = -1
+    while time.time() < deadline:
+        session.expire_all()
+        count = (
+            session.query(func.count(TokenLog.id))
+            .filter(TokenLog.id > baseline["max_log_id"], TokenLog.user_id.in_(user_ids))
+            .scalar()
+        )
+        if count == last:
+            return
+        last = count
+        await asyncio.sleep(2)
+
+
+async def run(args) -> Dict[str, Any]:
+    session = _db_session(args.server_cwd)
+    try:
+        users = prepare_users(session, args.users)
+        user_ids = [u["user_id"] for u in users]
+        print(f"👥 [LoadTest] 压测用户已就绪: {len(users)} 个")
+
+        async with httpx.AsyncClient(base_url=args.server, timeout=args.timeout) as client:
+            db_stats_available = await fetch_json(client, "POST", "/api/debug/db-queries/reset") is not None
+            stub_client = httpx.AsyncClient(base_url=args.stub, timeout=10) if args.stub else None
+            if stub_client is not None:
+                await fetch_json(stub_client, "POST", "/stub/reset")
+
+            baseline = ledger_snapshot(session, user_ids)
+            test = LoadTest(client, args)
+            started = time.perf_counter()
+            await asyncio.gather(*(test.virtual_user(user) for user in users))
+            wall_seconds = time.perf_counter() - started
+            report = test.report(wall_seconds)
+
+            print("⏳ [LoadTest] 等待后台 token 记账落库...")
+            await wait_for_ledger(session, user_ids, baseline, args.settle_seconds)
+            db_stats = await fetch_json(client, "GET", "/api/debug/db-queries") if db_stats_available else None
+            report["db_queries"] = db_stats
+            report["ledger"] = verify_ledger(session, user_ids, baseline)
+
+            if stub_client is not None:
+                stub_stats = await fetch_json(stub_client, "GET", "/stub/stats")
+                await stub_client.aclose()
+                if stub_stats:
+                    stub_total = stub_stats["totals"]["total_tokens"]
+                    report["stub"] = stub_stats["totals"]
+                    report["ledger"]["stub_total_tokens"] = stub_total
+                    report["ledger"]["matches_stub"] = stub_total == report["ledger"]["total_tokens"]
+
+        if args.cleanup:
+            removed = cleanup_users(session)
+            print(f"🧹 [LoadTest] 已删除压测用户: {removed} 个")
+        return report
+    finally:
+        session.close()
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print("\n" + "=" * 72)
+    print(f"📊 {report['users']} users × {report['turns']} turns, {report['wall_seconds']}s, {report['chat_per_second']} chat/s")
+    print(f"{'endpoint':<22}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  status")
+    rows = dict(report["endpoints"])
+    rows["knowledge_event"] = report["knowledge_event"]
+    for name, row in rows.items():
+        cells = "".join(f"{row[k] if row[k] is not None else '-':>9}" for k in ("p50_ms", "p95_ms", "p99_ms", "max_ms"))
+        print(f"{name:<22}{row['count']:>7}{cells}  {row['status']}")
+    print(f"knowledge event timeouts: {report['knowledge_event']['timeouts']}")
+    for error, count in report["errors"].items():
+        print(f"  ❌ {count}× {error}")
+
+    db_queries = report.get("db_queries")
+    if db_queries and db_queries.get("enabled"):
+        print("\nSQL statements per request:")
+        for label, row in db_queries["routes"].items():
+            print(f"  {label:<52}{row['requests']:>7} req {row['queries']:>8} q  {row['queries_per_request']} q/req")
+    else:
+        print("\n(SQL 统计未开启：后端需以 DB_QUERY_STATS=1 启动)")
+
+    ledger = report["ledger"]
+    print(f"\nToken ledger: {ledger['calls']} calls, {ledger['total_tokens']} tokens "
+          f"(cache hit {ledger['prompt_cache_hit_tokens']}), ledger entries {ledger['ledger_entries']}")
+    if "stub_total_tokens" in ledger:
+        print(f"  stub served {ledger['stub_total_tokens']} tokens -> {'✅ match' if ledger['matches_stub'] else '❌ mismatch'}")
+    print(f"  {'✅ consistent' if ledger['ok'] else '❌ inconsistent'}")
+    for key in ("mismatched_users", "logs_without_exactly_one_ledger_entry", "ledger_entries_without_log"):
+        if ledger[key]:
+            print(f"  {key}: {ledger[key]}")
+    print("=" * 72)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Concurrent /api/chat load test with ledger verification.")
+    parser.add_argument("--users", type=int, default=10, help="Number of concurrent virtual users.")
+    parser.add_argument("--turns", type=int, default=3, help="Questions per virtual user.")
+    parser.add_argument("--server", default="http://127.0.0.1:8000")
+    parser.add_argument("--stub", default="http://127.0.0.1:8899", help="LLM stub base URL ('' to skip stub stats).")
+    parser.add_argument("--server-cwd", default=DEFAULT_SERVER_CWD, help="Backend working directory (for the SQLite path).")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request timeout in seconds.")
+    parser.add_argument("--knowledge-timeout", type=float, default=60, help="Seconds to wait for the knowledge event.")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--think-time", type=float, default=0.0, help="Pause between turns in seconds.")
+    parser.add_argument("--settle-seconds", type=float, default=60, help="Max wait for background ledger flushes.")
+    parser.add_argument("--serialize-context", action="store_true", help="Serialize update_context + chat across users.")
+    parser.add_argument("--output", help="Write the JSON report to this file.")
+    parser.add_argument("--cleanup", action="store_true", help="Delete load-test users afterwards.")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        with open(os.path.join(REPO_ROOT, args.output) if not os.path.isabs(args.output) else args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📝 报告已写入 {args.output}")
+    return 0 if report["ledger"]["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+离线预生成预置文章的句子讲解，写入共享表 preset_explanations（见 backend/services/preset_explanations.py）
+
+对每篇预置文章（backend/data/presets/articles）的每个句子、每种 UI 语言（中文 / 英文）：
+1. AnswerQuestionAssistant：回答前端针对整句的建议问题（“这句话是什么意思？”等）
+2. ExtractKnowledgeAssistant：从该回答抽取语法点 / 词汇（线上命中预生成回答时直接复用，跳过抽取调用）
+3. VocabExplanationAssistant / GrammarExplanationAssistant：为抽取出的词汇、语法点生成解释
+
+线上 MainAssistant 先查这张表，命中则不调用大模型；未覆盖的问题照常实时生成。
+会真实调用模型并消耗 token（不计入任何用户），需要配置 OPENAI_API_KEY；
+默认断点续跑（已存在的条目跳过），--force 重新生成。
+
+需要先执行迁移: python migrate_add_preset_explanations.py
+
+用法（在项目根目录执行）:
+  python backend/scripts/precompute_preset_explanations.py
+  python backend/scripts/precompute_preset_explanations.py --languages de en --ui-languages 中文
+  python backend/scripts/precompute_preset_explanations.py --limit 20 --dry-run
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+os.chdir(REPO_ROOT)
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+BACKEND_DIR = os.path.join(REPO_ROOT, "backend")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+class _Generator:
+    """按需调用各子助手，累计调用次数与 token"""
+
+    def __init__(self):
+        from backend.assistants.sub_assistants.answer_question import AnswerQuestionAssistant
+        from backend.assistants.sub_assistants.extract_knowledge import ExtractKnowledgeAssistant
+        from backend.assistants.sub_assistants.grammar_explanation import GrammarExplanationAssistant
+        from backend.assistants.sub_assistants.vocab_explanation import VocabExplanationAssistant
+
+        self.answer = AnswerQuestionAssistant()
+        self.extract = ExtractKnowledgeAssistant()
+        self.vocab = VocabExplanationAssistant()
+        self.grammar = GrammarExplanationAssistant()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def call(self, assistant, *args, **kwargs):
+        result = assistant.run(*args, **kwargs)
+        self.calls += 1
+        usage = assistant.last_usage or {}
+        self.prompt_tokens += usage.get("prompt_tokens", 0)
+        self.completion_tokens += usage.get("completion_tokens", 0)
+        return result
+
+    @staticmethod
+    def meta(assistant) -> dict:
+        usage = assistant.last_usage or {}
+        return {
+            "model_name": assistant.model,
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "completion_tokens": usage.get("completion_tokens"),
+        }
+
+
+def _field(result, key: str) -> str:
+    """从子助手返回值中取出文本字段（dict 或原始字符串）"""
+    if isinstance(result, dict):
+        return str(result.get(key) or "").strip()
+    if isinstance(result, str):
+        return result.strip()
+    return ""
+
+
+def precompute_sentence(
+    session,
+    gen: _Generator,
+    language_code: str,
+    sentence_body: str,
+    ui_language: str,
+    force: bool = False,
+    include_grammar: bool = True,
+) -> dict:
+    """生成一个句子在一种 UI 语言下的全部条目；返回新增 / 跳过 / 失败计数"""
+    from backend.data_managers.preset_articles import LANG_CODE_TO_NAME
+    from backend.preprocessing.language_classification import is_non_whitespace_language
+    from backend.services import preset_explanations as pe
+
+    counts = {"written": 0, "skipped": 0, "failed": 0}
+    existing = set() if force else pe.existing_keys(session, sentence_body)
+    sentence = SimpleNamespace(sentence_body=sentence_body)
+    learning_language = LANG_CODE_TO_NAME.get(language_code, ui_language)
+
+    def have(kind, target="", question=""):
+        if pe.make_key(kind, ui_language, target, question) in existing:
+            counts["skipped"] += 1
+            return True
+        return False
+
+    def store(kind, content, assistant, target="", question=""):
+        if not content:
+            counts["failed"] += 1
+            return
+        pe.upsert(
+            session, language_code, sentence_body, kind, ui_language, content,
+            target=target, question=question, **gen.meta(assistant)
+        )
+        existing.add(pe.make_key(kind, ui_language, target, question))
+        counts["written"] += 1
+
+    for question in pe.SENTENCE_QUESTIONS.get(ui_language, []):
+        if not have(pe.KIND_ANSWER, question=question):
+            result = gen.call(gen.answer, full_sentence=sentence_body, user_question=question, ui_language=ui_language)
+            store(pe.KIND_ANSWER, _field(result, "answer"), gen.answer, question=question)
+        answer = pe.lookup_existing(session, sentence_body, pe.KIND_ANSWER, ui_language, question=question)
+        if not answer:
+            continue
+
+        extraction = None
+        if not have(pe.KIND_EXTRACTION, question=question):
+            extraction = gen.call(
+                gen.extract, sentence_body, question, answer,
+                language=ui_language, is_non_whitespace=is_non_whitespace_language(language_code)
+            )
+            store(pe.KIND_EXTRACTION, extraction.model_dump_json() if extraction else "", gen.extract, question=question)
+        else:
+            from backend.assistants.sub_assistants.output_schemas import KnowledgeExtraction
+
+            raw = pe.lookup_existing(session, sentence_body, pe.KIND_EXTRACTION, ui_language, question=question)
+            extraction = KnowledgeExtraction.model_validate_json(raw) if raw else None
+        if extraction is None:
+            continue
+
+        for item in extraction.vocab_summary():
+            vocab = item.get("vocab")
+            if vocab and not have(pe.KIND_VOCAB, target=vocab):
+                result = gen.call(gen.vocab, vocab=vocab, sentence=sentence, language=ui_language)
+                store(pe.KIND_VOCAB, _field(result, "explanation"), gen.vocab, target=vocab)
+
+        if not include_grammar:
+            continue
+        for item in extraction.grammar_summary():
+            canonical = item.get("canonical") or {}
+            target = pe.grammar_target(canonical.get("category"), canonical.get("subtype"))
+            if not have(pe.KIND_GRAMMAR, target=target):
+                result = gen.call(
+                    gen.grammar, quoted_sentence=sentence_body, grammar_summary=item,
+                    language=ui_language, learning_language=learning_language
+                )
+                store(pe.KIND_GRAMMAR, _field(result, "grammar_explanation"), gen.grammar, target=target)
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pre-generate shared explanations for preset article sentences.")
+    parser.add_argument("--languages", nargs="*", default=[], help="Preset language codes (e.g. de en); default all.")
+    parser.add_argument("--ui-languages", nargs="*", default=["中文", "英文"], help="Output (UI) languages.")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after this many sentences (0 = no limit).")
+    parser.add_argument("--force", action="store_true", help="Regenerate entries that already exist.")
+    parser.add_argument("--skip-grammar", action="store_true", help="Do not generate grammar explanations.")
+    parser.add_argument("--dry-run", action="store_true", help="List sentences and planned work without calling the model.")
+    args = parser.parse_args()
+
+    from backend.config import ENV
+    from database_system.database_manager import get_database_manager
+    from backend.data_managers.preset_articles import load_preset_files, preset_sentence_bodies
+    from backend.services import preset_explanations as pe
+
+    work = []
+    seen = set()
+    for preset in load_preset_files(args.languages):
+        language_code = preset.get("language_code")
+        if not language_code:
+            continue
+        for body in preset_sentence_bodies(preset):
+            digest = pe.sentence_hash(body)
+            if digest in seen:
+                continue
+            seen.add(digest)
+            work.append((language_code, preset.get("title"), body))
+    if args.limit:
+        work = work[: args.limit]
+    print(f"📚 预置句子: {len(work)}，UI 语言: {args.ui_languages}")
+
+    if args.dry_run:
+        for language_code, title, body in work:
+            print(f"  [{language_code}] {title}: {body[:80]}")
+        return
+
+    db_manager = get_database_manager(ENV)
+    session = db_manager.get_session()
+    gen = _Generator()
+    totals = {"written": 0, "skipped": 0, "failed": 0}
+    started = time.perf_counter()
+    try:
+        for index, (language_code, title, body) in enumerate(work, 1):
+            for ui_language in args.ui_languages:
+                try:
+                    counts = precompute_sentence(
+                        session, gen, language_code, body, ui_language,
+                        force=args.force, include_grammar=not args.skip_grammar
+                    )
+                    session.commit()
+                except Exception as e:
+                    session.rollback()
+                    print(f"❌ [{index}/{len(work)}] {title} / {ui_language}: {e}")
+                    totals["failed"] += 1
+                    continue
+                for key, value in counts.items():
+                    totals[key] += value
+            print(f"✅ [{index}/{len(work)}] [{language_code}] {body[:60]} "
+                  f"written={totals['written']} skipped={totals['skipped']} calls={gen.calls}")
+    finally:
+        session.close()
+
+    print("\nDone.")
+    print(f"  entries written: {totals['written']}, skipped (existing): {totals['skipped']}, failed: {totals['failed']}")
+    print(f"  model calls: {gen.calls}, prompt tokens: {gen.prompt_tokens}, completion tokens: {gen.completion_tokens}")
+    print(f"  elapsed: {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+文章访问记录（UserArticleAccess）的内存合并 + 后台批量写入
+
+背景：
+- 以前 GET /api/v2/texts/{id} 和 POST /{id}/access 每次打开文章都在请求里
+  查询 → 修改 → commit 一行 user_article_access，读接口里多了一次写事务，
+  Postgres 上同一行还有行锁竞争
+
+做法：
+- record_access 只把 (user_id, text_id) -> 最近打开时间写进内存字典，
+  同一篇文章在刷新间隔内多次打开只保留最新时间
+- 后台线程每 ARTICLE_ACCESS_FLUSH_SECONDS 秒把字典整体换出，
+  用一条 INSERT ... ON CONFLICT (user_id, text_id) DO UPDATE 批量写入
+  （不支持的方言退回"一次查询 + 逐行更新/插入"，仍在同一事务里）
+- 写入失败时把这批记录合并回字典，下次再试；进程退出前（atexit）再刷一次
+- 文章列表按最后打开时间排序时，用 pending_for_user 把尚未落库的时间叠加上去，
+  读接口不用等写入
+
+环境变量：
+- ARTICLE_ACCESS_FLUSH_SECONDS: 刷新间隔（秒），默认 5
+"""
+import atexit
+import os
+import threading
+from datetime import datetime
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from database_system.business_logic.models import OriginalText, UserArticleAccess
+
+
+FLUSH_INTERVAL_SECONDS = float(os.getenv("ARTICLE_ACCESS_FLUSH_SECONDS", "5"))
+
+# (user_id, text_id) -> 最近一次打开时间
+_pending: Dict[Tuple[int, int], datetime] = {}
+# 正在写入的一批（写入期间 pending_for_user 仍能看到）
+_inflight: Dict[Tuple[int, int], datetime] = {}
+_pending_lock = Lock()
+_stats = {"recorded": 0, "coalesced": 0, "flushes": 0, "flushed_rows": 0, "failures": 0}
+
+_flusher: Optional[threading.Thread] = None
+_flusher_lock = Lock()
+_stop_event = threading.Event()
+
+
+def record_access(user_id: int, text_id: int, at: Optional[datetime] = None) -> datetime:
+    """
+    记录一次文章打开（只写内存，不访问数据库）
+
+    Returns:
+        datetime: 记录的打开时间
+    """
+    at = at or datetime.now()
+    key = (user_id, text_id)
+    with _pending_lock:
+        previous = _pending.get(key)
+        if previous is not None:
+            _stats["coalesced"] += 1
+        if previous is None or at > previous:
+            _pending[key] = at
+        _stats["recorded"] += 1
+    _ensure_flusher()
+    return at
+
+
+def pending_for_user(user_id: int) -> Dict[int, datetime]:
+    """该用户尚未落库的打开时间 {text_id: last_opened_at}"""
+    with _pending_lock:
+        result = {text_id: at for (uid, text_id), at in _inflight.items() if uid == user_id}
+        for (uid, text_id), at in _pending.items():
+            if uid == user_id and (text_id not in result or at > result[text_id]):
+                result[text_id] = at
+        return result
+
+
+def _requeue(batch: Dict[Tuple[int, int], datetime]) -> None:
+    """写入失败时合并回待写字典（保留较新的时间）"""
+    with _pending_lock:
+        for key, at in batch.items():
+            current = _pending.get(key)
+            if current is None or at > current:
+                _pending[key] = at
+
+
+def _upsert(session: Session, rows: list) -> None:
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(UserArticleAccess).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "text_id"],
+            set_={
+                "last_opened_at": stmt.excluded.last_opened_at,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+        session.execute(stmt)
+        return
+
+    # 其他方言：一次查出已有记录，再逐行更新 / 插入
+    user_ids = {row["user_id"] for row in rows}
+    text_ids = {row["text_id"] for row in rows}
+    existing = {
+        (access.user_id, access.text_id): access
+        for access in session.query(UserArticleAccess).filter(
+            UserArticleAccess.user_id.in_(user_ids),
+            UserArticleAccess.text_id.in_(text_ids),
+        )
+    }
+    for row in rows:
+        access = existing.get((row["user_id"], row["text_id"]))
+        if access is not None:
+            access.last_opened_at = row["last_opened_at"]
+            access.updated_at = row["updated_at"]
+        else:
+            session.add(UserArticleAccess(**row))
+
+
+def flush(session: Optional[Session] = None) -> int:
+    """
+    把内存中的访问记录批量写入数据库
+
+    Args:
+        session: 可选的数据库会话；不传时内部创建并关闭
+
+    Returns:
+        int: 写入的行数
+    """
+    global _pending, _inflight
+    with _pending_lock:
+        if not _pending:
+            return 0
+        batch, _pending = _pending, {}
+        _inflight = batch
+
+    own_session = session is None
+    if own_session:
+        from backend.config import ENV
+        from database_system.database_manager import get_database_manager
+
+        session = get_database_manager(ENV).get_session()
+    try:
+        # 文章可能在记录之后被删除：只写仍存在的文章，避免外键错误让整批失败
+        text_ids = {text_id for _, text_id in batch}
+        existing_text_ids = {
+            text_id for (text_id,) in session.query(OriginalText.text_id).filter(OriginalText.text_id.in_(text_ids))
+        }
+        now = datetime.now()
+        rows = [
+            {"user_id": user_id, "text_id": text_id, "last_opened_at": at, "created_at": now, "updated_at": now}
+            for (user_id, text_id), at in batch.items()
+            if text_id in existing_text_ids
+        ]
+        if rows:
+            _upsert(session, rows)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        _requeue(batch)
+        with _pending_lock:
+            _inflight = {}
+            _stats["failures"] += 1
+        print(f"⚠️ [ArticleAccess] 批量写入访问记录失败，稍后重试: {e}")
+        return 0
+    finally:
+        if own_session:
+            session.close()
+
+    with _pending_lock:
+        _inflight = {}
+        _stats["flushes"] += 1
+        _stats["flushed_rows"] += len(rows)
+    return len(rows)
+
+
+def _flush_loop() -> None:
+    while not _stop_event.wait(FLUSH_INTERVAL_SECONDS):
+        try:
+            flush()
+        except Exception as e:
+            print(f"⚠️ [ArticleAccess] 后台刷新异常: {e}")
+
+
+def _ensure_flusher() -> None:
+    """第一次记录访问时启动后台刷新线程"""
+    global _flusher
+    if _flusher is not None:
+        return
+    with _flusher_lock:
+        if _flusher is not None:
+            return
+        _stop_event.clear()
+        _flusher = threading.Thread(target=_flush_loop, name="article-access-flusher", daemon=True)
+        _flusher.start()
+        atexit.register(shutdown)
+
+
+def shutdown() -> None:
+    """停止后台线程并把剩余记录写入数据库（进程退出前调用）"""
+    global _flusher
+    _stop_event.set()
+    with _flusher_lock:
+        thread, _flusher = _flusher, None
+    if thread is not None and thread is not threading.current_thread():
+        thread.join(timeout=FLUSH_INTERVAL_SECONDS + 1)
+    try:
+        flush()
+    except Exception as e:
+        print(f"⚠️ [ArticleAccess] 退出前写入访问记录失败: {e}")
+
+
+def get_stats() -> Dict[str, Any]:
+    """统计：记录次数、被合并的次数、刷新次数 / 行数、失败次数、当前待写条数"""
+    with _pending_lock:
+        return {
+            **_stats,
+            "pending": len(_pending),
+            "flush_interval_seconds": FLUSH_INTERVAL_SECONDS,
+        }
@@ -0,0 +1,132 @@
+"""
+文章内容接口的 ETag + 序列化结果缓存
+
+背景：
+- 文章 processing_status 变为 completed 之后，句子和 token 基本不再变化，
+  但 GET /api/v2/texts/{id}、/sentences、/pages/{page_index} 每次打开都重新查库、重新序列化
+
+做法：
+- OriginalText.content_version：导入 / 追加句子 / 修改标注或标题时换新（见 new_content_version）
+- ETag = content_version + 处理状态 + 接口变体（整篇 / 第几页 / 是否含句子）
+  请求带 If-None-Match 且一致时直接返回 304，不再查句子
+- 进程内 LRU 缓存序列化好的 JSON 字节，键为 (text_id, content_version, 变体)；
+  版本换新后旧键自然失效，按总字节数淘汰
+- 只缓存 completed 的内容；content_version 为空的历史数据（未跑迁移）不走缓存
+
+环境变量：
+- ARTICLE_PAYLOAD_CACHE_MAX_BYTES: 缓存总字节上限，默认 64MB
+"""
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+
+MAX_BYTES = int(os.getenv("ARTICLE_PAYLOAD_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# 浏览器可以缓存，但每次使用前都要带 If-None-Match 回来验证
+CACHE_CONTROL = "private, no-cache"
+
+# (text_id, content_version, 变体...) -> JSON 字节（末尾最新）
+_cache: "OrderedDict[Tuple[Hashable, ...], bytes]" = OrderedDict()
+_cache_lock = Lock()
+_total_bytes = 0
+_stats = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0}
+
+
+def make_etag(content_version: Optional[str], processing_status: Optional[str], *variant: Any) -> Optional[str]:
+    """生成强 ETag；没有内容版本或内容未完成时返回 None（不做条件请求）"""
+    if not content_version or processing_status != "completed":
+        return None
+    parts = [content_version] + [str(v) for v in variant]
+    return '"' + "-".join(parts) + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """If-None-Match 是否命中（支持逗号分隔的多个值、W/ 前缀和 *）"""
+    if not if_none_match or not etag:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    with _cache_lock:
+        _stats["not_modified"] += 1
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def _etag_headers(etag: Optional[str]) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL} if etag else {}
+
+
+def get_cached_response(key: Optional[Tuple[Hashable, ...]], etag: Optional[str]) -> Optional[Response]:
+    """命中时返回带 ETag 的响应；未命中（或不可缓存）返回 None"""
+    if key is None:
+        return None
+    with _cache_lock:
+        body = _cache.get(key)
+        if body is None:
+            _stats["misses"] += 1
+            return None
+        _cache.move_to_end(key)
+        _stats["hits"] += 1
+    return Response(content=body, media_type="application/json", headers=_etag_headers(etag))
+
+
+def cache_response(key: Optional[Tuple[Hashable, ...]], etag: Optional[str], payload: Any) -> Response:
+    """序列化 payload；key 不为空时放进缓存"""
+    global _total_bytes
+    response = JSONResponse(content=jsonable_encoder(payload), headers=_etag_headers(etag))
+    if key is None:
+        return response
+    body = response.body
+    if len(body) > MAX_BYTES:
+        return response
+    with _cache_lock:
+        previous = _cache.pop(key, None)
+        if previous is not None:
+            _total_bytes -= len(previous)
+        _cache[key] = body
+        _total_bytes += len(body)
+        while _total_bytes > MAX_BYTES and _cache:
+            _, evicted = _cache.popitem(last=False)
+            _total_bytes -= len(evicted)
+            _stats["evictions"] += 1
+    return response
+
+
+def cache_key(text_id: int, content_version: Optional[str], processing_status: Optional[str], *variant: Any):
+    """可缓存时返回缓存键，否则 None（与 make_etag 的条件一致）"""
+    if not content_version or processing_status != "completed":
+        return None
+    return (text_id, content_version) + tuple(variant)
+
+
+def get_stats() -> Dict[str, Any]:
+    """缓存统计：条目数、字节数、命中 / 未命中 / 304 / 淘汰次数"""
+    with _cache_lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            "entries": len(_cache),
+            "bytes": _total_bytes,
+            "max_bytes": MAX_BYTES,
+            **_stats,
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else None,
+        }
+
+
+def clear() -> None:
+    """清空缓存（测试 / 调试用）"""
+    global _total_bytes
+    with _cache_lock:
+        _cache.clear()
+        _total_bytes = 0
@@ -0,0 +1,272 @@
+"""
+文章句子的分段读取 + 字段投影 + 流式 JSON 输出
+
+背景：
+- GET /api/v2/texts/{text_id} 一次把整篇文章（每个句子连同全部 tokens / word_tokens）
+  组装成一个大 dict 再整体序列化，长篇文章响应几 MB，请求期间内存峰值很高
+- 前端渲染时并不需要每个字段（如 token 的 lemma / pos_tag）
+
+做法：
+- 游标分页：按 sentence_id 做 keyset（sentence_id > cursor），每页最多 MAX_LIMIT 句
+- 字段投影：fields / token_fields / word_token_fields 只输出请求的字段；
+  没请求 tokens / word_tokens 时不加载对应关系，请求了也只 load_only 需要的列
+- 分批读取：每 STREAM_BATCH_SIZE 句一次查询，tokens / word_tokens 用 selectinload
+  批量加载；一批序列化完即从 Session 中移除，内存只与批大小有关
+- 流式输出：逐句编码 JSON 并 yield，不在内存里拼整页响应
+
+环境变量：
+- ARTICLE_STREAM_BATCH_SIZE: 每批查询的句子数，默认 100
+- ARTICLE_STREAM_MAX_LIMIT: 每页最多句子数，默认 500
+"""
+import enum
+import json
+import os
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session, load_only, selectinload
+
+from database_system.business_logic.models import Sentence, Token, WordToken
+from backend.preprocessing.language_classification import (
+    get_language_code,
+    is_non_whitespace_language,
+)
+
+
+STREAM_BATCH_SIZE = int(os.getenv("ARTICLE_STREAM_BATCH_SIZE", "100"))
+MAX_LIMIT = int(os.getenv("ARTICLE_STREAM_MAX_LIMIT", "500"))
+
+# 输出字段 -> 需要加载的列（空元组表示不依赖列，如常量或派生字段）
+SENTENCE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "sentence_id": ("sentence_id",),
+    "sentence_body": ("sentence_body",),
+    "difficulty_level": ("sentence_difficulty_level",),
+    "grammar_annotations": ("grammar_annotations",),
+    "vocab_annotations": ("vocab_annotations",),
+    "tokens": (),
+    "word_tokens": (),
+    "readings": ("readings",),
+    "paragraph_id": ("paragraph_id",),
+    "is_new_paragraph": ("is_new_paragraph",),
+    "language": (),
+    "language_code": (),
+    "is_non_whitespace": (),
+}
+TOKEN_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "token_body": ("token_body",),
+    "sentence_token_id": ("sentence_token_id",),
+    "token_type": ("token_type",),
+    "difficulty_level": ("difficulty_level",),
+    "global_token_id": ("global_token_id",),
+    "pos_tag": ("pos_tag",),
+    "lemma": ("lemma",),
+    "word_token_id": ("word_token_id",),
+    "selectable": (),
+}
+WORD_TOKEN_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "word_token_id": ("word_token_id",),
+    "word_body": ("word_body",),
+    "token_ids": ("token_ids",),
+    "pos_tag": ("pos_tag",),
+    "lemma": ("lemma",),
+    "linked_vocab_id": ("linked_vocab_id",),
+}
+
+# 完整详情接口（_serialize_sentence_with_tokens）的默认输出字段
+DEFAULT_SENTENCE_FIELDS = (
+    "sentence_id", "sentence_body", "difficulty_level", "grammar_annotations", "vocab_annotations",
+    "tokens", "word_tokens", "readings", "language", "language_code", "is_non_whitespace",
+)
+
+
+def _json_default(value: Any) -> Any:
+    """与 FastAPI 的 jsonable_encoder 一致：枚举取 value，日期转 ISO 字符串"""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def parse_fields(value: Optional[str], allowed: Dict[str, Any], default: Sequence[str]) -> Tuple[str, ...]:
+    """
+    解析逗号分隔的字段列表（保持 allowed 中的顺序）
+
+    Raises:
+        ValueError: 含有不支持的字段
+    """
+    if value is None or not value.strip():
+        return tuple(default)
+    requested = {item.strip() for item in value.split(",") if item.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise ValueError(f"unsupported fields: {', '.join(sorted(unknown))}")
+    return tuple(name for name in allowed if name in requested)
+
+
+def _serialize_token(t, fields: Sequence[str]) -> Dict[str, Any]:
+    data: Dict[str, Any] = {}
+    for name in fields:
+        if name == "token_type":
+            data[name] = str(t.token_type).lower() if t.token_type is not None else "text"
+        elif name == "selectable":
+            data[name] = True
+        else:
+            data[name] = getattr(t, name, None)
+    return data
+
+
+def _serialize_word_token(wt, fields: Sequence[str]) -> Dict[str, Any]:
+    data: Dict[str, Any] = {}
+    for name in fields:
+        if name == "token_ids":
+            data[name] = list(wt.token_ids or [])
+        else:
+            data[name] = getattr(wt, name, None)
+    return data
+
+
+def serialize_sentence(
+    sentence_model,
+    text_language: Optional[str],
+    fields: Sequence[str] = DEFAULT_SENTENCE_FIELDS,
+    token_fields: Sequence[str] = tuple(TOKEN_FIELDS),
+    word_token_fields: Sequence[str] = tuple(WORD_TOKEN_FIELDS),
+) -> Dict[str, Any]:
+    """把 Sentence ORM 对象序列化为前端使用的 dict（只输出 fields 中的字段）"""
+    language_code = get_language_code(text_language) if text_language else None
+    data: Dict[str, Any] = {}
+    for name in fields:
+        if name == "tokens":
+            data[name] = [_serialize_token(t, token_fields) for t in (getattr(sentence_model, "tokens", None) or [])]
+        elif name == "word_tokens":
+            data[name] = [
+                _serialize_word_token(wt, word_token_fields)
+                for wt in (getattr(sentence_model, "word_tokens", None) or [])
+            ]
+        elif name == "difficulty_level":
+            data[name] = sentence_model.sentence_difficulty_level
+        elif name in ("grammar_annotations", "vocab_annotations"):
+            value = getattr(sentence_model, name)
+            data[name] = list(value) if value else []
+        elif name == "language":
+            data[name] = text_language
+        elif name == "language_code":
+            data[name] = language_code
+        elif name == "is_non_whitespace":
+            data[name] = is_non_whitespace_language(language_code) if language_code else None
+        else:
+            data[name] = getattr(sentence_model, name)
+    return data
+
+
+def _sentence_query_options(
+    fields: Sequence[str],
+    token_fields: Sequence[str],
+    word_token_fields: Sequence[str],
+) -> list:
+    """按请求的字段生成 load_only / selectinload 选项"""
+    columns = {"text_id", "sentence_id"}
+    for name in fields:
+        columns.update(SENTENCE_FIELDS[name])
+    options = [load_only(*[getattr(Sentence, c) for c in sorted(columns)])]
+    if "tokens" in fields:
+        token_columns = {"token_id", "text_id", "sentence_id"}
+        for name in token_fields:
+            token_columns.update(TOKEN_FIELDS[name])
+        options.append(selectinload(Sentence.tokens).load_only(*[getattr(Token, c) for c in sorted(token_columns)]))
+    if "word_tokens" in fields:
+        word_columns = {"word_token_id", "text_id", "sentence_id"}
+        for name in word_token_fields:
+            word_columns.update(WORD_TOKEN_FIELDS[name])
+        options.append(
+            selectinload(Sentence.word_tokens).load_only(*[getattr(WordToken, c) for c in sorted(word_columns)])
+        )
+    return options
+
+
+def iter_sentence_range(
+    session: Session,
+    text_id: int,
+    text_language: Optional[str],
+    cursor: int,
+    limit: int,
+    fields: Sequence[str],
+    token_fields: Sequence[str],
+    word_token_fields: Sequence[str],
+    end_sentence_id: Optional[int] = None,
+    batch_size: int = STREAM_BATCH_SIZE,
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    按 sentence_id 升序逐句产出 (sentence_id, 序列化结果)，只取 sentence_id > cursor 的句子（最多 limit 句）
+
+    每批一次查询（tokens / word_tokens 各一次 selectinload），
+    一批产出完就把这些对象移出 Session。
+    """
+    options = _sentence_query_options(fields, token_fields, word_token_fields)
+    remaining = limit
+    last_id = cursor
+    while remaining > 0:
+        query = session.query(Sentence).options(*options).filter(
+            Sentence.text_id == text_id,
+            Sentence.sentence_id > last_id,
+        )
+        if end_sentence_id is not None:
+            query = query.filter(Sentence.sentence_id <= end_sentence_id)
+        batch = query.order_by(Sentence.sentence_id.asc()).limit(min(batch_size, remaining)).all()
+        if not batch:
+            return
+        for sentence in batch:
+            yield sentence.sentence_id, serialize_sentence(sentence, text_language, fields, token_fields, word_token_fields)
+        last_id = batch[-1].sentence_id
+        remaining -= len(batch)
+        for sentence in batch:
+            session.expunge(sentence)
+        if len(batch) < batch_size:
+            return
+
+
+def stream_sentence_page(
+    session_factory,
+    text_id: int,
+    text_language: Optional[str],
+    cursor: int,
+    limit: int,
+    fields: Sequence[str],
+    token_fields: Sequence[str],
+    word_token_fields: Sequence[str],
+    end_sentence_id: Optional[int] = None,
+) -> Iterator[bytes]:
+    """
+    以流的形式输出一页句子的 JSON：
+        {"success": true, "data": {"text_id": ..., "sentences": [...],
+         "count": n, "next_cursor": ..., "has_more": ...}}
+
+    Session 由生成器自己创建并关闭（StreamingResponse 在请求依赖结束后才迭代）。
+    多取一句用来判断 has_more，不输出。
+    """
+    session = session_factory()
+    try:
+        yield b'{"success":true,"data":{"text_id":' + json.dumps(text_id).encode() + b',"sentences":['
+        count = 0
+        last_id = None
+        has_more = False
+        for sentence_id, sentence in iter_sentence_range(
+            session, text_id, text_language, cursor, limit + 1,
+            fields, token_fields, word_token_fields, end_sentence_id=end_sentence_id,
+        ):
+            if count == limit:
+                has_more = True
+                break
+            chunk = json.dumps(sentence, ensure_ascii=False, default=_json_default).encode("utf-8")
+            yield (b"," + chunk) if count else chunk
+            count += 1
+            last_id = sentence_id
+        tail = {
+            "count": count,
+            "next_cursor": last_id if has_more else None,
+            "has_more": has_more,
+        }
+        yield b"]," + json.dumps(tail)[1:-1].encode() + b"}}"
+    finally:
+        session.close()
@@ -0,0 +1,310 @@
+"""
+后台任务执行器（/api/chat 主回答之后的知识点抽取等）
+
+背景：
+- 之前用 FastAPI BackgroundTasks 调度，再用每个用户一把 Lock 串行化：
+  突发请求时每个任务都占着一个线程阻塞在 Lock.acquire 上，线程数和排队长度都没有上限
+
+做法：
+- 固定数量的工作线程 + 有界队列；队列满时 submit 抛 QueueFullError（调用方据此拒绝 / 跳过）
+- 同一用户的任务按提交顺序（FIFO）逐个执行：用户有任务在跑时，后续任务只留在该用户的队列里，
+  不占线程；任务结束后该用户的下一个任务才重新进入待调度堆
+- 不同用户之间按队首任务的优先级（数值越小越先）+ 提交顺序调度
+- 排队中的任务可以取消（cancel / cancel_user）；已开始执行的任务不会被打断
+
+环境变量：
+- BACKGROUND_JOB_WORKERS: 工作线程数，默认 4
+- BACKGROUND_JOB_QUEUE_SIZE: 全局排队上限（不含执行中），默认 200
+- BACKGROUND_JOB_MAX_PER_USER: 单个用户排队上限（不含执行中），默认 5
+- BACKGROUND_JOB_SHUTDOWN_TIMEOUT: 停机时等待排队任务执行完的秒数，默认 30（超时未执行的任务被取消）
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from backend.utils.structured_logging import get_logger
+
+logger = get_logger("background_jobs")
+
+WORKERS = int(os.getenv("BACKGROUND_JOB_WORKERS", "4"))
+QUEUE_SIZE = int(os.getenv("BACKGROUND_JOB_QUEUE_SIZE", "200"))
+MAX_PER_USER = int(os.getenv("BACKGROUND_JOB_MAX_PER_USER", "5"))
+SHUTDOWN_TIMEOUT = float(os.getenv("BACKGROUND_JOB_SHUTDOWN_TIMEOUT", "30"))
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+
+class QueueFullError(Exception):
+    """队列已满（全局或单个用户），任务未被接收"""
+
+
+class Job:
+    """一个排队 / 执行中的任务；state: pending / running / done / failed / cancelled"""
+
+    def __init__(self, key: Hashable, fn: Callable[[], Any], priority: int, name: str, seq: int, on_cancel: Optional[Callable[[], Any]]):
+        self.key = key
+        self.fn = fn
+        self.priority = priority
+        self.name = name
+        self.seq = seq
+        self.on_cancel = on_cancel
+        self.state = "pending"
+        self.error: Optional[BaseException] = None
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._executor: Optional["JobExecutor"] = None
+
+    def cancel(self) -> bool:
+        """取消排队中的任务；已开始执行 / 已结束时返回 False"""
+        if self._executor is None:
+            return False
+        return self._executor.cancel(self)
+
+    @property
+    def wait_ms(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        return (self.started_at - self.submitted_at) * 1000
+
+
+class JobExecutor:
+    def __init__(self, workers: int = WORKERS, queue_size: int = QUEUE_SIZE, max_per_user: int = MAX_PER_USER, name: str = "bg-job"):
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.max_per_user = max(1, max_per_user)
+        self.name = name
+        self._cond = threading.Condition()
+        # key -> 该用户排队中的任务（FIFO，可能含已取消、待跳过的任务）
+        self._queues: Dict[Hashable, Deque[Job]] = {}
+        # 有任务在执行的 key（同一 key 同时只执行一个）
+        self._running: Dict[Hashable, Job] = {}
+        # 可调度的 key：(队首优先级, 队首 seq, key)；每个 key 至多一项
+        self._ready: List[Tuple[int, int, Hashable]] = []
+        self._pending = 0
+        self._seq = itertools.count()
+        self._threads: List[threading.Thread] = []
+        self._shutdown = False
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "rejected": 0}
+        self._max_wait_ms = 0.0
+        self._total_wait_ms = 0.0
+
+    # ---- 提交 / 取消 ----
+
+    def can_accept(self, key: Hashable) -> bool:
+        """此刻是否还能接收该用户的任务（用于在花费 token 之前提前拒绝）"""
+        with self._cond:
+            return not self._shutdown and self._pending < self.queue_size and self._pending_for(key) < self.max_per_user
+
+    def submit(
+        self,
+        key: Hashable,
+        fn: Callable[[], Any],
+        priority: int = PRIORITY_NORMAL,
+        name: str = "",
+        on_cancel: Optional[Callable[[], Any]] = None,
+    ) -> Job:
+        """
+        提交任务；同一 key 的任务按提交顺序串行执行。
+        队列满时抛 QueueFullError。on_cancel 在任务被取消（含停机时丢弃）时调用，用于释放任务持有的资源。
+        """
+        with self._cond:
+            if self._shutdown:
+                self._stats["rejected"] += 1
+                raise QueueFullError("executor is shut down")
+            if self._pending >= self.queue_size:
+                self._stats["rejected"] += 1
+                raise QueueFullError(f"queue full ({self._pending}/{self.queue_size})")
+            if self._pending_for(key) >= self.max_per_user:
+                self._stats["rejected"] += 1
+                raise QueueFullError(f"too many queued jobs for {key!r} (max {self.max_per_user})")
+            job = Job(key, fn, priority, name, next(self._seq), on_cancel)
+            job._executor = self
+            queue = self._queues.setdefault(key, deque())
+            queue.append(job)
+            self._pending += 1
+            self._stats["submitted"] += 1
+            if len(queue) == 1 and key not in self._running:
+                heapq.heappush(self._ready, (job.priority, job.seq, key))
+            self._ensure_workers()
+            self._cond.notify()
+        return job
+
+    def cancel(self, job: Job) -> bool:
+        with self._cond:
+            if job.state != "pending":
+                return False
+            self._mark_cancelled(job)
+        self._run_on_cancel([job])
+        return True
+
+    def cancel_user(self, key: Hashable) -> int:
+        """取消该用户所有排队中的任务，返回取消个数"""
+        with self._cond:
+            cancelled = [job for job in self._queues.get(key, ()) if job.state == "pending"]
+            for job in cancelled:
+                self._mark_cancelled(job)
+        self._run_on_cancel(cancelled)
+        return len(cancelled)
+
+    def _mark_cancelled(self, job: Job) -> None:
+        # 已取消的任务留在用户队列里，轮到时直接跳过（避免在 deque 中间删除 / 重排堆）
+        job.state = "cancelled"
+        job.finished_at = time.monotonic()
+        self._pending -= 1
+        self._stats["cancelled"] += 1
+
+    def _run_on_cancel(self, jobs: List[Job]) -> None:
+        for job in jobs:
+            if job.on_cancel is None:
+                continue
+            try:
+                job.on_cancel()
+            except Exception as e:
+                logger.warning("⚠️ [BackgroundJobs] on_cancel 回调失败 (%s): %s", job.name, e)
+
+    def _pending_for(self, key: Hashable) -> int:
+        return sum(1 for job in self._queues.get(key, ()) if job.state == "pending")
+
+    # ---- 调度 ----
+
+    def _ensure_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, name=f"{self.name}-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_job(self) -> Optional[Job]:
+        """取出下一个可执行的任务（调用方持有锁）；该 key 随即标记为执行中"""
+        while self._ready:
+            _, _, key = heapq.heappop(self._ready)
+            queue = self._queues.get(key)
+            while queue and queue[0].state == "cancelled":
+                queue.popleft()
+            if not queue:
+                self._queues.pop(key, None)
+                continue
+            job = queue.popleft()
+            if not queue:
+                self._queues.pop(key, None)
+            self._running[key] = job
+            self._pending -= 1
+            return job
+        return None
+
+    def _release_key(self, key: Hashable) -> None:
+        """key 的任务执行完毕：若还有排队任务，按新的队首重新进入待调度堆（调用方持有锁）"""
+        self._running.pop(key, None)
+        queue = self._queues.get(key)
+        while queue and queue[0].state == "cancelled":
+            queue.popleft()
+        if queue:
+            head = queue[0]
+            heapq.heappush(self._ready, (head.priority, head.seq, key))
+            self._cond.notify()
+        else:
+            self._queues.pop(key, None)
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    if self._shutdown:
+                        return
+                    self._cond.wait()
+                    job = self._next_job()
+                job.state = "running"
+                job.started_at = time.monotonic()
+                wait_ms = job.wait_ms or 0.0
+                self._total_wait_ms += wait_ms
+                self._max_wait_ms = max(self._max_wait_ms, wait_ms)
+            try:
+                job.fn()
+                job.state = "done"
+            except BaseException as e:
+                job.state = "failed"
+                job.error = e
+                logger.error("❌ [BackgroundJobs] 任务失败 (%s): %s", job.name or job.key, e)
+            finally:
+                job.finished_at = time.monotonic()
+                with self._cond:
+                    self._stats["completed" if job.state == "done" else "failed"] += 1
+                    self._release_key(job.key)
+
+    # ---- 停机 / 统计 ----
+
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None, cancel_pending: bool = False) -> None:
+        """
+        停止接收新任务。cancel_pending=True 时立即丢弃排队中的任务；否则先把排队任务执行完，
+        超过 timeout 仍未执行的任务会被取消（触发 on_cancel）。
+        """
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+            threads = list(self._threads)
+        if cancel_pending:
+            self._cancel_all_pending()
+        if not wait:
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in threads:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            thread.join(remaining)
+        if any(thread.is_alive() for thread in threads):
+            cancelled = self._cancel_all_pending()
+            if cancelled:
+                logger.warning("⚠️ [BackgroundJobs] 停机超时，取消 %s 个排队中的任务", cancelled)
+
+    def _cancel_all_pending(self) -> int:
+        with self._cond:
+            cancelled = [job for queue in self._queues.values() for job in queue if job.state == "pending"]
+            for job in cancelled:
+                self._mark_cancelled(job)
+        self._run_on_cancel(cancelled)
+        return len(cancelled)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            started = self._stats["completed"] + self._stats["failed"] + len(self._running)
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "max_per_user": self.max_per_user,
+                "pending": self._pending,
+                "running": len(self._running),
+                "queued_users": sum(1 for q in self._queues.values() if any(j.state == "pending" for j in q)),
+                **self._stats,
+                "avg_wait_ms": round(self._total_wait_ms / started, 1) if started else None,
+                "max_wait_ms": round(self._max_wait_ms, 1),
+            }
+
+
+_executor: Optional[JobExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> JobExecutor:
+    """进程内共享的执行器（首次提交任务时才启动工作线程）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = JobExecutor()
+        return _executor
+
+
+def get_stats() -> Dict[str, Any]:
+    return get_executor().get_stats()
+
+
+def shutdown(wait: bool = True, timeout: Optional[float] = SHUTDOWN_TIMEOUT, cancel_pending: bool = False) -> None:
+    with _executor_lock:
+        executor = _executor
+    if executor is not None:
+        executor.shutdown(wait=wait, timeout=timeout, cancel_pending=cancel_pending)
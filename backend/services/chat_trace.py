@@ -0,0 +1,393 @@
+"""
+/api/chat 单轮链路追踪（按阶段记录耗时与 token）
+
+每轮对话一个 ChatTrace，span 树：
+  chat.turn                         整轮（请求进入 → 后台流程结束）
+  ├─ chat.answer                    主回答阶段（请求进入 → 返回给前端）
+  │   ├─ db.balance_check / db.save_user_message / db.save_ai_response
+  │   └─ llm.AnswerQuestionAssistant
+  └─ chat.background                后台知识点流程
+      ├─ queue.background           排队（返回主回答 → 后台开始执行，含等待同用户的串行锁）
+      ├─ llm.<SubAssistant> ...     每次子助手调用一个 span
+      └─ db.add_new_to_data / db.publish_event / db.token_flush
+
+llm.* span 的属性：
+  llm.attempts / llm.retries         调用次数 / 重试次数（空内容、不符合 schema、连接失败）
+  llm.network_ms                     请求 API 的耗时（所有尝试合计）
+  llm.backoff_ms                     连接失败后的退避等待
+  llm.parse_ms                       解析 / schema 校验耗时
+  llm.accounting_ms                  token 记账耗时（未启用缓冲时含一次提交）
+  llm.prompt_tokens / llm.completion_tokens / llm.total_tokens / llm.prompt_cache_hit_tokens
+
+与 TokenUsageBuffer 一样挂在 Session.info 上：子助手 run(session=...) 时自动找到本轮 trace。
+span 的父节点取当前线程中最近一个未结束的 span（主回答与后台流程在不同线程）。
+
+导出：整轮结束后转成 OpenTelemetry OTLP/JSON（ExportTraceServiceRequest），由后台线程写出
+- CHAT_TRACE_EXPORT=/path/to/traces.jsonl   每轮一行，追加写入（与 OTel Collector file exporter 格式一致）
+- CHAT_TRACE_EXPORT=http://127.0.0.1:4318/v1/traces   POST 到 OTLP/HTTP collector
+- 未设置则不导出，只保留内存中的最近 span（CHAT_TRACE_BUFFER 条）供 /api/debug/chat-traces 汇总
+
+CHAT_TRACE_ENABLED=0 可整体关闭（start_turn 返回空实现，调用方无需判断）。
+"""
+import json
+import math
+import os
+import queue
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+
+ENABLED = os.getenv("CHAT_TRACE_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+EXPORT_TARGET = os.getenv("CHAT_TRACE_EXPORT", "").strip()
+# 内存中保留的最近 span 数（汇总接口的数据来源）
+BUFFER_SIZE = int(os.getenv("CHAT_TRACE_BUFFER", "5000"))
+# 导出队列上限：导出跟不上时丢弃，不阻塞请求
+EXPORT_QUEUE_SIZE = int(os.getenv("CHAT_TRACE_EXPORT_QUEUE", "1000"))
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "language-learning-backend")
+
+_TRACE_SESSION_KEY = "chat_trace"
+
+
+# ==================== Span / Trace ====================
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add(self, key: str, value: float) -> None:
+        """数值属性累加（多次尝试的耗时 / token 合计）"""
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+
+class _NoopSpan:
+    """关闭追踪 / 没有 trace 时的占位 span"""
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def add(self, key: str, value: float) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class ChatTrace:
+    """一轮对话的 span 集合（主回答线程与后台线程共用，加锁）"""
+
+    def __init__(self, user_id: Optional[int], request_id: Optional[int] = None):
+        self.trace_id = secrets.token_hex(16)
+        self.root = Span("chat.turn", None, {"user.id": user_id, "chat.request_id": request_id})
+        self._spans: List[Span] = [self.root]
+        self._lock = Lock()
+        self._local = threading.local()
+        self._finished = False
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def start_span(self, name: str, parent: Optional[Span] = None, activate: bool = False, **attributes: Any) -> Span:
+        """
+        开始一个 span（父节点默认为当前线程最近一个已激活且未结束的 span，否则为根）
+
+        activate=True 时，本线程之后开始的 span 以它为父节点，直到 end_span
+        """
+        stack = self._stack()
+        if parent is None:
+            parent = stack[-1] if stack else self.root
+        span = Span(name, parent.span_id, attributes)
+        with self._lock:
+            self._spans.append(span)
+        if activate:
+            stack.append(span)
+        return span
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None) -> None:
+        stack = self._stack()
+        if span in stack:
+            del stack[stack.index(span):]
+        if span.end_ns is None:
+            span.end_ns = time.time_ns()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"[:500]
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Span] = None, **attributes: Any) -> Iterator[Span]:
+        """with trace.span("db.xxx") as span: ...（块内开始的 span 以它为父节点）"""
+        span = self.start_span(name, parent=parent, activate=True, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, error=e)
+            raise
+        finally:
+            self.end_span(span)
+
+    def finish(self) -> None:
+        """结束整轮：收尾未结束的 span，写入内存汇总并提交导出（重复调用为空操作）"""
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            spans = list(self._spans)
+        now_ns = time.time_ns()
+        for span in spans:
+            if span.end_ns is None:
+                span.end_ns = now_ns
+        _record_finished(self.trace_id, spans)
+        if EXPORT_TARGET:
+            _enqueue_export(to_otlp(self.trace_id, spans))
+
+
+class _NoopTrace:
+    """CHAT_TRACE_ENABLED=0 时的空实现（接口与 ChatTrace 相同）"""
+
+    trace_id = None
+
+    def start_span(self, name: str, parent=None, activate: bool = False, **attributes: Any) -> _NoopSpan:
+        return _NOOP_SPAN
+
+    def end_span(self, span, error: Optional[BaseException] = None) -> None:
+        pass
+
+    @contextmanager
+    def span(self, name: str, parent=None, **attributes: Any) -> Iterator[_NoopSpan]:
+        yield _NOOP_SPAN
+
+    def finish(self) -> None:
+        pass
+
+
+_NOOP_TRACE = _NoopTrace()
+
+
+def start_turn(user_id: Optional[int], request_id: Optional[int] = None):
+    """开始一轮对话的追踪（关闭时返回空实现）"""
+    if not ENABLED:
+        return _NOOP_TRACE
+    return ChatTrace(user_id, request_id)
+
+
+def attach_trace(session: Session, trace) -> None:
+    """把本轮 trace 挂到 Session 上；传 None 表示取消"""
+    if trace is None or trace is _NOOP_TRACE:
+        session.info.pop(_TRACE_SESSION_KEY, None)
+    else:
+        session.info[_TRACE_SESSION_KEY] = trace
+
+
+def get_trace(session: Optional[Session]) -> Optional[ChatTrace]:
+    """获取挂在 Session 上的 trace（没有则返回 None）"""
+    if session is None:
+        return None
+    return session.info.get(_TRACE_SESSION_KEY)
+
+
+@contextmanager
+def llm_span(session: Optional[Session], assistant_name: str, model: str) -> Iterator[Any]:
+    """子助手调用的 span；Session 上没有 trace 时返回占位 span"""
+    trace = get_trace(session)
+    if trace is None:
+        yield _NOOP_SPAN
+        return
+    with trace.span(f"llm.{assistant_name}", **{"llm.assistant": assistant_name, "llm.model": model}) as span:
+        yield span
+
+
+# ==================== OTLP/JSON ====================
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(trace_id: str, spans: List[Span]) -> Dict[str, Any]:
+    """转成 OTLP/JSON ExportTraceServiceRequest"""
+    otlp_spans = []
+    for span in spans:
+        item = {
+            "traceId": trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 3 if span.name.startswith("llm.") else 1,  # CLIENT / INTERNAL
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in span.attributes.items()
+                if value is not None
+            ],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            item["parentSpanId"] = span.parent_id
+        otlp_spans.append(item)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "backend.services.chat_trace"}, "spans": otlp_spans}],
+        }]
+    }
+
+
+# ==================== 导出（后台线程） ====================
+
+_export_queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+_export_thread: Optional[threading.Thread] = None
+_export_thread_lock = Lock()
+_export_stats = {"exported": 0, "dropped": 0, "failed": 0}
+
+
+def _write_export(payload: Dict[str, Any]) -> None:
+    if EXPORT_TARGET.startswith(("http://", "https://")):
+        import httpx
+
+        response = httpx.post(EXPORT_TARGET, json=payload, timeout=5)
+        response.raise_for_status()
+    else:
+        with open(EXPORT_TARGET, "a", encoding="utf-8") as f:
+            f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+
+
+def _export_worker() -> None:
+    while True:
+        payload = _export_queue.get()
+        try:
+            _write_export(payload)
+            _export_stats["exported"] += 1
+        except Exception as e:
+            _export_stats["failed"] += 1
+            print(f"⚠️ [ChatTrace] 导出失败（{EXPORT_TARGET}）: {e}")
+        finally:
+            _export_queue.task_done()
+
+
+def _enqueue_export(payload: Dict[str, Any]) -> None:
+    global _export_thread
+    with _export_thread_lock:
+        if _export_thread is None:
+            _export_thread = threading.Thread(target=_export_worker, name="chat-trace-export", daemon=True)
+            _export_thread.start()
+    try:
+        _export_queue.put_nowait(payload)
+    except queue.Full:
+        _export_stats["dropped"] += 1
+
+
+# ==================== 内存汇总 ====================
+
+_recent: deque = deque(maxlen=BUFFER_SIZE)
+_recent_lock = Lock()
+
+# 汇总时从 span 属性中累加的数值
+_SUMMED_ATTRIBUTES = (
+    "llm.retries", "llm.network_ms", "llm.backoff_ms", "llm.parse_ms", "llm.accounting_ms",
+    "llm.prompt_tokens", "llm.completion_tokens", "llm.prompt_cache_hit_tokens",
+)
+
+
+def _record_finished(trace_id: str, spans: List[Span]) -> None:
+    rows = [
+        {
+            "trace_id": trace_id,
+            "name": span.name,
+            "end_time": span.end_ns / 1e9,
+            "duration_ms": round(span.duration_ms, 2),
+            "error": span.error,
+            "attributes": span.attributes,
+        }
+        for span in spans
+    ]
+    with _recent_lock:
+        _recent.extend(rows)
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return round(ordered[index], 1)
+
+
+def get_summary(window_seconds: float = 3600, limit: int = 10) -> Dict[str, Any]:
+    """
+    最近 window_seconds 内各阶段的耗时分布（按 p95 降序）与最慢的 limit 个 span
+    """
+    since = time.time() - window_seconds
+    with _recent_lock:
+        rows = [row for row in _recent if row["end_time"] >= since]
+
+    by_stage: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        by_stage.setdefault(row["name"], []).append(row)
+
+    stages = []
+    for name, stage_rows in by_stage.items():
+        durations = sorted(row["duration_ms"] for row in stage_rows)
+        stage = {
+            "stage": name,
+            "count": len(stage_rows),
+            "errors": sum(1 for row in stage_rows if row["error"]),
+            "avg_ms": round(sum(durations) / len(durations), 1),
+            "p50_ms": _percentile(durations, 50),
+            "p95_ms": _percentile(durations, 95),
+            "max_ms": round(durations[-1], 1),
+        }
+        for key in _SUMMED_ATTRIBUTES:
+            values = [row["attributes"].get(key) for row in stage_rows if row["attributes"].get(key) is not None]
+            if values:
+                stage[key] = round(sum(values), 1)
+        stages.append(stage)
+    stages.sort(key=lambda s: s["p95_ms"], reverse=True)
+
+    slowest = sorted(
+        (row for row in rows if row["name"] != "chat.turn"),
+        key=lambda row: row["duration_ms"],
+        reverse=True,
+    )[:limit]
+    return {
+        "enabled": ENABLED,
+        "window_seconds": window_seconds,
+        "turns": len(by_stage.get("chat.turn", [])),
+        "stages": stages,
+        "slowest_spans": [
+            {key: row[key] for key in ("trace_id", "name", "duration_ms", "error", "attributes")}
+            for row in slowest
+        ],
+        "export": {"target": EXPORT_TARGET or None, "queued": _export_queue.qsize(), **_export_stats},
+    }
+
+
+def clear() -> None:
+    """清空内存中的 span（测试 / 调试用）"""
+    with _recent_lock:
+        _recent.clear()
@@ -0,0 +1,97 @@
+"""
+按接口统计 SQL 语句数（压测 / 排查 N+1 用）
+
+- 在 Engine 的 before_cursor_execute 事件里计数，按当前请求的路由标签归类
+- 路由标签 = 请求路径，数字段归一为 {id}（/api/v2/texts/12 -> /api/v2/texts/{id}）
+- 标签放在 contextvar 中：同一请求的 BackgroundTasks（在线程池中执行，会复制 context）
+  也计入该接口；不在请求内执行的语句计入 "(no request)"
+
+默认关闭（每条 SQL 多一次加锁计数）；设置 DB_QUERY_STATS=1 开启。
+"""
+import os
+import re
+from contextvars import ContextVar
+from threading import Lock
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+ENABLED = os.getenv("DB_QUERY_STATS", "0").strip().lower() in ("1", "true", "yes")
+
+# 标签个数上限（防止未归一的路径撑爆字典）
+_MAX_LABELS = 500
+_OTHER_LABEL = "(other)"
+_NO_REQUEST_LABEL = "(no request)"
+_NUMERIC_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+_current_label: ContextVar[Optional[str]] = ContextVar("db_query_stats_label", default=None)
+_stats: Dict[str, Dict[str, int]] = {}
+_stats_lock = Lock()
+
+
+def route_label(method: str, path: str) -> str:
+    return f"{method} {_NUMERIC_SEGMENT.sub('/{id}', path)}"
+
+
+def _bucket_locked(label: str) -> Dict[str, int]:
+    bucket = _stats.get(label)
+    if bucket is None:
+        if len(_stats) >= _MAX_LABELS:
+            label = _OTHER_LABEL
+            bucket = _stats.get(label)
+        if bucket is None:
+            bucket = _stats[label] = {"requests": 0, "queries": 0}
+    return bucket
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany) -> None:
+    label = _current_label.get() or _NO_REQUEST_LABEL
+    with _stats_lock:
+        _bucket_locked(label)["queries"] += 1
+
+
+async def label_requests_middleware(request, call_next):
+    """HTTP 中间件：为本次请求设置路由标签并计数"""
+    label = route_label(request.method, request.url.path)
+    token = _current_label.set(label)
+    with _stats_lock:
+        _bucket_locked(label)["requests"] += 1
+    try:
+        return await call_next(request)
+    finally:
+        _current_label.reset(token)
+
+
+def install(app) -> bool:
+    """开启时注册 SQL 计数事件与请求标签中间件；返回是否已开启"""
+    if not ENABLED:
+        return False
+    if not event.contains(Engine, "before_cursor_execute", _count_query):
+        event.listen(Engine, "before_cursor_execute", _count_query)
+    app.middleware("http")(label_requests_middleware)
+    return True
+
+
+def get_stats() -> Dict[str, Any]:
+    """各接口的请求数、SQL 语句数与平均每请求语句数"""
+    with _stats_lock:
+        routes = {
+            label: {
+                **bucket,
+                "queries_per_request": round(bucket["queries"] / bucket["requests"], 2) if bucket["requests"] else None,
+            }
+            for label, bucket in sorted(_stats.items())
+        }
+    return {
+        "enabled": ENABLED,
+        "total_queries": sum(r["queries"] for r in routes.values()),
+        "routes": routes,
+    }
+
+
+def reset() -> None:
+    """清空统计（压测开始前调用）"""
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,94 @@
+"""
+例句原句批量解析（语法 / 词汇详情接口）
+
+以前详情接口遍历 examples，每个例句单独 query(Sentence) 取原句，
+例句多的知识点打开详情要发几十条 SQL。这里改为一条 SQL：
+examples LEFT JOIN sentences ON (text_id, sentence_id)，
+语法例句的去重（同一 rule + text + sentence 只保留一条）也放在 SQL 里用窗口函数完成。
+
+无论例句多少，详情接口的查询数都是常数。
+"""
+from typing import Any, Dict, List
+
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.orm import Session
+
+from database_system.business_logic.models import GrammarExample, Sentence, VocabExpressionExample
+
+
+def load_grammar_examples(session: Session, rule_id: int) -> List[Dict[str, Any]]:
+    """
+    获取语法规则的例句（含原句），按 (text_id, sentence_id) 去重
+
+    去重规则（兼容历史重复数据）：
+    同一句子有多条例句时，优先保留有 explanation_context 的，其次保留最早的；
+    结果按每组最早出现的顺序排列。
+    """
+    partition = (GrammarExample.text_id, GrammarExample.sentence_id)
+    missing_context = case(
+        (or_(GrammarExample.explanation_context.is_(None), GrammarExample.explanation_context == ""), 1),
+        else_=0,
+    )
+    ranked = (
+        session.query(
+            GrammarExample.example_id.label("example_id"),
+            func.row_number().over(
+                partition_by=partition,
+                order_by=(missing_context, GrammarExample.example_id),
+            ).label("rank"),
+            func.min(GrammarExample.example_id).over(partition_by=partition).label("group_order"),
+        )
+        .filter(GrammarExample.rule_id == rule_id)
+        .subquery()
+    )
+
+    rows = (
+        session.query(GrammarExample, Sentence.sentence_body)
+        .join(ranked, and_(ranked.c.example_id == GrammarExample.example_id, ranked.c.rank == 1))
+        .outerjoin(
+            Sentence,
+            and_(Sentence.text_id == GrammarExample.text_id, Sentence.sentence_id == GrammarExample.sentence_id),
+        )
+        .order_by(ranked.c.group_order)
+        .all()
+    )
+
+    return [
+        {
+            "rule_id": ex.rule_id,
+            "text_id": ex.text_id,
+            "sentence_id": ex.sentence_id,
+            "original_sentence": sentence_body,
+            "explanation_context": ex.explanation_context,
+        }
+        for ex, sentence_body in rows
+    ]
+
+
+def load_vocab_examples(session: Session, vocab_id: int) -> List[Dict[str, Any]]:
+    """获取词汇的例句（含原句），按创建顺序排列"""
+    rows = (
+        session.query(VocabExpressionExample, Sentence.sentence_body)
+        .outerjoin(
+            Sentence,
+            and_(
+                Sentence.text_id == VocabExpressionExample.text_id,
+                Sentence.sentence_id == VocabExpressionExample.sentence_id,
+            ),
+        )
+        .filter(VocabExpressionExample.vocab_id == vocab_id)
+        .order_by(VocabExpressionExample.example_id)
+        .all()
+    )
+
+    return [
+        {
+            "vocab_id": ex.vocab_id,
+            "text_id": ex.text_id,
+            "sentence_id": ex.sentence_id,
+            "original_sentence": sentence_body,
+            "context_explanation": ex.context_explanation,
+            "token_indices": ex.token_indices,
+        }
+        for ex, sentence_body in rows
+    ]
@@ -0,0 +1,646 @@
+"""
+词汇 / 语法规则 / 文章的全文检索索引（search_documents）
+
+背景：
+- /api/v2/{vocab,grammar,texts}/search/ 用 LIKE '%keyword%' 扫描 vocab_body / explanation、
+  rule_name / rule_summary、text_title，用不上索引，库越大越慢；结果也没有排序和分页
+
+做法：
+- 一张索引表 search_documents，每个词汇 / 语法规则 / 文章一行（title_terms + body_terms）：
+  - SQLite：FTS5 虚表，rowid = entity_id * 4 + 类型码，scope 列 = "vocab12" 这类「类型+用户」标记，
+    查询用 MATCH + bm25 排序（标题权重 10，正文 1）
+  - PostgreSQL：普通表 + tsvector 列（GIN 索引，标题权重 A / 正文 B，ts_rank_cd 排序），
+    另对规范化后的标题建 pg_trgm GIN 索引，保留标题的子串匹配（LIKE '%kw%'）
+- 分词在 Python 里做（两种数据库结果一致，不依赖数据库的分词配置 / locale）：
+  - NFKC + 小写；拉丁等有空格的语言按词切分并去掉变音符号，查询时按前缀匹配（"nehm" 命中 "nehmen"）
+  - 中日韩连续字符切成二元组（bigram）+ 单字；查询两个字以上按二元组短语匹配，单字按单字匹配
+- 同步：
+  - ORM 写入（路由、各 Manager、MainAssistant）由 Session 的 after_flush 事件收集受影响的条目，
+    commit 前在同一事务里重建这些条目的索引行；回滚时丢弃
+  - 绕过 ORM 的批量 INSERT（knowledge_upsert）调用 mark_changed 登记
+  - 文章的正文 = 句子拼接（截断到 FULLTEXT_SEARCH_MAX_BODY_CHARS），增删改句子时重建所属文章
+- 查询结果回表过滤（条目被删除 / 不属于当前用户的索引行不会返回）
+- 索引表不存在（尚未执行迁移）、SQLite 不支持 FTS5 或查询出错时，自动退回 LIKE 查询
+
+需要先执行迁移（建表 + 回填）: python migrate_add_search_index.py
+
+环境变量：
+- FULLTEXT_SEARCH_ENABLED: 是否启用（默认 1；关闭后只用 LIKE，也不再维护索引）
+- FULLTEXT_SEARCH_MAX_BODY_CHARS: 文章正文最多索引多少字符，默认 8000
+- FULLTEXT_SEARCH_AVAILABILITY_TTL_SECONDS: 索引表是否存在的检查结果缓存时间，默认 60 秒
+"""
+import os
+import re
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import bindparam, event, inspect, select, text
+from sqlalchemy.orm import Session
+
+from backend.utils.structured_logging import get_logger
+from database_system.business_logic.models import GrammarRule, OriginalText, Sentence, VocabExpression
+
+logger = get_logger("fulltext_search")
+
+ENABLED = os.getenv("FULLTEXT_SEARCH_ENABLED", "1").strip().lower() not in ("0", "false", "no", "off")
+MAX_BODY_CHARS = int(os.getenv("FULLTEXT_SEARCH_MAX_BODY_CHARS", "8000"))
+AVAILABILITY_TTL_SECONDS = float(os.getenv("FULLTEXT_SEARCH_AVAILABILITY_TTL_SECONDS", "60"))
+
+TABLE = "search_documents"
+
+ENTITY_VOCAB = "vocab"
+ENTITY_GRAMMAR = "grammar"
+ENTITY_TEXT = "text"
+ENTITY_TYPES = (ENTITY_VOCAB, ENTITY_GRAMMAR, ENTITY_TEXT)
+
+MODE_FULLTEXT = "fulltext"
+MODE_LIKE = "like"
+
+# SQLite rowid = entity_id * 4 + 类型码
+_TYPE_CODES = {ENTITY_VOCAB: 1, ENTITY_GRAMMAR: 2, ENTITY_TEXT: 3}
+# 类型 -> (ORM 模型, 主键列名)
+_ENTITIES = {
+    ENTITY_VOCAB: (VocabExpression, "vocab_id"),
+    ENTITY_GRAMMAR: (GrammarRule, "rule_id"),
+    ENTITY_TEXT: (OriginalText, "text_id"),
+}
+# 影响索引内容的字段：dirty 对象只有这些字段变化时才重建
+_INDEXED_FIELDS = {
+    VocabExpression: ("vocab_body", "explanation", "user_id"),
+    GrammarRule: ("rule_name", "display_name", "rule_summary", "user_id"),
+    OriginalText: ("text_title", "user_id"),
+    Sentence: ("sentence_body", "text_id"),
+}
+
+# 查询最多取多少个词（避免超长关键词生成巨大的查询）
+_MAX_QUERY_TERMS = 16
+# PostgreSQL tsvector 的位置上限 / 每个词最多记录的位置数
+_PG_MAX_POSITION = 16383
+_PG_MAX_POSITIONS_PER_TERM = 255
+
+# session.info 中登记"本事务需要重建哪些索引行"的键
+_SESSION_INFO_KEY = "fulltext_search_pending"
+
+# 平假名 / 片假名、CJK 扩展 A、CJK 统一汉字、兼容汉字、韩文音节
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_CJK_RE = re.compile(f"[{_CJK}]")
+_SEGMENT_RE = re.compile(f"[{_CJK}]+|[^\\W_{_CJK}]+")
+
+_lock = Lock()
+# 数据库 URL -> (索引表是否可用, 检查时间)
+_availability: Dict[str, Tuple[bool, float]] = {}
+_stats = {
+    "indexed": 0,
+    "removed": 0,
+    "index_failures": 0,
+    "fulltext_searches": 0,
+    "like_searches": 0,
+    "search_failures": 0,
+    "rebuilds": 0,
+}
+
+
+@dataclass
+class SearchResult:
+    ids: List[int] = field(default_factory=list)  # 当前页的主键（按相关度排序）
+    total: int = 0
+    mode: str = MODE_FULLTEXT  # fulltext / like
+
+
+# ==================== 分词 ====================
+
+def _fold(word: str) -> str:
+    """去掉变音符号（für -> fur），查询与索引一致处理"""
+    decomposed = unicodedata.normalize("NFKD", word)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def _segments(value: Optional[str]) -> Iterable[Tuple[bool, str]]:
+    """切成 (是否中日韩, 片段)：中日韩连续字符为一段，其余按词"""
+    normalized = unicodedata.normalize("NFKC", value or "").lower()
+    for match in _SEGMENT_RE.finditer(normalized):
+        segment = match.group(0)
+        if _CJK_RE.match(segment):
+            yield True, segment
+        else:
+            folded = _fold(segment)
+            if folded:
+                yield False, folded
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """索引用分词：词 / 中日韩二元组（按顺序，供短语匹配）+ 单字"""
+    terms: List[str] = []
+    for is_cjk, segment in _segments(value):
+        if not is_cjk:
+            terms.append(segment)
+            continue
+        terms.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+        terms.extend(segment)
+    return terms
+
+
+def query_terms(keyword: Optional[str]) -> List[Tuple[str, Tuple[str, ...]]]:
+    """
+    查询用分词：[(kind, terms)]，各项之间为 AND
+    - ("prefix", (word,)): 拉丁等语言的词，前缀匹配
+    - ("term", (char,)): 单个中日韩字符
+    - ("phrase", (bigram, ...)): 两个字以上的中日韩片段，二元组按顺序相邻
+    """
+    result: List[Tuple[str, Tuple[str, ...]]] = []
+    seen = set()
+    for is_cjk, segment in _segments(keyword):
+        if not is_cjk:
+            item = ("prefix", (segment,))
+        elif len(segment) == 1:
+            item = ("term", (segment,))
+        else:
+            item = ("phrase", tuple(segment[i:i + 2] for i in range(len(segment) - 1)))
+        if item not in seen:
+            seen.add(item)
+            result.append(item)
+        if len(result) >= _MAX_QUERY_TERMS:
+            break
+    return result
+
+
+def _normalize_title(value: Optional[str]) -> str:
+    """PostgreSQL 标题子串匹配用：NFKC + 小写 + 去变音符号"""
+    return _fold(unicodedata.normalize("NFKC", value or "").lower())
+
+
+def _fts5_query(scope: str, terms: List[Tuple[str, Tuple[str, ...]]]) -> str:
+    parts = []
+    for kind, values in terms:
+        if kind == "prefix":
+            parts.append(f'"{values[0]}"*')
+        else:
+            parts.append('"' + " ".join(values) + '"')
+    return f'scope : "{scope}" AND {{title_terms body_terms}} : ({" AND ".join(parts)})'
+
+
+def _tsquery(terms: List[Tuple[str, Tuple[str, ...]]]) -> str:
+    def quote(value: str) -> str:
+        return "'" + value.replace("'", "''") + "'"
+
+    parts = []
+    for kind, values in terms:
+        if kind == "prefix":
+            parts.append(f"{quote(values[0])}:*")
+        elif kind == "term":
+            parts.append(quote(values[0]))
+        else:
+            parts.append("(" + " <-> ".join(quote(v) for v in values) + ")")
+    return " & ".join(parts)
+
+
+def _tsvector(title_terms: Sequence[str], body_terms: Sequence[str]) -> str:
+    """直接构造 tsvector 字面量（绕过数据库分词）：标题权重 A，正文权重 B"""
+    positions: Dict[str, List[str]] = {}
+    position = 0
+    for weight, terms in (("A", title_terms), ("B", body_terms)):
+        for term in terms:
+            position += 1
+            entries = positions.setdefault(term, [])
+            if len(entries) < _PG_MAX_POSITIONS_PER_TERM:
+                entries.append(f"{min(position, _PG_MAX_POSITION)}{weight}")
+        # 标题与正文之间留一个空位，短语不跨越两者
+        position += 1
+    return " ".join(
+        "'" + term.replace("'", "''") + "':" + ",".join(entries)
+        for term, entries in positions.items()
+    )
+
+
+def _scope(entity_type: str, user_id: int) -> str:
+    return f"{entity_type}{user_id}"
+
+
+# ==================== 建表 / 可用性 ====================
+
+def ensure_schema(engine) -> bool:
+    """创建索引表（可重复执行）；数据库不支持时返回 False"""
+    dialect = engine.dialect.name
+    try:
+        if dialect == "sqlite":
+            with engine.begin() as connection:
+                connection.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+                    "scope, title_terms, body_terms, tokenize='unicode61 remove_diacritics 2')"
+                ))
+        elif dialect == "postgresql":
+            with engine.begin() as connection:
+                connection.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+                    "entity_type VARCHAR(16) NOT NULL, "
+                    "entity_id INTEGER NOT NULL, "
+                    "user_id INTEGER NOT NULL, "
+                    "title_text TEXT NOT NULL DEFAULT '', "
+                    "tsv TSVECTOR NOT NULL, "
+                    "updated_at TIMESTAMP NOT NULL DEFAULT now(), "
+                    "PRIMARY KEY (entity_type, entity_id))"
+                ))
+                connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{TABLE}_tsv ON {TABLE} USING GIN (tsv)"))
+                connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{TABLE}_user_type ON {TABLE} (user_id, entity_type)"))
+            try:
+                with engine.begin() as connection:
+                    connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                    connection.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS ix_{TABLE}_title_trgm ON {TABLE} USING GIN (title_text gin_trgm_ops)"
+                    ))
+            except Exception as e:
+                # 没有建扩展的权限时，标题子串匹配只是走不了 trigram 索引
+                logger.warning("⚠️ [FulltextSearch] pg_trgm 不可用，标题子串匹配不走索引: %s", e)
+        else:
+            logger.warning("⚠️ [FulltextSearch] 不支持的数据库: %s", dialect)
+            return False
+    except Exception as e:
+        logger.warning("⚠️ [FulltextSearch] 创建索引表失败: %s", e)
+        return False
+    with _lock:
+        _availability.pop(str(engine.url), None)
+    return True
+
+
+def is_available(session: Session) -> bool:
+    """索引表是否存在（按数据库缓存 FULLTEXT_SEARCH_AVAILABILITY_TTL_SECONDS 秒）"""
+    if not ENABLED:
+        return False
+    bind = session.get_bind()
+    if bind.dialect.name not in ("sqlite", "postgresql"):
+        return False
+    key = str(bind.engine.url) if hasattr(bind, "engine") else str(bind.url)
+    now = time.monotonic()
+    with _lock:
+        cached = _availability.get(key)
+        if cached is not None and now - cached[1] < AVAILABILITY_TTL_SECONDS:
+            return cached[0]
+    try:
+        available = inspect(session.connection()).has_table(TABLE)
+    except Exception as e:
+        logger.warning("⚠️ [FulltextSearch] 检查索引表失败: %s", e)
+        available = False
+    with _lock:
+        _availability[key] = (available, now)
+    return available
+
+
+# ==================== 写索引 ====================
+
+def _load_documents(connection, entity_type: str, ids: Sequence[int]) -> Dict[int, Tuple[int, str, str]]:
+    """读取条目的 (user_id, 标题, 正文)；不存在的 id 不在结果里"""
+    if entity_type == ENTITY_VOCAB:
+        rows = connection.execute(
+            select(VocabExpression.vocab_id, VocabExpression.user_id, VocabExpression.vocab_body, VocabExpression.explanation)
+            .where(VocabExpression.vocab_id.in_(ids))
+        )
+        return {row[0]: (row[1], row[2] or "", row[3] or "") for row in rows}
+
+    if entity_type == ENTITY_GRAMMAR:
+        rows = connection.execute(
+            select(GrammarRule.rule_id, GrammarRule.user_id, GrammarRule.rule_name, GrammarRule.display_name, GrammarRule.rule_summary)
+            .where(GrammarRule.rule_id.in_(ids))
+        )
+        documents = {}
+        for rule_id, user_id, rule_name, display_name, rule_summary in rows:
+            title = rule_name or ""
+            if display_name and display_name != rule_name:
+                title = f"{title} {display_name}"
+            documents[rule_id] = (user_id, title, rule_summary or "")
+        return documents
+
+    rows = connection.execute(
+        select(OriginalText.text_id, OriginalText.user_id, OriginalText.text_title).where(OriginalText.text_id.in_(ids))
+    )
+    titles = {row[0]: (row[1], row[2] or "") for row in rows}
+    bodies: Dict[int, List[str]] = {text_id: [] for text_id in titles}
+    lengths: Dict[int, int] = {text_id: 0 for text_id in titles}
+    if titles:
+        sentences = connection.execute(
+            select(Sentence.text_id, Sentence.sentence_body)
+            .where(Sentence.text_id.in_(list(titles)))
+            .order_by(Sentence.text_id, Sentence.sentence_id)
+        )
+        for text_id, body in sentences:
+            if not body or lengths[text_id] >= MAX_BODY_CHARS:
+                continue
+            body = body[:MAX_BODY_CHARS - lengths[text_id]]
+            bodies[text_id].append(body)
+            lengths[text_id] += len(body) + 1
+    return {text_id: (user_id, title, " ".join(bodies[text_id])) for text_id, (user_id, title) in titles.items()}
+
+
+def _write_documents(connection, entity_type: str, ids: Sequence[int]) -> Tuple[int, int]:
+    """重建一批条目的索引行（先删后插）；返回 (写入数, 删除的不存在条目数)"""
+    ids = sorted(set(ids))
+    documents = _load_documents(connection, entity_type, ids)
+    code = _TYPE_CODES[entity_type]
+    if connection.dialect.name == "sqlite":
+        connection.execute(
+            text(f"DELETE FROM {TABLE} WHERE rowid IN :rowids").bindparams(bindparam("rowids", expanding=True)),
+            {"rowids": [entity_id * 4 + code for entity_id in ids]},
+        )
+        rows = [
+            {
+                "rowid": entity_id * 4 + code,
+                "scope": _scope(entity_type, user_id),
+                "title_terms": " ".join(tokenize(title)),
+                "body_terms": " ".join(tokenize(body)),
+            }
+            for entity_id, (user_id, title, body) in documents.items()
+        ]
+        if rows:
+            connection.execute(
+                text(f"INSERT INTO {TABLE} (rowid, scope, title_terms, body_terms) VALUES (:rowid, :scope, :title_terms, :body_terms)"),
+                rows,
+            )
+    else:
+        connection.execute(
+            text(f"DELETE FROM {TABLE} WHERE entity_type = :entity_type AND entity_id IN :ids").bindparams(
+                bindparam("ids", expanding=True)
+            ),
+            {"entity_type": entity_type, "ids": ids},
+        )
+        rows = [
+            {
+                "entity_type": entity_type,
+                "entity_id": entity_id,
+                "user_id": user_id,
+                "title_text": _normalize_title(title),
+                "tsv": _tsvector(tokenize(title), tokenize(body)),
+            }
+            for entity_id, (user_id, title, body) in documents.items()
+        ]
+        if rows:
+            connection.execute(
+                text(
+                    f"INSERT INTO {TABLE} (entity_type, entity_id, user_id, title_text, tsv) "
+                    "VALUES (:entity_type, :entity_id, :user_id, :title_text, CAST(:tsv AS tsvector))"
+                ),
+                rows,
+            )
+    return len(documents), len(ids) - len(documents)
+
+
+def index_entities(session: Session, entity_type: str, ids: Iterable[int]) -> None:
+    """立即重建这些条目的索引行（在当前事务里，不提交）"""
+    ids = [entity_id for entity_id in set(ids) if entity_id is not None]
+    if not ids or not is_available(session):
+        return
+    written, removed = _write_documents(session.connection(), entity_type, ids)
+    with _lock:
+        _stats["indexed"] += written
+        _stats["removed"] += removed
+
+
+def mark_changed(session: Session, entity_type: str, ids: Iterable[int]) -> None:
+    """登记本事务改动了这些条目（commit 前重建索引；用于绕过 ORM 的批量写入）"""
+    pending: Set[Tuple[str, int]] = session.info.setdefault(_SESSION_INFO_KEY, set())
+    pending.update((entity_type, entity_id) for entity_id in ids if entity_id is not None)
+
+
+# ==================== Session 事件：自动收集 ORM 写入 ====================
+
+def _fields_changed(obj, fields: Sequence[str]) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in fields)
+
+
+def _collect_changes(session: Session, flush_context) -> None:
+    if not ENABLED:
+        return
+    pending: Set[Tuple[str, int]] = set()
+    deleted = set(session.deleted)
+    for obj in list(session.new) + list(session.dirty) + list(deleted):
+        fields = _INDEXED_FIELDS.get(type(obj))
+        if fields is None:
+            continue
+        if obj not in deleted and obj not in session.new and not _fields_changed(obj, fields):
+            continue
+        if isinstance(obj, VocabExpression):
+            pending.add((ENTITY_VOCAB, obj.vocab_id))
+        elif isinstance(obj, GrammarRule):
+            pending.add((ENTITY_GRAMMAR, obj.rule_id))
+        elif isinstance(obj, OriginalText):
+            pending.add((ENTITY_TEXT, obj.text_id))
+        elif isinstance(obj, Sentence):
+            pending.add((ENTITY_TEXT, obj.text_id))
+    pending = {(entity_type, entity_id) for entity_type, entity_id in pending if entity_id is not None}
+    if pending:
+        session.info.setdefault(_SESSION_INFO_KEY, set()).update(pending)
+
+
+def _apply_changes(session: Session) -> None:
+    """commit 前：把本事务登记的条目在同一事务里重建索引；失败只记日志，不影响业务数据提交"""
+    if not ENABLED:
+        return
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+    pending = session.info.pop(_SESSION_INFO_KEY, None)
+    if not pending or not is_available(session):
+        return
+    by_type: Dict[str, List[int]] = {}
+    for entity_type, entity_id in pending:
+        by_type.setdefault(entity_type, []).append(entity_id)
+
+    connection = session.connection()
+    # PostgreSQL 上语句出错会让整个事务失效：用 SAVEPOINT 隔离索引写入
+    savepoint = connection.begin_nested() if connection.dialect.name == "postgresql" else None
+    try:
+        written = removed = 0
+        for entity_type, ids in by_type.items():
+            w, r = _write_documents(connection, entity_type, ids)
+            written += w
+            removed += r
+        if savepoint is not None:
+            savepoint.commit()
+    except Exception as e:
+        if savepoint is not None:
+            savepoint.rollback()
+        logger.warning("⚠️ [FulltextSearch] 更新索引失败（可执行 migrate_add_search_index.py 重建）: %s", e)
+        with _lock:
+            _stats["index_failures"] += 1
+        return
+    with _lock:
+        _stats["indexed"] += written
+        _stats["removed"] += removed
+
+
+def _discard_changes(session: Session, previous_transaction) -> None:
+    # 只在最外层事务回滚时丢弃（SAVEPOINT 回滚不影响外层已登记的改动）
+    if not previous_transaction.nested:
+        session.info.pop(_SESSION_INFO_KEY, None)
+
+
+event.listen(Session, "after_flush", _collect_changes)
+event.listen(Session, "before_commit", _apply_changes)
+event.listen(Session, "after_soft_rollback", _discard_changes)
+
+
+# ==================== 查询 ====================
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _fulltext_search(session: Session, entity_type: str, user_id: int, keyword: str, terms, skip: int, limit: int) -> SearchResult:
+    model, pk = _ENTITIES[entity_type]
+    table = model.__table__.name
+    if session.get_bind().dialect.name == "sqlite":
+        params = {
+            "query": _fts5_query(_scope(entity_type, user_id), terms),
+            "code": _TYPE_CODES[entity_type],
+            "user_id": user_id,
+        }
+        base = (
+            f"FROM {TABLE} JOIN {table} e ON e.{pk} = ({TABLE}.rowid >> 2) "
+            f"WHERE {TABLE} MATCH :query AND ({TABLE}.rowid & 3) = :code AND e.user_id = :user_id"
+        )
+        total = session.execute(text(f"SELECT count(*) {base}"), params).scalar() or 0
+        rows = session.execute(
+            text(f"SELECT e.{pk} {base} ORDER BY bm25({TABLE}, 0.0, 10.0, 1.0), {TABLE}.rowid DESC LIMIT :limit OFFSET :skip"),
+            {**params, "limit": limit, "skip": skip},
+        )
+    else:
+        title = _normalize_title(keyword)
+        params = {
+            "entity_type": entity_type,
+            "user_id": user_id,
+            "query": _tsquery(terms),
+            "pattern": f"%{_escape_like(title)}%",
+            "exact": title,
+        }
+        base = (
+            f"FROM {TABLE} d JOIN {table} e ON e.{pk} = d.entity_id "
+            "WHERE d.entity_type = :entity_type AND d.user_id = :user_id AND e.user_id = :user_id "
+            "AND (d.tsv @@ CAST(:query AS tsquery) OR d.title_text LIKE :pattern)"
+        )
+        total = session.execute(text(f"SELECT count(*) {base}"), params).scalar() or 0
+        rows = session.execute(
+            text(
+                f"SELECT e.{pk} {base} ORDER BY (d.title_text = :exact) DESC, "
+                "ts_rank_cd(d.tsv, CAST(:query AS tsquery)) DESC, d.entity_id DESC LIMIT :limit OFFSET :skip"
+            ),
+            {**params, "limit": limit, "skip": skip},
+        )
+    return SearchResult(ids=[row[0] for row in rows], total=int(total), mode=MODE_FULLTEXT)
+
+
+def _like_search(session: Session, entity_type: str, user_id: int, keyword: str, skip: int, limit: int) -> SearchResult:
+    """兜底：与原接口相同的 LIKE 匹配（词汇 / 语法查名称和解释，文章只查标题），按 id 倒序分页"""
+    pattern = f"%{keyword}%"
+    if entity_type == ENTITY_VOCAB:
+        pk = VocabExpression.vocab_id
+        query = session.query(pk).filter(
+            VocabExpression.user_id == user_id,
+            VocabExpression.vocab_body.like(pattern) | VocabExpression.explanation.like(pattern),
+        )
+    elif entity_type == ENTITY_GRAMMAR:
+        pk = GrammarRule.rule_id
+        query = session.query(pk).filter(
+            GrammarRule.user_id == user_id,
+            GrammarRule.rule_name.like(pattern) | GrammarRule.rule_summary.like(pattern),
+        )
+    else:
+        pk = OriginalText.text_id
+        query = session.query(pk).filter(OriginalText.user_id == user_id, OriginalText.text_title.like(pattern))
+    total = query.order_by(None).count()
+    ids = [row[0] for row in query.order_by(pk.desc()).offset(skip).limit(limit).all()]
+    return SearchResult(ids=ids, total=total, mode=MODE_LIKE)
+
+
+def search(session: Session, entity_type: str, user_id: int, keyword: str, skip: int = 0, limit: int = 50) -> SearchResult:
+    """
+    搜索当前用户的词汇 / 语法规则 / 文章，返回当前页的主键（按相关度排序）与总数。
+    索引不可用、关键词切不出词（如纯标点）或查询出错时退回 LIKE。
+    """
+    if entity_type not in _ENTITIES:
+        raise ValueError(f"unknown entity type: {entity_type}")
+    keyword = (keyword or "").strip()
+    terms = query_terms(keyword)
+    if terms and is_available(session):
+        try:
+            result = _fulltext_search(session, entity_type, user_id, keyword, terms, skip, limit)
+            with _lock:
+                _stats["fulltext_searches"] += 1
+            return result
+        except Exception as e:
+            logger.warning("⚠️ [FulltextSearch] 全文检索失败，退回 LIKE: %s", e)
+            session.rollback()
+            with _lock:
+                _stats["search_failures"] += 1
+    with _lock:
+        _stats["like_searches"] += 1
+    return _like_search(session, entity_type, user_id, keyword, skip, limit)
+
+
+def fetch_ordered(session: Session, entity_type: str, ids: Sequence[int]) -> list:
+    """按 ids 的顺序取回 ORM 对象（一次查询）"""
+    if not ids:
+        return []
+    model, pk = _ENTITIES[entity_type]
+    column = getattr(model, pk)
+    by_id = {getattr(obj, pk): obj for obj in session.query(model).filter(column.in_(ids)).all()}
+    return [by_id[entity_id] for entity_id in ids if entity_id in by_id]
+
+
+# ==================== 重建 / 统计 ====================
+
+def rebuild(session: Session, user_id: Optional[int] = None, batch_size: int = 500) -> Dict[str, int]:
+    """
+    重建索引（全部或某个用户），每种类型处理完提交一次；返回各类型写入的条目数。
+    调用前需 ensure_schema 建表。
+    """
+    counts: Dict[str, int] = {}
+    connection = session.connection()
+    sqlite = connection.dialect.name == "sqlite"
+    for entity_type, (model, pk) in _ENTITIES.items():
+        # 先清掉旧行（含已删除条目的残留）
+        if user_id is None:
+            if sqlite:
+                session.execute(text(f"DELETE FROM {TABLE} WHERE (rowid & 3) = :code"), {"code": _TYPE_CODES[entity_type]})
+            else:
+                session.execute(text(f"DELETE FROM {TABLE} WHERE entity_type = :entity_type"), {"entity_type": entity_type})
+        elif sqlite:
+            session.execute(
+                text(f"DELETE FROM {TABLE} WHERE rowid IN (SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH :query)"),
+                {"query": f'scope : "{_scope(entity_type, user_id)}"'},
+            )
+        else:
+            session.execute(
+                text(f"DELETE FROM {TABLE} WHERE entity_type = :entity_type AND user_id = :user_id"),
+                {"entity_type": entity_type, "user_id": user_id},
+            )
+
+        column = getattr(model, pk)
+        written = 0
+        last_id = 0
+        while True:
+            query = session.query(column).filter(column > last_id)
+            if user_id is not None:
+                query = query.filter(model.user_id == user_id)
+            ids = [row[0] for row in query.order_by(column).limit(batch_size).all()]
+            if not ids:
+                break
+            w, _ = _write_documents(session.connection(), entity_type, ids)
+            written += w
+            last_id = ids[-1]
+        session.commit()
+        counts[entity_type] = written
+    with _lock:
+        _stats["rebuilds"] += 1
+        _stats["indexed"] += sum(counts.values())
+    return counts
+
+
+def get_stats() -> Dict[str, Any]:
+    """索引维护与查询统计：写入 / 清除的行数、失败次数、全文检索与 LIKE 兜底次数"""
+    with _lock:
+        return {
+            "enabled": ENABLED,
+            "available": {url: state for url, (state, _) in _availability.items()},
+            **_stats,
+        }
@@ -0,0 +1,209 @@
+"""
+知识点推送服务（outbox + SSE 唤醒）
+
+背景：
+- /api/chat 的后台流程（_run_grammar_vocab_background）在 add_new_to_data 完成后
+  产出本轮新增/已有的 grammar、vocab，前端需要弹出 toast
+- 以前结果放在进程内 dict 里由前端轮询，重启丢失、多 worker 之间不可见
+
+做法：
+- 结果写入 knowledge_events 表（outbox），写入即持久化
+- 同进程内的 SSE 订阅者通过 asyncio.Event 立即唤醒；
+  其他 worker 的订阅者在心跳周期内重新查库兜底
+- 送达语义为至少一次：前端确认（ack / Last-Event-ID）后才标记 delivered_at，
+  前端需要按事件 id 去重
+
+内存上限：
+- 每个用户最多保留 MAX_SUBSCRIBERS_PER_USER 个订阅者，超出时淘汰最早的连接
+- 订阅者只持有一个 Event，不缓存事件内容（内容始终从表里读）
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from database_system.business_logic.models import KnowledgeEvent
+
+
+KNOWLEDGE_EVENT_TYPE = "knowledge_points"
+MAX_SUBSCRIBERS_PER_USER = int(os.getenv("KNOWLEDGE_EVENTS_MAX_SUBSCRIBERS", "4"))
+FETCH_BATCH_SIZE = 50
+# 已送达的事件保留 1 天，未送达的事件保留 3 天（用户可能隔天才回来）
+DELIVERED_RETENTION = timedelta(days=1)
+UNDELIVERED_RETENTION = timedelta(days=3)
+# 每写入多少条事件顺带清理一次过期记录
+PURGE_EVERY_N_PUBLISHES = 200
+
+
+class _Subscriber:
+    """一个 SSE 连接：所属事件循环 + 唤醒信号"""
+
+    __slots__ = ("loop", "wakeup", "evicted")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.wakeup = asyncio.Event()
+        self.evicted = False
+
+
+# user_id -> 订阅者列表（按连接先后排序）
+_subscribers: Dict[int, List[_Subscriber]] = {}
+_subscribers_lock = Lock()
+_publish_counter = 0
+
+
+def subscribe(user_id: int) -> _Subscriber:
+    """
+    注册一个订阅者（需在事件循环内调用）
+
+    超过 MAX_SUBSCRIBERS_PER_USER 时淘汰最早的连接（被淘汰的连接会收到唤醒并退出）
+    """
+    subscriber = _Subscriber(asyncio.get_running_loop())
+    evicted: List[_Subscriber] = []
+    with _subscribers_lock:
+        subscribers = _subscribers.setdefault(user_id, [])
+        subscribers.append(subscriber)
+        while len(subscribers) > MAX_SUBSCRIBERS_PER_USER:
+            evicted.append(subscribers.pop(0))
+    for old in evicted:
+        old.evicted = True
+        _wake(old)
+    return subscriber
+
+
+def unsubscribe(user_id: int, subscriber: _Subscriber) -> None:
+    """注销订阅者（连接断开时调用）"""
+    with _subscribers_lock:
+        subscribers = _subscribers.get(user_id)
+        if not subscribers:
+            return
+        if subscriber in subscribers:
+            subscribers.remove(subscriber)
+        if not subscribers:
+            del _subscribers[user_id]
+
+
+def _wake(subscriber: _Subscriber) -> None:
+    """线程安全地唤醒订阅者（发布方通常在后台线程）"""
+    try:
+        subscriber.loop.call_soon_threadsafe(subscriber.wakeup.set)
+    except RuntimeError:
+        # 事件循环已关闭，连接也已失效
+        pass
+
+
+def notify_user(user_id: int) -> None:
+    """唤醒某个用户在本进程内的所有订阅者"""
+    with _subscribers_lock:
+        subscribers = list(_subscribers.get(user_id, ()))
+    for subscriber in subscribers:
+        _wake(subscriber)
+
+
+def publish_knowledge_event(
+    session: Session,
+    user_id: int,
+    text_id: Optional[int],
+    payload: Dict[str, Any],
+    event_type: str = KNOWLEDGE_EVENT_TYPE,
+) -> int:
+    """
+    写入一条事件并提交，然后唤醒订阅者
+
+    Returns:
+        int: 事件 id（即 SSE 的 event id）
+    """
+    global _publish_counter
+
+    event = KnowledgeEvent(
+        user_id=user_id,
+        text_id=text_id,
+        event_type=event_type,
+        payload=payload,
+    )
+    session.add(event)
+    session.commit()
+
+    with _subscribers_lock:
+        _publish_counter += 1
+        should_purge = _publish_counter % PURGE_EVERY_N_PUBLISHES == 0
+    if should_purge:
+        try:
+            purge_expired_events(session)
+        except Exception as e:
+            session.rollback()
+            print(f"⚠️ [KnowledgeEvents] 清理过期事件失败: {e}")
+
+    notify_user(user_id)
+    return event.id
+
+
+def fetch_pending_events(
+    session: Session,
+    user_id: int,
+    after_id: int = 0,
+    text_id: Optional[int] = None,
+    limit: int = FETCH_BATCH_SIZE,
+) -> List[KnowledgeEvent]:
+    """查询未确认送达、且 id 大于 after_id 的事件（按 id 升序）"""
+    query = session.query(KnowledgeEvent).filter(
+        KnowledgeEvent.user_id == user_id,
+        KnowledgeEvent.id > after_id,
+        KnowledgeEvent.delivered_at.is_(None),
+    )
+    if text_id is not None:
+        query = query.filter(KnowledgeEvent.text_id == text_id)
+    return query.order_by(KnowledgeEvent.id.asc()).limit(limit).all()
+
+
+def ack_events(session: Session, user_id: int, up_to_id: int, text_id: Optional[int] = None) -> int:
+    """
+    确认送达：把 id <= up_to_id 的未送达事件标记为已送达
+
+    Returns:
+        int: 本次标记的行数
+    """
+    if not up_to_id or up_to_id <= 0:
+        return 0
+    query = session.query(KnowledgeEvent).filter(
+        KnowledgeEvent.user_id == user_id,
+        KnowledgeEvent.id <= up_to_id,
+        KnowledgeEvent.delivered_at.is_(None),
+    )
+    if text_id is not None:
+        query = query.filter(KnowledgeEvent.text_id == text_id)
+    updated = query.update({KnowledgeEvent.delivered_at: datetime.now()}, synchronize_session=False)
+    session.commit()
+    return updated
+
+
+def purge_expired_events(session: Session) -> int:
+    """删除过期事件（已送达超过 1 天 / 未送达超过 3 天）"""
+    now = datetime.now()
+    deleted = session.query(KnowledgeEvent).filter(
+        KnowledgeEvent.delivered_at.isnot(None),
+        KnowledgeEvent.delivered_at < now - DELIVERED_RETENTION,
+    ).delete(synchronize_session=False)
+    deleted += session.query(KnowledgeEvent).filter(
+        KnowledgeEvent.delivered_at.is_(None),
+        KnowledgeEvent.created_at < now - UNDELIVERED_RETENTION,
+    ).delete(synchronize_session=False)
+    session.commit()
+    if deleted:
+        print(f"🧹 [KnowledgeEvents] 清理过期事件: {deleted} 条")
+    return deleted
+
+
+def serialize_event(event: KnowledgeEvent) -> Dict[str, Any]:
+    """事件 -> 前端消费的数据结构（与 /api/chat/pending-knowledge 的 data 字段一致）"""
+    payload = event.payload or {}
+    return {
+        "event_id": event.id,
+        "text_id": event.text_id,
+        "grammar_to_add": payload.get("grammar_to_add", []),
+        "vocab_to_add": payload.get("vocab_to_add", []),
+        "timestamp": payload.get("timestamp") or (event.created_at.isoformat() if event.created_at else None),
+    }
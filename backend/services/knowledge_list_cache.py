@@ -0,0 +1,236 @@
+"""
+词汇 / 语法列表接口的序列化结果缓存（按用户版本号失效）
+
+背景：
+- word-demo / grammar-demo 页面频繁重新请求 GET /api/v2/vocab/ 和 /api/v2/grammar/，
+  每次都重新查询并把 ORM 对象逐个拼成 dict 再序列化，数据却很少变化
+
+做法：
+- 缓存键 = (kind, user_id, 版本号, language, learn_status, starred_only, text_id, skip, limit)，
+  值为编码好的 JSON 字节，命中时直接返回，不查库也不重新序列化
+- 每个 (user_id, kind) 一个版本号：该用户的词汇 / 语法规则 / 例句发生增删改时 +1，
+  旧版本的条目立即从缓存中移除
+- 版本号在 commit 之后才增加：
+  - ORM 写入（路由、各 Manager、MainAssistant）由 Session 的 before_flush 事件收集受影响的用户
+  - 绕过 ORM 的批量 INSERT（knowledge_upsert）调用 mark_changed 登记
+  - 回滚时丢弃收集到的用户，不误伤缓存
+- commit 后同样通知通过 add_change_listener 注册的其他按用户缓存（如 user_data_controllers 的分区）
+- 查询开始前记下版本号，写入缓存时版本已变化则不缓存，避免把旧数据放进新版本
+- 内存上限：按总字节数做 LRU 淘汰；另有 TTL 兜底（多 worker 部署时其他进程的写入不会通知本进程）
+
+环境变量：
+- KNOWLEDGE_LIST_CACHE_MAX_BYTES: 缓存总字节上限，默认 32MB
+- KNOWLEDGE_LIST_CACHE_TTL_SECONDS: 单条缓存最长存活时间（秒），默认 60
+"""
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from database_system.business_logic.models import (
+    GrammarExample,
+    GrammarRule,
+    OriginalText,
+    VocabExpression,
+    VocabExpressionExample,
+)
+
+
+KIND_VOCAB = "vocab"
+KIND_GRAMMAR = "grammar"
+ALL_KINDS = (KIND_VOCAB, KIND_GRAMMAR)
+
+MAX_BYTES = int(os.getenv("KNOWLEDGE_LIST_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+TTL_SECONDS = float(os.getenv("KNOWLEDGE_LIST_CACHE_TTL_SECONDS", "60"))
+
+# session.info 中登记"本事务改动了哪些用户的哪类数据"的键
+_SESSION_INFO_KEY = "knowledge_list_cache_changes"
+
+# (user_id, kind) -> 版本号
+_versions: Dict[Tuple[int, str], int] = {}
+# (kind, user_id, version, *params) -> (过期时间, JSON 字节)（末尾最新）
+_cache: "OrderedDict[Tuple[Hashable, ...], Tuple[float, bytes]]" = OrderedDict()
+_cache_lock = Lock()
+_total_bytes = 0
+_stats = {"hits": 0, "misses": 0, "stores": 0, "stale_stores": 0, "expirations": 0, "evictions": 0, "invalidations": 0}
+# commit 后需要一起失效的其他缓存：listener(user_id, kinds)
+_change_listeners: List[Callable[[int, Set[str]], None]] = []
+
+
+def current_version(user_id: int, kind: str) -> int:
+    """该用户某类列表的当前版本号（查询开始前读取，传给 store）"""
+    with _cache_lock:
+        return _versions.get((user_id, kind), 0)
+
+
+def _remove_locked(key: Tuple[Hashable, ...]) -> None:
+    global _total_bytes
+    _, body = _cache.pop(key)
+    _total_bytes -= len(body)
+
+
+def lookup(user_id: int, kind: str, params: Tuple[Hashable, ...]) -> Optional[Response]:
+    """命中时返回缓存的 JSON 响应，否则返回 None"""
+    now = time.monotonic()
+    with _cache_lock:
+        key = (kind, user_id, _versions.get((user_id, kind), 0)) + tuple(params)
+        entry = _cache.get(key)
+        if entry is not None and entry[0] <= now:
+            _remove_locked(key)
+            _stats["expirations"] += 1
+            entry = None
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        _cache.move_to_end(key)
+        _stats["hits"] += 1
+        body = entry[1]
+    return Response(content=body, media_type="application/json")
+
+
+def store(user_id: int, kind: str, version: int, params: Tuple[Hashable, ...], payload: Any) -> Response:
+    """序列化 payload 并返回响应；version 仍是当前版本时放进缓存"""
+    global _total_bytes
+    response = JSONResponse(content=jsonable_encoder(payload))
+    body = response.body
+    if len(body) > MAX_BYTES:
+        return response
+    with _cache_lock:
+        if _versions.get((user_id, kind), 0) != version:
+            # 查询期间数据已被修改，这份结果可能是旧的
+            _stats["stale_stores"] += 1
+            return response
+        key = (kind, user_id, version) + tuple(params)
+        if key in _cache:
+            _remove_locked(key)
+        _cache[key] = (time.monotonic() + TTL_SECONDS, body)
+        _total_bytes += len(body)
+        _stats["stores"] += 1
+        while _total_bytes > MAX_BYTES and _cache:
+            _, (_, evicted) = _cache.popitem(last=False)
+            _total_bytes -= len(evicted)
+            _stats["evictions"] += 1
+    return response
+
+
+def invalidate_user(user_id: int, kinds: Iterable[str] = ALL_KINDS) -> None:
+    """增加该用户的版本号，并移除其旧版本的缓存条目"""
+    kinds = set(kinds)
+    with _cache_lock:
+        for kind in kinds:
+            _versions[(user_id, kind)] = _versions.get((user_id, kind), 0) + 1
+        for key in [k for k in _cache if k[1] == user_id and k[0] in kinds]:
+            _remove_locked(key)
+        _stats["invalidations"] += 1
+
+
+def mark_changed(session: Session, user_id: int, kinds: Iterable[str] = ALL_KINDS) -> None:
+    """登记本事务改动了该用户的数据（commit 后失效；用于绕过 ORM 的批量写入）"""
+    changes: Set[Tuple[int, str]] = session.info.setdefault(_SESSION_INFO_KEY, set())
+    for kind in kinds:
+        changes.add((user_id, kind))
+
+
+def add_change_listener(listener: Callable[[int, Set[str]], None]) -> None:
+    """注册回调：某用户的词汇 / 语法数据提交后调用 listener(user_id, kinds)"""
+    if listener not in _change_listeners:
+        _change_listeners.append(listener)
+
+
+# ==================== Session 事件：自动收集 ORM 写入 ====================
+
+def _collect_changes(session: Session, flush_context, instances) -> None:
+    objects = list(session.new) + list(session.deleted) + [
+        obj for obj in session.dirty if session.is_modified(obj, include_collections=False)
+    ]
+    if not objects:
+        return
+
+    changes: Set[Tuple[int, str]] = set()
+    example_vocab_ids = set()
+    example_rule_ids = set()
+    for obj in objects:
+        if isinstance(obj, VocabExpression):
+            changes.add((obj.user_id, KIND_VOCAB))
+        elif isinstance(obj, GrammarRule):
+            changes.add((obj.user_id, KIND_GRAMMAR))
+        elif isinstance(obj, VocabExpressionExample):
+            example_vocab_ids.add(obj.vocab_id)
+        elif isinstance(obj, GrammarExample):
+            example_rule_ids.add(obj.rule_id)
+        elif isinstance(obj, OriginalText) and obj in session.deleted:
+            # 删除文章会级联删除例句，影响按 text_id 过滤的列表
+            changes.update((obj.user_id, kind) for kind in ALL_KINDS)
+
+    # 例句只有 vocab_id / rule_id：在同一连接上查出所属用户
+    connection = session.connection()
+    if example_vocab_ids:
+        rows = connection.execute(
+            select(VocabExpression.user_id).where(VocabExpression.vocab_id.in_(example_vocab_ids))
+        )
+        changes.update((user_id, KIND_VOCAB) for (user_id,) in rows)
+    if example_rule_ids:
+        rows = connection.execute(
+            select(GrammarRule.user_id).where(GrammarRule.rule_id.in_(example_rule_ids))
+        )
+        changes.update((user_id, KIND_GRAMMAR) for (user_id,) in rows)
+
+    changes = {(user_id, kind) for user_id, kind in changes if user_id is not None}
+    if changes:
+        session.info.setdefault(_SESSION_INFO_KEY, set()).update(changes)
+
+
+def _apply_changes(session: Session) -> None:
+    changes = session.info.pop(_SESSION_INFO_KEY, None)
+    if not changes:
+        return
+    by_user: Dict[int, Set[str]] = {}
+    for user_id, kind in changes:
+        by_user.setdefault(user_id, set()).add(kind)
+    for user_id, kinds in by_user.items():
+        invalidate_user(user_id, kinds)
+        for listener in _change_listeners:
+            try:
+                listener(user_id, kinds)
+            except Exception as e:
+                print(f"⚠️ [KnowledgeListCache] 失效回调失败 user_id={user_id}: {e}")
+
+
+def _discard_changes(session: Session, previous_transaction) -> None:
+    # 只在最外层事务回滚时丢弃（SAVEPOINT 回滚不影响外层已登记的改动）
+    if not previous_transaction.nested:
+        session.info.pop(_SESSION_INFO_KEY, None)
+
+
+event.listen(Session, "before_flush", _collect_changes)
+event.listen(Session, "after_commit", _apply_changes)
+event.listen(Session, "after_soft_rollback", _discard_changes)
+
+
+def get_stats() -> Dict[str, Any]:
+    """缓存统计：条目数、字节数、上限、命中率、失效 / 过期 / 淘汰次数"""
+    with _cache_lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            "entries": len(_cache),
+            "bytes": _total_bytes,
+            "max_bytes": MAX_BYTES,
+            "ttl_seconds": TTL_SECONDS,
+            "tracked_users": len({user_id for user_id, _ in _versions}),
+            **_stats,
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else None,
+        }
+
+
+def clear() -> None:
+    """清空缓存（测试 / 调试用）"""
+    global _total_bytes
+    with _cache_lock:
+        _cache.clear()
+        _total_bytes = 0
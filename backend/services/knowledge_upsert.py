@@ -0,0 +1,427 @@
+"""
+本轮知识点批量写入（单事务 + INSERT ... ON CONFLICT）
+
+背景：
+- 以前每轮知识点写两遍：MainAssistant.add_new_to_data 逐条经 GrammarRuleManagerDB /
+  VocabManagerDB / notation manager 写规则、例句、notation（每个 manager 内部各自 commit），
+  _sync_to_database 再逐条 get-or-create、查文章、查例句数量补齐一遍，每一步一次往返
+
+做法：
+- MainAssistant.add_new_to_data 把整轮的语法规则、词汇、例句、notation 组装成 KnowledgeBatch，
+  只在这里写一次、一次提交
+- 规则 / 词汇先一次查询已有行（已有的不再插入），
+  缺失的与 notation 一起用批量 INSERT ... ON CONFLICT DO NOTHING，冲突键即表上的唯一约束：
+    grammar_rules      uq_user_rule_name    (user_id, rule_name)
+    vocab_expressions  uq_user_vocab_body   (user_id, vocab_body)
+    vocab_notations    uq_vocab_notation    (user_id, text_id, sentence_id, token_id)
+    grammar_notations  uq_grammar_notation  (user_id, text_id, sentence_id, grammar_id)
+  已存在的行不会被修改（与 get_or_create 的语义一致）
+- 例句表没有唯一约束：一次查询取出已有的 (id, text_id, sentence_id)，只插入缺失的
+- 例句 / notation 引用的句子一次查询校验归属（文章属于当前用户且句子存在）
+- 语句数与本轮条目数无关；全部在一个事务里，失败整体回滚
+
+不支持 ON CONFLICT 的方言退回"先查已有键再插入缺失"，仍在同一事务内。
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import insert as generic_insert, or_, tuple_
+from sqlalchemy.orm import Session
+
+from database_system.business_logic.models import (
+    GrammarExample,
+    GrammarNotation,
+    GrammarRule,
+    OriginalText,
+    Sentence,
+    SourceType,
+    VocabExpression,
+    VocabExpressionExample,
+    VocabNotation,
+    normalize_language_code,
+)
+from backend.services import fulltext_search, knowledge_list_cache
+
+
+@dataclass
+class GrammarRuleUpsert:
+    rule_name: str
+    rule_summary: str
+    language: Optional[str] = None
+    display_name: Optional[str] = None
+    canonical_category: Optional[str] = None
+    canonical_subtype: Optional[str] = None
+    canonical_function: Optional[str] = None
+    canonical_key: Optional[str] = None
+    source: str = "qa"
+
+
+@dataclass
+class VocabUpsert:
+    vocab_body: str
+    # 为 None 时只解析 vocab_id，不创建新词汇（explanation 非空列）
+    explanation: Optional[str] = None
+    language: Optional[str] = None
+    source: str = "qa"
+
+
+@dataclass
+class GrammarExampleUpsert:
+    rule_name: str
+    text_id: int
+    sentence_id: int
+    explanation_context: Optional[str] = None
+
+
+@dataclass
+class VocabExampleUpsert:
+    vocab_body: str
+    text_id: int
+    sentence_id: int
+    context_explanation: Optional[str] = None
+    token_indices: List[int] = field(default_factory=list)
+
+
+@dataclass
+class GrammarNotationUpsert:
+    text_id: int
+    sentence_id: int
+    grammar_id: Optional[int] = None
+    # grammar_id 未知时按规则名解析（本批次内新建的规则）
+    rule_name: Optional[str] = None
+    marked_token_ids: List[int] = field(default_factory=list)
+
+
+@dataclass
+class VocabNotationUpsert:
+    text_id: int
+    sentence_id: int
+    token_id: int
+    vocab_id: Optional[int] = None
+    vocab_body: Optional[str] = None
+    word_token_id: Optional[int] = None
+
+
+@dataclass
+class KnowledgeBatch:
+    """一轮对话产出的全部知识点"""
+    grammar_rules: List[GrammarRuleUpsert] = field(default_factory=list)
+    vocabs: List[VocabUpsert] = field(default_factory=list)
+    grammar_examples: List[GrammarExampleUpsert] = field(default_factory=list)
+    vocab_examples: List[VocabExampleUpsert] = field(default_factory=list)
+    grammar_notations: List[GrammarNotationUpsert] = field(default_factory=list)
+    vocab_notations: List[VocabNotationUpsert] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not (
+            self.grammar_rules or self.vocabs or self.grammar_examples
+            or self.vocab_examples or self.grammar_notations or self.vocab_notations
+        )
+
+
+@dataclass
+class KnowledgeUpsertResult:
+    rule_ids: Dict[str, int] = field(default_factory=dict)    # rule_name -> rule_id
+    vocab_ids: Dict[str, int] = field(default_factory=dict)   # vocab_body -> vocab_id
+    grammar_rules_created: int = 0
+    vocabs_created: int = 0
+    grammar_examples_added: int = 0
+    vocab_examples_added: int = 0
+    grammar_notations_submitted: int = 0
+    vocab_notations_submitted: int = 0
+    skipped: int = 0  # 引用了不存在 / 不属于当前用户的句子，或无法解析 id 的条目
+    # 批次引用的句子中存在且属于当前用户的 (text_id, sentence_id)
+    valid_sentences: Set[Tuple[int, int]] = field(default_factory=set)
+
+
+def _dialect_insert(session: Session):
+    """返回支持 on_conflict_do_nothing 的 insert 构造器；不支持的方言返回 None"""
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+
+def _insert_ignore_conflicts(
+    session: Session,
+    model,
+    rows: List[Dict[str, Any]],
+    conflict_columns: Sequence[str],
+) -> None:
+    """批量插入，唯一键冲突的行跳过（一条语句）"""
+    if not rows:
+        return
+    insert = _dialect_insert(session)
+    if insert is not None:
+        stmt = insert(model).on_conflict_do_nothing(index_elements=list(conflict_columns))
+        session.execute(stmt, rows)
+        return
+
+    # 兜底：先查已有键，再插入缺失的行
+    columns = [getattr(model, name) for name in conflict_columns]
+    keys = {tuple(row[name] for name in conflict_columns) for row in rows}
+    existing = set(session.query(*columns).filter(tuple_(*columns).in_(list(keys))).all())
+    missing, seen = [], set(existing)
+    for row in rows:
+        key = tuple(row[name] for name in conflict_columns)
+        if key not in seen:
+            seen.add(key)
+            missing.append(row)
+    if missing:
+        session.execute(generic_insert(model), missing)
+
+
+def _coerce_source(source: Any) -> SourceType:
+    if isinstance(source, SourceType):
+        return source
+    try:
+        return SourceType(str(source).lower())
+    except ValueError:
+        return SourceType.QA
+
+
+def _dedupe(items: Iterable, key) -> list:
+    seen, result = set(), []
+    for item in items:
+        k = key(item)
+        if k not in seen:
+            seen.add(k)
+            result.append(item)
+    return result
+
+
+def _valid_sentences(session: Session, user_id: int, pairs: Set[Tuple[int, int]]) -> Set[Tuple[int, int]]:
+    """一次查询：返回属于当前用户文章、且句子存在的 (text_id, sentence_id)"""
+    if not pairs:
+        return set()
+    text_ids = {text_id for text_id, _ in pairs}
+    sentence_ids = {sentence_id for _, sentence_id in pairs}
+    rows = (
+        session.query(Sentence.text_id, Sentence.sentence_id)
+        .join(OriginalText, OriginalText.text_id == Sentence.text_id)
+        .filter(
+            OriginalText.user_id == user_id,
+            Sentence.text_id.in_(text_ids),
+            Sentence.sentence_id.in_(sentence_ids),
+        )
+        .all()
+    )
+    return {(row.text_id, row.sentence_id) for row in rows} & pairs
+
+
+def upsert_knowledge(session: Session, user_id: int, batch: KnowledgeBatch, commit: bool = True) -> KnowledgeUpsertResult:
+    """
+    在一个事务里写入整轮知识点
+
+    Args:
+        session: 数据库会话
+        user_id: 当前用户
+        batch: 本轮的规则、词汇、例句、notation
+        commit: 是否提交（False 时由调用方决定提交时机）
+
+    Returns:
+        KnowledgeUpsertResult: 名称 -> id 映射及各类写入数量
+    """
+    result = KnowledgeUpsertResult()
+    if user_id is None or batch.is_empty():
+        return result
+
+    try:
+        # 1. 语法规则：先一次查询已有规则（按 rule_name 或 canonical_key，与 get_or_create 的查重一致），
+        #    只对缺失的执行 INSERT ... ON CONFLICT (user_id, rule_name) DO NOTHING，再取回新行 id
+        rules = _dedupe(batch.grammar_rules, key=lambda r: r.rule_name)
+        rule_names = {r.rule_name for r in rules}
+        rule_names.update(ex.rule_name for ex in batch.grammar_examples)
+        rule_names.update(n.rule_name for n in batch.grammar_notations if n.grammar_id is None and n.rule_name)
+        canonical_keys = {r.canonical_key for r in rules if r.canonical_key}
+        if rule_names:
+            conditions = GrammarRule.rule_name.in_(rule_names)
+            if canonical_keys:
+                conditions = or_(conditions, GrammarRule.canonical_key.in_(canonical_keys))
+            existing_rules = (
+                session.query(GrammarRule.rule_name, GrammarRule.canonical_key, GrammarRule.rule_id)
+                .filter(GrammarRule.user_id == user_id, conditions)
+                .all()
+            )
+            by_canonical_key = {row.canonical_key: row.rule_id for row in existing_rules if row.canonical_key}
+            result.rule_ids = {row.rule_name: row.rule_id for row in existing_rules if row.rule_name in rule_names}
+            for rule in rules:
+                if rule.rule_name not in result.rule_ids and rule.canonical_key in by_canonical_key:
+                    result.rule_ids[rule.rule_name] = by_canonical_key[rule.canonical_key]
+
+        missing_rules = [rule for rule in rules if rule.rule_name not in result.rule_ids]
+        if missing_rules:
+            _insert_ignore_conflicts(session, GrammarRule, [
+                {
+                    "user_id": user_id,
+                    "rule_name": rule.rule_name,
+                    "rule_summary": rule.rule_summary or "",
+                    "language": rule.language,
+                    "language_code": normalize_language_code(rule.language),
+                    "display_name": rule.display_name or rule.rule_name,
+                    "canonical_category": rule.canonical_category,
+                    "canonical_subtype": rule.canonical_subtype,
+                    "canonical_function": rule.canonical_function,
+                    "canonical_key": rule.canonical_key,
+                    "source": _coerce_source(rule.source),
+                    "is_starred": False,
+                }
+                for rule in missing_rules
+            ], ("user_id", "rule_name"))
+            result.rule_ids.update(
+                session.query(GrammarRule.rule_name, GrammarRule.rule_id)
+                .filter(GrammarRule.user_id == user_id, GrammarRule.rule_name.in_({r.rule_name for r in missing_rules}))
+                .all()
+            )
+            fulltext_search.mark_changed(
+                session, fulltext_search.ENTITY_GRAMMAR,
+                (result.rule_ids.get(r.rule_name) for r in missing_rules)
+            )
+        result.grammar_rules_created = len(missing_rules)
+
+        # 2. 词汇：同上，按 (user_id, vocab_body) 查重；没有 explanation 的只解析 id，不创建
+        vocabs = _dedupe(batch.vocabs, key=lambda v: v.vocab_body)
+        vocab_bodies = {v.vocab_body for v in vocabs}
+        vocab_bodies.update(ex.vocab_body for ex in batch.vocab_examples)
+        vocab_bodies.update(n.vocab_body for n in batch.vocab_notations if n.vocab_id is None and n.vocab_body)
+        if vocab_bodies:
+            result.vocab_ids = dict(
+                session.query(VocabExpression.vocab_body, VocabExpression.vocab_id)
+                .filter(VocabExpression.user_id == user_id, VocabExpression.vocab_body.in_(vocab_bodies))
+                .all()
+            )
+
+        missing_vocabs = [v for v in vocabs if v.vocab_body not in result.vocab_ids and v.explanation]
+        if missing_vocabs:
+            _insert_ignore_conflicts(session, VocabExpression, [
+                {
+                    "user_id": user_id,
+                    "vocab_body": vocab.vocab_body,
+                    "explanation": vocab.explanation,
+                    "language": vocab.language,
+                    "language_code": normalize_language_code(vocab.language),
+                    "source": _coerce_source(vocab.source),
+                    "is_starred": False,
+                }
+                for vocab in missing_vocabs
+            ], ("user_id", "vocab_body"))
+            result.vocab_ids.update(
+                session.query(VocabExpression.vocab_body, VocabExpression.vocab_id)
+                .filter(VocabExpression.user_id == user_id, VocabExpression.vocab_body.in_({v.vocab_body for v in missing_vocabs}))
+                .all()
+            )
+            fulltext_search.mark_changed(
+                session, fulltext_search.ENTITY_VOCAB,
+                (result.vocab_ids.get(v.vocab_body) for v in missing_vocabs)
+            )
+        result.vocabs_created = len(missing_vocabs)
+
+        # 3. 例句 / notation 引用的句子：一次查询校验归属
+        pairs = {(ex.text_id, ex.sentence_id) for ex in batch.grammar_examples}
+        pairs |= {(ex.text_id, ex.sentence_id) for ex in batch.vocab_examples}
+        pairs |= {(n.text_id, n.sentence_id) for n in batch.grammar_notations}
+        pairs |= {(n.text_id, n.sentence_id) for n in batch.vocab_notations}
+        valid_pairs = _valid_sentences(session, user_id, pairs)
+        result.valid_sentences = set(valid_pairs)
+
+        # 4. 语法例句：查已有 (rule_id, text_id, sentence_id)，只插入缺失的
+        grammar_example_rows = {}
+        for ex in batch.grammar_examples:
+            rule_id = result.rule_ids.get(ex.rule_name)
+            if rule_id is None or (ex.text_id, ex.sentence_id) not in valid_pairs:
+                result.skipped += 1
+                continue
+            grammar_example_rows.setdefault((rule_id, ex.text_id, ex.sentence_id), {
+                "rule_id": rule_id,
+                "text_id": ex.text_id,
+                "sentence_id": ex.sentence_id,
+                "explanation_context": ex.explanation_context,
+            })
+        if grammar_example_rows:
+            existing = set(
+                session.query(GrammarExample.rule_id, GrammarExample.text_id, GrammarExample.sentence_id)
+                .filter(GrammarExample.rule_id.in_({key[0] for key in grammar_example_rows}))
+                .all()
+            )
+            missing = [row for key, row in grammar_example_rows.items() if key not in existing]
+            if missing:
+                session.execute(generic_insert(GrammarExample), missing)
+            result.grammar_examples_added = len(missing)
+
+        # 5. 词汇例句：同上
+        vocab_example_rows = {}
+        for ex in batch.vocab_examples:
+            vocab_id = result.vocab_ids.get(ex.vocab_body)
+            if vocab_id is None or (ex.text_id, ex.sentence_id) not in valid_pairs:
+                result.skipped += 1
+                continue
+            vocab_example_rows.setdefault((vocab_id, ex.text_id, ex.sentence_id), {
+                "vocab_id": vocab_id,
+                "text_id": ex.text_id,
+                "sentence_id": ex.sentence_id,
+                "context_explanation": ex.context_explanation,
+                "token_indices": list(ex.token_indices or []),
+            })
+        if vocab_example_rows:
+            existing = set(
+                session.query(VocabExpressionExample.vocab_id, VocabExpressionExample.text_id, VocabExpressionExample.sentence_id)
+                .filter(VocabExpressionExample.vocab_id.in_({key[0] for key in vocab_example_rows}))
+                .all()
+            )
+            missing = [row for key, row in vocab_example_rows.items() if key not in existing]
+            if missing:
+                session.execute(generic_insert(VocabExpressionExample), missing)
+            result.vocab_examples_added = len(missing)
+
+        # 6. notation：INSERT ... ON CONFLICT DO NOTHING
+        grammar_notation_rows = []
+        for n in batch.grammar_notations:
+            grammar_id = n.grammar_id if n.grammar_id is not None else result.rule_ids.get(n.rule_name)
+            if grammar_id is None or (n.text_id, n.sentence_id) not in valid_pairs:
+                result.skipped += 1
+                continue
+            grammar_notation_rows.append({
+                "user_id": user_id,
+                "text_id": n.text_id,
+                "sentence_id": n.sentence_id,
+                "grammar_id": grammar_id,
+                "marked_token_ids": list(n.marked_token_ids or []),
+            })
+        grammar_notation_rows = _dedupe(grammar_notation_rows, key=lambda r: (r["text_id"], r["sentence_id"], r["grammar_id"]))
+        _insert_ignore_conflicts(session, GrammarNotation, grammar_notation_rows,
+                                 ("user_id", "text_id", "sentence_id", "grammar_id"))
+        result.grammar_notations_submitted = len(grammar_notation_rows)
+
+        vocab_notation_rows = []
+        for n in batch.vocab_notations:
+            vocab_id = n.vocab_id if n.vocab_id is not None else result.vocab_ids.get(n.vocab_body)
+            if vocab_id is None or (n.text_id, n.sentence_id) not in valid_pairs:
+                result.skipped += 1
+                continue
+            vocab_notation_rows.append({
+                "user_id": user_id,
+                "text_id": n.text_id,
+                "sentence_id": n.sentence_id,
+                "token_id": n.token_id,
+                "word_token_id": n.word_token_id,
+                "vocab_id": vocab_id,
+            })
+        vocab_notation_rows = _dedupe(vocab_notation_rows, key=lambda r: (r["text_id"], r["sentence_id"], r["token_id"]))
+        _insert_ignore_conflicts(session, VocabNotation, vocab_notation_rows,
+                                 ("user_id", "text_id", "sentence_id", "token_id"))
+        result.vocab_notations_submitted = len(vocab_notation_rows)
+
+        # 批量 INSERT 不经过 ORM 的 flush：手动登记，commit 后让该用户的列表缓存失效
+        knowledge_list_cache.mark_changed(session, user_id)
+
+        if commit:
+            session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    return result
@@ -0,0 +1,303 @@
+"""
+预置文章的预生成讲解（共享表 preset_explanations）
+
+背景：
+- 预置文章（backend/data/presets）每个用户都有一份副本，大家对同一句话问的问题高度重复
+  （“这句话是什么意思？”“你能拆解一下这句话吗？”），每次都重新调用
+  AnswerQuestion / VocabExplanation / GrammarExplanation
+
+做法：
+- backend/scripts/precompute_preset_explanations.py 离线按「句子 × UI 语言」批量生成并写入共享表
+- MainAssistant 在调用这些助手前先 lookup()，命中直接使用（不调用大模型，不记 token）；未命中照常实时生成
+- 以规范化后句子内容的 sha1 作为定位键（用户副本的 text_id / sentence_id 各不相同）
+- 进程内缓存：已有预生成内容的句子哈希集合（定期刷新）+ 按句子加载的条目（LRU），
+  非预置句子只做一次集合判断，不查库
+
+环境变量：
+- PRESET_EXPLANATIONS_ENABLED: 是否启用（默认 1）
+- PRESET_EXPLANATIONS_REFRESH_SECONDS: 句子哈希集合的刷新间隔，默认 300 秒（批量任务跑完后无需重启）
+- PRESET_EXPLANATIONS_CACHE_SIZE: 最多缓存多少个句子的条目，默认 2000
+"""
+import hashlib
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional, Set, Tuple
+
+from backend.utils.structured_logging import get_logger
+
+logger = get_logger("preset_explanations")
+
+ENABLED = os.getenv("PRESET_EXPLANATIONS_ENABLED", "1").strip().lower() not in ("0", "false", "no", "off")
+REFRESH_SECONDS = float(os.getenv("PRESET_EXPLANATIONS_REFRESH_SECONDS", "300"))
+CACHE_SIZE = int(os.getenv("PRESET_EXPLANATIONS_CACHE_SIZE", "2000"))
+
+KIND_ANSWER = "answer"
+KIND_EXTRACTION = "extraction"
+KIND_VOCAB = "vocab_explanation"
+KIND_GRAMMAR = "grammar_explanation"
+KINDS = (KIND_ANSWER, KIND_EXTRACTION, KIND_VOCAB, KIND_GRAMMAR)
+
+# 前端 SuggestedQuestions 里针对整句的建议问题（按 UI 语言）；离线任务为每个预置句子生成这些问题的回答
+SENTENCE_QUESTIONS = {
+    "中文": ["这句话是什么意思？", "你能拆解一下这句话吗？"],
+    "英文": ["What does this sentence mean?", "Can you break down this sentence?"],
+}
+
+_UI_LANGUAGE_ALIASES = {
+    "中文": "中文", "zh": "中文", "chinese": "中文",
+    "英文": "英文", "en": "英文", "english": "英文",
+}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_QUESTION_TRAILING = "?？!！.。 "
+
+_lock = Lock()
+_hashes: Optional[Set[str]] = None
+_hashes_loaded_at = 0.0
+# sentence_hash -> {(ui_language, kind, target, question_key): content}（末尾最新）
+_entries: "OrderedDict[str, Dict[Tuple[str, str, str, str], str]]" = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "not_preset": 0, "refreshes": 0, "load_failures": 0}
+_hits_by_kind: Dict[str, int] = {kind: 0 for kind in KINDS}
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """NFKC + 合并空白，用于句子 / 选中文本 / 词汇的比较"""
+    if not text:
+        return ""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", str(text))).strip()
+
+
+def sentence_hash(sentence_body: Optional[str]) -> str:
+    return hashlib.sha1(normalize_text(sentence_body).encode("utf-8")).hexdigest()
+
+
+def normalize_question(question: Optional[str]) -> str:
+    """问题键：规范化空白、小写、去掉末尾的问号 / 句号（“这句话是什么意思”与“这句话是什么意思？”视为同一问题）"""
+    return normalize_text(question).lower().rstrip(_QUESTION_TRAILING)[:255]
+
+
+def normalize_ui_language(ui_language: Optional[str]) -> str:
+    value = (ui_language or "中文").strip()
+    return _UI_LANGUAGE_ALIASES.get(value.lower(), value)
+
+
+def normalize_target(target: Optional[str]) -> str:
+    return normalize_text(target).lower()[:255]
+
+
+def grammar_target(category: Optional[str], subtype: Optional[str]) -> str:
+    return normalize_target(f"{category or ''}::{subtype or ''}")
+
+
+def make_key(kind: str, ui_language: Optional[str], target: Optional[str] = "", question: Optional[str] = "") -> Tuple[str, str, str, str]:
+    """条目键（不含句子哈希）；离线任务写入与在线查询使用同一套规范化"""
+    question_key = normalize_question(question) if kind in (KIND_ANSWER, KIND_EXTRACTION) else ""
+    return (normalize_ui_language(ui_language), kind, normalize_target(target), question_key)
+
+
+def _new_session():
+    from backend.config import ENV
+    from database_system.database_manager import get_database_manager
+
+    return get_database_manager(ENV).get_session()
+
+
+def _known_hashes() -> Set[str]:
+    """有预生成内容的句子哈希集合；过期时重新加载（加载失败时沿用旧集合）"""
+    global _hashes, _hashes_loaded_at
+    now = time.monotonic()
+    with _lock:
+        if _hashes is not None and now - _hashes_loaded_at < REFRESH_SECONDS:
+            return _hashes
+    from database_system.business_logic.models import PresetExplanation
+
+    try:
+        session = _new_session()
+        try:
+            loaded = {row[0] for row in session.query(PresetExplanation.sentence_hash).distinct()}
+        finally:
+            session.close()
+    except Exception as e:
+        logger.warning("⚠️ [PresetExplanations] 加载句子哈希失败（表可能尚未迁移）: %s", e)
+        with _lock:
+            _stats["load_failures"] += 1
+            if _hashes is None:
+                _hashes = set()
+            _hashes_loaded_at = now
+            return _hashes
+    with _lock:
+        changed = _hashes is not None and loaded != _hashes
+        _hashes = loaded
+        _hashes_loaded_at = now
+        _stats["refreshes"] += 1
+        if changed:
+            # 批量任务补充了新内容：丢掉已加载的条目，下次按需重新读取
+            _entries.clear()
+        return _hashes
+
+
+def _entries_for(digest: str) -> Dict[Tuple[str, str, str, str], str]:
+    with _lock:
+        entries = _entries.get(digest)
+        if entries is not None:
+            _entries.move_to_end(digest)
+            return entries
+    from database_system.business_logic.models import PresetExplanation
+
+    entries = {}
+    try:
+        session = _new_session()
+        try:
+            rows = session.query(
+                PresetExplanation.ui_language,
+                PresetExplanation.kind,
+                PresetExplanation.target,
+                PresetExplanation.question_key,
+                PresetExplanation.content,
+            ).filter(PresetExplanation.sentence_hash == digest).all()
+        finally:
+            session.close()
+    except Exception as e:
+        logger.warning("⚠️ [PresetExplanations] 加载句子条目失败: %s", e)
+        with _lock:
+            _stats["load_failures"] += 1
+        return entries
+    for ui_language, kind, target, question_key, content in rows:
+        entries[(ui_language, kind, target or "", question_key or "")] = content
+    with _lock:
+        _entries[digest] = entries
+        while len(_entries) > CACHE_SIZE:
+            _entries.popitem(last=False)
+    return entries
+
+
+def lookup(
+    kind: str,
+    sentence_body: Optional[str],
+    ui_language: Optional[str],
+    target: Optional[str] = "",
+    question: Optional[str] = "",
+) -> Optional[str]:
+    """查预生成内容；命中返回内容字符串，否则 None（调用方走实时生成）"""
+    if not ENABLED or not sentence_body:
+        return None
+    digest = sentence_hash(sentence_body)
+    if digest not in _known_hashes():
+        with _lock:
+            _stats["not_preset"] += 1
+        return None
+    content = _entries_for(digest).get(make_key(kind, ui_language, target, question))
+    with _lock:
+        if content is None:
+            _stats["misses"] += 1
+        else:
+            _stats["hits"] += 1
+            _hits_by_kind[kind] = _hits_by_kind.get(kind, 0) + 1
+    return content
+
+
+def upsert(
+    session,
+    language_code: str,
+    sentence_body: str,
+    kind: str,
+    ui_language: str,
+    content: str,
+    target: str = "",
+    question: str = "",
+    model_name: Optional[str] = None,
+    prompt_tokens: Optional[int] = None,
+    completion_tokens: Optional[int] = None,
+) -> bool:
+    """写入 / 覆盖一条预生成内容（离线任务使用，不提交事务）；返回是否新增"""
+    from database_system.business_logic.models import PresetExplanation
+
+    digest = sentence_hash(sentence_body)
+    ui_key, kind, target_key, question_key = make_key(kind, ui_language, target, question)
+    row = session.query(PresetExplanation).filter(
+        PresetExplanation.sentence_hash == digest,
+        PresetExplanation.ui_language == ui_key,
+        PresetExplanation.kind == kind,
+        PresetExplanation.target == target_key,
+        PresetExplanation.question_key == question_key,
+    ).first()
+    created = row is None
+    if created:
+        row = PresetExplanation(
+            sentence_hash=digest,
+            ui_language=ui_key,
+            kind=kind,
+            target=target_key,
+            question_key=question_key,
+        )
+        session.add(row)
+    row.language_code = language_code
+    row.sentence_body = normalize_text(sentence_body)
+    row.content = content
+    row.model_name = model_name
+    row.prompt_tokens = prompt_tokens
+    row.completion_tokens = completion_tokens
+    session.flush()
+    return created
+
+
+def lookup_existing(
+    session,
+    sentence_body: str,
+    kind: str,
+    ui_language: str,
+    target: str = "",
+    question: str = "",
+) -> Optional[str]:
+    """直接查库读取一条内容（离线任务用，不经过进程内缓存）"""
+    from database_system.business_logic.models import PresetExplanation
+
+    ui_key, kind, target_key, question_key = make_key(kind, ui_language, target, question)
+    row = session.query(PresetExplanation.content).filter(
+        PresetExplanation.sentence_hash == sentence_hash(sentence_body),
+        PresetExplanation.ui_language == ui_key,
+        PresetExplanation.kind == kind,
+        PresetExplanation.target == target_key,
+        PresetExplanation.question_key == question_key,
+    ).first()
+    return row[0] if row else None
+
+
+def existing_keys(session, sentence_body: str) -> Set[Tuple[str, str, str, str]]:
+    """某个句子已有的条目键（离线任务断点续跑用）"""
+    from database_system.business_logic.models import PresetExplanation
+
+    rows = session.query(
+        PresetExplanation.ui_language,
+        PresetExplanation.kind,
+        PresetExplanation.target,
+        PresetExplanation.question_key,
+    ).filter(PresetExplanation.sentence_hash == sentence_hash(sentence_body)).all()
+    return {(r[0], r[1], r[2] or "", r[3] or "") for r in rows}
+
+
+def get_stats() -> Dict[str, Any]:
+    """命中统计：命中 / 未命中（预置句子但没有对应条目）/ 非预置句子，以及按类型的命中次数"""
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            "enabled": ENABLED,
+            "preset_sentences": len(_hashes) if _hashes is not None else None,
+            "cached_sentences": len(_entries),
+            **_stats,
+            "hits_by_kind": dict(_hits_by_kind),
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else None,
+        }
+
+
+def clear() -> None:
+    """清空进程内缓存（测试 / 批量任务跑完后强制刷新）"""
+    global _hashes, _hashes_loaded_at
+    with _lock:
+        _hashes = None
+        _hashes_loaded_at = 0.0
+        _entries.clear()
@@ -0,0 +1,364 @@
+"""
+整句读音标注（拼音 / 假名）+ LRU 缓存
+
+背景：
+- /zh-preview 逐字调用 lazy_pinyin：多音字失去词语上下文（"银行" 标成 yín xíng），
+  而且每个字一次调用
+- /zh-align、/align 每次打开文章都对同样的句子重新标注，token 逐个跑分词器
+
+做法：
+- 中文：先用 non_space_segmentation 里的 jieba 分词，再把整句的词列表一次性交给
+  lazy_pinyin（按词取音，多音字按词组消歧），得到逐字读音
+- 日文：fugashi 对整句一次分析，得到每个形态素的读音（平假名）
+- 结果按 (language, 句子原文) 放进进程内 LRU；同一句子再次标注直接读缓存
+- token 对齐：按顺序在句子里定位 token，读音取 token 覆盖的标注片段；
+  token 边界落在某个片段中间时（分词器不一致）才单独标注该 token
+- 导入阶段（enrich_sentences）把每句需要显示的 token 读音以紧凑形式
+  [[sentence_token_id, reading], ...] 存进 sentences.readings，
+  文章详情接口直接带在 token 上，前端不用再逐句请求
+
+环境变量：
+- READING_CACHE_MAX_SENTENCES: 缓存的句子数上限，默认 20000
+"""
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    from fugashi import Tagger
+except ImportError:
+    Tagger = None
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:
+    lazy_pinyin = None
+    Style = None
+
+from backend.preprocessing.language_classification import get_language_code
+from backend.preprocessing.non_space_segmentation import (
+    JIEBA_AVAILABLE,
+    Chinese_sentence_segmentation,
+)
+
+
+MAX_SENTENCES = int(os.getenv("READING_CACHE_MAX_SENTENCES", "20000"))
+
+LANG_ZH = "zh"
+LANG_JA = "ja"
+
+
+class ReadingUnavailable(RuntimeError):
+    """标注所需的库未安装（pypinyin / fugashi）"""
+
+
+class ReadingSegment(NamedTuple):
+    """句子中一段有读音的文字：[start, end) 为字符下标"""
+    start: int
+    end: int
+    surface: str
+    reading: Optional[str]
+    pos: Optional[str] = None
+
+
+class SentenceReading(NamedTuple):
+    """一句话的标注结果（片段按位置排列、互不重叠）"""
+    language: str
+    text: str
+    segments: Tuple[ReadingSegment, ...]
+
+
+# (language, text) -> SentenceReading（末尾最新）
+_cache: "OrderedDict[Tuple[str, str], SentenceReading]" = OrderedDict()
+_cache_lock = Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+_tagger = None
+_tagger_lock = Lock()
+# fugashi 的 Tagger 不保证线程安全
+_tag_lock = Lock()
+
+
+def normalize_language(language: Optional[str]) -> str:
+    value = get_language_code((language or "").strip())
+    if value in ("zh", "chinese", "cn", "zh-cn"):
+        return LANG_ZH
+    if value in ("ja", "japanese", "jp"):
+        return LANG_JA
+    return value
+
+
+def katakana_to_hiragana(value: str) -> str:
+    chars = []
+    for ch in value:
+        code = ord(ch)
+        if 0x30A1 <= code <= 0x30F6:
+            chars.append(chr(code - 0x60))
+        else:
+            chars.append(ch)
+    return "".join(chars)
+
+
+def is_kanji(ch: str) -> bool:
+    return 0x4E00 <= ord(ch) <= 0x9FFF
+
+
+def normalize_kana_text(value: str) -> str:
+    return katakana_to_hiragana(str(value or "")).replace(" ", "").strip()
+
+
+def needs_ruby(surface: str, reading: Optional[str], language: str) -> bool:
+    """是否需要在 token 上显示读音"""
+    if not reading:
+        return False
+    if any(is_kanji(ch) for ch in surface or ""):
+        return True
+    if normalize_language(language) == LANG_JA:
+        # 假名 token 的读音与字面不同（如助词 は → わ）时也显示
+        normalized_reading = normalize_kana_text(reading)
+        return normalized_reading != "" and normalized_reading != normalize_kana_text(surface)
+    return False
+
+
+def _require_pinyin():
+    if lazy_pinyin is None or Style is None:
+        raise ReadingUnavailable("pypinyin is not installed. Run: python -m pip install pypinyin")
+
+
+def _get_tagger():
+    global _tagger
+    if Tagger is None:
+        raise ReadingUnavailable('fugashi is not installed. Run: python -m pip install "fugashi[unidic-lite]"')
+    if _tagger is None:
+        with _tagger_lock:
+            if _tagger is None:
+                _tagger = Tagger()
+    return _tagger
+
+
+def _extract_reading(word) -> Optional[str]:
+    feature = getattr(word, "feature", None)
+    if feature is None:
+        return None
+    for field_name in ("kana", "pron", "pronBase", "orthBase"):
+        value = getattr(feature, field_name, None)
+        if value and value != "*":
+            return katakana_to_hiragana(str(value))
+    return None
+
+
+def _split_words(text: str) -> List[str]:
+    """jieba 分词，返回首尾相接、能还原原文的词列表（空白也作为独立片段保留）"""
+    if not JIEBA_AVAILABLE:
+        return [text]
+    words: List[str] = []
+    cursor = 0
+    for word, start, end in Chinese_sentence_segmentation(text):
+        if start < cursor:
+            # jieba 结果与原文对不上，放弃分词，按整句交给 pypinyin
+            return [text]
+        if start > cursor:
+            words.append(text[cursor:start])
+        words.append(text[start:end])
+        cursor = end
+    if cursor < len(text):
+        words.append(text[cursor:])
+    return words
+
+
+def _annotate_chinese(text: str) -> Tuple[ReadingSegment, ...]:
+    _require_pinyin()
+    words = _split_words(text)
+    # 非汉字逐字返回空串，保证输出与原文逐字对齐
+    readings = lazy_pinyin(words, style=Style.TONE, errors=lambda chunk: [""] * len(chunk))
+    if len(readings) != len(text):
+        # 个别字符（如扩展区汉字）可能展开为多项，退回逐词标注
+        readings = []
+        for word in words:
+            parts = lazy_pinyin(word, style=Style.TONE, errors=lambda chunk: [""] * len(chunk))
+            readings.extend(parts if len(parts) == len(word) else [""] * len(word))
+
+    segments = []
+    for idx, ch in enumerate(text):
+        reading = readings[idx] or None
+        if reading and is_kanji(ch):
+            segments.append(ReadingSegment(idx, idx + 1, ch, reading))
+    return tuple(segments)
+
+
+def _annotate_japanese(text: str) -> Tuple[ReadingSegment, ...]:
+    tagger = _get_tagger()
+    with _tag_lock:
+        words = list(tagger(text))
+
+    segments = []
+    cursor = 0
+    for word in words:
+        surface = str(word.surface)
+        if not surface:
+            continue
+        start = text.find(surface, cursor)
+        if start == -1:
+            continue
+        end = start + len(surface)
+        cursor = end
+        feature = getattr(word, "feature", None)
+        pos = getattr(feature, "pos1", None) if feature is not None else None
+        segments.append(ReadingSegment(start, end, surface, _extract_reading(word), pos))
+    return tuple(segments)
+
+
+def annotate_sentence(text: str, language: str) -> SentenceReading:
+    """
+    标注一整句（带 LRU 缓存）
+
+    Args:
+        text: 句子原文
+        language: "zh" / "ja"（也接受 "中文" / "日文" 等语言名称）
+
+    Raises:
+        ReadingUnavailable: 对应语言的标注库未安装
+        ValueError: 不支持的语言
+    """
+    language = normalize_language(language)
+    key = (language, text)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            return cached
+
+    if language == LANG_ZH:
+        segments = _annotate_chinese(text)
+    elif language == LANG_JA:
+        segments = _annotate_japanese(text)
+    else:
+        raise ValueError(f"unsupported language for reading annotation: {language}")
+    result = SentenceReading(language, text, segments)
+
+    with _cache_lock:
+        _stats["misses"] += 1
+        _cache[key] = result
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_SENTENCES:
+            _cache.popitem(last=False)
+            _stats["evictions"] += 1
+    return result
+
+
+def reading_for_span(sentence: SentenceReading, start: int, end: int) -> Tuple[bool, Optional[str]]:
+    """
+    取 [start, end) 范围内的读音
+
+    Returns:
+        (aligned, reading)：aligned=False 表示范围边界切在某个标注片段中间，
+        调用方需要单独标注这段文字
+    """
+    parts = []
+    for seg in sentence.segments:
+        if seg.end <= start or seg.start >= end:
+            continue
+        if seg.start < start or seg.end > end:
+            return False, None
+        if seg.reading:
+            parts.append(seg.reading)
+    if not parts:
+        return True, None
+    joiner = " " if sentence.language == LANG_ZH else ""
+    return True, joiner.join(parts)
+
+
+def _reading_for_fragment(text: str, language: str) -> Optional[str]:
+    """单独标注一段文字（对齐失败时的回退），同样走缓存"""
+    fragment = (text or "").strip()
+    if not fragment:
+        return None
+    return reading_for_span(annotate_sentence(fragment, language), 0, len(fragment))[1]
+
+
+def align_tokens(text: str, token_texts: Sequence[str], language: str) -> List[Optional[str]]:
+    """
+    为句子里按顺序排列的 token 取读音（整句只标注一次）
+
+    Args:
+        text: 句子原文
+        token_texts: token 文本列表（与句子中出现顺序一致）
+        language: "zh" / "ja"
+
+    Returns:
+        与 token_texts 等长的读音列表（无读音为 None）
+    """
+    sentence = annotate_sentence(text, language)
+    readings: List[Optional[str]] = []
+    cursor = 0
+    for token_text in token_texts:
+        token_text = token_text or ""
+        start = text.find(token_text, cursor) if token_text else -1
+        if start == -1:
+            readings.append(_reading_for_fragment(token_text, language))
+            continue
+        end = start + len(token_text)
+        cursor = end
+        aligned, reading = reading_for_span(sentence, start, end)
+        readings.append(reading if aligned else _reading_for_fragment(token_text, language))
+    return readings
+
+
+def enrich_sentences(sentences: List[Dict[str, Any]], language: Optional[str]) -> int:
+    """
+    导入阶段批量标注：为每个句子字典填上 readings（已有的跳过）
+
+    readings 为 [[sentence_token_id, reading], ...]，只包含需要显示读音的 token。
+
+    Args:
+        sentences: 预处理结果里的句子字典列表（含 sentence_body / tokens，原地修改）
+        language: 文章语言（"中文" / "zh" / "日文" 等）；其他语言直接返回
+
+    Returns:
+        int: 本次新标注的句子数
+    """
+    language = normalize_language(language)
+    if language not in (LANG_ZH, LANG_JA):
+        return 0
+    enriched = 0
+    for sentence in sentences:
+        if sentence.get("readings") is not None:
+            continue
+        body = sentence.get("sentence_body") or ""
+        tokens = sentence.get("tokens") or []
+        if not body.strip() or not tokens:
+            continue
+        token_texts = [str(t.get("token_body", t.get("text", "")) or "") for t in tokens]
+        try:
+            token_readings = align_tokens(body, token_texts, language)
+        except ReadingUnavailable as e:
+            print(f"⚠️ [ReadingAnnotation] 跳过读音标注: {e}")
+            return enriched
+        sentence["readings"] = [
+            [t.get("sentence_token_id", t.get("token_id")), reading]
+            for t, token_text, reading in zip(tokens, token_texts, token_readings)
+            if needs_ruby(token_text, reading, language)
+        ]
+        enriched += 1
+    return enriched
+
+
+def get_stats() -> Dict[str, Any]:
+    """缓存统计：句子数、命中 / 未命中 / 淘汰次数"""
+    with _cache_lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            "sentences": len(_cache),
+            "max_sentences": MAX_SENTENCES,
+            "hits": _stats["hits"],
+            "misses": _stats["misses"],
+            "evictions": _stats["evictions"],
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else None,
+        }
+
+
+def clear() -> None:
+    """清空缓存（测试 / 调试用）"""
+    with _cache_lock:
+        _cache.clear()
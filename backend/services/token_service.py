@@ -6,11 +6,130 @@ Token 使用记录与扣减服务
 1. API 调用可能失败（网络错误、超时等）
 2. 实际使用的 token 数量可能与预估不同
 3. 只有 API 成功返回后，response.usage 才是真实的使用量
+
+两种记账方式：
+- record_token_usage：立即记账（每次调用一个加锁事务）
+- TokenUsageBuffer：按轮次缓冲，整轮结束后 flush 一次（一个加锁事务写入全部记录）
+
+用量统计（小时用量 / 累计用量）读取 token_usage_buckets / token_usage_totals
+计数表，不再对 token_logs 做 SUM。
 """
-from datetime import datetime
+from datetime import datetime, timedelta
+from threading import Lock
 from typing import Optional
+import uuid
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from database_system.business_logic.models import User, TokenLog, TokenLedger
+from database_system.business_logic.models import (
+    User,
+    TokenLog,
+    TokenLedger,
+    TokenUsageBucket,
+    TokenUsageTotal,
+)
+from backend.utils.principal_cache import invalidate_user, invalidate_user_on_commit
+
+# 分桶粒度（分钟）。小时用量按桶汇总，窗口边界最多多算一个桶
+USAGE_BUCKET_MINUTES = 5
+
+# Session.info 中存放本轮缓冲区的键
+_BUFFER_SESSION_KEY = "token_usage_buffer"
+
+
+def _bucket_start(at: datetime) -> datetime:
+    """将时间向下取整到桶起点"""
+    minute = at.minute - at.minute % USAGE_BUCKET_MINUTES
+    return at.replace(minute=minute, second=0, microsecond=0)
+
+
+def _bump_usage_counters(
+    session: Session,
+    user_id: int,
+    total_tokens: int,
+    prompt_tokens: int,
+    completion_tokens: int,
+    call_count: int,
+    at: datetime,
+) -> None:
+    """
+    累加分桶计数与累计计数
+
+    ⚠️ 调用方必须已持有该用户 users 行的 FOR UPDATE 锁，
+    这样同一用户的 get-or-create 不会并发冲突。
+    """
+    bucket_start = _bucket_start(at)
+    bucket = (
+        session.query(TokenUsageBucket)
+        .filter(
+            TokenUsageBucket.user_id == user_id,
+            TokenUsageBucket.bucket_start == bucket_start,
+        )
+        .first()
+    )
+    created = bucket is None
+    if bucket is None:
+        bucket = TokenUsageBucket(
+            user_id=user_id,
+            bucket_start=bucket_start,
+            total_tokens=0,
+            prompt_tokens=0,
+            completion_tokens=0,
+            call_count=0,
+        )
+        session.add(bucket)
+    bucket.total_tokens = (bucket.total_tokens or 0) + total_tokens
+    bucket.prompt_tokens = (bucket.prompt_tokens or 0) + prompt_tokens
+    bucket.completion_tokens = (bucket.completion_tokens or 0) + completion_tokens
+    bucket.call_count = (bucket.call_count or 0) + call_count
+
+    totals = session.get(TokenUsageTotal, user_id)
+    if totals is None:
+        created = True
+        totals = TokenUsageTotal(user_id=user_id, total_tokens=0, call_count=0)
+        session.add(totals)
+    totals.total_tokens = (totals.total_tokens or 0) + total_tokens
+    totals.call_count = (totals.call_count or 0) + call_count
+    # Session 关闭了 autoflush：新建的行要先 flush，同一事务里再次 get-or-create 才查得到（否则重复插入）
+    if created:
+        session.flush()
+
+
+def get_hourly_token_usage(session: Session, user_id: int, window_minutes: int = 60) -> int:
+    """
+    最近 window_minutes 分钟内的 token 用量（按桶汇总，最多读取 window/5 + 1 行）
+    """
+    window_start = _bucket_start(datetime.utcnow() - timedelta(minutes=window_minutes))
+    total_tokens = (
+        session.query(func.sum(TokenUsageBucket.total_tokens))
+        .filter(
+            TokenUsageBucket.user_id == user_id,
+            TokenUsageBucket.bucket_start >= window_start,
+        )
+        .scalar()
+    )
+    return int(total_tokens or 0)
+
+
+def get_lifetime_token_usage(session: Session, user_id: int) -> int:
+    """用户累计 token 用量（主键读取）"""
+    totals = session.get(TokenUsageTotal, user_id)
+    return int(totals.total_tokens or 0) if totals else 0
+
+
+def _lock_user(session: Session, user_id: int) -> Optional[User]:
+    """
+    加行级锁并重新读取用户行
+
+    populate_existing：会话里已经有这个 User（例如 /api/chat 余额检查时加载的）时，
+    默认会直接返回旧对象、不覆盖其属性，余额就会按旧值计算、覆盖其他会话已提交的变更
+    """
+    return (
+        session.query(User)
+        .filter(User.user_id == user_id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+        .first()
+    )
 
 
 def record_token_usage(
@@ -20,19 +139,21 @@ def record_token_usage(
     prompt_tokens: int,
     completion_tokens: int,
     model_name: str = "deepseek-chat",
-    assistant_name: Optional[str] = None
+    assistant_name: Optional[str] = None,
+    prompt_cache_hit_tokens: Optional[int] = None
 ) -> dict:
     """
     记录 token 使用并扣减用户余额
-    
+
     执行顺序（必须在同一事务中）：
     1. 从 response.usage 中读取真实 token 使用量
     2. 使用 usage.total_tokens 作为唯一扣减依据
     3. 从 user.token_balance 中扣减
     4. 写入一条 TokenLog
     5. 写入一条 TokenLedger（用于账本记录）
-    6. 保存 user 与 log（放在同一个事务中）
-    
+    6. 累加用量计数（分桶 + 累计）
+    7. 保存 user 与 log（放在同一个事务中）
+
     Args:
         session: 数据库会话（必须在事务中）
         user_id: 用户 ID
@@ -41,25 +162,29 @@ def record_token_usage(
         completion_tokens: Completion tokens（从 response.usage.completion_tokens 获取）
         model_name: 使用的模型名称（默认 "deepseek-chat"）
         assistant_name: 调用的 SubAssistant 名称（如 "AnswerQuestionAssistant"），用于详细统计
-    
+        prompt_cache_hit_tokens: prompt tokens 中命中前缀缓存的部分（provider 未返回时为 None）
+
     Returns:
         dict: 包含扣减后的余额等信息
     """
     # 1. 查询用户（使用行级锁，避免并发问题）
-    user = session.query(User).filter(User.user_id == user_id).with_for_update().first()
+    user = _lock_user(session, user_id)
     if not user:
         raise ValueError(f"用户不存在: user_id={user_id}")
-    
+
     # 2. 检查余额是否充足（可选，根据业务需求决定是否在调用前检查）
     if user.token_balance is None:
         user.token_balance = 0
-    
+
     # 3. 扣减 token（使用 total_tokens 作为唯一扣减依据）
     # ⚠️ 注意：这里不做余额检查，因为 API 已经成功调用
     # 如果余额不足，应该在调用 API 前检查，或者允许负余额（根据业务需求）
+    now = datetime.utcnow()
     user.token_balance = (user.token_balance or 0) - total_tokens
-    user.token_updated_at = datetime.utcnow()
-    
+    user.token_updated_at = now
+    # 余额已变更：调用方提交事务后再失效 principal 缓存（提前失效会被并发请求用旧余额重新填充）
+    invalidate_user_on_commit(session, user_id)
+
     # 4. 创建 TokenLog 记录（详细的使用日志）
     token_log = TokenLog(
         user_id=user_id,
@@ -68,12 +193,13 @@ def record_token_usage(
         completion_tokens=completion_tokens,
         model_name=model_name,
         assistant_name=assistant_name,
-        created_at=datetime.utcnow()
+        prompt_cache_hit_tokens=prompt_cache_hit_tokens,
+        created_at=now
     )
     session.add(token_log)
     # 刷新以获取 token_log.id（需要在创建 TokenLedger 之前）
     session.flush()
-    
+
     # 5. 创建 TokenLedger 记录（账本记录，用于审计）
     token_ledger = TokenLedger(
         user_id=user_id,
@@ -81,19 +207,213 @@ def record_token_usage(
         reason="ai_usage",  # 变动原因：AI 使用
         ref_type="api_call",  # 参考类型：API 调用
         ref_id=f"token_log_{token_log.id}",  # 关联到 TokenLog
-        created_at=datetime.utcnow()
+        created_at=now
     )
     session.add(token_ledger)
-    
-    # 6. 提交事务（由调用者决定是否立即提交，或在外层事务中统一提交）
+
+    # 6. 累加用量计数
+    _bump_usage_counters(session, user_id, total_tokens, prompt_tokens, completion_tokens, 1, now)
+
+    # 7. 提交事务（由调用者决定是否立即提交，或在外层事务中统一提交）
     # session.commit()  # 这里不提交，由调用者控制事务
-    
-    # 7. 返回结果
+
+    # 8. 返回结果
     return {
         "user_id": user_id,
         "total_tokens_used": total_tokens,
         "prompt_tokens": prompt_tokens,
         "completion_tokens": completion_tokens,
+        "prompt_cache_hit_tokens": prompt_cache_hit_tokens,
         "token_balance_after": user.token_balance,
         "model_name": model_name
     }
+
+
+class TokenUsageBuffer:
+    """
+    单轮（一次 /api/chat）token 记账缓冲区
+
+    用法：
+        buffer = TokenUsageBuffer(user_id)
+        attach_usage_buffer(session, buffer)   # SubAssistant.run 会把用量记到 buffer
+        ...
+        buffer.flush(session)                  # 每个阶段结束后落库（只写上次 flush 之后的新记录）
+
+    /api/chat 在返回主回答前 flush 一次（后续请求的余额 / 小时预算检查要看到主回答的消耗），
+    后台知识点抽取结束后再 flush 其余调用。
+
+    保证：
+    - 每次 API 调用仍然对应一条 TokenLog + 一条 TokenLedger（账本精确）
+    - TokenLedger.idempotency_key = "ai_usage:<turn_id>:<seq>"，重复 flush 不会重复扣费
+    - flush 在一个事务中完成：锁一次用户行、批量写入、提交一次
+    """
+
+    def __init__(self, user_id: int, turn_id: Optional[str] = None):
+        self.user_id = user_id
+        self.turn_id = turn_id or uuid.uuid4().hex
+        self._entries: list[dict] = []
+        self._flushed_count = 0
+        self._lock = Lock()
+
+    def add(
+        self,
+        total_tokens: int,
+        prompt_tokens: int,
+        completion_tokens: int,
+        model_name: str = "deepseek-chat",
+        assistant_name: Optional[str] = None,
+        prompt_cache_hit_tokens: Optional[int] = None,
+    ) -> None:
+        with self._lock:
+            self._entries.append({
+                "seq": len(self._entries),
+                "total_tokens": int(total_tokens or 0),
+                "prompt_tokens": int(prompt_tokens or 0),
+                "completion_tokens": int(completion_tokens or 0),
+                "prompt_cache_hit_tokens": int(prompt_cache_hit_tokens) if prompt_cache_hit_tokens is not None else None,
+                "model_name": model_name,
+                "assistant_name": assistant_name,
+                "created_at": datetime.utcnow(),
+            })
+
+    @property
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._entries) - self._flushed_count
+
+    def summary(self) -> dict:
+        """本轮用量汇总（总计 + 按 assistant 分组 + 调用明细），不访问数据库"""
+        with self._lock:
+            entries = list(self._entries)
+        by_assistant: dict[str, dict] = {}
+        for entry in entries:
+            name = entry["assistant_name"] or "Unknown"
+            stats = by_assistant.setdefault(
+                name,
+                {"call_count": 0, "total_tokens": 0, "prompt_tokens": 0, "completion_tokens": 0, "prompt_cache_hit_tokens": 0},
+            )
+            stats["call_count"] += 1
+            stats["total_tokens"] += entry["total_tokens"]
+            stats["prompt_tokens"] += entry["prompt_tokens"]
+            stats["completion_tokens"] += entry["completion_tokens"]
+            stats["prompt_cache_hit_tokens"] += entry["prompt_cache_hit_tokens"] or 0
+        return {
+            "call_count": len(entries),
+            "total_tokens": sum(e["total_tokens"] for e in entries),
+            "prompt_tokens": sum(e["prompt_tokens"] for e in entries),
+            "completion_tokens": sum(e["completion_tokens"] for e in entries),
+            "prompt_cache_hit_tokens": sum(e["prompt_cache_hit_tokens"] or 0 for e in entries),
+            "by_assistant": dict(sorted(by_assistant.items())),
+            "calls": entries,
+        }
+
+    def flush(self, session: Session) -> Optional[dict]:
+        """
+        把尚未落库的记录写入数据库并提交
+
+        Returns:
+            dict: 与 record_token_usage 相同结构的汇总（没有待写入记录时返回 None）
+        """
+        with self._lock:
+            pending = self._entries[self._flushed_count:]
+        if not pending:
+            return None
+
+        keys = {f"ai_usage:{self.turn_id}:{entry['seq']}": entry for entry in pending}
+
+        try:
+            user = _lock_user(session, self.user_id)
+            if not user:
+                raise ValueError(f"用户不存在: user_id={self.user_id}")
+
+            # 幂等：跳过已经写入账本的记录（例如上一次 flush 提交成功但调用方未感知）
+            already_written = {
+                key for (key,) in session.query(TokenLedger.idempotency_key)
+                .filter(TokenLedger.idempotency_key.in_(list(keys)))
+                .all()
+            }
+            to_write = [(key, entry) for key, entry in keys.items() if key not in already_written]
+
+            total = sum(entry["total_tokens"] for _, entry in to_write)
+            if to_write:
+                logs = [
+                    TokenLog(
+                        user_id=self.user_id,
+                        total_tokens=entry["total_tokens"],
+                        prompt_tokens=entry["prompt_tokens"],
+                        completion_tokens=entry["completion_tokens"],
+                        prompt_cache_hit_tokens=entry["prompt_cache_hit_tokens"],
+                        model_name=entry["model_name"],
+                        assistant_name=entry["assistant_name"],
+                        created_at=entry["created_at"],
+                    )
+                    for _, entry in to_write
+                ]
+                session.add_all(logs)
+                # 一次 flush 获取全部 token_log.id
+                session.flush()
+                session.add_all([
+                    TokenLedger(
+                        user_id=self.user_id,
+                        delta=-entry["total_tokens"],
+                        reason="ai_usage",
+                        ref_type="api_call",
+                        ref_id=f"token_log_{log.id}",
+                        created_at=entry["created_at"],
+                        idempotency_key=key,
+                    )
+                    for (key, entry), log in zip(to_write, logs)
+                ])
+
+                now = datetime.utcnow()
+                user.token_balance = (user.token_balance or 0) - total
+                user.token_updated_at = now
+                # 计数按调用时间所在的桶累加（一轮可能跨越桶边界）；同一个桶的调用先合并，每个桶只累加一次
+                per_bucket: dict = {}
+                for _, entry in to_write:
+                    sums = per_bucket.setdefault(_bucket_start(entry["created_at"]), [0, 0, 0, 0])
+                    sums[0] += entry["total_tokens"]
+                    sums[1] += entry["prompt_tokens"]
+                    sums[2] += entry["completion_tokens"]
+                    sums[3] += 1
+                for bucket_start, (bucket_total, bucket_prompt, bucket_completion, bucket_calls) in per_bucket.items():
+                    _bump_usage_counters(
+                        session,
+                        self.user_id,
+                        bucket_total,
+                        bucket_prompt,
+                        bucket_completion,
+                        bucket_calls,
+                        bucket_start,
+                    )
+
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+        with self._lock:
+            self._flushed_count += len(pending)
+        invalidate_user(self.user_id)
+
+        return {
+            "user_id": self.user_id,
+            "total_tokens_used": total,
+            "calls_written": len(to_write),
+            "token_balance_after": user.token_balance,
+        }
+
+
+def attach_usage_buffer(session: Session, buffer: Optional[TokenUsageBuffer]) -> None:
+    """把缓冲区挂到 Session 上；传 None 表示取消缓冲（恢复立即记账）"""
+    if buffer is None:
+        session.info.pop(_BUFFER_SESSION_KEY, None)
+    else:
+        session.info[_BUFFER_SESSION_KEY] = buffer
+
+
+def get_usage_buffer(session: Optional[Session]) -> Optional[TokenUsageBuffer]:
+    """获取挂在 Session 上的缓冲区（没有则返回 None）"""
+    if session is None:
+        return None
+    return session.info.get(_BUFFER_SESSION_KEY)
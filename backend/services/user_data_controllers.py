@@ -0,0 +1,312 @@
+"""
+按用户分区、按需加载的 DataController 缓存
+
+背景：
+- 以前 main.py 在 import 时创建进程级 global_dc，并把 JSON 里所有用户的
+  grammar / vocab / 文章全部 load_data 进内存；启动时间和常驻内存随总数据量增长，
+  MainAssistant 读到的还是所有用户混在一起的数据
+- 数据库才是主存储
+
+做法：
+- 每个用户一个 DataController，第一次用到时从数据库加载该用户的
+  语法规则、词汇及其例句（4 条查询，与其他用户的数据量无关）
+- 进程启动时不加载任何数据
+- LRU 淘汰，按"条目数"计重（规则 + 词汇 + 例句）：
+  超过 USER_DC_CACHE_MAX_USERS 个用户或总条目数超过 USER_DC_CACHE_MAX_ENTRIES 时，
+  从最久未使用的用户开始淘汰
+- 统计命中 / 未命中 / 淘汰 / 失效次数和加载耗时（get_stats）
+
+注意：
+- 分区里的数据只是数据库的只读镜像，不再写回全局 JSON 文件
+- 该用户的词汇 / 语法规则 / 例句在数据库里提交改动后（REST 增删改、后台批量写入、删除文章级联），
+  分区随 knowledge_list_cache 的 commit 事件一起丢弃，下次访问重新加载，
+  避免 MainAssistant 按旧分区查重
+- 失效发生在加载途中（分区还没放进缓存）时，加载方比较失效代数，丢弃可能过期的快照并重新加载
+- 文章（text_manager）不预加载：MainAssistant 读文章走数据库
+"""
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict
+
+from backend.data_managers.data_controller import DataController
+from backend.services import knowledge_list_cache
+from backend.data_managers.data_classes_new import (
+    GrammarExample as NewGrammarExample,
+    GrammarRule as NewGrammarRule,
+    VocabExpression as NewVocabExpression,
+    VocabExpressionExample as NewVocabExpressionExample,
+)
+
+
+MAX_USERS = int(os.getenv("USER_DC_CACHE_MAX_USERS", "256"))
+MAX_ENTRIES = int(os.getenv("USER_DC_CACHE_MAX_ENTRIES", "200000"))
+DIALOGUE_MAX_TURNS = 100
+
+
+class _Partition:
+    """一个用户的 DataController + 计重"""
+
+    __slots__ = ("controller", "weight")
+
+    def __init__(self, controller: DataController, weight: int):
+        self.controller = controller
+        self.weight = weight
+
+
+# user_id -> _Partition（按最近使用排序，末尾最新）
+_partitions: "OrderedDict[int, _Partition]" = OrderedDict()
+_partitions_lock = Lock()
+# 同一用户并发未命中时只加载一次：user_id -> _LoadSlot（最后一个等待者离开后才移除）
+_load_slots: Dict[int, "_LoadSlot"] = {}
+_total_weight = 0
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "stale_loads": 0, "load_seconds": 0.0}
+
+
+class _LoadSlot:
+    """一个用户正在进行的加载：加载锁 + 持有 / 等待者计数 + 失效代数"""
+
+    __slots__ = ("lock", "users", "generation")
+
+    def __init__(self):
+        self.lock = Lock()
+        self.users = 0
+        # 加载期间每次失效 +1；加载结束时与开始时不同说明读到的快照可能已过期
+        self.generation = 0
+
+
+# 加载期间失效的重试次数上限（超过后返回本次加载结果但不放进缓存）
+_MAX_LOAD_ATTEMPTS = 3
+
+
+def _source_value(source: Any) -> str:
+    return getattr(source, "value", source) or "qa"
+
+
+def _estimate_weight(controller: DataController) -> int:
+    """按条目数估算分区大小：每条规则 / 词汇 / 例句计 1"""
+    weight = 1
+    for rule in controller.grammar_manager.grammar_bundles.values():
+        weight += 1 + len(rule.examples)
+    for vocab in controller.vocab_manager.vocab_bundles.values():
+        weight += 1 + len(vocab.examples)
+    return weight
+
+
+def _load_partition(user_id: int, session=None) -> DataController:
+    """从数据库加载一个用户的语法规则、词汇及例句"""
+    from database_system.business_logic.models import (
+        GrammarExample,
+        GrammarRule,
+        VocabExpression,
+        VocabExpressionExample,
+    )
+
+    own_session = session is None
+    if own_session:
+        from backend.config import ENV
+        from database_system.database_manager import DatabaseManager
+
+        session = DatabaseManager(ENV).get_session()
+
+    controller = DataController(max_turns=DIALOGUE_MAX_TURNS)
+    try:
+        grammar_bundles = controller.grammar_manager.grammar_bundles
+        for rule in session.query(GrammarRule).filter(GrammarRule.user_id == user_id).order_by(GrammarRule.rule_id):
+            grammar_bundles[rule.rule_id] = NewGrammarRule(
+                rule_id=rule.rule_id,
+                name=rule.rule_name,
+                explanation=rule.rule_summary,
+                display_name=rule.display_name,
+                canonical_category=rule.canonical_category,
+                canonical_subtype=rule.canonical_subtype,
+                canonical_function=rule.canonical_function,
+                canonical_key=rule.canonical_key,
+                language=rule.language,
+                source=_source_value(rule.source),
+                is_starred=bool(rule.is_starred),
+                examples=[],
+            )
+        grammar_examples = (
+            session.query(GrammarExample)
+            .join(GrammarRule, GrammarRule.rule_id == GrammarExample.rule_id)
+            .filter(GrammarRule.user_id == user_id)
+            .order_by(GrammarExample.example_id)
+        )
+        for ex in grammar_examples:
+            rule = grammar_bundles.get(ex.rule_id)
+            if rule is not None:
+                rule.examples.append(NewGrammarExample(
+                    rule_id=ex.rule_id,
+                    text_id=ex.text_id,
+                    sentence_id=ex.sentence_id,
+                    explanation_context=ex.explanation_context,
+                ))
+
+        vocab_bundles = controller.vocab_manager.vocab_bundles
+        for vocab in session.query(VocabExpression).filter(VocabExpression.user_id == user_id).order_by(VocabExpression.vocab_id):
+            vocab_bundles[vocab.vocab_id] = NewVocabExpression(
+                vocab_id=vocab.vocab_id,
+                vocab_body=vocab.vocab_body,
+                explanation=vocab.explanation,
+                language=vocab.language,
+                source=_source_value(vocab.source),
+                is_starred=bool(vocab.is_starred),
+                examples=[],
+            )
+        vocab_examples = (
+            session.query(VocabExpressionExample)
+            .join(VocabExpression, VocabExpression.vocab_id == VocabExpressionExample.vocab_id)
+            .filter(VocabExpression.user_id == user_id)
+            .order_by(VocabExpressionExample.example_id)
+        )
+        for ex in vocab_examples:
+            vocab = vocab_bundles.get(ex.vocab_id)
+            if vocab is not None:
+                vocab.examples.append(NewVocabExpressionExample(
+                    vocab_id=ex.vocab_id,
+                    text_id=ex.text_id,
+                    sentence_id=ex.sentence_id,
+                    context_explanation=ex.context_explanation,
+                    token_indices=list(ex.token_indices or []),
+                ))
+    finally:
+        if own_session:
+            session.close()
+
+    return controller
+
+
+def _evict_locked(keep_user_id: int) -> None:
+    """超过上限时从最久未使用的用户开始淘汰（调用方持有 _partitions_lock）"""
+    global _total_weight
+    while _partitions and (len(_partitions) > MAX_USERS or _total_weight > MAX_ENTRIES):
+        oldest_user_id = next(iter(_partitions))
+        if oldest_user_id == keep_user_id:
+            # 只剩当前用户时不淘汰（单个分区超过上限也要能用）
+            if len(_partitions) == 1:
+                break
+            _partitions.move_to_end(oldest_user_id)
+            continue
+        partition = _partitions.pop(oldest_user_id)
+        _total_weight -= partition.weight
+        _stats["evictions"] += 1
+
+
+def get_user_data_controller(user_id: int, session=None) -> DataController:
+    """
+    获取用户的 DataController（未命中时从数据库加载）
+
+    Args:
+        user_id: 用户 ID
+        session: 可选的数据库会话；不传时内部创建并关闭
+    """
+    global _total_weight
+
+    with _partitions_lock:
+        partition = _partitions.get(user_id)
+        if partition is not None:
+            _partitions.move_to_end(user_id)
+            _stats["hits"] += 1
+            return partition.controller
+        slot = _load_slots.get(user_id)
+        if slot is None:
+            slot = _load_slots[user_id] = _LoadSlot()
+        slot.users += 1
+
+    try:
+        with slot.lock:
+            for attempt in range(1, _MAX_LOAD_ATTEMPTS + 1):
+                # 等锁期间其他请求可能已经加载完成
+                with _partitions_lock:
+                    partition = _partitions.get(user_id)
+                    if partition is not None:
+                        _partitions.move_to_end(user_id)
+                        _stats["hits"] += 1
+                        return partition.controller
+                    _stats["misses"] += 1
+                    generation = slot.generation
+
+                started = time.perf_counter()
+                controller = _load_partition(user_id, session=session)
+                elapsed = time.perf_counter() - started
+                weight = _estimate_weight(controller)
+
+                with _partitions_lock:
+                    _stats["load_seconds"] += elapsed
+                    if slot.generation != generation:
+                        # 加载期间该用户的数据被修改并提交：快照可能缺少这次改动，不放进缓存
+                        _stats["stale_loads"] += 1
+                        continue
+                    _partitions[user_id] = _Partition(controller, weight)
+                    _total_weight += weight
+                    _evict_locked(keep_user_id=user_id)
+                print(f"📦 [UserDataControllers] 已加载 user_id={user_id} 的分区: {weight} 条, {elapsed * 1000:.1f}ms")
+                return controller
+
+            print(f"⚠️ [UserDataControllers] user_id={user_id} 的数据在加载期间持续变化，本次结果不缓存")
+            return controller
+    finally:
+        with _partitions_lock:
+            slot.users -= 1
+            if slot.users == 0 and _load_slots.get(user_id) is slot:
+                del _load_slots[user_id]
+
+
+def invalidate_user_data_controller(user_id: int) -> None:
+    """丢弃用户分区（数据库里的数据被修改后调用，下次访问重新加载）"""
+    global _total_weight
+    with _partitions_lock:
+        partition = _partitions.pop(user_id, None)
+        if partition is not None:
+            _total_weight -= partition.weight
+            _stats["invalidations"] += 1
+        # 正在加载的快照可能读在这次提交之前：让加载方丢弃结果
+        slot = _load_slots.get(user_id)
+        if slot is not None:
+            slot.generation += 1
+
+
+# 词汇 / 语法数据提交后丢弃该用户的分区（与列表缓存共用同一套 commit 事件收集）
+knowledge_list_cache.add_change_listener(lambda user_id, kinds: invalidate_user_data_controller(user_id))
+
+
+def refresh_partition_weight(user_id: int) -> None:
+    """分区内容增长后重新计重（后台流程写完本轮知识点后调用），必要时触发淘汰"""
+    global _total_weight
+    with _partitions_lock:
+        partition = _partitions.get(user_id)
+        if partition is None:
+            return
+        weight = _estimate_weight(partition.controller)
+        _total_weight += weight - partition.weight
+        partition.weight = weight
+        _evict_locked(keep_user_id=user_id)
+
+
+def get_stats() -> Dict[str, Any]:
+    """缓存统计：命中 / 未命中 / 淘汰 / 失效次数、加载耗时、当前分区数与总条目数"""
+    with _partitions_lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            "users": len(_partitions),
+            "entries": _total_weight,
+            "max_users": MAX_USERS,
+            "max_entries": MAX_ENTRIES,
+            "hits": _stats["hits"],
+            "misses": _stats["misses"],
+            "evictions": _stats["evictions"],
+            "invalidations": _stats["invalidations"],
+            "stale_loads": _stats["stale_loads"],
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else None,
+            "avg_load_ms": round(_stats["load_seconds"] * 1000 / _stats["misses"], 2) if _stats["misses"] else None,
+        }
+
+
+def clear() -> None:
+    """清空全部分区（测试 / 调试用）"""
+    global _total_weight
+    with _partitions_lock:
+        _partitions.clear()
+        _total_weight = 0
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from database_system.business_logic.models import Base, TokenLedger, User
+from backend.services.token_service import TokenUsageBuffer, record_token_usage
+
+
+def make_sessionmaker(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tokens.db'}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def create_user(Session, balance: int) -> int:
+    session = Session()
+    try:
+        user = User(password_hash="x", token_balance=balance)
+        session.add(user)
+        session.commit()
+        return user.user_id
+    finally:
+        session.close()
+
+
+def ledger_sum(Session, user_id: int) -> int:
+    session = Session()
+    try:
+        return session.query(func.coalesce(func.sum(TokenLedger.delta), 0)).filter(TokenLedger.user_id == user_id).scalar()
+    finally:
+        session.close()
+
+
+def current_balance(Session, user_id: int) -> int:
+    session = Session()
+    try:
+        return session.get(User, user_id).token_balance
+    finally:
+        session.close()
+
+
+def test_concurrent_flushes_keep_balance_in_sync_with_ledger(tmp_path) -> None:
+    Session = make_sessionmaker(tmp_path)
+    user_id = create_user(Session, 1000)
+
+    # 两轮对话各自的会话都先加载了用户（/api/chat 的余额检查），之后才先后 flush
+    first_session, second_session = Session(), Session()
+    try:
+        assert first_session.get(User, user_id).token_balance == 1000
+        assert second_session.get(User, user_id).token_balance == 1000
+
+        first = TokenUsageBuffer(user_id)
+        first.add(100, 60, 40, assistant_name="AnswerQuestionAssistant")
+        second = TokenUsageBuffer(user_id)
+        second.add(30, 20, 10, assistant_name="AnswerQuestionAssistant")
+        second.add(20, 10, 10, assistant_name="VocabExplanationAssistant")
+
+        assert first.flush(first_session)["token_balance_after"] == 900
+        # 第二个会话手里的 User 仍是 1000：flush 必须按数据库里的最新余额扣减
+        assert second.flush(second_session)["token_balance_after"] == 850
+    finally:
+        first_session.close()
+        second_session.close()
+
+    assert current_balance(Session, user_id) == 850
+    assert ledger_sum(Session, user_id) == -150
+
+
+def test_record_token_usage_rereads_balance_held_by_session(tmp_path) -> None:
+    Session = make_sessionmaker(tmp_path)
+    user_id = create_user(Session, 500)
+
+    session = Session()
+    try:
+        assert session.get(User, user_id).token_balance == 500
+
+        other = Session()
+        try:
+            record_token_usage(other, user_id, 200, 150, 50)
+            other.commit()
+        finally:
+            other.close()
+
+        result = record_token_usage(session, user_id, 50, 30, 20)
+        session.commit()
+        assert result["token_balance_after"] == 250
+    finally:
+        session.close()
+
+    assert current_balance(Session, user_id) == 250
+    assert ledger_sum(Session, user_id) == -250
@@ -2,8 +2,11 @@
 认证工具模块
 提供密码加密、JWT token 生成和验证功能
 """
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from threading import Lock
 from typing import Optional
+import time
 import bcrypt
 from jose import JWTError, jwt
 
@@ -20,6 +23,12 @@ except ImportError:
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7天
 
+# 解码结果缓存（token 字符串 -> (payload, 过期时间戳)）
+# 一次文章页打开会并发十几个请求，全部携带同一个 token，避免每次都重复验签
+_DECODED_TOKEN_CACHE_MAX_SIZE = 2048
+_decoded_token_cache: "OrderedDict[str, tuple[dict, float]]" = OrderedDict()
+_decoded_token_cache_lock = Lock()
+
 
 def hash_password(password: str) -> str:
     """
@@ -76,7 +85,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    # iat 用于区分同一用户的不同登录（principal 缓存键的一部分）
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     
     return encoded_jwt
@@ -91,13 +101,35 @@ def decode_access_token(token: str) -> Optional[dict]:
         
     Returns:
         dict: 解码后的数据，如果 token 无效则返回 None
+
+    说明：
+        验签结果按 token 缓存，直到 token 的 exp 为止；无效 token 不缓存。
+        返回的是缓存 payload 的副本，调用方可以随意修改。
     """
+    now = time.time()
+    with _decoded_token_cache_lock:
+        cached = _decoded_token_cache.get(token)
+        if cached is not None:
+            payload, expires_at = cached
+            if expires_at > now:
+                _decoded_token_cache.move_to_end(token)
+                return dict(payload)
+            del _decoded_token_cache[token]
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
         return None
 
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        with _decoded_token_cache_lock:
+            _decoded_token_cache[token] = (dict(payload), float(exp))
+            _decoded_token_cache.move_to_end(token)
+            while len(_decoded_token_cache) > _DECODED_TOKEN_CACHE_MAX_SIZE:
+                _decoded_token_cache.popitem(last=False)
+    return payload
+
 
 def create_password_reset_token(user_id: int) -> str:
     """
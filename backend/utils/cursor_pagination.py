@@ -0,0 +1,69 @@
+"""
+列表接口的游标（keyset）分页
+
+背景：
+- offset(skip).limit(limit) 翻到第 N 页要先扫过前面 skip 行，越往后越慢；
+  翻页期间有新增 / 删除时还会重复或漏掉条目
+
+做法：
+- 列表按 (排序键, id) 升序；游标 = 上一页最后一行的 (排序键, id)，下一页查询
+  WHERE (排序键, id) > (游标值) ORDER BY 排序键, id LIMIT n，配合 (过滤列..., 排序键, id) 复合索引直接定位
+- 游标对客户端不透明：{"k": 列表类型, "v": 排序键, "t": 值类型, "i": id} 的 JSON 经 base64url 编码；
+  带上列表类型，避免把词汇列表的游标用到语法列表上
+- 多取一行判断是否还有下一页：响应中 next_cursor 为下一页的 cursor，has_more=false 表示已到末尾
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+
+
+class InvalidCursorError(ValueError):
+    """游标无法解析，或不属于当前列表"""
+
+
+def encode_cursor(kind: str, sort_value: Any, row_id: int) -> str:
+    if isinstance(sort_value, datetime):
+        payload = {"k": kind, "v": sort_value.isoformat(), "t": "dt", "i": row_id}
+    else:
+        payload = {"k": kind, "v": sort_value, "t": "raw", "i": row_id}
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str) -> Tuple[Any, int]:
+    """返回 (排序键, id)；格式错误或列表类型不符时抛 InvalidCursorError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw.decode("utf-8"))
+        if payload["k"] != kind:
+            raise InvalidCursorError(f"cursor belongs to {payload['k']!r}, not {kind!r}")
+        value = payload["v"]
+        if payload["t"] == "dt":
+            value = datetime.fromisoformat(value)
+        row_id = payload["i"]
+        if not isinstance(row_id, int) or isinstance(row_id, bool):
+            raise InvalidCursorError("cursor id must be an integer")
+        return value, row_id
+    except InvalidCursorError:
+        raise
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError(f"invalid cursor: {e}") from e
+
+
+def after(sort_column, id_column, position: Tuple[Any, int]):
+    """(排序键, id) > 游标位置 的过滤条件（行值比较，SQLite / PostgreSQL 都能走复合索引）"""
+    return tuple_(sort_column, id_column) > tuple_(*position)
+
+
+def next_cursor(kind: str, rows: Sequence[Any], limit: int, sort_attr: str, id_attr: str) -> Tuple[list, Optional[str]]:
+    """
+    rows 为按 limit + 1 取回的结果：返回 (本页 rows[:limit], 下一页游标或 None)
+    """
+    page = list(rows[:limit])
+    if len(rows) <= limit or not page:
+        return page, None
+    last = page[-1]
+    return page, encode_cursor(kind, getattr(last, sort_attr), getattr(last, id_attr))
@@ -0,0 +1,133 @@
+"""
+已认证用户（principal）短 TTL 缓存
+
+用途：
+- get_current_user 每个请求都要按 JWT 的 sub 查询一次 User，
+  打开一篇文章会并发触发十几个接口，重复查询同一行
+- 这里按 (user_id, iat) 缓存 User 的列快照，命中时通过
+  session.merge(load=False) 挂到当前请求的 Session 上，不发 SQL
+
+一致性：
+- TTL 很短（默认 30 秒，可用 AUTH_PRINCIPAL_CACHE_TTL 调整，0 表示关闭）
+- 角色 / 余额 / 密码 / 偏好变更时调用 invalidate_user() 立即失效；
+  变更尚未提交时用 invalidate_user_on_commit()，在事务提交后才失效
+  （提交前失效的话，并发请求会读到旧值并重新缓存整个 TTL）
+- 多进程部署时失效只作用于本进程，其余进程依赖 TTL 过期
+- 余额敏感的接口应使用 get_current_user_fresh，始终读库
+"""
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from database_system.business_logic.models import User
+
+
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", "30"))
+PRINCIPAL_CACHE_MAX_SIZE = 1024
+
+# (user_id, iat) -> (User 快照（detached）, 写入时间戳)
+_principal_cache: "OrderedDict[Tuple[int, int], Tuple[User, float]]" = OrderedDict()
+_principal_cache_lock = Lock()
+
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _snapshot(user: User) -> User:
+    """复制 User 的全部列为一个 detached 实例（不共享原 Session 的状态）"""
+    copy = User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+    make_transient_to_detached(copy)
+    return copy
+
+
+def get_cached_principal(session: Session, user_id: int, issued_at: int) -> Optional[User]:
+    """
+    从缓存获取用户并挂载到给定 Session
+
+    Returns:
+        User: 属于 session 的持久化实例；未命中或已过期返回 None
+    """
+    if PRINCIPAL_CACHE_TTL_SECONDS <= 0:
+        return None
+
+    key = (user_id, issued_at)
+    now = time.time()
+    with _principal_cache_lock:
+        entry = _principal_cache.get(key)
+        if entry is None or now - entry[1] > PRINCIPAL_CACHE_TTL_SECONDS:
+            if entry is not None:
+                del _principal_cache[key]
+            _stats["misses"] += 1
+            return None
+        _principal_cache.move_to_end(key)
+        _stats["hits"] += 1
+        cached_user = entry[0]
+
+    # 同一请求内若 Session 已有该用户（identity map），merge 会直接返回它
+    return session.merge(cached_user, load=False)
+
+
+def cache_principal(user: User, issued_at: int) -> None:
+    """写入缓存（在从数据库加载到 user 之后调用）"""
+    if PRINCIPAL_CACHE_TTL_SECONDS <= 0:
+        return
+
+    key = (user.user_id, issued_at)
+    snapshot = _snapshot(user)
+    with _principal_cache_lock:
+        _principal_cache[key] = (snapshot, time.time())
+        _principal_cache.move_to_end(key)
+        while len(_principal_cache) > PRINCIPAL_CACHE_MAX_SIZE:
+            _principal_cache.popitem(last=False)
+
+
+def invalidate_user(user_id: int) -> None:
+    """失效某个用户的所有缓存项（角色、余额、密码、偏好变更后调用）"""
+    with _principal_cache_lock:
+        stale_keys = [key for key in _principal_cache if key[0] == user_id]
+        for key in stale_keys:
+            del _principal_cache[key]
+        _stats["invalidations"] += 1
+
+
+_SESSION_INFO_KEY = "principal_cache_pending_invalidations"
+
+
+def invalidate_user_on_commit(session: Session, user_id: int) -> None:
+    """登记失效：session 的事务提交后才失效该用户（回滚则丢弃）"""
+    session.info.setdefault(_SESSION_INFO_KEY, set()).add(user_id)
+
+
+def _apply_pending(session: Session) -> None:
+    for user_id in session.info.pop(_SESSION_INFO_KEY, ()):
+        invalidate_user(user_id)
+
+
+def _discard_pending(session: Session, previous_transaction) -> None:
+    # 只在最外层事务回滚时丢弃（SAVEPOINT 回滚不影响外层已登记的失效）
+    if not previous_transaction.nested:
+        session.info.pop(_SESSION_INFO_KEY, None)
+
+
+event.listen(Session, "after_commit", _apply_pending)
+event.listen(Session, "after_soft_rollback", _discard_pending)
+
+
+def clear_principal_cache() -> None:
+    """清空缓存（用于调试 / 测试）"""
+    with _principal_cache_lock:
+        _principal_cache.clear()
+
+
+def get_principal_cache_stats() -> dict:
+    """返回缓存命中统计（用于调试）"""
+    with _principal_cache_lock:
+        return {
+            **_stats,
+            "size": len(_principal_cache),
+            "ttl_seconds": PRINCIPAL_CACHE_TTL_SECONDS,
+        }
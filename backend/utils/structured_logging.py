@@ -0,0 +1,227 @@
+"""
+结构化日志（替代热路径上的 print）
+
+问题：
+- /api/chat、MainAssistant 的逐 token / 逐知识点循环里大量 print，
+  且 f-string 会立即格式化整段 payload / dict / key 列表
+- 同步写 stdout 在线上会出现在延迟剖析里
+
+做法：
+- logger.debug("... %s", value) 形式：级别未开启时不格式化、不做 I/O
+- 参数本身开销大时用 lazy(lambda: ...) 包装，只在真正输出时求值
+- 每个模块可以单独设置级别（LOG_MODULE_LEVELS）
+- 逐条目的 debug 行可以按模板采样（LOG_DEBUG_SAMPLE_EVERY）
+- QueueHandler + QueueListener：请求线程只做格式化和入队，写 stdout 在后台线程
+
+环境变量：
+- LOG_LEVEL:            全局级别，默认 INFO
+- LOG_MODULE_LEVELS:    逐模块级别，如 "chat=DEBUG,main_assistant=WARNING"（server / chat / main_assistant）
+- LOG_FORMAT:           text（默认，保持原 print 的输出样式）或 json
+- LOG_DEBUG_SAMPLE_EVERY: DEBUG 行每个模板每 N 条输出 1 条，默认 1（不采样）
+- LOG_QUEUE_SIZE:       队列上限，默认 10000；满时丢弃并计数，不阻塞请求线程
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+
+# LogRecord 的内置属性（其余属性视为 extra 结构化字段）
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_configured = False
+_configure_lock = Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+_dropped_records = 0
+
+
+class lazy:
+    """
+    延迟求值的日志参数：只有在该日志真正输出时才调用 func
+
+    示例：
+        logger.debug("payload=%s", lazy(lambda: json.dumps(payload, ensure_ascii=False)))
+    """
+
+    __slots__ = ("func",)
+
+    def __init__(self, func: Callable[[], Any]):
+        self.func = func
+
+    def __str__(self) -> str:
+        try:
+            return str(self.func())
+        except Exception as e:
+            return f"<lazy error: {e}>"
+
+    __repr__ = __str__
+
+
+class DebugSamplingFilter(logging.Filter):
+    """
+    DEBUG 行按消息模板采样：同一模板每 every 条只放行 1 条（第 1 条总是放行）
+
+    只影响 DEBUG；INFO 及以上不采样。采样计数以模板（record.msg）为键，
+    模板数量有限（源码里的字面量），不会无限增长。
+    """
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._counters: Dict[Any, int] = {}
+        self._lock = Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.every <= 1 or record.levelno > logging.DEBUG:
+            return True
+        key = (record.name, record.msg if isinstance(record.msg, str) else id(record.msg))
+        with self._lock:
+            count = self._counters.get(key, 0)
+            self._counters[key] = count + 1
+        return count % self.every == 0
+
+
+class TextFormatter(logging.Formatter):
+    """与原 print 输出保持一致：只输出消息，有 user_id / chat_req 时加前缀"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        prefix = ""
+        if hasattr(record, "user_id"):
+            prefix += f"[user_id={record.user_id}] "
+        if hasattr(record, "chat_req"):
+            prefix += f"[chat_req={record.chat_req}] "
+        text = prefix + message
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """一行一个 JSON 对象：ts / level / logger / msg + extra 字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时丢弃记录并计数，而不是阻塞请求线程"""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        global _dropped_records
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped_records += 1
+
+
+def _parse_level(value: str, default: int) -> int:
+    level = logging.getLevelName(str(value).strip().upper())
+    return level if isinstance(level, int) else default
+
+
+def configure_logging(force: bool = False) -> None:
+    """
+    初始化日志管线（幂等；进程内第一次 get_logger 时自动调用）
+    """
+    global _configured, _listener
+    with _configure_lock:
+        if _configured and not force:
+            return
+
+        root_level = _parse_level(os.getenv("LOG_LEVEL", "INFO"), logging.INFO)
+        log_format = os.getenv("LOG_FORMAT", "text").strip().lower()
+        sample_every = int(os.getenv("LOG_DEBUG_SAMPLE_EVERY", "1") or 1)
+        queue_size = int(os.getenv("LOG_QUEUE_SIZE", "10000") or 10000)
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+
+        if _listener is not None:
+            _listener.stop()
+        log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=queue_size)
+        queue_handler = _NonBlockingQueueHandler(log_queue)
+        queue_handler.addFilter(DebugSamplingFilter(sample_every))
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=False)
+        _listener.start()
+
+        app_logger = logging.getLogger("app")
+        app_logger.handlers = [queue_handler]
+        app_logger.setLevel(root_level)
+        app_logger.propagate = False
+
+        for item in os.getenv("LOG_MODULE_LEVELS", "").split(","):
+            if "=" not in item:
+                continue
+            name, level = item.split("=", 1)
+            name = name.strip()
+            if name:
+                logging.getLogger(_qualify(name)).setLevel(_parse_level(level, root_level))
+
+        if not _configured:
+            atexit.register(shutdown_logging)
+        _configured = True
+
+
+def _qualify(name: str) -> str:
+    """所有应用 logger 挂在 "app" 下，共用同一个队列 handler"""
+    return name if name == "app" or name.startswith("app.") else f"app.{name}"
+
+
+def get_logger(name: str) -> logging.Logger:
+    """获取应用 logger（名称会挂到 "app." 命名空间下）"""
+    configure_logging()
+    return logging.getLogger(_qualify(name))
+
+
+def shutdown_logging() -> None:
+    """停止后台写线程并刷出队列中剩余的日志（进程退出前调用）"""
+    global _listener, _configured
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        _configured = False
+
+
+def get_logging_stats() -> dict:
+    """返回日志管线状态（用于调试）"""
+    app_logger = logging.getLogger("app")
+    return {
+        "level": logging.getLevelName(app_logger.level),
+        "dropped_records": _dropped_records,
+        "listener_running": _listener is not None,
+    }
+
+
+def level_for_message(message: str) -> int:
+    """
+    按原 print 的前缀约定推断级别：
+    ❌ / Error / [ERROR] -> ERROR，⚠️ / Warning / [WARN] -> WARNING，🔍 / [DEBUG] -> DEBUG，其余 -> INFO
+    """
+    head = message.lstrip()[:16]
+    lowered = head.lower()
+    if head.startswith("❌") or lowered.startswith("error") or "[ERROR]" in head:
+        return logging.ERROR
+    if head.startswith("⚠") or lowered.startswith("warning") or "[WARN" in head:
+        return logging.WARNING
+    if head.startswith("🔍") or "[DEBUG]" in message[:40]:
+        return logging.DEBUG
+    return logging.INFO
@@ -55,13 +55,15 @@ class TextCRUD:
         return query.all()
     
     def create_sentence(self, text_id: int, sentence_id: int, sentence_body: str,
-                       difficulty_level: Optional[str] = None, auto_commit: bool = True) -> Sentence:
+                       difficulty_level: Optional[str] = None, auto_commit: bool = True,
+                       readings: Optional[list] = None) -> Sentence:
         """创建句子"""
         sentence = Sentence(
             text_id=text_id,
             sentence_id=sentence_id,
             sentence_body=sentence_body,
-            sentence_difficulty_level=difficulty_level
+            sentence_difficulty_level=difficulty_level,
+            readings=readings,
         )
         self.session.add(sentence)
         if auto_commit:
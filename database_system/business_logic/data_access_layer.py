@@ -186,6 +186,7 @@ class TextDataAccessLayer:
         sentence_body: str,
         difficulty_level: Optional[str] = None,
         auto_commit: bool = True,
+        readings: Optional[list] = None,
     ):
         """创建句子"""
         return self._crud.create_sentence(
@@ -194,6 +195,7 @@ class TextDataAccessLayer:
             sentence_body,
             difficulty_level=difficulty_level,
             auto_commit=auto_commit,
+            readings=readings,
         )
     
     def get_sentences_by_text(self, text_id: int):
@@ -37,6 +37,7 @@ class TextManager:
         sentence_body: str,
         difficulty_level: Optional[str] = None,
         auto_commit: bool = True,
+        readings: Optional[list] = None,
     ) -> Sentence:
         """
         创建句子
@@ -47,6 +48,7 @@ class TextManager:
             sentence_body,
             difficulty_level=difficulty_level,
             auto_commit=auto_commit,
+            readings=readings,
         )
     
     def get_sentences(self, text_id: int) -> List[Sentence]:
@@ -15,12 +15,44 @@ from sqlalchemy import (
     BigInteger,
     Index,
 )
-from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+from sqlalchemy.orm import declarative_base, relationship, sessionmaker, validates
 from datetime import datetime
+from typing import Optional
 import enum
+import secrets
 
 Base = declarative_base()
 
+
+def new_content_version() -> str:
+    """文章内容版本号（句子 / token 变化时换新，用于 ETag 和序列化结果缓存）"""
+    return secrets.token_hex(8)
+
+
+# 语言名称 / 别名 -> 规范语言代码（vocab_expressions / grammar_rules 的 language_code 列）
+LANGUAGE_CODE_ALIASES = {
+    "zh": "zh", "zh-cn": "zh", "zh-hans": "zh", "中文": "zh", "chinese": "zh",
+    "en": "en", "en-us": "en", "英文": "en", "英语": "en", "english": "en",
+    "de": "de", "de-de": "de", "德文": "de", "德语": "de", "german": "de",
+    "es": "es", "es-es": "es", "西班牙语": "es", "spanish": "es",
+    "fr": "fr", "fr-fr": "fr", "法语": "fr", "french": "fr",
+    "ja": "ja", "ja-jp": "ja", "日语": "ja", "日文": "ja", "日本語": "ja", "japanese": "ja",
+    "ko": "ko", "ko-kr": "ko", "韩语": "ko", "korean": "ko",
+    "ar": "ar", "ar-sa": "ar", "阿拉伯语": "ar", "arabic": "ar",
+    "ru": "ru", "ru-ru": "ru", "俄语": "ru", "russian": "ru",
+}
+
+
+def normalize_language_code(language: Optional[str]) -> Optional[str]:
+    """language（"德文" / "German" / "de-DE" ...）-> 规范代码（"de"）；未知语言返回小写原值，空值返回 None"""
+    if not language:
+        return None
+    value = str(language).strip().lower().replace("_", "-")
+    if not value:
+        return None
+    return LANGUAGE_CODE_ALIASES.get(value, value)[:50]
+
+
 class SourceType(enum.Enum):
     AUTO = 'auto'
     QA = 'qa'
@@ -87,6 +119,7 @@ class VocabExpression(Base):
     vocab_body = Column(String(255), nullable=False)
     explanation = Column(Text, nullable=False)
     language = Column(String(50), nullable=True)  # 语言：中文、英文、德文
+    language_code = Column(String(50), nullable=True)  # 规范语言代码（zh / en / de ...），随 language 自动维护，用于列表过滤
     source = Column(EnumType(SourceType, length=50), default=SourceType.AUTO, nullable=False)
     is_starred = Column(Boolean, default=False, nullable=False)
     learn_status = Column(EnumType(LearnStatus, length=50), default=LearnStatus.NOT_MASTERED, nullable=False)  # 学习状态：未掌握/已掌握
@@ -95,8 +128,17 @@ class VocabExpression(Base):
 
     __table_args__ = (
         UniqueConstraint('user_id', 'vocab_body', name='uq_user_vocab_body'),
+        Index('idx_vocab_user_lang_status_starred', 'user_id', 'language_code', 'learn_status', 'is_starred'),
+        # 列表游标分页：按 (created_at, vocab_id) 顺序扫描，WHERE (created_at, vocab_id) > 游标 直接定位
+        Index('idx_vocab_user_created', 'user_id', 'created_at', 'vocab_id'),
+        Index('idx_vocab_user_lang_created', 'user_id', 'language_code', 'created_at', 'vocab_id'),
     )
 
+    @validates('language')
+    def _sync_language_code(self, key, value):
+        self.language_code = normalize_language_code(value)
+        return value
+
     examples = relationship('VocabExpressionExample', back_populates='vocab', cascade='all, delete-orphan')
     tokens = relationship('Token', back_populates='linked_vocab')
     owner = relationship('User', backref='vocab_expressions')
@@ -109,6 +151,7 @@ class GrammarRule(Base):
     rule_name = Column(String(255), nullable=False)
     rule_summary = Column(Text, nullable=False)
     language = Column(String(50), nullable=True)  # 语言：中文、英文、德文
+    language_code = Column(String(50), nullable=True)  # 规范语言代码（zh / en / de ...），随 language 自动维护，用于列表过滤
     # 展示用名称（可选，保留 rule_name 作为主键/唯一约束的一部分）
     display_name = Column(String(255), nullable=True)
     # 规范化语法分类信息（全部可空，逐步填充）
@@ -124,8 +167,17 @@ class GrammarRule(Base):
 
     __table_args__ = (
         UniqueConstraint('user_id', 'rule_name', name='uq_user_rule_name'),
+        Index('idx_grammar_user_lang_status_starred', 'user_id', 'language_code', 'learn_status', 'is_starred'),
+        # 列表游标分页：按 (created_at, rule_id) 顺序扫描
+        Index('idx_grammar_user_created', 'user_id', 'created_at', 'rule_id'),
+        Index('idx_grammar_user_lang_created', 'user_id', 'language_code', 'created_at', 'rule_id'),
     )
 
+    @validates('language')
+    def _sync_language_code(self, key, value):
+        self.language_code = normalize_language_code(value)
+        return value
+
     examples = relationship('GrammarExample', back_populates='grammar_rule', cascade='all, delete-orphan')
     owner = relationship('User', backref='grammar_rules')
 
@@ -137,6 +189,7 @@ class OriginalText(Base):
     text_title = Column(String(500), nullable=False)
     language = Column(String(50), nullable=True)  # 语言：中文、英文、德文
     processing_status = Column(String(50), default='completed', nullable=False)  # 处理状态：processing（处理中）、completed（已完成）、failed（失败）
+    content_version = Column(String(32), default=new_content_version, nullable=True)  # 内容版本：导入 / 追加句子 / 修改时换新
     created_at = Column(DateTime, default=datetime.now, nullable=False)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
 
@@ -185,6 +238,7 @@ class Sentence(Base):
     vocab_annotations = Column(JSON)
     paragraph_id = Column(Integer, nullable=True)  # 段落ID，用于分段显示
     is_new_paragraph = Column(Boolean, default=False, nullable=True)  # 是否是新段落的开始
+    readings = Column(JSON, nullable=True)  # 导入时预计算的 token 读音（拼音 / 假名）：[[sentence_token_id, reading], ...]
     created_at = Column(DateTime, default=datetime.now, nullable=False)
 
     __table_args__ = (
@@ -307,7 +361,9 @@ class AskedToken(Base):
         # SQLite 中 NULL != NULL，所以同一句子可以有多个 NULL 的 sentence_token_id
         # 我们需要确保：对于 token 类型，同一用户的同一 token 只能标记一次
         # 对于 sentence 类型，同一用户的同一句子只能标记一次（但 sentence_token_id 为 NULL）
-        UniqueConstraint('user_id', 'text_id', 'sentence_id', 'sentence_token_id', 'type', name='uq_asked_token_user_text_sentence_token_type')
+        UniqueConstraint('user_id', 'text_id', 'sentence_id', 'sentence_token_id', 'type', name='uq_asked_token_user_text_sentence_token_type'),
+        # 打开文章时按 (user_id, text_id) 取已提问 token
+        Index('idx_asked_tokens_user_text', 'user_id', 'text_id'),
     )
 
 class VocabNotation(Base):
@@ -489,6 +545,8 @@ class TokenLog(Base):
     prompt_tokens = Column(Integer, nullable=False)
     # Completion tokens（用于详细记录）
     completion_tokens = Column(Integer, nullable=False)
+    # prompt tokens 中命中 provider 前缀缓存的部分（usage.prompt_cache_hit_tokens；provider 未返回时为空）
+    prompt_cache_hit_tokens = Column(Integer, nullable=True)
     # 使用的模型名称（如 "deepseek-chat"）
     model_name = Column(String(64), nullable=False)
     # 调用的 SubAssistant 名称（如 "AnswerQuestionAssistant", "CheckIfGrammarRelevantAssistant" 等）
@@ -504,6 +562,103 @@ class TokenLog(Base):
     )
 
 
+class TokenUsageBucket(Base):
+    """
+    Token 使用量分桶计数（滚动窗口统计用）：
+    - 每个用户每 5 分钟一行（bucket_start 为 UTC 向下取整后的桶起点）
+    - 由 token_service 在记账时累加，1 小时用量只需汇总最近 12~13 行
+    """
+    __tablename__ = 'token_usage_buckets'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    total_tokens = Column(BigInteger, nullable=False, default=0)
+    prompt_tokens = Column(BigInteger, nullable=False, default=0)
+    completion_tokens = Column(BigInteger, nullable=False, default=0)
+    call_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'bucket_start', name='uq_token_usage_bucket_user_start'),
+    )
+
+
+class TokenUsageTotal(Base):
+    """
+    Token 累计使用量（每个用户一行）：
+    - 与 token_logs 的 SUM(total_tokens) 保持一致，避免 /api/auth/me 每次全表汇总
+    """
+    __tablename__ = 'token_usage_totals'
+
+    user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
+    total_tokens = Column(BigInteger, nullable=False, default=0)
+    call_count = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
+
+
+class KnowledgeEvent(Base):
+    """
+    知识点推送 outbox：
+    - /api/chat 后台流程完成 add_new_to_data 后写入一条（新增/已有 grammar、vocab 列表）
+    - 通过 SSE 推送给前端；delivered_at 为空表示尚未确认送达（至少一次语义）
+    - 已送达 / 过期记录会被定期清理
+    """
+    __tablename__ = 'knowledge_events'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
+    text_id = Column(Integer, ForeignKey('original_texts.text_id', ondelete='CASCADE'), nullable=True)
+    event_type = Column(String(32), nullable=False, default='knowledge_points')
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    delivered_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_knowledge_events_user_id', 'user_id', 'id'),
+    )
+
+
+class PresetExplanation(Base):
+    """
+    预置文章的预生成讲解（所有用户共享，不归属某个用户）：
+    - 由 backend/scripts/precompute_preset_explanations.py 离线批量生成
+    - MainAssistant 回答 / 生成词汇、语法解释前先按键查这里，命中则不再调用大模型
+    - 以句子内容哈希定位（每个用户的预置文章是各自的副本，text_id / sentence_id 不通用）
+
+    kind:
+    - answer：整句 / 选中部分的常见问题回答（question_key 为规范化后的问题）
+    - extraction：该回答对应的知识点抽取结果（KnowledgeExtraction JSON）
+    - vocab_explanation：词汇解释（target 为词汇）
+    - grammar_explanation：语法规则解释（target 为 category::subtype）
+    """
+    __tablename__ = 'preset_explanations'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    language_code = Column(String(10), nullable=False)
+    # 规范化后句子内容的 sha1（见 backend/services/preset_explanations.sentence_hash）
+    sentence_hash = Column(String(40), nullable=False)
+    sentence_body = Column(Text, nullable=False)
+    # 输出语言（UI 语言）："中文" / "英文"
+    ui_language = Column(String(16), nullable=False)
+    kind = Column(String(32), nullable=False)
+    # 选中的文本 / 词汇 / 语法 canonical；针对整句时为空串
+    target = Column(String(255), nullable=False, default='')
+    # 规范化后的问题（仅 answer / extraction 使用，其余为空串）
+    question_key = Column(String(255), nullable=False, default='')
+    content = Column(Text, nullable=False)
+    model_name = Column(String(64), nullable=True)
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint(
+            'sentence_hash', 'ui_language', 'kind', 'target', 'question_key',
+            name='uq_preset_explanation_key',
+        ),
+    )
+
+
 def create_database_engine(database_url: str):
     return create_engine(database_url, echo=False, future=True)
 
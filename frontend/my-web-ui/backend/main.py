@@ -1,15 +1,17 @@
-from fastapi import FastAPI, Query, HTTPException, UploadFile, File, Form, BackgroundTasks, Depends, Header
+from fastapi import FastAPI, Query, HTTPException, UploadFile, File, Form, Depends, Header, Request
 from fastapi.concurrency import run_in_threadpool
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import Optional
+import asyncio
 import json
+import logging
 import copy
 import re
 import requests
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime
 from threading import Lock
 
 # 首先设置路径
@@ -33,10 +35,15 @@ for p in [REPO_ROOT, BACKEND_DIR, CURRENT_DIR]:
     if p not in sys.path:
         sys.path.insert(0, p)
 
+# 结构化日志：热路径日志走队列 handler，级别由 LOG_LEVEL / LOG_MODULE_LEVELS 控制
+from backend.utils.structured_logging import get_logger, level_for_message
+logger = get_logger("server")
+chat_logger = get_logger("chat")
+
 # 切换工作目录到项目根目录，确保数据库路径正确
 original_cwd = os.getcwd()
 os.chdir(REPO_ROOT)
-print(f"[OK] 工作目录已切换: {original_cwd} -> {REPO_ROOT}")
+logger.info("[OK] 工作目录已切换: %s -> %s", original_cwd, REPO_ROOT)
 
 # 导入自定义模块（现在使用绝对路径导入）
 sys.path.insert(0, CURRENT_DIR)
@@ -69,21 +76,21 @@ def ensure_article_preprocess_loaded() -> None:
         extract_main_text_from_url = _url
         extract_text_from_pdf_bytes = _pdf
         _article_preprocess_status = "ok"
-        print("[OK] 延迟加载文章处理器成功 (无AI依赖)")
+        logger.info("[OK] 延迟加载文章处理器成功 (无AI依赖)")
     except ImportError as e:
         process_article = None
         save_structured_data = None
         extract_main_text_from_url = None
         extract_text_from_pdf_bytes = None
         _article_preprocess_status = "fail"
-        print(f"Warning: Could not import article_processor: {e}")
+        logger.warning("Warning: Could not import article_processor: %s", e)
     except Exception as e:
         process_article = None
         save_structured_data = None
         extract_main_text_from_url = None
         extract_text_from_pdf_bytes = None
         _article_preprocess_status = "fail"
-        print(f"Warning: Could not load article preprocess: {e}")
+        logger.warning("Warning: Could not load article preprocess: %s", e)
 
 # 导入 asked tokens manager
 from backend.data_managers.asked_tokens_manager import get_asked_tokens_manager
@@ -124,20 +131,6 @@ MAX_CHAT_TOKENS_PER_HOUR = 30000
 _active_chat_users = set()
 _active_chat_users_lock = Lock()
 
-# 后台 grammar/vocab 处理串行锁（按 user_id）
-# 目的：允许下一轮 /api/chat 立即返回主回答，但避免同一用户的后台写入（JSON/DB）并发导致错乱/竞态。
-_background_user_locks: dict[int, Lock] = {}
-_background_user_locks_lock = Lock()
-
-
-def _get_background_user_lock(user_id: int) -> Lock:
-    with _background_user_locks_lock:
-        lock = _background_user_locks.get(user_id)
-        if lock is None:
-            lock = Lock()
-            _background_user_locks[user_id] = lock
-        return lock
-
 
 def _chat_error_response(status_code: int, error: str, message: str, **extra):
     detail = {"error": error, "message": message}
@@ -153,10 +146,23 @@ def _chat_error_response(status_code: int, error: str, message: str, **extra):
     )
 
 
-def _main_assistant_flow_log(user_id: Optional[int], request_id: Optional[int], message: str) -> None:
-    """Prefix MainAssistant /api/chat flow logs so operators can tie server output to a user during beta."""
+def _main_assistant_flow_log(
+    user_id: Optional[int],
+    request_id: Optional[int],
+    message: str,
+    *args,
+    level: Optional[int] = None,
+) -> None:
+    """Prefix MainAssistant /api/chat flow logs so operators can tie server output to a user during beta.
+
+    message 是 %-格式模板，args 延迟到真正输出时才格式化；level 缺省时按前缀（❌/⚠️/🔍）推断。
+    """
+    if level is None:
+        level = level_for_message(message)
+    if not chat_logger.isEnabledFor(level):
+        return
     rid = request_id if request_id is not None else "?"
-    print(f"[user_id={user_id}] [chat_req={rid}] {message}")
+    chat_logger.log(level, message, *args, extra={"user_id": user_id, "chat_req": rid})
 
 
 def _check_user_article_limit(user_id: int):
@@ -203,19 +209,30 @@ def _release_chat_slot(user_id: Optional[int]):
 
 
 def _get_user_hourly_token_usage(session, user_id: int, window_minutes: int = 60) -> int:
-    from sqlalchemy import func
-    from database_system.business_logic.models import TokenLog
-
-    window_start = datetime.utcnow() - timedelta(minutes=window_minutes)
-    total_tokens = (
-        session.query(func.sum(TokenLog.total_tokens))
-        .filter(
-            TokenLog.user_id == user_id,
-            TokenLog.created_at >= window_start,
-        )
-        .scalar()
-    )
-    return int(total_tokens or 0)
+    # 读取分桶计数（token_usage_buckets），不再对 token_logs 做 SUM
+    from backend.services.token_service import get_hourly_token_usage
+
+    return get_hourly_token_usage(session, user_id, window_minutes=window_minutes)
+
+
+def _flush_turn_token_usage(usage_buffer, session=None) -> None:
+    """把本轮缓冲的 token 用量一次性落库（没有待写入记录时不访问数据库）"""
+    if usage_buffer is None or usage_buffer.pending_count == 0:
+        return
+    own_session = session is None
+    if own_session:
+        session = get_database_manager(ENV).get_session()
+    try:
+        result = usage_buffer.flush(session)
+        if result:
+            logger.info("💰 [Token Usage] 本轮记账完成: user_id=%s | calls=%s | total_tokens=%s | balance_after=%s", result['user_id'], result['calls_written'], result['total_tokens_used'], result['token_balance_after'])
+    except Exception as e:
+        logger.error("❌ [Token Usage] 本轮记账失败（turn=%s）: %s", usage_buffer.turn_id, e)
+        import traceback
+        traceback.print_exc()
+    finally:
+        if own_session:
+            session.close()
 
 
 def _limit_knowledge_lists(grammar_items: list, vocab_items: list, max_items: int = MAX_CHAT_KNOWLEDGE_ITEMS):
@@ -228,17 +245,17 @@ def _limit_knowledge_lists(grammar_items: list, vocab_items: list, max_items: in
 # 导入新的标注API路由
 try:
     from backend.api.notation_routes import router as notation_router
-    print("[OK] 加载新的标注API路由模块成功")
+    logger.info("[OK] 加载新的标注API路由模块成功")
 except ImportError as e:
     import traceback
-    print(f"❌ [ERROR] 无法导入 notation_routes: {e}")
-    print("详细错误信息:")
+    logger.error("❌ [ERROR] 无法导入 notation_routes: %s", e)
+    logger.info("详细错误信息:")
     traceback.print_exc()
     notation_router = None
 except Exception as e:
     import traceback
-    print(f"❌ [ERROR] 导入 notation_routes 时发生其他错误: {e}")
-    print("详细错误信息:")
+    logger.error("❌ [ERROR] 导入 notation_routes 时发生其他错误: %s", e)
+    logger.info("详细错误信息:")
     traceback.print_exc()
     notation_router = None
 
@@ -323,7 +340,7 @@ def _load_article_summary_from_dir(dir_path: str):
             "dir": os.path.basename(dir_path),
         }
     except Exception as e:
-        print(f"Error summarizing dir {dir_path}: {e}")
+        logger.error("Error summarizing dir %s: %s", dir_path, e)
         return None
 
 def _load_json_file(path: str):
@@ -355,7 +372,7 @@ def _collect_articles_summary():
                 "filename": filename,
             })
         except Exception as e:
-            print(f"Error processing {path}: {e}")
+            logger.error("Error processing %s: %s", path, e)
             continue
 
     # 2) 新目录结构
@@ -407,7 +424,7 @@ def _load_article_detail_from_dir(article_id: int):
         }
         return detail
     except Exception as e:
-        print(f"Error loading detail from dir {d}: {e}")
+        logger.error("Error loading detail from dir %s: %s", d, e)
         return None
 
 def _mark_tokens_selectable(data):
@@ -488,9 +505,9 @@ async def validation_exception_handler(request, exc: RequestValidationError):
     except Exception:
         body = b""
     
-    print("❌ [ValidationError] 请求路径:", request.url.path)
-    print("❌ [ValidationError] 原始请求体:", body.decode("utf-8", errors="ignore"))
-    print("❌ [ValidationError] 详细错误:", exc.errors())
+    logger.error("❌ [ValidationError] 请求路径: %s", request.url.path)
+    logger.error("❌ [ValidationError] 原始请求体: %s", body.decode('utf-8', errors='ignore'))
+    logger.error("❌ [ValidationError] 详细错误: %s", exc.errors())
 
     # 将 pydantic 错误数组压缩成一行字符串，方便前端展示
     messages = []
@@ -534,11 +551,16 @@ app.add_middleware(
 try:
     from backend.middleware.rate_limit import rate_limit_middleware
     app.middleware("http")(rate_limit_middleware)
-    print("[OK] Rate limit 中间件已启用")
-    print("   - /api/chat: 每个用户每分钟最多 20 次请求")
-    print("   - 其他接口: 每个用户每分钟最多 100 次请求")
+    logger.info("[OK] Rate limit 中间件已启用")
+    logger.info("   - /api/chat: 每个用户每分钟最多 20 次请求")
+    logger.info("   - 其他接口: 每个用户每分钟最多 100 次请求")
 except ImportError as e:
-    print(f"[WARN] Rate limit 中间件加载失败: {e}")
+    logger.warning("[WARN] Rate limit 中间件加载失败: %s", e)
+
+# ==================== SQL 语句计数（压测用，DB_QUERY_STATS=1 时开启）====================
+from backend.services import db_query_stats
+if db_query_stats.install(app):
+    logger.info("[OK] SQL 语句计数已开启: /api/debug/db-queries")
 
 # ==================== 数据库初始化（应用启动时）====================
 @app.on_event("startup")
@@ -548,9 +570,9 @@ async def startup_event():
         from database_system.business_logic.models import Base
         from backend.config import ENV
         
-        print("\n" + "="*60)
-        print("🔧 初始化数据库表结构...")
-        print("="*60)
+        logger.info("%s", '\n' + '=' * 60)
+        logger.info("🔧 初始化数据库表结构...")
+        logger.info("%s", '=' * 60)
         
         # 获取数据库管理器
         db_manager = get_database_manager(ENV)
@@ -563,46 +585,52 @@ async def startup_event():
                       database_url.startswith('postgres://'))
         
         if is_postgres:
-            print("📊 检测到 PostgreSQL 数据库")
+            logger.info("📊 检测到 PostgreSQL 数据库")
             # 检查表是否已存在
             from sqlalchemy import inspect
             inspector = inspect(engine)
             existing_tables = inspector.get_table_names()
             
             if existing_tables:
-                print(f"✅ 数据库表已存在 ({len(existing_tables)} 个表)")
+                logger.info("✅ 数据库表已存在 (%s 个表)", len(existing_tables))
                 for table in sorted(existing_tables):
-                    print(f"   - {table}")
+                    logger.debug("   - %s", table)
             else:
-                print("📋 创建数据库表结构...")
+                logger.info("📋 创建数据库表结构...")
                 Base.metadata.create_all(engine)
-                print("✅ 数据库表创建完成")
+                logger.info("✅ 数据库表创建完成")
                 
                 # 显示创建的表
                 inspector = inspect(engine)
                 new_tables = inspector.get_table_names()
-                print(f"✅ 共创建 {len(new_tables)} 个表:")
+                logger.info("✅ 共创建 %s 个表:", len(new_tables))
                 for table in sorted(new_tables):
                     columns = inspector.get_columns(table)
-                    print(f"   - {table} ({len(columns)} 列)")
+                    logger.debug("   - %s (%s 列)", table, len(columns))
         else:
-            print("📊 检测到 SQLite 数据库")
+            logger.info("📊 检测到 SQLite 数据库")
             # SQLite: 确保表结构存在
             Base.metadata.create_all(engine)
-            print("✅ SQLite 数据库表已初始化")
+            logger.info("✅ SQLite 数据库表已初始化")
         
-        print("="*60 + "\n")
+        logger.info("%s", '=' * 60 + '\n')
         
     except Exception as e:
-        print(f"⚠️ 数据库初始化失败: {e}")
+        logger.warning("⚠️ 数据库初始化失败: %s", e)
         import traceback
         traceback.print_exc()
-        print("⚠️ 应用将继续启动，但数据库功能可能不可用")
+        logger.warning("⚠️ 应用将继续启动，但数据库功能可能不可用")
+
+@app.on_event("shutdown")
+async def shutdown_background_jobs():
+    """应用关闭时停止接收后台任务，等待排队中的知识点抽取执行完（超时未执行的取消，token 用量照常落库）"""
+    from backend.services import background_jobs as _background_jobs
+    await asyncio.to_thread(_background_jobs.shutdown)
 
 # 添加请求日志中间件（用于调试）
 @app.middleware("http")
 async def log_requests(request, call_next):
-    print(f"📥 [Request] {request.method} {request.url.path}")
+    logger.info("📥 [Request] %s %s", request.method, request.url.path)
     # 🔧 修复：只在需要时读取请求体，并且正确处理异常
     try:
         # 如果是 POST 请求，尝试记录请求体大小（但不影响后续处理）
@@ -610,17 +638,17 @@ async def log_requests(request, call_next):
             # 使用 FastAPI 官方推荐方式：一次性读取 body，然后重新注入 _receive
             body_bytes = await request.body()
             if body_bytes:
-                print(f"📦 [Request] Body size: {len(body_bytes)} bytes")
+                logger.info("📦 [Request] Body size: %s bytes", len(body_bytes))
                 async def receive():
                     return {"type": "http.request", "body": body_bytes, "more_body": False}
                 request._receive = receive
     except Exception as e:
         # 🔧 如果读取请求体失败，记录但不影响后续处理
-        print(f"⚠️ [Request] 读取请求体失败: {e}")
+        logger.warning("⚠️ [Request] 读取请求体失败: %s", e)
     
     try:
         response = await call_next(request)
-        print(f"📤 [Response] {request.method} {request.url.path} -> {response.status_code}")
+        logger.info("📤 [Response] %s %s -> %s", request.method, request.url.path, response.status_code)
         return response
     except HTTPException as e:
         # Ensure HTTPException (e.g. 429 rate limit) returns as-is, not as 500.
@@ -628,34 +656,34 @@ async def log_requests(request, call_next):
         status_code = getattr(e, "status_code", 500) or 500
         headers = getattr(e, "headers", None) or {}
         detail = getattr(e, "detail", None)
-        print(f"📤 [Response] {request.method} {request.url.path} -> {status_code}")
+        logger.info("📤 [Response] %s %s -> %s", request.method, request.url.path, status_code)
         return JSONResponse(status_code=status_code, content={"detail": detail}, headers=headers)
     except Exception as e:
         # 🔧 捕获并记录异常，然后重新抛出
-        print(f"❌ [Request] 处理请求时发生异常: {e}")
+        logger.error("❌ [Request] 处理请求时发生异常: %s", e)
         raise
 
 # 注册新的标注API路由
 if notation_router:
     try:
         app.include_router(notation_router)
-        print("[OK] 注册新的标注API路由: /api/v2/notations")
+        logger.info("[OK] 注册新的标注API路由: /api/v2/notations")
     except Exception as e:
         import traceback
-        print(f"❌ [ERROR] 注册 notation_router 时发生错误: {e}")
-        print("详细错误信息:")
+        logger.error("❌ [ERROR] 注册 notation_router 时发生错误: %s", e)
+        logger.info("详细错误信息:")
         traceback.print_exc()
 else:
-    print("⚠️ [WARNING] notation_router 为 None，未注册标注API路由")
+    logger.warning("⚠️ [WARNING] notation_router 为 None，未注册标注API路由")
 
 # 注册认证API路由
 try:
     from backend.api.auth_routes import router as auth_router, get_current_user
     from database_system.business_logic.models import User
     app.include_router(auth_router)
-    print("[OK] 注册认证API路由: /api/auth")
+    logger.info("[OK] 注册认证API路由: /api/auth")
 except ImportError as e:
-    print(f"Warning: Could not import auth_routes: {e}")
+    logger.warning("Warning: Could not import auth_routes: %s", e)
     # 如果导入失败，提供一个占位函数
     def get_current_user():
         raise HTTPException(status_code=500, detail="认证系统未加载")
@@ -665,49 +693,49 @@ except ImportError as e:
 try:
     from backend.api.invite_routes import router as invite_router
     app.include_router(invite_router)
-    print("[OK] 注册邀请码API路由: /api/invite")
+    logger.info("[OK] 注册邀请码API路由: /api/invite")
 except ImportError as e:
-    print(f"Warning: Could not import invite_routes: {e}")
+    logger.warning("Warning: Could not import invite_routes: %s", e)
 
 # 注册文章API路由
 try:
     from backend.api.text_routes import router as text_router
     app.include_router(text_router)
-    print("[OK] 注册文章API路由: /api/v2/texts")
+    logger.info("[OK] 注册文章API路由: /api/v2/texts")
 except ImportError as e:
-    print(f"Warning: Could not import text_routes: {e}")
+    logger.warning("Warning: Could not import text_routes: %s", e)
 
 # 注册词汇API路由
 try:
     from backend.api.vocab_routes import router as vocab_router
     app.include_router(vocab_router)
-    print("[OK] 注册词汇API路由: /api/v2/vocab")
+    logger.info("[OK] 注册词汇API路由: /api/v2/vocab")
 except ImportError as e:
-    print(f"Warning: Could not import vocab_routes: {e}")
+    logger.warning("Warning: Could not import vocab_routes: %s", e)
 
 # 注册语法API路由
 try:
     from backend.api.grammar_routes import router as grammar_router
     app.include_router(grammar_router)
-    print("[OK] 注册语法API路由: /api/v2/grammar")
+    logger.info("[OK] 注册语法API路由: /api/v2/grammar")
 except ImportError as e:
-    print(f"Warning: Could not import grammar_routes: {e}")
+    logger.warning("Warning: Could not import grammar_routes: %s", e)
 
 # 注册日语注音测试API路由
 try:
     from backend.api.furigana_routes import router as furigana_router
     app.include_router(furigana_router)
-    print("[OK] 注册Furigana测试API路由: /api/v2/furigana")
+    logger.info("[OK] 注册Furigana测试API路由: /api/v2/furigana")
 except ImportError as e:
-    print(f"Warning: Could not import furigana_routes: {e}")
+    logger.warning("Warning: Could not import furigana_routes: %s", e)
 
 # 注册聊天历史API路由
 try:
     from backend.api.chat_history_routes import router as chat_history_router
     app.include_router(chat_history_router)
-    print("[OK] 注册聊天历史API路由: /api/chat/history")
+    logger.info("[OK] 注册聊天历史API路由: /api/chat/history")
 except ImportError as e:
-    print(f"Warning: Could not import chat_history_routes: {e}")
+    logger.warning("Warning: Could not import chat_history_routes: %s", e)
 
 @app.get("/")
 async def root():
@@ -753,6 +781,77 @@ async def debug_db_info():
     
     return info
 
+@app.get("/api/debug/data-controllers")
+async def debug_data_controllers():
+    """调试端点：按用户分区的 DataController 缓存统计（命中 / 未命中 / 淘汰）"""
+    return get_user_data_controller_stats()
+
+@app.get("/api/debug/article-access")
+async def debug_article_access():
+    """调试端点：文章访问记录的合并 / 批量写入统计"""
+    from backend.services.article_access_tracker import get_stats as get_article_access_stats
+    return get_article_access_stats()
+
+@app.get("/api/debug/article-payload-cache")
+async def debug_article_payload_cache():
+    """调试端点：文章内容 ETag / 序列化结果缓存统计"""
+    from backend.services.article_payload_cache import get_stats as get_article_payload_cache_stats
+    return get_article_payload_cache_stats()
+
+@app.get("/api/debug/knowledge-list-cache")
+async def debug_knowledge_list_cache():
+    """调试端点：词汇 / 语法列表缓存统计（内存占用、命中率、失效次数）"""
+    from backend.services.knowledge_list_cache import get_stats as get_knowledge_list_cache_stats
+    return get_knowledge_list_cache_stats()
+
+@app.get("/api/debug/sub-assistant-parse")
+async def debug_sub_assistant_parse():
+    """调试端点：各子助手的结构化输出解析统计（schema 命中 / 回退 / 失败、重试率、解析耗时）"""
+    from backend.assistants.sub_assistants.sub_assistant import get_parse_stats
+    return get_parse_stats()
+
+@app.get("/api/debug/prompt-cache")
+async def debug_prompt_cache():
+    """调试端点：各子助手的 prompt 前缀缓存命中率与前缀稳定性（distinct_prefixes 应保持很小）"""
+    from backend.assistants.sub_assistants.prompt_assembly import get_stats as get_prompt_cache_stats
+    return get_prompt_cache_stats()
+
+@app.get("/api/debug/background-jobs")
+async def debug_background_jobs():
+    """调试端点：后台任务执行器的排队 / 执行 / 拒绝 / 取消统计与排队等待时间"""
+    return background_jobs.get_stats()
+
+@app.get("/api/debug/preset-explanations")
+async def debug_preset_explanations():
+    """调试端点：预置文章预生成讲解的命中统计（命中 / 未命中 / 非预置句子，按类型的命中次数）"""
+    from backend.services.preset_explanations import get_stats as get_preset_explanation_stats
+    return get_preset_explanation_stats()
+
+@app.get("/api/debug/search-index")
+async def debug_search_index():
+    """调试端点：全文检索索引的维护与查询统计（写入 / 失败次数，全文检索与 LIKE 兜底次数）"""
+    from backend.services.fulltext_search import get_stats as get_search_index_stats
+    return get_search_index_stats()
+
+@app.get("/api/debug/db-queries")
+async def debug_db_queries():
+    """调试端点：按接口统计的 SQL 语句数（需 DB_QUERY_STATS=1；后台任务计入发起它的接口）"""
+    return db_query_stats.get_stats()
+
+@app.post("/api/debug/db-queries/reset")
+async def reset_debug_db_queries():
+    """调试端点：清空 SQL 语句计数（压测开始前调用）"""
+    db_query_stats.reset()
+    return {"success": True}
+
+@app.get("/api/debug/chat-traces")
+async def debug_chat_traces(
+    window_minutes: float = Query(60, gt=0, description="统计最近多少分钟"),
+    limit: int = Query(10, ge=1, le=100, description="返回最慢的 span 个数"),
+):
+    """调试端点：/api/chat 各阶段（子助手调用、数据库阶段、后台排队）耗时分布，按 p95 降序"""
+    return chat_trace.get_summary(window_seconds=window_minutes * 60, limit=limit)
+
 @app.get("/api/db-test")
 async def db_test():
     """数据库连接测试接口"""
@@ -783,42 +882,28 @@ from backend.preprocessing.language_classification import (
 )
 
 session_state = SessionState()
-print("[OK] SessionState singleton initialized")
-
-# 初始化全局 DataController
-from backend.data_managers import data_controller
-
-# 数据文件路径
-DATA_DIR = os.path.join(BACKEND_DIR, "data", "current")
-GRAMMAR_PATH = os.path.join(DATA_DIR, "grammar.json")
-VOCAB_PATH = os.path.join(DATA_DIR, "vocab.json")
-TEXT_PATH = os.path.join(DATA_DIR, "original_texts.json")
-DIALOGUE_RECORD_PATH = os.path.join(DATA_DIR, "dialogue_record.json")
-DIALOGUE_HISTORY_PATH = os.path.join(DATA_DIR, "dialogue_history.json")
+logger.info("[OK] SessionState singleton initialized")
 
-global_dc = data_controller.DataController(max_turns=100)
-print("✅ Global DataController created")
+# 按用户分区、按需从数据库加载的 DataController（LRU），启动时不加载任何数据
+from backend.services.user_data_controllers import (
+    get_user_data_controller,
+    refresh_partition_weight,
+    get_stats as get_user_data_controller_stats,
+)
 
-# 🔧 临时存储：用于存储后台任务创建的新知识点，供前端轮询获取
-# 格式: {(user_id, text_id): {'vocab_to_add': [...], 'grammar_to_add': [...], 'timestamp': ...}}
-pending_knowledge_points = {}
+# 后台任务产出的新知识点写入 knowledge_events（outbox），通过 SSE 推送给前端
+from backend.services.knowledge_events import (
+    publish_knowledge_event,
+    fetch_pending_events,
+    ack_events,
+    serialize_event,
+    subscribe as subscribe_knowledge_events,
+    unsubscribe as unsubscribe_knowledge_events,
+)
 
-# 加载数据
-try:
-    global_dc.load_data(
-        grammar_path=GRAMMAR_PATH,
-        vocab_path=VOCAB_PATH,
-        text_path=TEXT_PATH,
-        dialogue_record_path=DIALOGUE_RECORD_PATH,
-        dialogue_history_path=DIALOGUE_HISTORY_PATH
-    )
-    print("✅ Global data loaded successfully")
-    print(f"  - Grammar rules: {len(global_dc.grammar_manager.grammar_bundles)}")
-    print(f"  - Vocab items: {len(global_dc.vocab_manager.vocab_bundles)}")
-    print(f"  - Texts: {len(global_dc.text_manager.original_texts)}")
-except Exception as e:
-    print(f"⚠️ Global data loading failed: {e}")
-    print("⚠️ Continuing with empty data")
+# /api/chat 单轮链路追踪（每个子助手调用 / 数据库阶段一个 span，可导出为 OTLP/JSON）
+from backend.services import chat_trace
+from backend.services import background_jobs
 
 # 将处理后的文章数据导入到数据库
 def import_article_to_database(
@@ -847,7 +932,7 @@ def import_article_to_database(
     
     if is_guest:
         # 游客模式：返回文章数据，由前端保存到 localStorage
-        print(f"👤 [Import] 游客模式，返回文章数据供前端保存 (guest_id: {user_id}, language: {language})")
+        logger.info("👤 [Import] 游客模式，返回文章数据供前端保存 (guest_id: %s, language: %s)", user_id, language)
         
         # 优先使用传入的title，如果没有则使用result中的
         final_title = title or result.get('text_title', 'Untitled Article')
@@ -875,7 +960,7 @@ def import_article_to_database(
             # 验证用户是否存在
             user = session.query(User).filter(User.user_id == user_id).first()
             if not user:
-                print(f"❌ [Import] 用户 {user_id} 不存在")
+                logger.error("❌ [Import] 用户 %s 不存在", user_id)
                 return False
             
             from backend.data_managers import OriginalTextManagerDB
@@ -905,7 +990,7 @@ def import_article_to_database(
                 text_model.language = language or text_model.language
                 text_model.processing_status = 'completed'  # 更新状态为"已完成"
                 session.commit()  # 确保状态更新被提交
-                print(f"✅ [Import] 更新文章状态为已完成: {text_model.text_title} (ID: {article_id}, User: {user_id}, Language: {language})")
+                logger.info("✅ [Import] 更新文章状态为已完成: %s (ID: %s, User: %s, Language: %s)", text_model.text_title, article_id, user_id, language)
             else:
                 # 如果文章记录不存在（可能是旧数据），创建新记录
                 # 优先使用传入的title
@@ -919,23 +1004,23 @@ def import_article_to_database(
                 )
                 session.add(text_model)
                 session.flush()  # 刷新以获取ID
-                print(f"✅ [Import] 创建文章: {text_model.text_title} (ID: {article_id}, User: {user_id}, Language: {language})")
+                logger.info("✅ [Import] 创建文章: %s (ID: %s, User: %s, Language: %s)", text_model.text_title, article_id, user_id, language)
             
             # 2. 导入句子和tokens
             sentences = result.get('sentences', [])
-            print(f"🔍 [Import] 预处理结果检查: sentences数量={len(sentences)}")
+            logger.debug("🔍 [Import] 预处理结果检查: sentences数量=%s", len(sentences))
             if sentences:
                 first_sentence = sentences[0]
-                print(f"🔍 [Import] 第一个句子检查: sentence_id={first_sentence.get('sentence_id')}, 有tokens={bool(first_sentence.get('tokens'))}, 有word_tokens={bool(first_sentence.get('word_tokens'))}")
+                logger.debug("🔍 [Import] 第一个句子检查: sentence_id=%s, 有tokens=%s, 有word_tokens=%s", first_sentence.get('sentence_id'), bool(first_sentence.get('tokens')), bool(first_sentence.get('word_tokens')))
                 if first_sentence.get('word_tokens'):
-                    print(f"🔍 [Import] 第一个句子的word_tokens数量: {len(first_sentence.get('word_tokens', []))}")
+                    logger.debug("🔍 [Import] 第一个句子的word_tokens数量: %s", len(first_sentence.get('word_tokens', [])))
                     if len(first_sentence.get('word_tokens', [])) > 0:
-                        print(f"🔍 [Import] 第一个word_token示例: {first_sentence.get('word_tokens')[0]}")
+                        logger.debug("🔍 [Import] 第一个word_token示例: %s", first_sentence.get('word_tokens')[0])
             
             # 🔧 修复：查询数据库中当前最大的 word_token_id，确保新分配的 ID 全局唯一
             from database_system.business_logic.models import WordToken
             max_word_token_id = session.query(func.max(WordToken.word_token_id)).scalar() or 0
-            print(f"🔍 [Import] 数据库中当前最大 word_token_id: {max_word_token_id}")
+            logger.debug("🔍 [Import] 数据库中当前最大 word_token_id: %s", max_word_token_id)
             next_word_token_id = max_word_token_id + 1
             
             # 创建 word_token_id 映射表：预处理生成的 ID -> 新的全局唯一 ID
@@ -947,6 +1032,10 @@ def import_article_to_database(
             
             from sqlalchemy.exc import IntegrityError
 
+            # 中文 / 日文：预处理阶段没带读音的句子（如从输出目录恢复的分段结果）在这里补算
+            from backend.services.reading_annotation import enrich_sentences
+            enrich_sentences(sentences, language or text_model.language)
+
             for sentence_data in sentences:
                 sentence_id = sentence_data.get('sentence_id', total_sentences + 1)
                 sentence_body = sentence_data.get('sentence_body', '')
@@ -954,7 +1043,7 @@ def import_article_to_database(
                 # 检查句子是否已存在
                 existing_sentence = text_manager.get_sentence(article_id, sentence_id)
                 if existing_sentence:
-                    print(f"⚠️ [Import] 句子 {article_id}:{sentence_id} 已存在，跳过")
+                    logger.warning("⚠️ [Import] 句子 %s:%s 已存在，跳过", article_id, sentence_id)
                     continue
                 
                 # 创建句子（显式 sentence_id，与 token 导入一致；支持分段续传追加）
@@ -964,27 +1053,28 @@ def import_article_to_database(
                         sentence_text=sentence_body,
                         difficulty_level=None,
                         sentence_id=sentence_id,
+                        readings=sentence_data.get('readings'),
                     )
                 except IntegrityError:
                     # 并发/重试场景下，可能已有其他请求先写入同一 sentence_id
                     session.rollback()
                     existing_sentence = text_manager.get_sentence(article_id, sentence_id)
                     if existing_sentence:
-                        print(f"⚠️ [Import] 句子 {article_id}:{sentence_id} 并发已写入，跳过")
+                        logger.warning("⚠️ [Import] 句子 %s:%s 并发已写入，跳过", article_id, sentence_id)
                         continue
                     raise
                 total_sentences += 1
                 
                 # 3. 先导入 word_tokens（仅用于非空格语言），确保在创建 tokens 时可以引用
                 word_tokens = sentence_data.get('word_tokens', [])
-                print(f"🔍 [Import] 句子 {sentence_id} 的 word_tokens: {len(word_tokens) if word_tokens else 0} 个")
+                logger.debug("🔍 [Import] 句子 %s 的 word_tokens: %s 个", sentence_id, len(word_tokens) if word_tokens else 0)
                 for word_token_data in word_tokens:
                     old_word_token_id = word_token_data.get('word_token_id')  # 预处理生成的 ID（可能从 1 开始）
                     word_body = word_token_data.get('word_body', '')
                     token_ids = word_token_data.get('token_ids', [])
                     
                     if not old_word_token_id or not word_body or not token_ids:
-                        print(f"⚠️ [Import] 跳过无效的 word_token: word_token_id={old_word_token_id}, word_body={word_body}, token_ids={token_ids}")
+                        logger.warning("⚠️ [Import] 跳过无效的 word_token: word_token_id=%s, word_body=%s, token_ids=%s", old_word_token_id, word_body, token_ids)
                         continue
                     
                     # 🔧 修复：分配新的全局唯一 word_token_id
@@ -1009,9 +1099,9 @@ def import_article_to_database(
                         )
                         session.add(word_token)
                         total_word_tokens += 1
-                        print(f"✅ [Import] 创建 word_token: old_id={old_word_token_id} -> new_id={new_word_token_id}, word_body={word_body}, token_ids={token_ids}")
+                        logger.debug("✅ [Import] 创建 word_token: old_id=%s -> new_id=%s, word_body=%s, token_ids=%s", old_word_token_id, new_word_token_id, word_body, token_ids)
                     except Exception as wt_e:
-                        print(f"❌ [Import] 创建 word_token 失败: {wt_e}")
+                        logger.error("❌ [Import] 创建 word_token 失败: %s", wt_e)
                         import traceback
                         traceback.print_exc()
                 
@@ -1019,7 +1109,7 @@ def import_article_to_database(
                 tokens = sentence_data.get('tokens', [])
                 tokens_count = len(tokens)
                 if tokens_count > 0:
-                    print(f"📝 [Import] 开始导入句子 {sentence_id} 的 {tokens_count} 个tokens...")
+                    logger.debug("📝 [Import] 开始导入句子 %s 的 %s 个tokens...", sentence_id, tokens_count)
                 
                 for idx, token_data in enumerate(tokens):
                     token_body = token_data.get('token_body', token_data.get('text', ''))
@@ -1047,7 +1137,7 @@ def import_article_to_database(
                     if old_word_token_id is not None:
                         new_word_token_id = word_token_id_mapping.get(old_word_token_id)
                         if new_word_token_id is None:
-                            print(f"⚠️ [Import] token 引用的 word_token_id={old_word_token_id} 未找到映射，跳过 word_token_id 引用")
+                            logger.warning("⚠️ [Import] token 引用的 word_token_id=%s 未找到映射，跳过 word_token_id 引用", old_word_token_id)
                     
                     # 创建token（传递枚举名称字符串，数据库期望枚举名称）
                     token_crud.create(
@@ -1064,25 +1154,28 @@ def import_article_to_database(
                     
                     # 🔧 添加更频繁的进度日志（每 1000 个 tokens 或每 10 个句子打印一次）
                     if total_tokens % 1000 == 0:
-                        print(f"📊 [Import] 进度: {total_sentences} 个句子，{total_tokens} 个tokens，{total_word_tokens} 个word_tokens...")
+                        logger.debug("📊 [Import] 进度: %s 个句子，%s 个tokens，%s 个word_tokens...", total_sentences, total_tokens, total_word_tokens)
                         # 🔧 每 1000 个 tokens 执行一次 flush，减少内存使用并提高性能
                         session.flush()
                     elif total_sentences % 10 == 0 and idx == 0:  # 每 10 个句子的第一个 token 时打印
-                        print(f"📊 [Import] 进度: {total_sentences} 个句子，{total_tokens} 个tokens，{total_word_tokens} 个word_tokens...")
+                        logger.debug("📊 [Import] 进度: %s 个句子，%s 个tokens，%s 个word_tokens...", total_sentences, total_tokens, total_word_tokens)
                         session.flush()  # 每 10 个句子也 flush 一次
                 
                 # 每完成一个句子，如果句子有很多 tokens，打印完成信息
                 if tokens_count > 100:
-                    print(f"✅ [Import] 句子 {sentence_id} 完成: {tokens_count} 个tokens")
+                    logger.debug("✅ [Import] 句子 %s 完成: %s 个tokens", sentence_id, tokens_count)
             
             # 🔧 在提交前打印最终统计
-            print(f"💾 [Import] 准备提交到数据库: {total_sentences} 个句子，{total_tokens} 个tokens，{total_word_tokens} 个word_tokens...")
+            logger.info("💾 [Import] 准备提交到数据库: %s 个句子，%s 个tokens，%s 个word_tokens...", total_sentences, total_tokens, total_word_tokens)
+            # tokens 与句子分开提交：最后再换一次内容版本，避免读到半截内容的缓存 / ETag 继续有效
+            from database_system.business_logic.models import new_content_version
+            text_model.content_version = new_content_version()
             import time
             commit_start = time.time()
             session.commit()
             commit_elapsed = (time.time() - commit_start) * 1000
-            print(f"✅ [Import] 数据库提交完成，耗时: {commit_elapsed:.2f}ms")
-            print(f"✅ [Import] 导入完成: {total_sentences} 个句子，{total_tokens} 个tokens，{total_word_tokens} 个word_tokens (User: {user_id}, Language: {language})")
+            logger.info("✅ [Import] 数据库提交完成，耗时: %sms", format(commit_elapsed, '.2f'))
+            logger.info("✅ [Import] 导入完成: %s 个句子，%s 个tokens，%s 个word_tokens (User: %s, Language: %s)", total_sentences, total_tokens, total_word_tokens, user_id, language)
             return True
             
         except Exception as e:
@@ -1099,16 +1192,16 @@ def import_article_to_database(
                     if text_model:
                         text_model.processing_status = 'failed'
                         session.commit()
-                        print(f"⚠️ [Import] 导入失败，已更新文章状态为失败: {article_id}")
+                        logger.warning("⚠️ [Import] 导入失败，已更新文章状态为失败: %s", article_id)
                 except Exception as update_error:
                     session.rollback()
-                    print(f"⚠️ [Import] 更新文章状态失败: {update_error}")
+                    logger.warning("⚠️ [Import] 更新文章状态失败: %s", update_error)
             raise e
         finally:
             session.close()
         
     except Exception as e:
-        print(f"❌ [Import] 导入文章到数据库失败: {e}")
+        logger.error("❌ [Import] 导入文章到数据库失败: %s", e)
         import traceback
         traceback.print_exc()
         # 如果是在外层异常，首段导入失败时才更新整篇状态
@@ -1125,39 +1218,21 @@ def import_article_to_database(
                     if text_model:
                         text_model.processing_status = 'failed'
                         session.commit()
-                        print(f"⚠️ [Import] 导入失败，已更新文章状态为失败: {article_id}")
+                        logger.warning("⚠️ [Import] 导入失败，已更新文章状态为失败: %s", article_id)
                 except Exception as update_error:
                     session.rollback()
-                    print(f"⚠️ [Import] 更新文章状态失败: {update_error}")
+                    logger.warning("⚠️ [Import] 更新文章状态失败: %s", update_error)
                 finally:
                     session.close()
             except Exception as session_error:
-                print(f"⚠️ [Import] 无法获取数据库会话: {session_error}")
+                logger.warning("⚠️ [Import] 无法获取数据库会话: %s", session_error)
         return False
 
-# 异步保存数据的辅助函数
-def save_data_async(dc, grammar_path, vocab_path, text_path, dialogue_record_path, dialogue_history_path):
-    """后台异步保存数据"""
-    try:
-        print("\n💾 [Background] ========== 开始异步保存数据 ==========")
-        dc.save_data(
-            grammar_path=grammar_path,
-            vocab_path=vocab_path,
-            text_path=text_path,
-            dialogue_record_path=dialogue_record_path,
-            dialogue_history_path=dialogue_history_path
-        )
-        print("✅ [Background] 数据保存成功")
-    except Exception as e:
-        print(f"❌ [Background] 数据保存失败: {e}")
-        import traceback
-        print(traceback.format_exc())
-
 @app.post("/api/session/set_sentence")
 async def set_session_sentence(payload: dict):
     """设置当前句子上下文"""
     try:
-        print(f"[Session] Setting session sentence")
+        logger.info("[Session] Setting session sentence")
         sentence_data = payload.get('sentence', payload)
         tokens_payload = sentence_data.get('tokens', [])
         word_tokens_payload = sentence_data.get('word_tokens')
@@ -1174,14 +1249,14 @@ async def set_session_sentence(payload: dict):
         session_state.set_language_context(language, language_code, is_non_whitespace)
         return {"success": True, "message": "Sentence context set"}
     except Exception as e:
-        print(f"[Session] Error setting sentence: {e}")
+        logger.info("[Session] Error setting sentence: %s", e)
         return {"success": False, "error": str(e)}
 
 @app.post("/api/session/select_token")
 async def set_session_selected_token(payload: dict):
     """设置选中的token"""
     try:
-        print(f"[Session] Setting selected token")
+        logger.info("[Session] Setting selected token")
         token_data = payload.get('token', {})
         selected_token = SelectedToken(
             token_indices=token_data.get('token_indices', [-1]),
@@ -1193,14 +1268,14 @@ async def set_session_selected_token(payload: dict):
         session_state.set_current_selected_token(selected_token)
         return {"success": True, "message": "Token context set"}
     except Exception as e:
-        print(f"[Session] Error setting token: {e}")
+        logger.info("[Session] Error setting token: %s", e)
         return {"success": False, "error": str(e)}
 
 @app.post("/api/session/update_context")
 async def update_session_context(payload: dict):
     """一次性更新会话上下文（批量更新）"""
     try:
-        print(f"[SessionState] 批量更新上下文...")
+        logger.info("[SessionState] 批量更新上下文...")
         updated_fields = []
         
         # 更新 current_input
@@ -1211,10 +1286,10 @@ async def update_session_context(payload: dict):
         # 更新句子
         if 'sentence' in payload:
             sentence_data = payload['sentence']
-            print(f"🔍 [SessionState] 设置句子上下文:")
-            print(f"  - text_id: {sentence_data.get('text_id')} (type: {type(sentence_data.get('text_id'))})")
-            print(f"  - sentence_id: {sentence_data.get('sentence_id')}")
-            print(f"  - sentence_body: {sentence_data.get('sentence_body', '')[:50]}...")
+            logger.debug("🔍 [SessionState] 设置句子上下文:")
+            logger.info("  - text_id: %s (type: %s)", sentence_data.get('text_id'), type(sentence_data.get('text_id')))
+            logger.info("  - sentence_id: %s", sentence_data.get('sentence_id'))
+            logger.info("  - sentence_body: %s...", sentence_data.get('sentence_body', '')[:50])
             
             tokens_payload = sentence_data.get('tokens', [])
             word_tokens_payload = sentence_data.get('word_tokens')
@@ -1259,7 +1334,7 @@ async def update_session_context(payload: dict):
             
             # 🔧 如果 token_data 为 None，明确清除 token 选择
             if token_data is None:
-                print("[SessionState] 清除 token 选择（token = null）")
+                logger.info("[SessionState] 清除 token 选择（token = null）")
                 session_state.set_current_selected_token(None)
                 updated_fields.append('token (cleared)')
             elif session_state.current_sentence:
@@ -1299,258 +1374,30 @@ async def update_session_context(payload: dict):
         raise
     except Exception as e:
         import traceback
-        print(f"[SessionState] Error updating context: {e}")
-        print(f"[SessionState] Traceback:\n{traceback.format_exc()}")
+        logger.info("[SessionState] Error updating context: %s", e)
+        logger.info("[SessionState] Traceback:\n%s", traceback.format_exc())
         raise HTTPException(status_code=500, detail={"error": "session_update_failed", "message": str(e)})
 
 @app.post("/api/session/reset")
 async def reset_session_state(payload: dict):
     """重置会话状态"""
     try:
-        print(f"[Session] Resetting session state")
+        logger.info("[Session] Resetting session state")
         session_state.reset()
         return {"success": True, "message": "Session state reset"}
     except Exception as e:
-        print(f"[Session] Error resetting session: {e}")
+        logger.info("[Session] Error resetting session: %s", e)
         return {"success": False, "error": str(e)}
 
 @app.post("/api/admin/sync-to-db")
 async def trigger_sync_to_db():
-    """手动触发 JSON 数据同步到数据库"""
-    try:
-        print("🔄 [Admin] Manual sync triggered")
-        _sync_to_database()
-        return {"success": True, "message": "Data synced to database"}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
-
-def _sync_to_database(user_id: int = None, session_state_instance: SessionState = None):
-    """同步 JSON 数据到数据库
-    
-    参数:
-        user_id: 当前用户ID，用于关联新创建的数据
-        session_state_instance: 可选的 SessionState 实例，如果不提供则使用全局 session_state
-    """
-    # 🔧 修复：使用传入的 session_state_instance，如果没有则使用全局 session_state
-    state = session_state_instance if session_state_instance is not None else session_state
-    
-    try:
-        from backend.data_managers import GrammarRuleManagerDB, VocabManagerDB
-        
-        db_manager = get_database_manager(ENV)
-        session = db_manager.get_session()
-        
-        try:
-            from backend.data_managers import OriginalTextManagerDB
-            grammar_db_mgr = GrammarRuleManagerDB(session)
-            vocab_db_mgr = VocabManagerDB(session)
-            text_db_mgr = OriginalTextManagerDB(session)
-            
-            # 🔧 修复：不再同步所有内存中的文章，因为：
-            # 1. global_dc.text_manager.original_texts 包含所有用户的数据（没有用户隔离）
-            # 2. 文章应该通过文章上传API处理，而不是在这里同步
-            # 3. 如果需要在同步vocab/grammar时确保文章存在，应该在创建example时检查
-            print("📄 [Sync] 跳过文章同步（文章应通过上传API处理，且global_dc包含所有用户数据）")
-            
-            # 🔧 可选：如果需要，可以同步当前操作相关的文章
-            # 从 session_state 获取当前文章ID
-            current_text_id = None
-            if hasattr(state, 'current_sentence') and state.current_sentence:
-                current_text_id = getattr(state.current_sentence, 'text_id', None)
-            
-            if current_text_id and user_id:
-                try:
-                    # 检查当前文章是否存在于数据库中，且属于当前用户
-                    from database_system.business_logic.models import OriginalText
-                    text_model = session.query(OriginalText).filter(
-                        OriginalText.text_id == current_text_id,
-                        OriginalText.user_id == user_id
-                    ).first()
-                    if not text_model:
-                        print(f"⚠️ [Sync] 当前文章 (ID: {current_text_id}) 在数据库中不存在或不属于用户 {user_id}")
-                        print(f"  ℹ️  文章应通过文章上传API导入到数据库")
-                    else:
-                        print(f"✅ [Sync] 当前文章存在于数据库: {text_model.text_title} (ID: {current_text_id})")
-                except Exception as e:
-                    print(f"⚠️ [Sync] 检查当前文章时出错: {e}")
-            
-            # 同步 Grammar Rules（只同步本轮新增的）
-            print(f"📚 [Sync] 同步本轮新增的 Grammar Rules (共{len(state.grammar_to_add)}个)...")
-            print(f"🔍 [Sync] 诊断：state.grammar_to_add 类型: {type(state.grammar_to_add)}, 长度: {len(state.grammar_to_add) if state.grammar_to_add else 0}")
-            if state.grammar_to_add:
-                print(f"🔍 [Sync] 诊断：state.grammar_to_add 内容: {[g.display_name if hasattr(g, 'display_name') else str(g) for g in state.grammar_to_add]}")
-            else:
-                print(f"🔍 [Sync] 诊断：state.grammar_to_add 为空或 None")
-                print(f"🔍 [Sync] 注意：语法规则可能已在 add_new_to_data() 中创建到数据库，这里只做验证")
-            synced_grammar = 0
-            for grammar_item in state.grammar_to_add:
-                # 🔧 使用新格式：display_name 和 rule_summary
-                rule_name = grammar_item.display_name
-                rule_explanation = grammar_item.rule_summary
-                
-                # 🔧 修复：直接使用add_new_rule，它内部使用get_or_create逻辑（按user_id和rule_name检查）
-                # 如果已存在（属于当前用户），会返回现有记录；如果不存在或属于其他用户，会创建新记录
-                # 注意：这里没有language，因为在main_assistant中已经创建时传递了language
-                # 但为了保持一致性，我们仍然调用add_new_rule（它会在已存在时跳过）
-                # 实际上，在main_assistant中已经创建了，这里可能不需要再次创建
-                # 但为了确保数据同步，我们仍然调用（get_or_create会处理已存在的情况）
-                try:
-                    new_rule = grammar_db_mgr.add_new_rule(
-                        name=rule_name,
-                        explanation=rule_explanation or '',
-                        source='qa',  # 🔧 修复：使用'qa'而不是'auto'，与main_assistant保持一致
-                        user_id=user_id,
-                        language=None  # 🔧 注意：这里没有language，因为在main_assistant中已经创建时传递了
-                    )
-                    # 🔧 检查是新建还是已存在（通过检查数据库模型）
-                    from database_system.business_logic.models import GrammarRule
-                    grammar_model = session.query(GrammarRule).filter(
-                        GrammarRule.rule_id == new_rule.rule_id
-                    ).first()
-                    if grammar_model:
-                        # 检查创建时间是否很近（1秒内），如果是，可能是新创建的
-                        import datetime
-                        time_diff = (datetime.datetime.now() - grammar_model.created_at).total_seconds()
-                        if time_diff < 2:
-                            print(f"✅ [Sync] 新增 grammar rule: {rule_name} (ID: {new_rule.rule_id})")
-                            synced_grammar += 1
-                        else:
-                            print(f"📝 [Sync] Grammar rule已存在（当前用户）: {rule_name} (ID: {new_rule.rule_id})")
-                    
-                    # 同步本轮的grammar notation（如果有）
-                    for notation in state.created_grammar_notations:
-                        # 只同步与当前rule相关的notation（通过grammar_id匹配）
-                        # 注意：此时新rule刚创建，需要在assistant中先记录rule_id
-                        pass  # TODO: 需要从assistant中传递grammar_id映射
-                except Exception as e:
-                    print(f"⚠️ [Sync] 同步 grammar rule 时出错: {e}")
-                    import traceback
-                    traceback.print_exc()
-            
-            # 🔧 修复：vocab 和 grammar 已经在 main_assistant.add_new_to_data() 中使用数据库管理器创建了
-            # 所以这里不需要再同步，因为：
-            # 1. vocab 和 grammar 已经在数据库中（通过数据库管理器直接创建）
-            # 2. examples 也在 main_assistant 中创建了（通过 data_controller.add_vocab_example）
-            # 3. global_dc.vocab_manager.vocab_bundles 中没有数据（因为使用的是数据库管理器，不是 global_dc）
-            # 
-            # 如果需要在 _sync_to_database 中同步 examples，应该直接从数据库查找 vocab，而不是从 global_dc 查找
-            # 但实际上 examples 已经在 main_assistant 中创建了，所以这里不需要再同步
-            
-            # 同步 Vocab Expressions（只同步本轮新增的）
-            print(f"📖 [Sync] 同步本轮新增的 Vocab Expressions (共{len(state.vocab_to_add)}个)...")
-            print(f"  ℹ️  注意：vocab 已在 main_assistant 中使用数据库管理器创建，这里只同步 examples（如果需要）")
-            synced_vocab = 0
-            
-            # 从session_state获取本轮新增的vocab
-            for vocab_item in state.vocab_to_add:
-                vocab_body = vocab_item.vocab
-                
-                # 🔧 修复：直接从数据库查找 vocab（因为已经在 main_assistant 中创建了）
-                try:
-                    # 从数据库查找 vocab（按 user_id 和 vocab_body）
-                    from database_system.business_logic.models import VocabExpression
-                    vocab_model = session.query(VocabExpression).filter(
-                        VocabExpression.vocab_body == vocab_body,
-                        VocabExpression.user_id == user_id
-                    ).first()
-                    
-                    if not vocab_model:
-                        print(f"⚠️ [Sync] 在数据库中找不到vocab: {vocab_body} (user_id={user_id})")
-                        print(f"  ℹ️  可能 vocab 在 main_assistant 中创建失败，或还未创建")
-                        continue
-                    
-                    vocab_id = vocab_model.vocab_id
-                    print(f"✅ [Sync] 找到vocab: {vocab_body} (ID: {vocab_id})")
-                    
-                    # 🔧 检查 examples 是否需要同步
-                    # 实际上，examples 已经在 main_assistant 中创建了（通过 data_controller.add_vocab_example）
-                    # 但 data_controller 使用的是文件系统管理器，所以 examples 可能不在数据库中
-                    # 让我们检查一下数据库中是否已有 examples
-                    from database_system.business_logic.models import VocabExpressionExample
-                    existing_examples_count = session.query(VocabExpressionExample).filter(
-                        VocabExpressionExample.vocab_id == vocab_id
-                    ).count()
-                    
-                    # 🔧 尝试从 global_dc 获取 examples（如果存在）
-                    # 注意：由于使用的是数据库管理器，global_dc 中可能没有数据
-                    examples = []
-                    bundle = None
-                    for vid, vb in global_dc.vocab_manager.vocab_bundles.items():
-                        if getattr(vb, 'vocab_body', None) == vocab_body:
-                            bundle = vb
-                            break
-                    
-                    if bundle:
-                        examples = getattr(bundle, 'examples', None) or getattr(bundle, 'example', [])
-                        print(f"  🔍 [Sync] 从内存中找到 {len(examples)} 个 examples")
-                    else:
-                        print(f"  ℹ️  [Sync] 在内存中找不到vocab bundle，examples 可能已在 main_assistant 中同步到数据库")
-                        print(f"  🔍 [Sync] 数据库中已有 {existing_examples_count} 个 examples")
-                        # examples 已经在数据库中，不需要再同步
-                        continue
-                    
-                    # 🔧 同步 examples（如果内存中有，但数据库中还没有）
-                    if examples and existing_examples_count == 0:
-                        print(f"🔍 [Sync] 同步 Vocab {vocab_body} 的 {len(examples)} 个 examples 到数据库...")
-                        added_examples = 0
-                        skipped_examples = 0
-                        for ex in examples:
-                            try:
-                                # 调试：打印example的完整信息
-                                print(f"  🔍 [Debug] Example详情: text_id={ex.text_id}, sentence_id={ex.sentence_id}, type={type(ex.text_id)}")
-                                
-                                # 先检查text_id是否存在且属于当前用户
-                                from database_system.business_logic.models import OriginalText
-                                text_model = session.query(OriginalText).filter(
-                                    OriginalText.text_id == ex.text_id,
-                                    OriginalText.user_id == user_id
-                                ).first()
-                                if not text_model:
-                                    print(f"  ⚠️ 跳过 example (text_id={ex.text_id} 不存在或不属于用户 {user_id}): sentence_id={ex.sentence_id}")
-                                    skipped_examples += 1
-                                    continue
-                                
-                                vocab_db_mgr.add_vocab_example(
-                                    vocab_id=vocab_id,
-                                    text_id=ex.text_id,
-                                    sentence_id=ex.sentence_id,
-                                    context_explanation=getattr(ex, 'context_explanation', ''),
-                                    token_indices=getattr(ex, 'token_indices', [])
-                                )
-                                print(f"  ✅ 添加 example: text_id={ex.text_id}, sentence_id={ex.sentence_id}")
-                                added_examples += 1
-                            except Exception as ex_err:
-                                print(f"  ❌ Example 添加失败: {ex_err}")
-                                skipped_examples += 1
-                        
-                        if skipped_examples > 0:
-                            print(f"  ⚠️ {skipped_examples} 个 examples 被跳过（text_id不存在或其他错误）")
-                        if added_examples > 0:
-                            print(f"  ✅ {added_examples} 个 examples 已同步到数据库")
-                    else:
-                        print(f"  ℹ️  Examples 已在数据库中或内存中不存在，跳过同步")
-                        
-                except Exception as e:
-                    print(f"⚠️ [Sync] 处理 vocab {vocab_body} 时出错: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    continue
-            
-            session.commit()
-            print(f"✅ [Sync] 数据库同步完成: {synced_grammar} grammar rules, {synced_vocab} vocab expressions")
-            
-        finally:
-            session.close()
-            
-    except Exception as e:
-        print(f"❌ [Sync] 数据库同步失败: {e}")
-        import traceback
-        traceback.print_exc()
+    """手动同步（已无需要：每轮知识点由 MainAssistant.add_new_to_data 单事务写入数据库）"""
+    logger.info("🔄 [Admin] Manual sync triggered — nothing to sync")
+    return {"success": True, "message": "Knowledge is written to the database during each chat turn; nothing to sync"}
 
 @app.post("/api/chat")
 async def chat_with_assistant(
     payload: dict, 
-    background_tasks: BackgroundTasks, 
     authorization: Optional[str] = Header(None)
 ):
     """聊天功能（完整 MainAssistant 集成）"""
@@ -1558,11 +1405,13 @@ async def chat_with_assistant(
     user_id = None
     chat_slot_acquired = False
     release_chat_slot_in_endpoint = True
+    # 本轮 token 记账缓冲区（主回答 + 后台流程共用，整轮结束后统一落库一次）
+    turn_usage = None
+    # 本轮链路追踪（主回答 + 后台流程共用，后台流程结束时导出）
+    turn_trace = None
     try:
         import time
         request_id = int(time.time() * 1000) % 10000
-        # 🔧 记录本轮请求的开始时间（用于后续汇总 token 使用）
-        request_start_time = datetime.utcnow()
         
         # 开放内测：未登录用户禁止使用 AI Chat
         if not authorization or not authorization.startswith("Bearer "):
@@ -1575,9 +1424,9 @@ async def chat_with_assistant(
             if not payload_data or "sub" not in payload_data:
                 return _chat_error_response(401, "auth_required", "请先登录后使用 AI chat")
             user_id = int(payload_data["sub"])
-            _main_assistant_flow_log(user_id, request_id, f"✅ [Chat] 使用认证用户: {user_id}")
+            _main_assistant_flow_log(user_id, request_id, "✅ [Chat] 使用认证用户: %s", user_id)
         except Exception as e:
-            _main_assistant_flow_log(None, request_id, f"⚠️ [Chat] Token 解析失败: {e}")
+            _main_assistant_flow_log(None, request_id, "⚠️ [Chat] Token 解析失败: %s", e)
             return _chat_error_response(401, "auth_required", "请先登录后使用 AI chat")
         
         # 🔧 从 payload 获取 UI 语言（用于控制 AI 输出语言）
@@ -1589,9 +1438,9 @@ async def chat_with_assistant(
         else:
             ui_language = str(raw_ui_language or '中文')
         _main_assistant_flow_log(user_id, request_id, "\n" + "=" * 80)
-        _main_assistant_flow_log(user_id, request_id, f"💬 [Chat] ========== Chat endpoint called ==========")
-        _main_assistant_flow_log(user_id, request_id, f"📥 [Chat] Payload: {payload}")
-        _main_assistant_flow_log(user_id, request_id, f"🌐 [Chat] UI Language: {ui_language}")
+        _main_assistant_flow_log(user_id, request_id, "💬 [Chat] ========== Chat endpoint called ==========")
+        _main_assistant_flow_log(user_id, request_id, "📥 [Chat] Payload: %s", payload, level=logging.DEBUG)
+        _main_assistant_flow_log(user_id, request_id, "🌐 [Chat] UI Language: %s", ui_language)
         _main_assistant_flow_log(user_id, request_id, "=" * 80)
         
         # 从 session_state 获取上下文信息
@@ -1599,15 +1448,15 @@ async def chat_with_assistant(
         current_selected_token = session_state.current_selected_token
         current_input = session_state.current_input
         
-        _main_assistant_flow_log(user_id, request_id, f"📋 [Chat] Session State Info:")
-        _main_assistant_flow_log(user_id, request_id, f"  - current_input: {current_input}")
-        _main_assistant_flow_log(user_id, request_id, f"  - current_sentence text_id: {current_sentence.text_id if current_sentence else 'None'}")
-        _main_assistant_flow_log(user_id, request_id, f"  - current_sentence sentence_id: {current_sentence.sentence_id if current_sentence else 'None'}")
-        _main_assistant_flow_log(user_id, request_id, f"  - current_sentence: {current_sentence.sentence_body[:50] if current_sentence else 'None'}...")
-        _main_assistant_flow_log(user_id, request_id, f"  - current_selected_token: {current_selected_token}")
+        _main_assistant_flow_log(user_id, request_id, "📋 [Chat] Session State Info:", level=logging.DEBUG)
+        _main_assistant_flow_log(user_id, request_id, "  - current_input: %s", current_input, level=logging.DEBUG)
+        _main_assistant_flow_log(user_id, request_id, "  - current_sentence text_id: %s", current_sentence.text_id if current_sentence else 'None')
+        _main_assistant_flow_log(user_id, request_id, "  - current_sentence sentence_id: %s", current_sentence.sentence_id if current_sentence else 'None')
+        _main_assistant_flow_log(user_id, request_id, "  - current_sentence: %s...", current_sentence.sentence_body[:50] if current_sentence else 'None')
+        _main_assistant_flow_log(user_id, request_id, "  - current_selected_token: %s", current_selected_token, level=logging.DEBUG)
         if current_selected_token:
-            _main_assistant_flow_log(user_id, request_id, f"    - token_text: {current_selected_token.token_text}")
-            _main_assistant_flow_log(user_id, request_id, f"    - token_indices: {current_selected_token.token_indices if hasattr(current_selected_token, 'token_indices') else 'N/A'}")
+            _main_assistant_flow_log(user_id, request_id, "    - token_text: %s", current_selected_token.token_text)
+            _main_assistant_flow_log(user_id, request_id, "    - token_indices: %s", current_selected_token.token_indices if hasattr(current_selected_token, 'token_indices') else 'N/A')
         
         # 验证必要的参数
         if not current_sentence:
@@ -1663,6 +1512,9 @@ async def chat_with_assistant(
         local_state.user_id = user_id
         _main_assistant_flow_log(user_id, request_id, "🧹 [Chat] 使用独立的 SessionState 副本处理本轮请求")
 
+        turn_trace = chat_trace.start_turn(user_id, request_id)
+        answer_span = turn_trace.start_span("chat.answer", activate=True)
+
         # 🔧 获取数据库 session（用于 token 记录和扣减以及检查token是否不足）
         try:
             from backend.config import ENV
@@ -1675,6 +1527,7 @@ async def chat_with_assistant(
         
         # 🔧 检查token是否不足（只在当前没有main assistant流程时判断）
         # 如果main assistant流程已触发，在使用过程中积分不足，仍然完成当前的AI流程
+        balance_span = turn_trace.start_span("db.balance_check")
         try:
             from database_system.business_logic.models import User
             user = db_session.query(User).filter(User.user_id == user_id).first()
@@ -1682,11 +1535,13 @@ async def chat_with_assistant(
                 # 非admin用户且token不足1000（积分不足0.1）
                 if user.role != 'admin' and (user.token_balance is None or user.token_balance < 1000):
                     db_session.close()
+                    turn_trace.finish()
                     return _chat_error_response(403, "insufficient_tokens", "积分不足")
                 if user.role != 'admin':
                     hourly_token_usage = _get_user_hourly_token_usage(db_session, user_id)
                     if hourly_token_usage >= MAX_CHAT_TOKENS_PER_HOUR:
                         db_session.close()
+                        turn_trace.finish()
                         return _chat_error_response(
                             429,
                             "token_budget_exceeded",
@@ -1695,21 +1550,33 @@ async def chat_with_assistant(
                             window_minutes=60,
                         )
         except Exception as e:
-            _main_assistant_flow_log(user_id, request_id, f"⚠️ [Chat] 检查token不足时出错: {e}")
+            _main_assistant_flow_log(user_id, request_id, "⚠️ [Chat] 检查token不足时出错: %s", e)
             # 如果检查失败，继续执行（避免影响正常流程）
+        turn_trace.end_span(balance_span)
+
+        # 后台队列已满时在生成主回答之前拒绝（否则主回答花了 token，知识点抽取却排不上队）
+        if not background_jobs.get_executor().can_accept(user_id):
+            db_session.close()
+            turn_trace.finish()
+            return _chat_error_response(503, "background_queue_full", "当前提问人数较多，请稍后再试")
 
         if not _acquire_chat_slot(user_id):
             db_session.close()
+            turn_trace.finish()
             return _chat_error_response(409, "chat_already_in_progress", "当前有一条提问正在处理中，请稍候再试")
         chat_slot_acquired = True
         
         # 创建 MainAssistant 实例（绑定本轮独立的 session_state）
         from backend.assistants.main_assistant import MainAssistant
         main_assistant = MainAssistant(
-            data_controller_instance=global_dc,
+            data_controller_instance=get_user_data_controller(user_id, session=db_session),
             session_state_instance=local_state
         )
         # 🔧 设置 user_id 和 session（用于 token 记录）
+        from backend.services.token_service import TokenUsageBuffer, attach_usage_buffer
+        turn_usage = TokenUsageBuffer(user_id)
+        attach_usage_buffer(db_session, turn_usage)
+        chat_trace.attach_trace(db_session, turn_trace)
         main_assistant.set_user_context(user_id=user_id, session=db_session)
         # 🔧 主回答阶段也必须同步 UI 语言，否则首条回答会退回默认语言
         main_assistant.ui_language = ui_language
@@ -1721,6 +1588,7 @@ async def chat_with_assistant(
         _main_assistant_flow_log(user_id, request_id, "🚀 [Chat] 生成主回答...")
         try:
             # ✅ 关键修复：在生成回答前保存用户消息到 chat_messages（跨设备同步依赖它）
+            save_span = turn_trace.start_span("db.save_user_message")
             try:
                 # SelectedToken 定义在 backend.assistants.chat_info.selected_token
                 from backend.assistants.chat_info.selected_token import SelectedToken
@@ -1735,9 +1603,11 @@ async def chat_with_assistant(
                     selected_token_for_save,
                     user_id=chat_user_id
                 )
-                _main_assistant_flow_log(user_id, request_id, f"✅ [Chat] 已保存用户消息到 chat_messages (user_id={chat_user_id})")
+                _main_assistant_flow_log(user_id, request_id, "✅ [Chat] 已保存用户消息到 chat_messages (user_id=%s)", chat_user_id)
             except Exception as e:
-                _main_assistant_flow_log(user_id, request_id, f"⚠️ [Chat] 保存用户消息失败（不影响回答生成）: {e}")
+                _main_assistant_flow_log(user_id, request_id, "⚠️ [Chat] 保存用户消息失败（不影响回答生成）: %s", e)
+                turn_trace.end_span(save_span, error=e)
+            turn_trace.end_span(save_span)
 
             ai_response = main_assistant.answer_question_function(
                 quoted_sentence=current_sentence,
@@ -1746,6 +1616,7 @@ async def chat_with_assistant(
             )
 
             # ✅ 关键修复：保存 AI 响应到 chat_messages
+            save_span = turn_trace.start_span("db.save_ai_response")
             try:
                 chat_user_id = str(user_id) if user_id is not None else None
                 main_assistant.dialogue_record.add_ai_response(
@@ -1753,10 +1624,14 @@ async def chat_with_assistant(
                     ai_response,
                     user_id=chat_user_id
                 )
-                _main_assistant_flow_log(user_id, request_id, f"✅ [Chat] 已保存AI响应到 chat_messages (user_id={chat_user_id})")
+                _main_assistant_flow_log(user_id, request_id, "✅ [Chat] 已保存AI响应到 chat_messages (user_id=%s)", chat_user_id)
             except Exception as e:
-                _main_assistant_flow_log(user_id, request_id, f"⚠️ [Chat] 保存AI响应失败（不影响返回）: {e}")
+                _main_assistant_flow_log(user_id, request_id, "⚠️ [Chat] 保存AI响应失败（不影响返回）: %s", e)
+                turn_trace.end_span(save_span, error=e)
+            turn_trace.end_span(save_span)
         finally:
+            # 主回答的用量在返回前落库：后台任务可能还在排队，余额 / 小时预算检查必须看到这部分消耗
+            _flush_turn_token_usage(turn_usage, db_session)
             # 确保 session 被正确关闭
             db_session.close()
         _main_assistant_flow_log(user_id, request_id, "✅ [Chat] 主回答就绪，立即返回给前端")
@@ -1780,13 +1655,10 @@ async def chat_with_assistant(
         
         # 🔧 后台执行 grammar/vocab 处理和创建 notations
         def _run_grammar_vocab_background():
-            def _bg_log(msg: str) -> None:
-                _main_assistant_flow_log(user_id, request_id, msg)
+            def _bg_log(msg: str, *args, level: Optional[int] = None) -> None:
+                _main_assistant_flow_log(user_id, request_id, msg, *args, level=level)
 
             import traceback
-            from backend.assistants import main_assistant as _ma_mod
-            prev_disable_grammar = getattr(_ma_mod, 'DISABLE_GRAMMAR_FEATURES', True)
-            bg_user_lock = _get_background_user_lock(user_id)
             # 🔧 为后台任务创建新的数据库 session（用于 token 记录）
             try:
                 from backend.config import ENV
@@ -1796,26 +1668,33 @@ async def chat_with_assistant(
                 environment = os.getenv("ENV", "development")
             bg_db_manager = get_database_manager(environment)
             bg_db_session = bg_db_manager.get_session()
+            bg_span = None
             try:
-                # 同一用户的后台任务串行化，避免并发写 asked_tokens/json/db 导致错乱
-                bg_user_lock.acquire()
+                # 同一用户的后台任务由执行器按提交顺序串行执行，避免并发写 asked_tokens/json/db 导致错乱
+                turn_trace.end_span(queue_span)
+                bg_span = turn_trace.start_span("chat.background", activate=True)
                 _bg_log("🧠 [Background] 执行 handle_grammar_vocab_function...")
-                _ma_mod.DISABLE_GRAMMAR_FEATURES = False
-                # 🔧 为后台任务设置 user_id 和 session（用于 token 记录）
+                # 后台流程开启语法能力：只作用于本轮的 main_assistant 实例，不修改模块级开关
+                main_assistant.disable_grammar_features = False
+                # 🔧 为后台任务设置 user_id 和 session（用于 token 记录，沿用本轮缓冲区）
+                attach_usage_buffer(bg_db_session, turn_usage)
+                chat_trace.attach_trace(bg_db_session, turn_trace)
                 main_assistant.set_user_context(user_id=user_id, session=bg_db_session)
                 # 🔧 同步 UI 语言到 main_assistant（用于控制所有子助手输出语言）
                 main_assistant.ui_language = ui_language
-                _bg_log(f"🌐 [Background] 设置 UI 语言到 main_assistant: {ui_language}")
-                main_assistant.handle_grammar_vocab_function(
-                    quoted_sentence=current_sentence,
-                    user_question=current_input,
-                    ai_response=ai_response,
-                    effective_sentence_body=effective_sentence_body
-                )
+                _bg_log("🌐 [Background] 设置 UI 语言到 main_assistant: %s", ui_language)
+                with turn_trace.span("stage.extract_knowledge"):
+                    main_assistant.handle_grammar_vocab_function(
+                        quoted_sentence=current_sentence,
+                        user_question=current_input,
+                        ai_response=ai_response,
+                        effective_sentence_body=effective_sentence_body
+                    )
                 
                 # 🔧 调用 add_new_to_data() 以创建新词汇和 notations
                 _bg_log("🧠 [Background] 执行 add_new_to_data()...")
-                main_assistant.add_new_to_data()
+                with turn_trace.span("stage.add_new_to_data"):
+                    main_assistant.add_new_to_data()
                 _bg_log("✅ [Background] add_new_to_data() 完成")
                 
                 # 🔧 关键修复：在 add_new_to_data() 完成后，从 session_state 获取新创建的 vocab_to_add 和 grammar_to_add
@@ -1827,7 +1706,7 @@ async def chat_with_assistant(
                 
                 # 🔧 从 session_state 获取 grammar_to_add（add_new_to_data() 会填充它）
                 if local_state.grammar_to_add:
-                    _bg_log(f"🔍 [Background] 从 session_state 获取 grammar_to_add: {len(local_state.grammar_to_add)} 个")
+                    _bg_log("🔍 [Background] 从 session_state 获取 grammar_to_add: %s 个", len(local_state.grammar_to_add))
                     for g in local_state.grammar_to_add:
                         # 🔧 使用新格式：display_name 和 rule_summary，标记为新知识点
                         grammar_to_add_list.append({
@@ -1837,26 +1716,27 @@ async def chat_with_assistant(
                         })
                 
                 # 🔧 从 session_state 获取已有语法知识点的 notation
-                _bg_log(f"🔍 [Background] 检查 existing_grammar_notations: hasattr={hasattr(local_state, 'existing_grammar_notations')}")
+                _bg_log("🔍 [Background] 检查 existing_grammar_notations: hasattr=%s", hasattr(local_state, 'existing_grammar_notations'))
                 if hasattr(local_state, 'existing_grammar_notations'):
-                    _bg_log(f"🔍 [Background] existing_grammar_notations 值: {local_state.existing_grammar_notations}")
-                    _bg_log(f"🔍 [Background] existing_grammar_notations 长度: {len(local_state.existing_grammar_notations) if local_state.existing_grammar_notations else 0}")
+                    _bg_log("🔍 [Background] existing_grammar_notations 值: %s", local_state.existing_grammar_notations)
+                    _bg_log("🔍 [Background] existing_grammar_notations 长度: %s", len(local_state.existing_grammar_notations) if local_state.existing_grammar_notations else 0)
                 if hasattr(local_state, 'existing_grammar_notations') and local_state.existing_grammar_notations:
-                    _bg_log(f"🔍 [Background] 从 session_state 获取 existing_grammar_notations: {len(local_state.existing_grammar_notations)} 个")
+                    _bg_log("🔍 [Background] 从 session_state 获取 existing_grammar_notations: %s 个", len(local_state.existing_grammar_notations))
                     for idx, g in enumerate(local_state.existing_grammar_notations):
-                        _bg_log(f"🔍 [Background] 处理 existing_grammar_notation[{idx}]: {g}")
+                        _bg_log("🔍 [Background] 处理 existing_grammar_notation[%s]: %s", idx, g)
                         existing_grammar_list.append({
                             'name': g.get('display_name', ''),
                             'grammar_id': g.get('grammar_id'),
                             'type': 'existing'  # 已有知识点
                         })
-                    _bg_log(f"🔍 [Background] existing_grammar_list 构建完成: {existing_grammar_list}")
+                    _bg_log("🔍 [Background] existing_grammar_list 构建完成: %s", existing_grammar_list)
                 else:
-                    _bg_log(f"⚠️ [Background] existing_grammar_notations 为空或不存在")
+                    _bg_log("⚠️ [Background] existing_grammar_notations 为空或不存在")
                 
                 # 🔧 从 session_state 获取 vocab_to_add（add_new_to_data() 会填充它）
+                lookup_span = turn_trace.start_span("db.lookup_new_vocab_ids")
                 if local_state.vocab_to_add:
-                    _bg_log(f"🔍 [Background] 从 session_state 获取 vocab_to_add: {len(local_state.vocab_to_add)} 个词汇")
+                    _bg_log("🔍 [Background] 从 session_state 获取 vocab_to_add: %s 个词汇", len(local_state.vocab_to_add))
                     for v in local_state.vocab_to_add:
                         vocab_body = getattr(v, 'vocab', None)
                         vocab_id = None
@@ -1873,11 +1753,11 @@ async def chat_with_assistant(
                                 ).order_by(VocabExpression.vocab_id.desc()).first()
                                 if vocab_model:
                                     vocab_id = vocab_model.vocab_id
-                                    _bg_log(f"✅ [Background] 从数据库找到 vocab_id={vocab_id} for vocab='{vocab_body}'")
+                                    _bg_log("✅ [Background] 从数据库找到 vocab_id=%s for vocab='%s'", vocab_id, vocab_body, level=logging.DEBUG)
                             finally:
                                 session.close()
                         except Exception as db_err:
-                            _bg_log(f"⚠️ [Background] 从数据库查询 vocab_id 失败: {db_err}")
+                            _bg_log("⚠️ [Background] 从数据库查询 vocab_id 失败: %s", db_err)
                         
                         if vocab_id:
                             vocab_to_add_list.append({
@@ -1885,7 +1765,7 @@ async def chat_with_assistant(
                                 'vocab_id': vocab_id,
                                 'type': 'new'  # 新知识点
                             })
-                            _bg_log(f"✅ [Background] 添加 vocab_to_add: vocab='{vocab_body}', vocab_id={vocab_id}")
+                            _bg_log("✅ [Background] 添加 vocab_to_add: vocab='%s', vocab_id=%s", vocab_body, vocab_id, level=logging.DEBUG)
                         else:
                             vocab_to_add_list.append({
                                 'vocab': vocab_body, 
@@ -1893,23 +1773,25 @@ async def chat_with_assistant(
                                 'type': 'new'  # 新知识点
                             })
                 
+                turn_trace.end_span(lookup_span)
+
                 # 🔧 从 session_state 获取已有词汇知识点的 notation
-                _bg_log(f"🔍 [Background] 检查 existing_vocab_notations: hasattr={hasattr(local_state, 'existing_vocab_notations')}")
+                _bg_log("🔍 [Background] 检查 existing_vocab_notations: hasattr=%s", hasattr(local_state, 'existing_vocab_notations'))
                 if hasattr(local_state, 'existing_vocab_notations'):
-                    _bg_log(f"🔍 [Background] existing_vocab_notations 值: {local_state.existing_vocab_notations}")
-                    _bg_log(f"🔍 [Background] existing_vocab_notations 长度: {len(local_state.existing_vocab_notations) if local_state.existing_vocab_notations else 0}")
+                    _bg_log("🔍 [Background] existing_vocab_notations 值: %s", local_state.existing_vocab_notations)
+                    _bg_log("🔍 [Background] existing_vocab_notations 长度: %s", len(local_state.existing_vocab_notations) if local_state.existing_vocab_notations else 0)
                 if hasattr(local_state, 'existing_vocab_notations') and local_state.existing_vocab_notations:
-                    _bg_log(f"🔍 [Background] 从 session_state 获取 existing_vocab_notations: {len(local_state.existing_vocab_notations)} 个")
+                    _bg_log("🔍 [Background] 从 session_state 获取 existing_vocab_notations: %s 个", len(local_state.existing_vocab_notations))
                     for idx, v in enumerate(local_state.existing_vocab_notations):
-                        _bg_log(f"🔍 [Background] 处理 existing_vocab_notation[{idx}]: {v}")
+                        _bg_log("🔍 [Background] 处理 existing_vocab_notation[%s]: %s", idx, v)
                         existing_vocab_list.append({
                             'vocab': v.get('vocab_body', ''),
                             'vocab_id': v.get('vocab_id'),
                             'type': 'existing'  # 已有知识点
                         })
-                    _bg_log(f"🔍 [Background] existing_vocab_list 构建完成: {existing_vocab_list}")
+                    _bg_log("🔍 [Background] existing_vocab_list 构建完成: %s", existing_vocab_list)
                 else:
-                    _bg_log(f"⚠️ [Background] existing_vocab_notations 为空或不存在")
+                    _bg_log("⚠️ [Background] existing_vocab_notations 为空或不存在")
                 
                 # 🔧 合并新知识点和已有知识点的列表
                 all_grammar_list = grammar_to_add_list + existing_grammar_list
@@ -1920,193 +1802,153 @@ async def chat_with_assistant(
                     max_items=MAX_CHAT_KNOWLEDGE_ITEMS,
                 )
                 
-                _bg_log(f"🔍 [Background] ========== 知识点汇总 ==========")
-                _bg_log(f"🔍 [Background] 新语法知识点: {len(grammar_to_add_list)} 个")
-                _bg_log(f"🔍 [Background] 已有语法知识点: {len(existing_grammar_list)} 个")
-                _bg_log(f"🔍 [Background] 新词汇知识点: {len(vocab_to_add_list)} 个")
-                _bg_log(f"🔍 [Background] 已有词汇知识点: {len(existing_vocab_list)} 个")
-                _bg_log(f"🔍 [Background] 合并后语法总数: {len(all_grammar_list)} 个")
-                _bg_log(f"🔍 [Background] 合并后词汇总数: {len(all_vocab_list)} 个")
-                _bg_log(f"🔍 [Background] all_grammar_list 详情: {all_grammar_list}")
-                _bg_log(f"🔍 [Background] all_vocab_list 详情: {all_vocab_list}")
+                _bg_log("🔍 [Background] ========== 知识点汇总 ==========")
+                _bg_log("🔍 [Background] 新语法知识点: %s 个", len(grammar_to_add_list))
+                _bg_log("🔍 [Background] 已有语法知识点: %s 个", len(existing_grammar_list))
+                _bg_log("🔍 [Background] 新词汇知识点: %s 个", len(vocab_to_add_list))
+                _bg_log("🔍 [Background] 已有词汇知识点: %s 个", len(existing_vocab_list))
+                _bg_log("🔍 [Background] 合并后语法总数: %s 个", len(all_grammar_list))
+                _bg_log("🔍 [Background] 合并后词汇总数: %s 个", len(all_vocab_list))
+                _bg_log("🔍 [Background] all_grammar_list 详情: %s", all_grammar_list)
+                _bg_log("🔍 [Background] all_vocab_list 详情: %s", all_vocab_list)
                 
                 # 存储到临时存储中，供前端轮询获取
-                _bg_log(f"🔍 [Background] 检查是否需要存储知识点: 新语法={len(grammar_to_add_list)}, 已有语法={len(existing_grammar_list)}, 新词汇={len(vocab_to_add_list)}, 已有词汇={len(existing_vocab_list)}")
+                _bg_log("🔍 [Background] 检查是否需要存储知识点: 新语法=%s, 已有语法=%s, 新词汇=%s, 已有词汇=%s", len(grammar_to_add_list), len(existing_grammar_list), len(vocab_to_add_list), len(existing_vocab_list))
                 if all_grammar_list or all_vocab_list:
-                    _bg_log(f"🔍 [Background] 有知识点需要存储，检查 current_sentence...")
-                    _bg_log(f"🔍 [Background] current_sentence 类型: {type(current_sentence)}")
-                    _bg_log(f"🔍 [Background] current_sentence 是否有 text_id 属性: {hasattr(current_sentence, 'text_id')}")
+                    _bg_log("🔍 [Background] 有知识点需要存储，检查 current_sentence...")
+                    _bg_log("🔍 [Background] current_sentence 类型: %s", type(current_sentence))
+                    _bg_log("🔍 [Background] current_sentence 是否有 text_id 属性: %s", hasattr(current_sentence, 'text_id'))
                     text_id = current_sentence.text_id if hasattr(current_sentence, 'text_id') else None
-                    _bg_log(f"🔍 [Background] 提取的 text_id: {text_id} (type={type(text_id) if text_id else 'None'})")
+                    _bg_log("🔍 [Background] 提取的 text_id: %s (type=%s)", text_id, type(text_id) if text_id else 'None')
                     if text_id:
                         # 🔧 确保 text_id 是整数类型（与前端一致）
                         text_id = int(text_id) if text_id else None
-                        _bg_log(f"🔍 [Background] 转换后的 text_id: {text_id} (type={type(text_id) if text_id else 'None'})")
+                        _bg_log("🔍 [Background] 转换后的 text_id: %s (type=%s)", text_id, type(text_id) if text_id else 'None')
                         if text_id:
-                            key = (user_id, text_id)
-                            pending_knowledge_points[key] = {
-                                'grammar_to_add': all_grammar_list,  # 包含新知识点和已有知识点
-                                'vocab_to_add': all_vocab_list,  # 包含新知识点和已有知识点
-                                'timestamp': datetime.now().isoformat()
-                            }
-                            _bg_log(f"✅ [Background] 存储知识点到临时存储: user_id={user_id}, text_id={text_id} (type={type(text_id).__name__}), 语法总数={len(all_grammar_list)} (新={len(grammar_to_add_list)}, 已有={len(existing_grammar_list)}), 词汇总数={len(all_vocab_list)} (新={len(vocab_to_add_list)}, 已有={len(existing_vocab_list)})")
-                            _bg_log(f"🔍 [Background] 存储的数据详情:")
-                            _bg_log(f"🔍 [Background]   grammar_to_add: {all_grammar_list}")
-                            _bg_log(f"🔍 [Background]   vocab_to_add: {all_vocab_list}")
-                            _bg_log(f"🔍 [Background] pending_knowledge_points[{key}] = {pending_knowledge_points[key]}")
-                            _bg_log(f"🔍 [Background] 临时存储的 key: {key}, 当前所有 keys: {list(pending_knowledge_points.keys())}")
+                            # 写入 outbox 并唤醒该用户的 SSE 连接（前端据此弹 toast）
+                            event_db_session = get_database_manager(ENV).get_session()
+                            event_span = turn_trace.start_span("db.publish_event")
+                            try:
+                                event_id = publish_knowledge_event(
+                                    event_db_session,
+                                    user_id=user_id,
+                                    text_id=text_id,
+                                    payload={
+                                        'grammar_to_add': all_grammar_list,  # 包含新知识点和已有知识点
+                                        'vocab_to_add': all_vocab_list,  # 包含新知识点和已有知识点
+                                        'timestamp': datetime.now().isoformat()
+                                    },
+                                )
+                                _bg_log("✅ [Background] 知识点事件已写入 outbox: event_id=%s, user_id=%s, text_id=%s, 语法总数=%s (新=%s, 已有=%s), 词汇总数=%s (新=%s, 已有=%s)", event_id, user_id, text_id, len(all_grammar_list), len(grammar_to_add_list), len(existing_grammar_list), len(all_vocab_list), len(vocab_to_add_list), len(existing_vocab_list))
+                            except Exception as event_error:
+                                event_db_session.rollback()
+                                turn_trace.end_span(event_span, error=event_error)
+                                _bg_log("❌ [Background] 写入知识点事件失败: %s", event_error)
+                            finally:
+                                event_db_session.close()
+                                turn_trace.end_span(event_span)
                         else:
-                            _bg_log(f"⚠️ [Background] text_id 转换失败，无法存储新知识点")
+                            _bg_log("⚠️ [Background] text_id 转换失败，无法存储新知识点")
                     else:
-                        _bg_log(f"⚠️ [Background] text_id 不存在，无法存储新知识点")
-                        _bg_log(f"🔍 [Background] current_sentence 详细信息: {current_sentence}")
+                        _bg_log("⚠️ [Background] text_id 不存在，无法存储新知识点")
+                        _bg_log("🔍 [Background] current_sentence 详细信息: %s", current_sentence)
                 else:
-                    _bg_log(f"⚠️ [Background] 没有知识点需要存储（grammar_to_add_list 和 vocab_to_add_list 都为空）")
+                    _bg_log("⚠️ [Background] 没有知识点需要存储（grammar_to_add_list 和 vocab_to_add_list 都为空）")
                 
-                # 同步到数据库
-                _bg_log("💾 [Background] 同步数据到数据库...")
-                _sync_to_database(user_id=user_id, session_state_instance=local_state)
+                # 本轮知识点已由 add_new_to_data 单事务写入数据库（提交后该用户分区随之失效，写入失败时排队重试）；
+                # 已有知识点的例句在数据库不可用时仍可能回退写进用户分区，这里重新计重（必要时淘汰其他用户的分区）
+                refresh_partition_weight(user_id)
                 
-                # 保存到 JSON 文件（保持兼容）
-                save_data_async(
-                    dc=global_dc,
-                    grammar_path=GRAMMAR_PATH,
-                    vocab_path=VOCAB_PATH,
-                    text_path=TEXT_PATH,
-                    dialogue_record_path=DIALOGUE_RECORD_PATH,
-                    dialogue_history_path=DIALOGUE_HISTORY_PATH
-                )
-                _bg_log("✅ [Background] 数据持久化完成")
-                
-                # 🔧 汇总并显示本轮全部 token 使用量（详细版本）
+                # 🔧 本轮 token 用量一次性落库（主回答 + 后台全部子助手调用）
+                with turn_trace.span("db.token_flush"):
+                    _flush_turn_token_usage(turn_usage, bg_db_session)
+
+                # 🔧 汇总并显示本轮全部 token 使用量（直接读取缓冲区，不再按时间窗口查询 token_logs）
                 try:
-                    from database_system.business_logic.models import TokenLog
-                    from sqlalchemy import func
-                    # 查询从请求开始时间到现在的所有 token_logs
-                    # 使用一个时间窗口（请求开始时间往前推3秒，确保包含主回答的 token 记录）
-                    # 因为主回答的 token 记录可能在后台任务开始之前就已经写入
-                    time_window_start = request_start_time - timedelta(seconds=3)
-                    time_window_end = datetime.utcnow() + timedelta(seconds=1)  # 加1秒确保包含刚刚写入的记录
-                    
-                    # 1. 获取总体统计
-                    token_summary = (
-                        bg_db_session.query(
-                            func.count(TokenLog.id).label('call_count'),
-                            func.sum(TokenLog.total_tokens).label('total_tokens'),
-                            func.sum(TokenLog.prompt_tokens).label('total_prompt_tokens'),
-                            func.sum(TokenLog.completion_tokens).label('total_completion_tokens')
-                        )
-                        .filter(
-                            TokenLog.user_id == user_id,
-                            TokenLog.created_at >= time_window_start,
-                            TokenLog.created_at <= time_window_end
-                        )
-                        .first()
-                    )
-                    
-                    # 2. 获取按 assistant 分组的详细统计
-                    assistant_stats = (
-                        bg_db_session.query(
-                            TokenLog.assistant_name,
-                            func.count(TokenLog.id).label('call_count'),
-                            func.sum(TokenLog.total_tokens).label('total_tokens'),
-                            func.sum(TokenLog.prompt_tokens).label('total_prompt_tokens'),
-                            func.sum(TokenLog.completion_tokens).label('total_completion_tokens')
-                        )
-                        .filter(
-                            TokenLog.user_id == user_id,
-                            TokenLog.created_at >= time_window_start,
-                            TokenLog.created_at <= time_window_end
-                        )
-                        .group_by(TokenLog.assistant_name)
-                        .order_by(TokenLog.assistant_name)
-                        .all()
-                    )
-                    
-                    # 3. 获取所有调用的详细列表（按时间排序）
-                    all_calls = (
-                        bg_db_session.query(TokenLog)
-                        .filter(
-                            TokenLog.user_id == user_id,
-                            TokenLog.created_at >= time_window_start,
-                            TokenLog.created_at <= time_window_end
-                        )
-                        .order_by(TokenLog.created_at)
-                        .all()
-                    )
-                    
-                    if token_summary and token_summary.total_tokens:
-                        call_count = token_summary.call_count or 0
-                        total_tokens = int(token_summary.total_tokens) if token_summary.total_tokens else 0
-                        total_prompt = int(token_summary.total_prompt_tokens) if token_summary.total_prompt_tokens else 0
-                        total_completion = int(token_summary.total_completion_tokens) if token_summary.total_completion_tokens else 0
-                        
-                        # 获取最终余额
+                    token_summary = turn_usage.summary()
+                    if token_summary['total_tokens']:
                         from database_system.business_logic.models import User
                         final_user = bg_db_session.query(User).filter(User.user_id == user_id).first()
                         final_balance = final_user.token_balance if final_user else 0
-                        
+
                         _bg_log("\n" + "="*80)
-                        _bg_log(f"📊 [Token Summary] 本轮 Chat API 调用 Token 使用汇总")
+                        _bg_log("📊 [Token Summary] 本轮 Chat API 调用 Token 使用汇总")
                         _bg_log("="*80)
-                        _bg_log(f"  👤 用户 ID: {user_id}")
-                        _bg_log(f"  🔢 总 API 调用次数: {call_count}")
-                        _bg_log(f"  📝 总 Prompt Tokens: {total_prompt:,}")
-                        _bg_log(f"  ✍️  总 Completion Tokens: {total_completion:,}")
-                        _bg_log(f"  💰 总 Token 使用量: {total_tokens:,}")
-                        _bg_log(f"  💵 最终余额: {final_balance:,}")
+                        _bg_log("  👤 用户 ID: %s", user_id)
+                        _bg_log("  🧭 Trace ID: %s（分阶段耗时见 /api/debug/chat-traces）", turn_trace.trace_id)
+                        _bg_log("  🔢 总 API 调用次数: %s", token_summary['call_count'])
+                        _bg_log("  📝 总 Prompt Tokens: %s", format(token_summary['prompt_tokens'], ','))
+                        _bg_log("  ♻️  命中前缀缓存的 Prompt Tokens: %s", format(token_summary['prompt_cache_hit_tokens'], ','))
+                        _bg_log("  ✍️  总 Completion Tokens: %s", format(token_summary['completion_tokens'], ','))
+                        _bg_log("  💰 总 Token 使用量: %s", format(token_summary['total_tokens'], ','))
+                        _bg_log("  💵 最终余额: %s", format(final_balance, ','))
                         _bg_log("="*80)
-                        
+
                         # 按 Assistant 分组统计
-                        if assistant_stats:
-                            _bg_log(f"\n📋 按 SubAssistant 分组统计:")
+                        if token_summary['by_assistant']:
+                            _bg_log("\n📋 按 SubAssistant 分组统计:")
                             _bg_log("-" * 80)
-                            for assistant_name, a_call_count, a_total, a_prompt, a_completion in assistant_stats:
-                                a_total_int = int(a_total) if a_total else 0
-                                a_prompt_int = int(a_prompt) if a_prompt else 0
-                                a_completion_int = int(a_completion) if a_completion else 0
-                                assistant_display = assistant_name or "Unknown"
-                                _bg_log(f"  • {assistant_display}:")
-                                _bg_log(f"     调用次数: {a_call_count}")
-                                _bg_log(f"     Prompt: {a_prompt_int:,} | Completion: {a_completion_int:,} | 总计: {a_total_int:,}")
-                        
-                        # 详细调用列表
-                        if all_calls:
-                            _bg_log(f"\n📝 详细调用记录（按时间顺序）:")
+                            for assistant_display, a_stats in token_summary['by_assistant'].items():
+                                _bg_log("  • %s:", assistant_display, level=logging.DEBUG)
+                                _bg_log("     调用次数: %s", a_stats['call_count'], level=logging.DEBUG)
+                                _bg_log("     Prompt: %s (缓存命中 %s) | Completion: %s | 总计: %s", format(a_stats['prompt_tokens'], ','), format(a_stats['prompt_cache_hit_tokens'], ','), format(a_stats['completion_tokens'], ','), format(a_stats['total_tokens'], ','), level=logging.DEBUG)
+
+                        # 详细调用记录
+                        if token_summary['calls']:
+                            _bg_log("\n📝 详细调用记录（按时间顺序）:")
                             _bg_log("-" * 80)
-                            for idx, call in enumerate(all_calls, 1):
-                                assistant_display = call.assistant_name or "Unknown"
-                                call_time = call.created_at.strftime("%H:%M:%S.%f")[:-3] if call.created_at else "N/A"
-                                _bg_log(f"  {idx}. [{call_time}] {assistant_display}")
-                                _bg_log(f"     Prompt: {call.prompt_tokens:,} | Completion: {call.completion_tokens:,} | 总计: {call.total_tokens:,}")
-                        
+                            for idx, call in enumerate(token_summary['calls'], 1):
+                                assistant_display = call['assistant_name'] or "Unknown"
+                                call_time = call['created_at'].strftime("%H:%M:%S.%f")[:-3]
+                                _bg_log("  %s. [%s] %s", idx, call_time, assistant_display, level=logging.DEBUG)
+                                _bg_log("     Prompt: %s | Completion: %s | 总计: %s", format(call['prompt_tokens'], ','), format(call['completion_tokens'], ','), format(call['total_tokens'], ','), level=logging.DEBUG)
+
                         _bg_log("="*80 + "\n")
                     else:
                         _bg_log("⚠️ [Token Summary] 未找到本轮 token 使用记录")
                 except Exception as summary_error:
-                    _bg_log(f"⚠️ [Token Summary] 汇总 token 使用量时出错: {summary_error}")
+                    _bg_log("⚠️ [Token Summary] 汇总 token 使用量时出错: %s", summary_error)
                     import traceback
                     traceback.print_exc()
             except Exception as bg_e:
-                _bg_log(f"❌ [Background] 后台流程失败: {bg_e}")
+                _bg_log("❌ [Background] 后台流程失败: %s", bg_e)
                 traceback.print_exc()
+                if bg_span is not None:
+                    turn_trace.end_span(bg_span, error=bg_e)
             finally:
-                try:
-                    _ma_mod.DISABLE_GRAMMAR_FEATURES = prev_disable_grammar
-                except Exception:
-                    pass
+                # 🔧 后台流程异常退出时也要把已缓冲的 token 用量落库（已落库则为空操作）
+                _flush_turn_token_usage(turn_usage, bg_db_session)
+                # 整轮结束：导出本轮全部 span
+                turn_trace.finish()
                 # 🔧 确保后台任务的 session 被正确关闭
                 try:
                     bg_db_session.close()
                 except Exception as e:
-                    _bg_log(f"⚠️ [Background] 关闭 session 时出错: {e}")
-                try:
-                    bg_user_lock.release()
-                except Exception:
-                    pass
-        
-        # 启动后台任务
-        background_tasks.add_task(_run_grammar_vocab_background)
+                    _bg_log("⚠️ [Background] 关闭 session 时出错: %s", e)
+
+        def _cancel_grammar_vocab_background():
+            # 排队中被取消（如停机时丢弃）：主回答的用量已在返回前落库，这里只补写之前落库失败的部分
+            turn_trace.end_span(queue_span, error=RuntimeError("background job cancelled"))
+            _flush_turn_token_usage(turn_usage)
+            turn_trace.finish()
+
+        # 启动后台任务（排队时间 = 现在 → 后台开始执行，含等待同用户前面的任务）
+        turn_trace.end_span(answer_span)
+        queue_span = turn_trace.start_span("queue.background")
+        try:
+            background_jobs.get_executor().submit(
+                user_id,
+                _run_grammar_vocab_background,
+                priority=background_jobs.PRIORITY_NORMAL,
+                name=f"chat-knowledge:{user_id}:{request_id}",
+                on_cancel=_cancel_grammar_vocab_background,
+            )
+        except background_jobs.QueueFullError as e:
+            # 提前检查之后队列又被占满：主回答照常返回，本轮跳过知识点抽取
+            _main_assistant_flow_log(user_id, request_id, "⚠️ [Chat] 后台队列已满，本轮跳过知识点抽取: %s", e)
+            turn_trace.end_span(queue_span, error=e)
+            _flush_turn_token_usage(turn_usage)
+            turn_trace.finish()
         # ✅ 主回答已完成：释放 chat 锁，允许用户继续提问（后台任务仍会按 user 串行执行）
         if chat_slot_acquired:
             _release_chat_slot(user_id)
@@ -2120,8 +1962,13 @@ async def chat_with_assistant(
     except Exception as e:
         if chat_slot_acquired and release_chat_slot_in_endpoint:
             _release_chat_slot(user_id)
+        # 后台任务未能启动时，主回答阶段尚未落库的 token 用量在这里落库
+        if release_chat_slot_in_endpoint:
+            _flush_turn_token_usage(turn_usage)
+            if turn_trace is not None:
+                turn_trace.finish()
         _rid = locals().get("request_id")
-        _main_assistant_flow_log(user_id, _rid, f"❌ [Chat] Error: {e}")
+        _main_assistant_flow_log(user_id, _rid, "❌ [Chat] Error: %s", e)
         _main_assistant_flow_log(user_id, _rid, traceback.format_exc())
         return {
             "success": False,
@@ -2130,65 +1977,169 @@ async def chat_with_assistant(
             "traceback": traceback.format_exc()
         }
 
+KNOWLEDGE_EVENTS_HEARTBEAT_SECONDS = 15
+
+
+def _knowledge_events_user_id(authorization: Optional[str], token: Optional[str]) -> Optional[int]:
+    """从 Authorization 头或 token 查询参数解析 user_id（EventSource 无法设置请求头）"""
+    from backend.utils.auth import decode_access_token
+    raw_token = None
+    if authorization and authorization.startswith("Bearer "):
+        raw_token = authorization.replace("Bearer ", "")
+    elif token:
+        raw_token = token
+    if not raw_token:
+        return None
+    payload_data = decode_access_token(raw_token)
+    if not payload_data or "sub" not in payload_data:
+        return None
+    try:
+        return int(payload_data["sub"])
+    except (TypeError, ValueError):
+        return None
+
+
+def _load_pending_knowledge_events(user_id: int, after_id: int, text_id: Optional[int] = None) -> list:
+    """读取未确认的知识点事件（同步，供 run_in_threadpool 调用）"""
+    session = get_database_manager(ENV).get_session()
+    try:
+        return [serialize_event(event) for event in fetch_pending_events(session, user_id, after_id, text_id)]
+    finally:
+        session.close()
+
+
+def _ack_knowledge_events(user_id: int, up_to_id: int, text_id: Optional[int] = None) -> int:
+    """确认送达（同步，供 run_in_threadpool 调用）"""
+    session = get_database_manager(ENV).get_session()
+    try:
+        return ack_events(session, user_id, up_to_id, text_id)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+@app.get("/api/chat/knowledge-events")
+async def stream_knowledge_events(
+    request: Request,
+    token: Optional[str] = Query(None, description="JWT（EventSource 无法携带 Authorization 头）"),
+    text_id: Optional[int] = Query(None, description="只推送该文章的事件（可选）"),
+    last_event_id: Optional[int] = Query(None, description="首次连接时已处理到的事件 id（可选）"),
+    authorization: Optional[str] = Header(None),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    """
+    SSE：后台任务完成 add_new_to_data 后立即推送新知识点（event: knowledge_points）
+
+    - 事件持久化在 knowledge_events 表中，至少送达一次，前端按 event_id 去重
+    - 重连时浏览器自动携带 Last-Event-ID，视为已确认该 id 及之前的事件
+    - 同进程内发布立即唤醒；其他 worker 发布的事件在心跳周期内查库补发
+    """
+    user_id = _knowledge_events_user_id(authorization, token)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="请先登录")
+
+    resume_from = last_event_id or 0
+    if last_event_id_header:
+        try:
+            resume_from = max(resume_from, int(last_event_id_header))
+        except ValueError:
+            pass
+    if resume_from:
+        await run_in_threadpool(_ack_knowledge_events, user_id, resume_from, text_id)
+
+    async def event_stream():
+        subscriber = subscribe_knowledge_events(user_id)
+        sent_up_to = resume_from
+        try:
+            yield f"retry: 3000\n\n"
+            while not subscriber.evicted:
+                if await request.is_disconnected():
+                    break
+                # 先清除信号再查库：查库期间的新发布会让下一次 wait 立即返回
+                subscriber.wakeup.clear()
+                events = await run_in_threadpool(_load_pending_knowledge_events, user_id, sent_up_to, text_id)
+                for event in events:
+                    sent_up_to = event["event_id"]
+                    yield (
+                        f"id: {event['event_id']}\n"
+                        f"event: knowledge_points\n"
+                        f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+                    )
+                if events:
+                    continue
+                try:
+                    await asyncio.wait_for(subscriber.wakeup.wait(), timeout=KNOWLEDGE_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            unsubscribe_knowledge_events(user_id, subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@app.post("/api/chat/knowledge-events/ack")
+async def ack_knowledge_events(
+    payload: dict,
+    current_user: User = Depends(get_current_user),
+):
+    """确认已展示的知识点事件（id <= last_event_id 的事件不再推送；只作用于当前登录用户）"""
+    user_id = int(current_user.user_id)
+    try:
+        up_to_id = int(payload.get("last_event_id") or 0)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="last_event_id 无效")
+    acked = await run_in_threadpool(_ack_knowledge_events, user_id, up_to_id, payload.get("text_id"))
+    return {'success': True, 'data': {'acked': acked}}
+
+
 @app.get("/api/chat/pending-knowledge")
 async def get_pending_knowledge(
-    user_id: int = Query(..., description="用户ID"),
     text_id: int = Query(..., description="文章ID"),
-    authorization: Optional[str] = Header(None)
+    user_id: Optional[int] = Query(None, description="已废弃：始终使用当前登录用户，传入时必须与之一致"),
+    current_user: User = Depends(get_current_user),
 ):
     """
     获取后台任务创建的新知识点（vocab_to_add 和 grammar_to_add）
-    供前端轮询获取并显示 toast
+
+    兼容旧的轮询方式：从 knowledge_events 读取该文章最新一条未送达事件，
+    返回后把该文章此前的事件一并标记为已送达。新前端应使用 /api/chat/knowledge-events。
+    只读取 / 确认当前登录用户的事件。
     """
+    if user_id is not None and int(user_id) != int(current_user.user_id):
+        raise HTTPException(status_code=403, detail="无权访问其他用户的知识点事件")
+    user_id = int(current_user.user_id)
+    empty = {'success': True, 'data': {'grammar_to_add': [], 'vocab_to_add': []}}
     try:
-        # 🔧 确保 text_id 是整数类型（与存储时一致）
         text_id = int(text_id) if text_id else None
         if not text_id:
-            print(f"⚠️ [PendingKnowledge] text_id 无效: {text_id}")
-            return {
-                'success': True,
-                'data': {
-                    'grammar_to_add': [],
-                    'vocab_to_add': []
-                }
-            }
-        
-        key = (user_id, text_id)
-        print(f"🔍 [PendingKnowledge] ========== 查询新知识点 ==========")
-        print(f"🔍 [PendingKnowledge] 查找 key: {key}")
-        print(f"🔍 [PendingKnowledge] key 类型: {type(key)}")
-        print(f"🔍 [PendingKnowledge] 当前所有 keys: {list(pending_knowledge_points.keys())}")
-        print(f"🔍 [PendingKnowledge] 当前所有 keys 的类型: {[type(k) for k in pending_knowledge_points.keys()]}")
-        print(f"🔍 [PendingKnowledge] pending_knowledge_points 总数量: {len(pending_knowledge_points)}")
-        
-        if key in pending_knowledge_points:
-            data = pending_knowledge_points[key]
-            print(f"✅ [PendingKnowledge] 找到数据: grammar={len(data.get('grammar_to_add', []))}, vocab={len(data.get('vocab_to_add', []))}")
-            print(f"✅ [PendingKnowledge] grammar_to_add 详情: {data.get('grammar_to_add', [])}")
-            print(f"✅ [PendingKnowledge] vocab_to_add 详情: {data.get('vocab_to_add', [])}")
-            print(f"🔍 [PendingKnowledge] 返回的完整数据结构: {data}")
-            # 返回后删除，避免重复获取
-            del pending_knowledge_points[key]
-            print(f"✅ [PendingKnowledge] 返回新知识点: user_id={user_id}, text_id={text_id}, grammar={len(data['grammar_to_add'])}, vocab={len(data['vocab_to_add'])}")
-            print(f"🔍 [PendingKnowledge] 删除后，剩余 keys: {list(pending_knowledge_points.keys())}")
-            return {
-                'success': True,
-                'data': {
-                    'grammar_to_add': data['grammar_to_add'],
-                    'vocab_to_add': data['vocab_to_add']
-                }
-            }
-        else:
-            print(f"⚠️ [PendingKnowledge] key {key} 不存在于临时存储中")
-            return {
-                'success': True,
-                'data': {
-                    'grammar_to_add': [],
-                    'vocab_to_add': []
-                }
+            return empty
+
+        events = await run_in_threadpool(_load_pending_knowledge_events, user_id, 0, text_id)
+        if not events:
+            return empty
+
+        latest = events[-1]
+        await run_in_threadpool(_ack_knowledge_events, user_id, latest['event_id'], text_id)
+        logger.info("✅ [PendingKnowledge] 返回新知识点: user_id=%s, text_id=%s, event_id=%s, grammar=%s, vocab=%s", user_id, text_id, latest['event_id'], len(latest['grammar_to_add']), len(latest['vocab_to_add']))
+        return {
+            'success': True,
+            'data': {
+                'grammar_to_add': latest['grammar_to_add'],
+                'vocab_to_add': latest['vocab_to_add'],
+                'event_id': latest['event_id'],
             }
+        }
     except Exception as e:
-        print(f"❌ [PendingKnowledge] 获取新知识点失败: {e}")
+        logger.error("❌ [PendingKnowledge] 获取新知识点失败: %s", e)
         import traceback
         traceback.print_exc()
         return {
@@ -2206,9 +2157,9 @@ async def get_vocab_example_by_location(
 ):
     """按位置查找词汇例句"""
     try:
-        print(f"🔍 [VocabExample] Searching by location: text_id={text_id}, sentence_id={sentence_id}, token_index={token_index}, vocab_id={vocab_id}")
+        logger.debug("🔍 [VocabExample] Searching by location: text_id=%s, sentence_id=%s, token_index=%s, vocab_id=%s", text_id, sentence_id, token_index, vocab_id)
         
-        # 🔧 修复：从数据库查询，而不是从 global_dc（文件系统管理器）查询
+        # 🔧 修复：从数据库查询，而不是从内存中的文件系统管理器查询
         from database_system.business_logic.models import VocabExpressionExample, OriginalText
         from backend.adapters import VocabExampleAdapter
         
@@ -2226,7 +2177,7 @@ async def get_vocab_example_by_location(
                     OriginalText.user_id == user_id
                 ).first()
                 if not text_model:
-                    print(f"⚠️ [VocabExample] text_id={text_id} 不存在或不属于用户 {user_id}")
+                    logger.warning("⚠️ [VocabExample] text_id=%s 不存在或不属于用户 %s", text_id, user_id)
                     return {
                         'success': False,
                         'data': None,
@@ -2237,7 +2188,7 @@ async def get_vocab_example_by_location(
             # 1. 首先按 text_id 和 sentence_id 查找，并通过 vocab_id 关联到 VocabExpression 来过滤 user_id
             from database_system.business_logic.models import VocabExpression
             
-            print(f"🔍 [VocabExample] Query params: text_id={text_id}, sentence_id={sentence_id}, token_index={token_index}, vocab_id={vocab_id}, user_id={user_id}")
+            logger.debug("🔍 [VocabExample] Query params: text_id=%s, sentence_id=%s, token_index=%s, vocab_id=%s, user_id=%s", text_id, sentence_id, token_index, vocab_id, user_id)
             
             query = session.query(VocabExpressionExample).join(
                 VocabExpression,
@@ -2249,27 +2200,27 @@ async def get_vocab_example_by_location(
             # 🔧 如果有 user_id，只查询属于该用户的 vocab 的 example
             if user_id:
                 query = query.filter(VocabExpression.user_id == user_id)
-                print(f"🔍 [VocabExample] Filtering by user_id={user_id}")
+                logger.debug("🔍 [VocabExample] Filtering by user_id=%s", user_id)
             else:
                 # 理论上不会发生（当前接口强制认证）
-                print(f"⚠️ [VocabExample] No user_id provided (unexpected), refusing to query cross-user data")
+                logger.warning("⚠️ [VocabExample] No user_id provided (unexpected), refusing to query cross-user data")
                 return {'success': False, 'data': None, 'message': 'Unauthorized'}
             
             if sentence_id is not None:
                 query = query.filter(VocabExpressionExample.sentence_id == sentence_id)
-                print(f"🔍 [VocabExample] Filtering by sentence_id={sentence_id}")
+                logger.debug("🔍 [VocabExample] Filtering by sentence_id=%s", sentence_id)
 
             if vocab_id is not None:
                 query = query.filter(VocabExpressionExample.vocab_id == vocab_id)
-                print(f"🔍 [VocabExample] Filtering by vocab_id={vocab_id}")
+                logger.debug("🔍 [VocabExample] Filtering by vocab_id=%s", vocab_id)
             
             examples = query.all()
-            print(f"🔍 [VocabExample] Found {len(examples)} example(s) before token_index filtering (user_id={user_id})")
+            logger.debug("🔍 [VocabExample] Found %s example(s) before token_index filtering (user_id=%s)", len(examples), user_id)
             
             # ✅ 不再跨用户回退查询（确保用户数据隔离）
             for ex in examples:
                 vocab_model = session.query(VocabExpression).filter(VocabExpression.vocab_id == ex.vocab_id).first()
-                print(f"  - Example: vocab_id={ex.vocab_id}, text_id={ex.text_id}, sentence_id={ex.sentence_id}, token_indices={ex.token_indices}, vocab_user_id={vocab_model.user_id if vocab_model else 'N/A'}")
+                logger.debug("  - Example: vocab_id=%s, text_id=%s, sentence_id=%s, token_indices=%s, vocab_user_id=%s", ex.vocab_id, ex.text_id, ex.sentence_id, ex.token_indices, vocab_model.user_id if vocab_model else 'N/A')
             
             # 🔧 2. 如果有 token_index，进一步过滤（检查 token_indices 是否包含 token_index）
             # 🔧 修复：如果 token_indices 为空，说明 example 是为整个句子创建的，应该匹配任何 token_index
@@ -2279,29 +2230,29 @@ async def get_vocab_example_by_location(
                 for ex in examples:
                     # token_indices 是 JSON 列，可能是列表或 None
                     token_indices = ex.token_indices if ex.token_indices else []
-                    print(f"🔍 [VocabExample] Checking example: vocab_id={ex.vocab_id}, token_indices={token_indices}, looking for token_index={token_index}")
+                    logger.debug("🔍 [VocabExample] Checking example: vocab_id=%s, token_indices=%s, looking for token_index=%s", ex.vocab_id, token_indices, token_index)
                     
                     # 🔧 如果 token_indices 为空，说明 example 是为整个句子创建的，应该匹配
                     if len(token_indices) == 0:
-                        print(f"✅ [VocabExample] Match found (empty token_indices, sentence-level example): vocab_id={ex.vocab_id}")
+                        logger.debug("✅ [VocabExample] Match found (empty token_indices, sentence-level example): vocab_id=%s", ex.vocab_id)
                         matching_examples.append(ex)
                     elif token_index in token_indices:
                         matching_examples.append(ex)
-                        print(f"✅ [VocabExample] Match found: vocab_id={ex.vocab_id}")
+                        logger.debug("✅ [VocabExample] Match found: vocab_id=%s", ex.vocab_id)
                     else:
-                        print(f"⚠️ [VocabExample] Token index mismatch: token_index={token_index} not in token_indices={token_indices}, skipping example vocab_id={ex.vocab_id}")
+                        logger.warning("⚠️ [VocabExample] Token index mismatch: token_index=%s not in token_indices=%s, skipping example vocab_id=%s", token_index, token_indices, ex.vocab_id)
                 if matching_examples:
                     examples = matching_examples
                 elif len(examples) == 1:
-                    print("⚠️ [VocabExample] No token-level match, but only one example exists for this vocab+sentence; using it as fallback")
+                    logger.warning("⚠️ [VocabExample] No token-level match, but only one example exists for this vocab+sentence; using it as fallback")
                 else:
                     examples = []
-                print(f"🔍 [VocabExample] After token_index filtering: {len(examples)} example(s)")
+                logger.debug("🔍 [VocabExample] After token_index filtering: %s example(s)", len(examples))
             
             if examples:
                 # 🔧 使用第一个匹配的 example
                 example_model = examples[0]
-                print(f"✅ [VocabExample] Found {len(examples)} example(s)")
+                logger.info("✅ [VocabExample] Found %s example(s)", len(examples))
                 
                 # 🔧 转换为 DTO，然后转换为字典
                 example_dto = VocabExampleAdapter.model_to_dto(example_model)
@@ -2321,7 +2272,7 @@ async def get_vocab_example_by_location(
                     'message': f'Found vocab example'
                 }
             else:
-                print(f"❌ [VocabExample] No example found")
+                logger.error("❌ [VocabExample] No example found")
                 return {
                     'success': False,
                     'data': None,
@@ -2331,7 +2282,7 @@ async def get_vocab_example_by_location(
             session.close()
             
     except Exception as e:
-        print(f"❌ [VocabExample] Error: {e}")
+        logger.error("❌ [VocabExample] Error: %s", e)
         import traceback
         traceback.print_exc()
         return {'success': False, 'error': str(e)}
@@ -2374,7 +2325,8 @@ async def get_vocab_list(current_user: User = Depends(get_current_user)):
 async def get_vocab_detail(vocab_id: int, current_user: User = Depends(get_current_user)):
     """获取词汇详情（兼容端点：强制按当前用户过滤，避免数据泄露）"""
     try:
-        from database_system.business_logic.models import VocabExpression, Sentence
+        from database_system.business_logic.models import VocabExpression
+        from backend.services.example_sentences import load_vocab_examples
         db_manager = get_database_manager(ENV)
         session = db_manager.get_session()
         try:
@@ -2385,32 +2337,7 @@ async def get_vocab_detail(vocab_id: int, current_user: User = Depends(get_curre
             if not vocab:
                 return create_error_response(f"词汇不存在或无权限访问: {vocab_id}")
 
-            examples_data = []
-            if getattr(vocab, "examples", None):
-                for ex in vocab.examples:
-                    original_sentence = None
-                    try:
-                        if ex.text_id is not None and ex.sentence_id is not None:
-                            sentence_obj = session.query(Sentence).filter(
-                                Sentence.text_id == ex.text_id,
-                                Sentence.sentence_id == ex.sentence_id
-                            ).first()
-                            if sentence_obj:
-                                original_sentence = sentence_obj.sentence_body
-                    except Exception as se:
-                        print(
-                            f"⚠️ [VocabAPI Compatibility] 获取例句原句失败: "
-                            f"text_id={ex.text_id}, sentence_id={ex.sentence_id}, error={se}"
-                        )
-
-                    examples_data.append({
-                        "vocab_id": ex.vocab_id,
-                        "text_id": ex.text_id,
-                        "sentence_id": ex.sentence_id,
-                        "original_sentence": original_sentence,
-                        "context_explanation": ex.context_explanation,
-                        "token_indices": ex.token_indices,
-                    })
+            examples_data = load_vocab_examples(session, vocab.vocab_id)
 
             data = {
                 "vocab_id": vocab.vocab_id,
@@ -2473,7 +2400,8 @@ async def get_grammar_list(current_user: User = Depends(get_current_user)):
 async def get_grammar_detail(rule_id: int, current_user: User = Depends(get_current_user)):
     """获取单个语法规则详情（兼容端点：重定向到 v2 API）"""
     try:
-        from database_system.business_logic.models import GrammarRule, Sentence
+        from database_system.business_logic.models import GrammarRule
+        from backend.services.example_sentences import load_grammar_examples
         db_manager = get_database_manager(ENV)
         session = db_manager.get_session()
         try:
@@ -2486,29 +2414,8 @@ async def get_grammar_detail(rule_id: int, current_user: User = Depends(get_curr
             if not grammar_rule:
                 raise HTTPException(status_code=404, detail=f"语法规则 ID {rule_id} 不存在或不属于当前用户")
             
-            # 获取例句数据
-            examples_data = []
-            if grammar_rule.examples:
-                for ex in grammar_rule.examples:
-                    original_sentence = None
-                    try:
-                        if ex.text_id is not None and ex.sentence_id is not None:
-                            sentence_obj = session.query(Sentence).filter(
-                                Sentence.text_id == ex.text_id,
-                                Sentence.sentence_id == ex.sentence_id
-                            ).first()
-                            if sentence_obj:
-                                original_sentence = sentence_obj.sentence_body
-                    except Exception as se:
-                        print(f"⚠️ [GrammarAPI] 获取例句原句失败: text_id={ex.text_id}, sentence_id={ex.sentence_id}, error={se}")
-                    
-                    examples_data.append({
-                        "rule_id": ex.rule_id,
-                        "text_id": ex.text_id,
-                        "sentence_id": ex.sentence_id,
-                        "original_sentence": original_sentence,
-                        "explanation_context": ex.explanation_context,
-                    })
+            # 获取例句数据（一条 JOIN 查询，与 v2 接口相同的去重规则）
+            examples_data = load_grammar_examples(session, grammar_rule.rule_id)
             
             data = {
                 "rule_id": grammar_rule.rule_id,
@@ -2571,7 +2478,7 @@ async def list_articles(current_user: User = Depends(get_current_user)):
     建议前端直接使用 /api/v2/texts/ 端点。
     """
     try:
-        print(f"⚠️ [API] /api/articles 被调用（用户 {current_user.user_id}），重定向到数据库查询")
+        logger.warning("⚠️ [API] /api/articles 被调用（用户 %s），重定向到数据库查询", current_user.user_id)
         
         # 🔧 从数据库查询，确保用户隔离
         from database_system.business_logic.models import OriginalText
@@ -2598,7 +2505,7 @@ async def list_articles(current_user: User = Depends(get_current_user)):
                 for t in texts
             ]
             
-            print(f"✅ [API] 从数据库获取 {len(summaries)} 篇文章（用户 {current_user.user_id}）")
+            logger.info("✅ [API] 从数据库获取 %s 篇文章（用户 %s）", len(summaries), current_user.user_id)
             return create_success_response(
                 data=summaries,
                 message=f"成功获取文章列表，共 {len(summaries)} 篇（仅当前用户）"
@@ -2607,7 +2514,7 @@ async def list_articles(current_user: User = Depends(get_current_user)):
             session.close()
             
     except Exception as e:
-        print(f"❌ [API] 获取文章列表失败: {e}")
+        logger.error("❌ [API] 获取文章列表失败: %s", e)
         import traceback
         traceback.print_exc()
         return create_error_response(f"获取文章列表失败: {str(e)}")
@@ -2639,7 +2546,7 @@ async def get_article_detail(
     ⚠️ 此接口已改为从数据库查询，只返回属于当前用户的文章。
     """
     try:
-        print(f"🔍 [API] /api/articles/{article_id} 被调用 - user_id: {current_user.user_id}")
+        logger.debug("🔍 [API] /api/articles/%s 被调用 - user_id: %s", article_id, current_user.user_id)
         
         # 🔧 从数据库查询，确保用户隔离
         from database_system.business_logic.models import OriginalText
@@ -2656,7 +2563,7 @@ async def get_article_detail(
             ).first()
             
             if not text_model:
-                print(f"❌ [API] 文章 {article_id} 不存在或不属于用户 {current_user.user_id}")
+                logger.error("❌ [API] 文章 %s 不存在或不属于用户 %s", article_id, current_user.user_id)
                 return create_error_response(
                     f"文章不存在或无权访问: {article_id}",
                     status_code=404
@@ -2756,7 +2663,7 @@ async def get_article_detail(
             # 标记 token 的可选择性
             data = _mark_tokens_selectable(data)
 
-            print(f"✅ [API] 成功获取文章 {article_id}（用户 {current_user.user_id}）")
+            logger.info("✅ [API] 成功获取文章 %s（用户 %s）", article_id, current_user.user_id)
             return create_success_response(
                 data=data,
                 message=f"成功获取文章详情: {text.text_title}"
@@ -2765,7 +2672,7 @@ async def get_article_detail(
             session.close()
             
     except Exception as e:
-        print(f"❌ [API] 获取文章详情失败: {e}")
+        logger.error("❌ [API] 获取文章详情失败: %s", e)
         import traceback
         traceback.print_exc()
         return create_error_response(f"获取文章详情失败: {str(e)}")
@@ -2790,7 +2697,7 @@ async def upload_file(
     """
     try:
         user_id = current_user.user_id
-        print(f"📤 [Upload] 用户 {user_id} 上传文件: {file.filename}, 标题: {title}, 语言: {language}")
+        logger.info("📤 [Upload] 用户 %s 上传文件: %s, 标题: %s, 语言: %s", user_id, file.filename, title, language)
         
         # 验证语言参数
         allowed_languages = ['中文', '英文', '德文', '西班牙语', '法语', '日语', '韩语', '葡萄牙语', '意大利语', '俄语']
@@ -2815,7 +2722,7 @@ async def upload_file(
             ensure_article_preprocess_loaded()
             if not extract_text_from_pdf_bytes:
                 return create_error_response("PDF 提取器未初始化（extract_text_from_pdf_bytes 不可用）")
-            print("🔍 [Upload] 使用 PDF 提取器从文件提取正文...")
+            logger.debug("🔍 [Upload] 使用 PDF 提取器从文件提取正文...")
             text_content = extract_text_from_pdf_bytes(content) or ""
             if not text_content.strip():
                 return create_error_response("无法从 PDF 提取正文内容（可能是扫描版/图片PDF）")
@@ -2831,7 +2738,7 @@ async def upload_file(
         
         # 检查内容长度
         if len(text_content) > MAX_ARTICLE_LENGTH:
-            print(f"⚠️ [Upload] 文件内容长度超出限制: {len(text_content)} > {MAX_ARTICLE_LENGTH}")
+            logger.warning("⚠️ [Upload] 文件内容长度超出限制: %s > %s", len(text_content), MAX_ARTICLE_LENGTH)
             return create_error_response(
                 f"文章长度超出限制（{len(text_content)} 字符 > {MAX_ARTICLE_LENGTH} 字符）",
                 data={
@@ -2860,17 +2767,17 @@ async def upload_file(
             )
             session.add(text_model)
             session.commit()
-            print(f"✅ [Upload] 创建文章记录（处理中）: {title} (ID: {article_id})")
+            logger.info("✅ [Upload] 创建文章记录（处理中）: %s (ID: %s)", title, article_id)
         except Exception as e:
             session.rollback()
-            print(f"⚠️ [Upload] 创建文章记录失败: {e}")
+            logger.warning("⚠️ [Upload] 创建文章记录失败: %s", e)
         finally:
             session.close()
         
         # 使用简单文章处理器处理文章
         ensure_article_preprocess_loaded()
         if process_article:
-            print(f"📝 [Upload] 开始处理文章: {title} (用户 {user_id}, 语言: {language}, split_mode={split_mode})")
+            logger.info("📝 [Upload] 开始处理文章: %s (用户 %s, 语言: %s, split_mode=%s)", title, user_id, language, split_mode)
             # 在线程池中执行 CPU/IO 密集处理，避免阻塞事件循环导致其他接口（如 auth/me）超时
             result = await run_in_threadpool(process_article, first_segment, article_id, title, language)
             
@@ -2878,7 +2785,7 @@ async def upload_file(
             await run_in_threadpool(save_structured_data, result, RESULT_DIR)
             
             # 保存到数据库（会更新状态为"completed"）
-            print(f"💾 [Upload] 开始导入文章到数据库...")
+            logger.info("💾 [Upload] 开始导入文章到数据库...")
             import_success = await run_in_threadpool(
                 import_article_to_database,
                 result,
@@ -2888,7 +2795,7 @@ async def upload_file(
                 title
             )
             if not import_success:
-                print(f"⚠️ [Upload] 数据库导入失败，但文件系统保存成功")
+                logger.warning("⚠️ [Upload] 数据库导入失败，但文件系统保存成功")
                 # 如果导入失败，更新状态为"failed"
                 session = db_manager.get_session()
                 try:
@@ -2898,7 +2805,7 @@ async def upload_file(
                         session.commit()
                 except Exception as e:
                     session.rollback()
-                    print(f"⚠️ [Upload] 更新文章状态失败: {e}")
+                    logger.warning("⚠️ [Upload] 更新文章状态失败: %s", e)
                 finally:
                     session.close()
             elif is_segmented_upload:
@@ -2919,7 +2826,7 @@ async def upload_file(
                     start_page_index=2,
                 )
                 if not remaining_ok:
-                    print("⚠️ [Upload] 文件分段续处理失败，部分分页可能不可用")
+                    logger.warning("⚠️ [Upload] 文件分段续处理失败，部分分页可能不可用")
             
             return create_success_response(
                 data={
@@ -2938,7 +2845,7 @@ async def upload_file(
             return create_error_response("预处理系统未初始化")
             
     except Exception as e:
-        print(f"❌ [Upload] 文件上传处理失败: {e}")
+        logger.error("❌ [Upload] 文件上传处理失败: %s", e)
         import traceback
         traceback.print_exc()
         return create_error_response(f"文件上传处理失败: {str(e)}")
@@ -2963,7 +2870,7 @@ async def upload_url(
     """
     try:
         user_id = current_user.user_id
-        print(f"📤 [Upload] 用户 {user_id} 上传URL: {url}, 标题: {title}, 语言: {language}")
+        logger.info("📤 [Upload] 用户 %s 上传URL: %s, 标题: %s, 语言: %s", user_id, url, title, language)
         
         # 验证语言参数
         allowed_languages = ['中文', '英文', '德文', '西班牙语', '法语', '日语', '韩语', '葡萄牙语', '意大利语', '俄语']
@@ -2979,16 +2886,16 @@ async def upload_url(
         # 🔧 使用 HTML 提取器从 URL 获取正文
         ensure_article_preprocess_loaded()
         if extract_main_text_from_url:
-            print(f"🔍 [Upload] 使用 HTML 提取器从 URL 提取正文...")
+            logger.debug("🔍 [Upload] 使用 HTML 提取器从 URL 提取正文...")
             text_content = extract_main_text_from_url(url)
             
             if not text_content or not text_content.strip():
                 return create_error_response("无法从 URL 提取正文内容，请检查 URL 是否有效")
             
-            print(f"✅ [Upload] HTML 提取成功，正文长度: {len(text_content)} 字符")
+            logger.info("✅ [Upload] HTML 提取成功，正文长度: %s 字符", len(text_content))
         else:
             # Fallback：简单抓取（不推荐，但作为备用）
-            print(f"⚠️ [Upload] HTML 提取器未可用，使用简单抓取（不推荐）")
+            logger.warning("⚠️ [Upload] HTML 提取器未可用，使用简单抓取（不推荐）")
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
             }
@@ -3005,7 +2912,7 @@ async def upload_url(
 
         # 检查内容长度
         if len(text_content) > MAX_ARTICLE_LENGTH:
-            print(f"⚠️ [Upload] 内容长度超出限制: {len(text_content)} > {MAX_ARTICLE_LENGTH}")
+            logger.warning("⚠️ [Upload] 内容长度超出限制: %s > %s", len(text_content), MAX_ARTICLE_LENGTH)
             return create_error_response(
                 f"文章长度超出限制（{len(text_content)} 字符 > {MAX_ARTICLE_LENGTH} 字符）",
                 data={
@@ -3034,17 +2941,17 @@ async def upload_url(
             )
             session.add(text_model)
             session.commit()
-            print(f"✅ [Upload] 创建文章记录（处理中）: {title} (ID: {article_id})")
+            logger.info("✅ [Upload] 创建文章记录（处理中）: %s (ID: %s)", title, article_id)
         except Exception as e:
             session.rollback()
-            print(f"⚠️ [Upload] 创建文章记录失败: {e}")
+            logger.warning("⚠️ [Upload] 创建文章记录失败: %s", e)
         finally:
             session.close()
         
         # 使用简单文章处理器处理文章
         ensure_article_preprocess_loaded()
         if process_article:
-            print(f"📝 [Upload] 开始处理URL文章: {title} (用户 {user_id}, 语言: {language}, split_mode={split_mode})")
+            logger.info("📝 [Upload] 开始处理URL文章: %s (用户 %s, 语言: %s, split_mode=%s)", title, user_id, language, split_mode)
             # 在线程池中执行 CPU/IO 密集处理，避免阻塞事件循环导致其他接口（如 auth/me）超时
             result = await run_in_threadpool(process_article, first_segment, article_id, title, language)
             
@@ -3052,7 +2959,7 @@ async def upload_url(
             await run_in_threadpool(save_structured_data, result, RESULT_DIR)
             
             # 保存到数据库或返回游客数据（会更新状态为"completed"）
-            print(f"💾 [Upload] 开始导入文章...")
+            logger.info("💾 [Upload] 开始导入文章...")
             import_result = await run_in_threadpool(
                 import_article_to_database,
                 result,
@@ -3065,7 +2972,7 @@ async def upload_url(
             # 处理导入结果
             if isinstance(import_result, dict) and import_result.get('is_guest'):
                 # 游客模式：返回文章数据，由前端保存到 localStorage
-                print(f"👤 [Upload] 游客模式，返回文章数据供前端保存")
+                logger.info("👤 [Upload] 游客模式，返回文章数据供前端保存")
                 return create_success_response(
                     data={
                         "article_id": article_id,
@@ -3082,7 +2989,7 @@ async def upload_url(
                 )
             elif import_result is True:
                 # 正式用户模式：已成功保存到数据库（状态已在import_article_to_database中更新为"completed"）
-                print(f"✅ [Upload] 文章已成功导入数据库")
+                logger.info("✅ [Upload] 文章已成功导入数据库")
                 if is_segmented_upload:
                     _init_segment_tasks_for_first_page(
                         article_id=article_id,
@@ -3101,7 +3008,7 @@ async def upload_url(
                         start_page_index=2,
                     )
                     if not remaining_ok:
-                        print("⚠️ [Upload] URL 分段续处理失败，部分分页可能不可用")
+                        logger.warning("⚠️ [Upload] URL 分段续处理失败，部分分页可能不可用")
                 return create_success_response(
                     data={
                         "article_id": article_id,
@@ -3118,7 +3025,7 @@ async def upload_url(
                 )
             else:
                 # 导入失败，更新状态为"failed"
-                print(f"⚠️ [Upload] 数据库导入失败，但文件系统保存成功")
+                logger.warning("⚠️ [Upload] 数据库导入失败，但文件系统保存成功")
                 session = db_manager.get_session()
                 try:
                     text_model = session.query(OriginalText).filter(OriginalText.text_id == article_id).first()
@@ -3127,7 +3034,7 @@ async def upload_url(
                         session.commit()
                 except Exception as e:
                     session.rollback()
-                    print(f"⚠️ [Upload] 更新文章状态失败: {e}")
+                    logger.warning("⚠️ [Upload] 更新文章状态失败: %s", e)
                 finally:
                     session.close()
                 return create_success_response(
@@ -3145,7 +3052,7 @@ async def upload_url(
                 )
         else:
             # 预处理系统未初始化，更新状态为"failed"
-            print(f"❌ [Upload] 预处理系统未初始化")
+            logger.error("❌ [Upload] 预处理系统未初始化")
             session = db_manager.get_session()
             try:
                 text_model = session.query(OriginalText).filter(OriginalText.text_id == article_id).first()
@@ -3154,13 +3061,13 @@ async def upload_url(
                     session.commit()
             except Exception as e:
                 session.rollback()
-                print(f"⚠️ [Upload] 更新文章状态失败: {e}")
+                logger.warning("⚠️ [Upload] 更新文章状态失败: %s", e)
             finally:
                 session.close()
             return create_error_response("预处理系统未初始化")
             
     except Exception as e:
-        print(f"❌ [Upload] URL内容抓取失败: {e}")
+        logger.error("❌ [Upload] URL内容抓取失败: %s", e)
         import traceback
         traceback.print_exc()
         # 发生异常时，更新状态为"failed"
@@ -3173,11 +3080,11 @@ async def upload_url(
                     session.commit()
             except Exception as update_error:
                 session.rollback()
-                print(f"⚠️ [Upload] 更新文章状态失败: {update_error}")
+                logger.warning("⚠️ [Upload] 更新文章状态失败: %s", update_error)
             finally:
                 session.close()
         except Exception as session_error:
-            print(f"⚠️ [Upload] 无法获取数据库会话: {session_error}")
+            logger.warning("⚠️ [Upload] 无法获取数据库会话: %s", session_error)
         return create_error_response(f"URL内容抓取失败: {str(e)}")
 
 # 新增：文字输入处理API
@@ -3203,10 +3110,10 @@ async def upload_text(
     """
     try:
         user_id = current_user.user_id
-        print(f"📤 [Upload] 用户 {user_id} 上传文本, 标题: {title}, 语言: {language}")
-        print(f"📏 [Upload] 接收到的文本长度: {len(text)} 字符")
-        print(f"📏 [Upload] 文本前100字符: {text[:100]}")
-        print(f"📏 [Upload] 文本后100字符: {text[-100:]}")
+        logger.info("📤 [Upload] 用户 %s 上传文本, 标题: %s, 语言: %s", user_id, title, language)
+        logger.info("📏 [Upload] 接收到的文本长度: %s 字符", len(text))
+        logger.info("📏 [Upload] 文本前100字符: %s", text[:100])
+        logger.info("📏 [Upload] 文本后100字符: %s", text[-100:])
         
         # 验证语言参数
         allowed_languages = ['中文', '英文', '德文', '西班牙语', '法语', '日语', '韩语', '葡萄牙语', '意大利语', '俄语']
@@ -3229,7 +3136,7 @@ async def upload_text(
         
         # 检查内容长度（如果 skip_length_check 为 True，则跳过检查）
         if not should_skip_check and len(text) > MAX_ARTICLE_LENGTH:
-            print(f"⚠️ [Upload] 文本内容长度超出限制: {len(text)} > {MAX_ARTICLE_LENGTH}")
+            logger.warning("⚠️ [Upload] 文本内容长度超出限制: %s > %s", len(text), MAX_ARTICLE_LENGTH)
             return create_error_response(
                 f"文章长度超出限制（{len(text)} 字符 > {MAX_ARTICLE_LENGTH} 字符）",
                 data={
@@ -3241,7 +3148,7 @@ async def upload_text(
             )
         
         if should_skip_check:
-            print(f"ℹ️ [Upload] 跳过长度检查（截取后的内容），实际长度: {len(text)} 字符")
+            logger.info("ℹ️ [Upload] 跳过长度检查（截取后的内容），实际长度: %s 字符", len(text))
         
         # 生成文章ID
         article_id = int(datetime.now().timestamp())
@@ -3263,17 +3170,17 @@ async def upload_text(
             )
             session.add(text_model)
             session.commit()
-            print(f"✅ [Upload] 创建文章记录（处理中）: {title} (ID: {article_id})")
+            logger.info("✅ [Upload] 创建文章记录（处理中）: %s (ID: %s)", title, article_id)
         except Exception as e:
             session.rollback()
-            print(f"⚠️ [Upload] 创建文章记录失败: {e}")
+            logger.warning("⚠️ [Upload] 创建文章记录失败: %s", e)
         finally:
             session.close()
         
         # 使用简单文章处理器处理文章
         ensure_article_preprocess_loaded()
         if process_article:
-            print(f"📝 [Upload] 开始处理文字内容: {title} (用户 {user_id}, 语言: {language}, split_mode={split_mode})")
+            logger.info("📝 [Upload] 开始处理文字内容: %s (用户 %s, 语言: %s, split_mode=%s)", title, user_id, language, split_mode)
             # 在线程池中执行 CPU/IO 密集处理，避免阻塞事件循环导致其他接口（如 auth/me）超时
             result = await run_in_threadpool(process_article, text, article_id, title, language)
             
@@ -3281,7 +3188,7 @@ async def upload_text(
             await run_in_threadpool(save_structured_data, result, RESULT_DIR)
             
             # 保存到数据库或返回游客数据（会更新状态为"completed"）
-            print(f"💾 [Upload] 开始导入文章...")
+            logger.info("💾 [Upload] 开始导入文章...")
             import_result = await run_in_threadpool(
                 import_article_to_database,
                 result,
@@ -3294,7 +3201,7 @@ async def upload_text(
             # 处理导入结果
             if isinstance(import_result, dict) and import_result.get('is_guest'):
                 # 游客模式：返回文章数据，由前端保存到 localStorage
-                print(f"👤 [Upload] 游客模式，返回文章数据供前端保存")
+                logger.info("👤 [Upload] 游客模式，返回文章数据供前端保存")
                 return create_success_response(
                     data={
                         "article_id": article_id,
@@ -3310,7 +3217,7 @@ async def upload_text(
                 )
             elif import_result is True:
                 # 正式用户模式：已成功保存到数据库
-                print(f"✅ [Upload] 文章已成功导入数据库")
+                logger.info("✅ [Upload] 文章已成功导入数据库")
                 if is_segmented_upload:
                     _init_segment_tasks_for_first_page(
                         article_id=article_id,
@@ -3334,7 +3241,7 @@ async def upload_text(
                 )
             else:
                 # 导入失败，更新状态为"failed"
-                print(f"⚠️ [Upload] 数据库导入失败，但文件系统保存成功")
+                logger.warning("⚠️ [Upload] 数据库导入失败，但文件系统保存成功")
                 session = db_manager.get_session()
                 try:
                     text_model = session.query(OriginalText).filter(OriginalText.text_id == article_id).first()
@@ -3343,7 +3250,7 @@ async def upload_text(
                         session.commit()
                 except Exception as e:
                     session.rollback()
-                    print(f"⚠️ [Upload] 更新文章状态失败: {e}")
+                    logger.warning("⚠️ [Upload] 更新文章状态失败: %s", e)
                 finally:
                     session.close()
                 return create_success_response(
@@ -3362,7 +3269,7 @@ async def upload_text(
             return create_error_response("预处理系统未初始化")
             
     except Exception as e:
-        print(f"❌ [Upload] 文字内容处理失败: {e}")
+        logger.error("❌ [Upload] 文字内容处理失败: %s", e)
         import traceback
         traceback.print_exc()
         return create_error_response(f"文字内容处理失败: {str(e)}")
@@ -3606,7 +3513,7 @@ def _init_segment_tasks_for_first_page(
         session.commit()
     except Exception as e:
         session.rollback()
-        print(f"⚠️ [SegmentTask] 初始化分页任务失败: {e}")
+        logger.warning("⚠️ [SegmentTask] 初始化分页任务失败: %s", e)
     finally:
         session.close()
 
@@ -3647,7 +3554,7 @@ def _mark_segment_task_status(
         session.commit()
     except Exception as e:
         session.rollback()
-        print(f"⚠️ [SegmentTask] 更新分页任务失败: {e}")
+        logger.warning("⚠️ [SegmentTask] 更新分页任务失败: %s", e)
     finally:
         session.close()
 
@@ -3797,7 +3704,7 @@ async def upload_text_append_segment(
             message=f"已追加分段: {title}",
         )
     except Exception as e:
-        print(f"❌ [Upload] 分段续传失败: {e}")
+        logger.error("❌ [Upload] 分段续传失败: %s", e)
         import traceback
         traceback.print_exc()
         if target_page_index:
@@ -3833,11 +3740,11 @@ async def get_asked_tokens(
         # ✅ 强制使用当前认证用户，避免跨用户读取
         effective_user_id = str(current_user.user_id)
         if user_id != effective_user_id:
-            print(f"⚠️ [AskedTokens] Ignoring user_id={user_id}, using current_user.user_id={effective_user_id}")
-        print(f"[AskedTokens] Getting asked tokens for user={effective_user_id}, text_id={text_id}, include_new_system={include_new_system}")
+            logger.warning("⚠️ [AskedTokens] Ignoring user_id=%s, using current_user.user_id=%s", user_id, effective_user_id)
+        logger.info("[AskedTokens] Getting asked tokens for user=%s, text_id=%s, include_new_system=%s", effective_user_id, text_id, include_new_system)
         
-        # 使用 JSON 文件模式（测试阶段）
-        manager = get_asked_tokens_manager(use_database=False)
+        # asked_tokens 表（按 (user_id, text_id) 索引，结果按文章缓存）
+        manager = get_asked_tokens_manager(use_database=True)
         asked_tokens = manager.get_asked_tokens_for_article(effective_user_id, text_id)
         
         result_data = {
@@ -3867,19 +3774,19 @@ async def get_asked_tokens(
                     "source": "merged_systems"
                 })
                 
-                print(f"[AskedTokens] Merged data: {len(asked_tokens)} legacy + {len(new_notations)} new = {len(all_notations)} total")
+                logger.info("[AskedTokens] Merged data: %s legacy + %s new = %s total", len(asked_tokens), len(new_notations), len(all_notations))
                 
             except Exception as e:
-                print(f"[WARN] Failed to get new system data: {e}")
+                logger.warning("[WARN] Failed to get new system data: %s", e)
                 # 继续使用旧系统数据
         
-        print(f"[AskedTokens] Found {result_data['count']} total tokens")
+        logger.info("[AskedTokens] Found %s total tokens", result_data['count'])
         return create_success_response(
             data=result_data,
             message=f"成功获取已提问的 tokens，共 {result_data['count']} 个"
         )
     except Exception as e:
-        print(f"[AskedTokens] Error getting asked tokens: {e}")
+        logger.info("[AskedTokens] Error getting asked tokens: %s", e)
         return create_error_response(f"获取已提问 tokens 失败: {str(e)}")
 
 @app.post("/api/user/asked-tokens")
@@ -3911,14 +3818,14 @@ async def mark_token_asked(payload: dict, current_user: User = Depends(get_curre
             else:
                 type_param = "sentence"
         
-        print(f"[AskedTokens] Marking as asked:")
-        print(f"  - user_id (from current_user): {user_id}")
-        print(f"  - text_id: {text_id}")
-        print(f"  - sentence_id: {sentence_id}")
-        print(f"  - sentence_token_id: {sentence_token_id}")
-        print(f"  - type: {type_param}")
-        print(f"  - vocab_id: {vocab_id}")
-        print(f"  - grammar_id: {grammar_id}")
+        logger.info("[AskedTokens] Marking as asked:")
+        logger.info("  - user_id (from current_user): %s", user_id)
+        logger.info("  - text_id: %s", text_id)
+        logger.info("  - sentence_id: %s", sentence_id)
+        logger.info("  - sentence_token_id: %s", sentence_token_id)
+        logger.info("  - type: %s", type_param)
+        logger.info("  - vocab_id: %s", vocab_id)
+        logger.info("  - grammar_id: %s", grammar_id)
         
         # 验证必需参数
         if not text_id or sentence_id is None:
@@ -3928,8 +3835,8 @@ async def mark_token_asked(payload: dict, current_user: User = Depends(get_curre
         if type_param == "token" and sentence_token_id is None:
             return create_error_response("type='token' 时，sentence_token_id 是必需的")
         
-        # 使用旧系统（向后兼容）
-        manager = get_asked_tokens_manager(use_database=False)
+        # asked_tokens 表（写入后失效该文章的缓存）
+        manager = get_asked_tokens_manager(use_database=True)
         success = manager.mark_token_asked(
             user_id=user_id,
             text_id=text_id,
@@ -3966,13 +3873,13 @@ async def mark_token_asked(payload: dict, current_user: User = Depends(get_curre
                         grammar_id=grammar_id,
                         marked_token_ids=[]
                     )
-                print(f"[AskedTokens] Also created new system notation")
+                logger.info("[AskedTokens] Also created new system notation")
             except Exception as e:
-                print(f"[WARN] Failed to create new system notation: {e}")
+                logger.warning("[WARN] Failed to create new system notation: %s", e)
                 # 不阻止旧系统操作成功
         
         if success:
-            print(f" [AskedTokens] Token marked as asked successfully")
+            logger.info(" [AskedTokens] Token marked as asked successfully")
             return create_success_response(
                 data={
                     "user_id": user_id,
@@ -3985,7 +3892,7 @@ async def mark_token_asked(payload: dict, current_user: User = Depends(get_curre
         else:
             return create_error_response("标记 token 为已提问失败")
     except Exception as e:
-        print(f" [AskedTokens] Error marking token as asked: {e}")
+        logger.info(" [AskedTokens] Error marking token as asked: %s", e)
         return create_error_response(f"标记 token 为已提问失败: {str(e)}")
 
 @app.delete("/api/user/asked-tokens")
@@ -3996,17 +3903,17 @@ async def unmark_token_asked(payload: dict, current_user: User = Depends(get_cur
         user_id = str(current_user.user_id)
         token_key = payload.get("token_key")
         
-        print(f" [AskedTokens] Unmarking token: user={user_id}, key={token_key}")
+        logger.info(" [AskedTokens] Unmarking token: user=%s, key=%s", user_id, token_key)
         
         if not token_key:
             return create_error_response("token_key 是必需的")
         
-        # 使用 JSON 文件模式（测试阶段）
-        manager = get_asked_tokens_manager(use_database=False)
+        # asked_tokens 表（按 (user_id, text_id) 索引，结果按文章缓存）
+        manager = get_asked_tokens_manager(use_database=True)
         success = manager.unmark_token_asked(user_id, token_key)
         
         if success:
-            print(f" [AskedTokens] Token unmarked successfully")
+            logger.info(" [AskedTokens] Token unmarked successfully")
             return create_success_response(
                 data={"token_key": token_key},
                 message="Token 已取消标记"
@@ -4014,7 +3921,7 @@ async def unmark_token_asked(payload: dict, current_user: User = Depends(get_cur
         else:
             return create_error_response("取消标记 token 失败")
     except Exception as e:
-        print(f" [AskedTokens] Error unmarking token: {e}")
+        logger.info(" [AskedTokens] Error unmarking token: %s", e)
         return create_error_response(f"取消标记 token 失败: {str(e)}")
 
 # ==================== End Asked Tokens API ====================
@@ -4023,24 +3930,24 @@ if __name__ == "__main__":
     import uvicorn
     
     # 打印所有注册的路由（调试用）
-    print("\n" + "="*80)
-    print("📋 已注册的API路由：")
-    print("="*80)
+    logger.info("%s", '\n' + '=' * 80)
+    logger.info("📋 已注册的API路由：")
+    logger.info("%s", '=' * 80)
     for route in app.routes:
         if hasattr(route, 'path') and hasattr(route, 'methods'):
             methods = ', '.join(route.methods) if route.methods else 'N/A'
-            print(f"  {methods:8} {route.path}")
-    print("="*80 + "\n")
+            logger.debug("  %s %s", format(methods, '8'), route.path)
+    logger.info("%s", '=' * 80 + '\n')
     
-    print("="*80)
-    print("🚀 启动数据库后端服务器（含 Chat/Session/MainAssistant）")
-    print("="*80)
-    print("📡 端口: 8000")
-    print("📊 功能:")
-    print("  ✅ Session 管理")
-    print("  ✅ Chat 聊天（MainAssistant）")
-    print("  ✅ Vocab/Grammar CRUD")
-    print("  ✅ Notation 管理（主 ORM）")
-    print("  ✅ Articles 上传与查看")
-    print("="*80 + "\n")
+    logger.info("%s", '=' * 80)
+    logger.info("🚀 启动数据库后端服务器（含 Chat/Session/MainAssistant）")
+    logger.info("%s", '=' * 80)
+    logger.info("📡 端口: 8000")
+    logger.info("📊 功能:")
+    logger.info("  ✅ Session 管理")
+    logger.info("  ✅ Chat 聊天（MainAssistant）")
+    logger.info("  ✅ Vocab/Grammar CRUD")
+    logger.info("  ✅ Notation 管理（主 ORM）")
+    logger.info("  ✅ Articles 上传与查看")
+    logger.info("%s", '=' * 80 + '\n')
     uvicorn.run(app, host="0.0.0.0", port=8000)
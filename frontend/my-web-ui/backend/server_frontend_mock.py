@@ -1038,9 +1038,8 @@ async def chat_with_assistant(payload: dict, background_tasks: BackgroundTasks):
             print(f"⚠️ [Chat] 预读取 vocab notations 失败（忽略）: {pre_e}")
 
         try:
-            from backend.assistants import main_assistant as _ma_mod
-            prev_disable_grammar = getattr(_ma_mod, 'DISABLE_GRAMMAR_FEATURES', True)
-            _ma_mod.DISABLE_GRAMMAR_FEATURES = False
+            # 只对本轮的 main_assistant 实例开启语法能力，不修改模块级开关
+            main_assistant.disable_grammar_features = False
             print("🧠 [Chat] 同步执行 handle_grammar_vocab_function 以便前端即时展示...")
             main_assistant.handle_grammar_vocab_function(
                 quoted_sentence=current_sentence,
@@ -1114,11 +1113,6 @@ async def chat_with_assistant(payload: dict, background_tasks: BackgroundTasks):
             })
         except Exception as lite_e:
             print(f"⚠️ [Chat] 同步摘要生成失败，忽略（不影响主回答）: {lite_e}")
-        finally:
-            try:
-                _ma_mod.DISABLE_GRAMMAR_FEATURES = prev_disable_grammar
-            except Exception:
-                pass
 
         # 🔧 关键修复：在启动后台任务前，先保存当前的 created_notations
         # 因为后台任务会调用 reset_processing_results() 清空这些数据
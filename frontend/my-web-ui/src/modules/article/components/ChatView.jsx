@@ -214,7 +214,7 @@ function ChatView({
   
   const scrollContainerRef = useRef(null)
   const messageIdCounterRef = useRef(0)
-  const pollPendingKnowledgeRef = useRef(null)  // 🔧 存储轮询定时器引用，用于清理
+  const seenKnowledgeEventIdsRef = useRef(new Set())  // 🔧 SSE 至少送达一次：按 event_id 去重
   const messagesRef = useRef([])
   const generateMessageId = () => {
     messageIdCounterRef.current += 1
@@ -538,15 +538,100 @@ function ChatView({
     }
     
     loadHistory()
+  }, [articleId, normalizedArticleId])
+  
+  // 🔧 后台知识点推送：把一条 knowledge_points 事件转换为 toast，并刷新 notation 缓存
+  const handleKnowledgeEvent = useCallback(async (event) => {
+    if (!event || seenKnowledgeEventIdsRef.current.has(event.event_id)) return
+    seenKnowledgeEventIdsRef.current.add(event.event_id)
     
-    // 🔧 组件卸载时清理轮询
-    return () => {
-      if (pollPendingKnowledgeRef.current) {
-        clearInterval(pollPendingKnowledgeRef.current)
-        pollPendingKnowledgeRef.current = null
+    const pendingGrammar = event.grammar_to_add || []
+    const pendingVocab = event.vocab_to_add || []
+    console.log(`🍞 [ChatView] 收到知识点事件 #${event.event_id}: grammar=${pendingGrammar.length}, vocab=${pendingVocab.length}`)
+    
+    if (pendingGrammar.length > 0 || pendingVocab.length > 0) {
+      // 🔧 根据类型生成不同的 toast 消息（按知识点名称去重）
+      const items = []
+      const seenItems = new Set()
+      const pushItem = (kind, label, name, type) => {
+        const itemKey = `${kind}:${name}`
+        if (seenItems.has(itemKey)) return
+        seenItems.add(itemKey)
+        if (type === 'existing') {
+          // 已有知识点：加入新例句
+          const message = tUI('已有知识点：{type} {name} 加入新例句')
+            .replace('{type}', label)
+            .replace('{name}', name)
+          items.push({ message, type: 'existing', key: itemKey })
+        } else {
+          items.push({ message: `🆕 ${label}: ${name} ${tUI('知识点已总结并加入列表')}`, type: 'new', key: itemKey })
+        }
+      }
+      pendingGrammar.forEach(g => {
+        // 后端返回的字段名是 'name'，不是 'display_name'
+        pushItem('grammar', tUI('语法'), g.name || g.display_name || g.title || g.rule || tUI('语法'), g.type || 'new')
+      })
+      pendingVocab.forEach(v => {
+        pushItem('vocab', tUI('词汇'), v.vocab || tUI('词汇'), v.type || 'new')
+      })
+      
+      if (items.length > 0) {
+        setToasts(prev => {
+          const baseSlot = prev.length
+          const newToasts = items.map((item, idx) => ({
+            id: Date.now() + Math.random() * 1000 + idx,
+            message: item.message,
+            slot: baseSlot + idx
+          }))
+          const updated = [...prev, ...newToasts]
+          window.chatViewToastsRef = updated
+          return updated
+        })
+      }
+      
+      // 🔧 刷新 notation 缓存，使 article view 自动更新
+      if (refreshGrammarNotations) {
+        try {
+          await refreshGrammarNotations()
+        } catch (err) {
+          console.error('❌ [ChatView] notation 缓存刷新失败:', err)
+        }
       }
     }
-  }, [articleId, normalizedArticleId])
+    
+    // 🔧 确认送达：该事件及之前的事件不再推送（重连时浏览器也会带上 Last-Event-ID）
+    try {
+      const { apiService } = await import('../../../services/api')
+      await apiService.ackKnowledgeEvents({ last_event_id: event.event_id, text_id: event.text_id ?? null })
+    } catch (err) {
+      console.warn('⚠️ [ChatView] 确认知识点事件失败（重连后会重新推送）:', err)
+    }
+  }, [tUI, refreshGrammarNotations])
+  
+  // 🔧 订阅处理器通过 ref 读取最新的回调，避免 tUI / refreshGrammarNotations 变化时重建 SSE 连接
+  const handleKnowledgeEventRef = useRef(handleKnowledgeEvent)
+  useEffect(() => {
+    handleKnowledgeEventRef.current = handleKnowledgeEvent
+  }, [handleKnowledgeEvent])
+  
+  // 🔧 订阅当前文章的知识点事件（SSE，替代轮询 /api/chat/pending-knowledge）
+  useEffect(() => {
+    if (!token || !articleId) return
+    let unsubscribe = null
+    let cancelled = false
+    import('../../../services/api').then(({ apiService }) => {
+      if (cancelled) return
+      unsubscribe = apiService.subscribeKnowledgeEvents(
+        { text_id: articleId },
+        (event) => handleKnowledgeEventRef.current(event),
+        (err) => console.warn('⚠️ [ChatView] 知识点事件连接中断，EventSource 将自动重连:', err)
+      )
+    })
+    return () => {
+      cancelled = true
+      if (unsubscribe) unsubscribe()
+    }
+  }, [token, articleId])
   
   // 🔧 添加消息（立即显示）
   const addMessage = useCallback((newMessage) => {
@@ -904,241 +989,7 @@ function ChatView({
           }
         }
         
-        // 🔧 轮询新知识点（与 handleSendMessage 相同的逻辑）
-        console.log(`🔍 [ChatView] sendPendingMessage - 检查轮询条件: response存在=${!!response}, grammar_to_add长度=${response?.grammar_to_add?.length || 0}, vocab_to_add长度=${response?.vocab_to_add?.length || 0}`)
-        
-        if (response && !response.grammar_to_add?.length && !response.vocab_to_add?.length) {
-          const textId = currentSelectionContext?.sentence?.text_id || articleId
-          const userId = parseInt(localStorage.getItem('user_id') || '2')
-          
-          console.log(`🔍 [ChatView] sendPendingMessage - ✅ 满足轮询条件，准备启动轮询`)
-          console.log(`🔍 [ChatView] sendPendingMessage - 启动轮询: textId=${textId}, userId=${userId}`)
-          console.log(`🔍 [ChatView] sendPendingMessage - currentSelectionContext:`, currentSelectionContext)
-          console.log(`🔍 [ChatView] sendPendingMessage - articleId:`, articleId)
-          
-          if (textId) {
-            console.log(`🔍 [ChatView] sendPendingMessage - ✅ textId有效，开始设置轮询`)
-            // 🔧 先清理之前的轮询（如果存在）
-            if (pollPendingKnowledgeRef.current) {
-              clearInterval(pollPendingKnowledgeRef.current)
-              pollPendingKnowledgeRef.current = null
-            }
-            
-            let pollCount = 0
-            const maxPolls = 15  // 🔧 增加最大轮询次数，适应线上服务器延迟
-            const pollInterval = 1500  // 🔧 缩短到1.5秒一次，加快响应速度（线上服务器需要更频繁的轮询）
-            
-            // 🔧 立即执行第一次轮询（不等待 pollInterval），减少延迟
-            const pollOnce = async () => {
-              pollCount++
-              try {
-                const { apiService } = await import('../../../services/api')
-                console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] 开始轮询 pending-knowledge: user_id=${userId}, text_id=${textId}`)
-                const resp = await apiService.getPendingKnowledge({ user_id: userId, text_id: textId })
-                console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] 原始响应:`, JSON.stringify(resp, null, 2))
-                console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] 原始响应类型:`, typeof resp)
-                console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] resp.success:`, resp?.success)
-                console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] resp.data:`, resp?.data)
-                
-                // 🔧 修复：API 响应拦截器已经返回 response.data，所以 resp 是 { success: true, data: {...} }
-                // 需要访问 resp.data，而不是 resp.data.data
-                const data = resp?.data || {}
-                console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] 提取的data:`, JSON.stringify(data, null, 2))
-                console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] data.grammar_to_add:`, data.grammar_to_add)
-                console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] data.vocab_to_add:`, data.vocab_to_add)
-                
-                // 🔧 修复：后端返回的字段名是 grammar_to_add 和 vocab_to_add
-                const pendingGrammar = data.grammar_to_add || []
-                const pendingVocab = data.vocab_to_add || []
-                
-                console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] ========== Toast 诊断日志 ==========`)
-                console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] 原始响应:`, resp)
-                console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] 提取的data:`, data)
-                console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] 解析后的数据: grammar=${pendingGrammar.length} (${JSON.stringify(pendingGrammar)}), vocab=${pendingVocab.length} (${JSON.stringify(pendingVocab)})`)
-                console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] pendingGrammar 类型: ${Array.isArray(pendingGrammar)}, 长度: ${pendingGrammar.length}`)
-                console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] pendingVocab 类型: ${Array.isArray(pendingVocab)}, 长度: ${pendingVocab.length}`)
-                
-                console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] 检查条件: pendingGrammar.length=${pendingGrammar.length}, pendingVocab.length=${pendingVocab.length}`)
-                if (pendingGrammar.length > 0 || pendingVocab.length > 0) {
-                  console.log(`🍞 [ChatView] sendPendingMessage - [轮询${pollCount}] ✅ 检测到知识点: grammar=${pendingGrammar.length}, vocab=${pendingVocab.length}`)
-                  
-                  // 🔧 根据类型生成不同的 toast 消息
-                  const items = []
-                  const seenItems = new Set()  // 🔧 用于去重
-                  console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] 开始生成 toast items...`)
-                  
-                  // 处理语法知识点
-                  pendingGrammar.forEach(g => {
-                    // 🔧 修复：后端返回的字段名是 'name'，不是 'display_name'
-                    const name = g.name || g.display_name || g.title || g.rule || tUI('语法')
-                    const type = g.type || 'new'  // 默认为新知识点
-                    
-                    // 🔧 去重：使用 name 作为唯一标识
-                    const itemKey = `grammar:${name}`
-                    if (seenItems.has(itemKey)) {
-                      console.log(`⚠️ [ChatView] sendPendingMessage - [轮询${pollCount}] 跳过重复的语法知识点: ${name}`)
-                      return
-                    }
-                    seenItems.add(itemKey)
-                    
-                    if (type === 'existing') {
-                      // 已有知识点：使用新文案
-                      const message = tUI('已有知识点：{type} {name} 加入新例句')
-                        .replace('{type}', tUI('语法'))
-                        .replace('{name}', name)
-                      items.push({ message, type: 'existing', key: itemKey })
-                    } else {
-                      // 新知识点：保持现状
-                      items.push({ 
-                        message: `🆕 ${tUI('语法')}: ${name} ${tUI('知识点已总结并加入列表')}`, 
-                        type: 'new',
-                        key: itemKey
-                      })
-                    }
-                  })
-                  
-                  // 处理词汇知识点
-                  pendingVocab.forEach(v => {
-                    const vocab = v.vocab || tUI('词汇')
-                    const type = v.type || 'new'  // 默认为新知识点
-                    
-                    // 🔧 去重：使用 vocab 作为唯一标识
-                    const itemKey = `vocab:${vocab}`
-                    if (seenItems.has(itemKey)) {
-                      console.log(`⚠️ [ChatView] sendPendingMessage - [轮询${pollCount}] 跳过重复的词汇知识点: ${vocab}`)
-                      return
-                    }
-                    seenItems.add(itemKey)
-                    
-                    if (type === 'existing') {
-                      // 已有知识点：使用新文案
-                      const message = tUI('已有知识点：{type} {name} 加入新例句')
-                        .replace('{type}', tUI('词汇'))
-                        .replace('{name}', vocab)
-                      items.push({ message, type: 'existing', key: itemKey })
-                    } else {
-                      // 新知识点：保持现状
-                      items.push({ 
-                        message: `🆕 ${tUI('词汇')}: ${vocab} ${tUI('知识点已总结并加入列表')}`, 
-                        type: 'new',
-                        key: itemKey
-                      })
-                    }
-                  })
-                  
-                  console.log(`🍞 [ChatView] sendPendingMessage - [轮询${pollCount}] 准备创建 ${items.length} 个toast`)
-                  console.log(`🍞 [ChatView] sendPendingMessage - [轮询${pollCount}] items:`, items)
-                  console.log(`🍞 [ChatView] sendPendingMessage - [轮询${pollCount}] 当前toasts数量:`, toasts.length)
-                  console.log(`🍞 [ChatView] sendPendingMessage - [轮询${pollCount}] 当前toasts状态:`, toasts)
-                  
-                  if (items.length === 0) {
-                    console.warn(`⚠️ [ChatView] sendPendingMessage - [轮询${pollCount}] items 为空，无法创建 toast`)
-                  } else {
-                    console.log(`🍞 [ChatView] sendPendingMessage - [轮询${pollCount}] 开始创建 ${items.length} 个toast...`)
-                    // 🔧 修复：一次性创建所有 toast，确保所有知识点都能显示
-                    // 所有 toast 立即显示，通过 slot 控制位置（垂直堆叠）
-                    setToasts(prev => {
-                      const baseSlot = prev.length
-                      console.log(`🍞 [ChatView] sendPendingMessage - [轮询${pollCount}] 当前toasts数量: ${prev.length}, 基础slot: ${baseSlot}`)
-                      
-                      // 一次性创建所有 toast
-                      const newToasts = items.map((item, idx) => {
-                        const id = Date.now() + Math.random() * 1000 + idx
-                        const newToast = { 
-                          id, 
-                          message: item.message, 
-                          slot: baseSlot + idx
-                        }
-                        console.log(`🍞 [ChatView] sendPendingMessage - [轮询${pollCount}] 创建toast ${idx + 1}/${items.length}:`, newToast)
-                        console.log(`🍞 [ChatView] sendPendingMessage - [轮询${pollCount}] toast message: "${newToast.message}"`)
-                        return newToast
-                      })
-                      
-                      const updated = [...prev, ...newToasts]
-                      console.log(`🍞 [ChatView] sendPendingMessage - [轮询${pollCount}] setToasts更新: 从${prev.length}个增加到${updated.length}个`)
-                      console.log(`🍞 [ChatView] sendPendingMessage - [轮询${pollCount}] 更新后的toasts:`, updated)
-                      window.chatViewToastsRef = updated
-                      return updated
-                    })
-                    
-                    console.log(`🍞 [ChatView] sendPendingMessage - [轮询${pollCount}] 已创建 ${items.length} 个toast（全部立即显示）`)
-                  }
-                  
-                  // 🔧 刷新 notation 缓存，使 article view 自动更新（使用 await 确保完成）
-                  if (refreshGrammarNotations) {
-                    console.log('🔄 [ChatView] sendPendingMessage - 检测到新知识点，刷新 notation 缓存...')
-                    console.log('🔄 [ChatView] sendPendingMessage - refreshGrammarNotations 类型:', typeof refreshGrammarNotations)
-                    try {
-                      // 🔧 如果是异步函数，等待完成；否则立即执行
-                      const refreshResult = refreshGrammarNotations()
-                      if (refreshResult && typeof refreshResult.then === 'function') {
-                        await refreshResult
-                        console.log('✅ [ChatView] sendPendingMessage - notation 缓存刷新完成（异步）')
-                      } else {
-                        console.log('✅ [ChatView] sendPendingMessage - notation 缓存刷新完成（同步）')
-                      }
-                    } catch (err) {
-                      console.error('❌ [ChatView] sendPendingMessage - notation 缓存刷新失败:', err)
-                    }
-                  } else {
-                    console.warn('⚠️ [ChatView] sendPendingMessage - refreshGrammarNotations 未定义，无法刷新缓存')
-                  }
-                  
-                  // 🔧 找到数据后立即停止轮询
-                  if (pollPendingKnowledgeRef.current) {
-                    clearInterval(pollPendingKnowledgeRef.current)
-                    pollPendingKnowledgeRef.current = null
-                    console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] ✅ 已停止轮询`)
-                  }
-                  return
-                } else {
-                  console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] ⏸️ 暂无知识点，继续轮询...`)
-                }
-              } catch (err) {
-                console.error(`⚠️ [ChatView] sendPendingMessage - [轮询${pollCount}] 轮询失败:`, err)
-                console.error(`⚠️ [ChatView] sendPendingMessage - [轮询${pollCount}] 错误详情:`, err.message, err.stack)
-                // 🔧 出错时也停止轮询，避免无限重试
-                if (pollPendingKnowledgeRef.current) {
-                  clearInterval(pollPendingKnowledgeRef.current)
-                  pollPendingKnowledgeRef.current = null
-                  console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] ❌ 因错误停止轮询`)
-                }
-              }
-              
-              // 🔧 达到最大轮询次数后停止
-              if (pollCount >= maxPolls) {
-                console.log(`🔍 [ChatView] sendPendingMessage - [轮询${pollCount}] ⏸️ 达到最大轮询次数(${maxPolls})，停止轮询`)
-                if (pollPendingKnowledgeRef.current) {
-                  clearInterval(pollPendingKnowledgeRef.current)
-                  pollPendingKnowledgeRef.current = null
-                }
-              }
-            }
-            
-            // 🔧 延迟启动轮询，给后台任务一些时间执行（线上服务器可能需要更长时间）
-            setTimeout(() => {
-              // 立即执行第一次轮询
-              pollOnce()
-              
-              // 然后设置定时轮询
-              pollPendingKnowledgeRef.current = setInterval(pollOnce, pollInterval)
-              console.log(`🔍 [ChatView] sendPendingMessage - ✅ 轮询已设置，interval ID:`, pollPendingKnowledgeRef.current)
-            }, 500)  // 🔧 延迟 500ms 启动，确保后台任务有时间开始执行
-            
-            // 🔧 设置超时清理（双重保险）
-            setTimeout(() => {
-              if (pollPendingKnowledgeRef.current) {
-                clearInterval(pollPendingKnowledgeRef.current)
-                pollPendingKnowledgeRef.current = null
-                console.log(`🔍 [ChatView] sendPendingMessage - ⏸️ 超时清理轮询`)
-              }
-            }, 500 + maxPolls * pollInterval)  // 🔧 加上延迟启动的时间
-          } else {
-            console.log(`🔍 [ChatView] sendPendingMessage - ❌ textId无效(${textId})，无法启动轮询`)
-          }
-        } else {
-          console.log(`🔍 [ChatView] sendPendingMessage - ⏸️ 不满足轮询条件（响应中有即时返回的新知识点或response为空），跳过轮询`)
-        }
+        // 新知识点由后台任务完成后通过 SSE 推送（见 knowledge-events 订阅 effect），不再轮询
       } catch (error) {
         console.error('❌ [ChatView] 发送 pendingMessage 失败:', error)
         // ⚠️ Language detection in error handler: Presentation-only, does NOT affect error handling logic
@@ -1651,224 +1502,7 @@ function ChatView({
         })
       }
       
-      // 🔧 轮询新知识点（优化：降低频率，确保清理）
-      // 🔧 只在响应中没有即时返回的新知识点时才启动轮询
-      console.log(`🔍 [ChatView] 检查轮询条件: response存在=${!!response}, grammar_to_add长度=${response?.grammar_to_add?.length || 0}, vocab_to_add长度=${response?.vocab_to_add?.length || 0}`)
-      
-      if (response && !response.grammar_to_add?.length && !response.vocab_to_add?.length) {
-        const textId = currentSelectionContext?.sentence?.text_id || articleId
-        const userId = parseInt(localStorage.getItem('user_id') || '2')
-        
-        console.log(`🔍 [ChatView] ✅ 满足轮询条件，准备启动轮询`)
-        console.log(`🔍 [ChatView] 启动轮询: textId=${textId}, userId=${userId}`)
-        console.log(`🔍 [ChatView] currentSelectionContext:`, currentSelectionContext)
-        console.log(`🔍 [ChatView] articleId:`, articleId)
-        
-        if (textId) {
-          console.log(`🔍 [ChatView] ✅ textId有效，开始设置轮询`)
-          // 🔧 先清理之前的轮询（如果存在）
-          if (pollPendingKnowledgeRef.current) {
-            clearInterval(pollPendingKnowledgeRef.current)
-            pollPendingKnowledgeRef.current = null
-          }
-          
-          let pollCount = 0
-          const maxPolls = 15  // 🔧 增加最大轮询次数，适应线上服务器延迟
-          const pollInterval = 1500  // 🔧 缩短到1.5秒一次，加快响应速度（线上服务器需要更频繁的轮询）
-          
-          // 🔧 立即执行第一次轮询（不等待 pollInterval），减少延迟
-          const pollOnce = async () => {
-            pollCount++
-            try {
-              const { apiService } = await import('../../../services/api')
-              console.log(`🔍 [ChatView] [轮询${pollCount}] 开始轮询 pending-knowledge: user_id=${userId}, text_id=${textId}`)
-              const resp = await apiService.getPendingKnowledge({ user_id: userId, text_id: textId })
-              console.log(`🔍 [ChatView] [轮询${pollCount}] 原始响应:`, JSON.stringify(resp, null, 2))
-              
-              // 🔧 修复：API 响应拦截器已经返回 response.data，所以 resp 是 { success: true, data: {...} }
-              // 需要访问 resp.data，而不是 resp.data.data
-              const data = resp?.data || {}
-              console.log(`🔍 [ChatView] [轮询${pollCount}] 提取的data:`, JSON.stringify(data, null, 2))
-              
-              // 🔧 修复：后端返回的字段名是 grammar_to_add 和 vocab_to_add
-              const pendingGrammar = data.grammar_to_add || []
-              const pendingVocab = data.vocab_to_add || []
-              
-              console.log(`🔍 [ChatView] [轮询${pollCount}] 解析后的数据: grammar=${pendingGrammar.length} (${JSON.stringify(pendingGrammar)}), vocab=${pendingVocab.length} (${JSON.stringify(pendingVocab)})`)
-              
-              if (pendingGrammar.length > 0 || pendingVocab.length > 0) {
-                console.log(`🍞 [ChatView] [轮询${pollCount}] ✅ 检测到知识点: grammar=${pendingGrammar.length}, vocab=${pendingVocab.length}`)
-                
-                // 🔧 根据类型生成不同的 toast 消息
-                const items = []
-                const seenItems = new Set()  // 🔧 用于去重（基于知识点名称）
-                
-                // 处理语法知识点
-                pendingGrammar.forEach(g => {
-                  // 🔧 修复：后端返回的字段名是 'name'，不是 'display_name'
-                  const name = g.name || g.display_name || g.title || g.rule || tUI('语法')
-                  const type = g.type || 'new'  // 默认为新知识点
-                  
-                  // 🔧 去重：使用 name 作为唯一标识
-                  const itemKey = `grammar:${name}`
-                  if (seenItems.has(itemKey)) {
-                    console.log(`⚠️ [ChatView] [轮询${pollCount}] 跳过重复的语法知识点: ${name}`)
-                    return
-                  }
-                  seenItems.add(itemKey)
-                  
-                  if (type === 'existing') {
-                    // 已有知识点：使用新文案
-                    const message = tUI('已有知识点：{type} {name} 加入新例句')
-                      .replace('{type}', tUI('语法'))
-                      .replace('{name}', name)
-                    items.push({ message, type: 'existing', key: itemKey })
-                  } else {
-                    // 新知识点：保持现状
-                    items.push({ 
-                      message: `🆕 ${tUI('语法')}: ${name} ${tUI('知识点已总结并加入列表')}`, 
-                      type: 'new',
-                      key: itemKey
-                    })
-                  }
-                })
-                
-                // 处理词汇知识点
-                pendingVocab.forEach(v => {
-                  const vocab = v.vocab || tUI('词汇')
-                  const type = v.type || 'new'  // 默认为新知识点
-                  
-                  // 🔧 去重：使用 vocab 作为唯一标识
-                  const itemKey = `vocab:${vocab}`
-                  if (seenItems.has(itemKey)) {
-                    console.log(`⚠️ [ChatView] [轮询${pollCount}] 跳过重复的词汇知识点: ${vocab}`)
-                    return
-                  }
-                  seenItems.add(itemKey)
-                  
-                  if (type === 'existing') {
-                    // 已有知识点：使用新文案
-                    const message = tUI('已有知识点：{type} {name} 加入新例句')
-                      .replace('{type}', tUI('词汇'))
-                      .replace('{name}', vocab)
-                    items.push({ message, type: 'existing', key: itemKey })
-                  } else {
-                    // 新知识点：保持现状
-                    items.push({ 
-                      message: `🆕 ${tUI('词汇')}: ${vocab} ${tUI('知识点已总结并加入列表')}`, 
-                      type: 'new',
-                      key: itemKey
-                    })
-                  }
-                })
-                
-                // 🔧 二次去重：使用 Set 去除重复的 items（基于 message，作为额外保障）
-                const uniqueItems = []
-                const seenMessages = new Set()
-                items.forEach(item => {
-                  if (!seenMessages.has(item.message)) {
-                    seenMessages.add(item.message)
-                    uniqueItems.push(item)
-                  } else {
-                    console.log(`⚠️ [ChatView] [轮询${pollCount}] 跳过重复的 toast 消息: ${item.message}`)
-                  }
-                })
-                
-                console.log(`🍞 [ChatView] [轮询${pollCount}] 准备创建 ${uniqueItems.length} 个toast (去重前: ${items.length})`)
-                console.log(`🍞 [ChatView] [轮询${pollCount}] items:`, uniqueItems)
-                console.log(`🍞 [ChatView] [轮询${pollCount}] 当前toasts数量:`, toasts.length)
-                
-                // 🔧 修复：一次性创建所有 toast，确保所有知识点都能显示
-                setToasts(prev => {
-                  const baseSlot = prev.length
-                  const newToasts = uniqueItems.map((item, idx) => {
-                    const id = Date.now() + Math.random() * 1000 + idx
-                    const newToast = { 
-                      id, 
-                      message: item.message, 
-                      slot: baseSlot + idx
-                    }
-                    console.log(`🍞 [ChatView] [轮询${pollCount}] 创建toast ${idx + 1}/${uniqueItems.length}:`, newToast)
-                    return newToast
-                  })
-                  const updated = [...prev, ...newToasts]
-                  console.log(`🍞 [ChatView] [轮询${pollCount}] setToasts更新: 从${prev.length}个增加到${updated.length}个`)
-                  window.chatViewToastsRef = updated
-                  return updated
-                })
-                
-                // 🔧 刷新 notation 缓存，使 article view 自动更新（使用 await 确保完成）
-                if (refreshGrammarNotations) {
-                  console.log('🔄 [ChatView] 检测到新知识点，刷新 notation 缓存...')
-                  try {
-                    // 🔧 如果是异步函数，等待完成；否则立即执行
-                    const refreshResult = refreshGrammarNotations()
-                    if (refreshResult && typeof refreshResult.then === 'function') {
-                      await refreshResult
-                      console.log('✅ [ChatView] notation 缓存刷新完成（异步）')
-                    } else {
-                      console.log('✅ [ChatView] notation 缓存刷新完成（同步）')
-                    }
-                  } catch (err) {
-                    console.error('❌ [ChatView] notation 缓存刷新失败:', err)
-                  }
-                }
-                
-                // 🔧 找到数据后立即停止轮询
-                if (pollPendingKnowledgeRef.current) {
-                  clearInterval(pollPendingKnowledgeRef.current)
-                  pollPendingKnowledgeRef.current = null
-                  console.log(`🔍 [ChatView] [轮询${pollCount}] ✅ 已停止轮询`)
-                }
-                return
-              } else {
-                console.log(`🔍 [ChatView] [轮询${pollCount}] ⏸️ 暂无新知识点，继续轮询...`)
-              }
-            } catch (err) {
-              console.error(`⚠️ [ChatView] [轮询${pollCount}] 轮询失败:`, err)
-              console.error(`⚠️ [ChatView] [轮询${pollCount}] 错误详情:`, err.message, err.stack)
-              // 🔧 出错时也停止轮询，避免无限重试
-              if (pollPendingKnowledgeRef.current) {
-                clearInterval(pollPendingKnowledgeRef.current)
-                pollPendingKnowledgeRef.current = null
-                console.log(`🔍 [ChatView] [轮询${pollCount}] ❌ 因错误停止轮询`)
-              }
-            }
-            
-            // 🔧 达到最大轮询次数后停止
-            if (pollCount >= maxPolls) {
-              console.log(`🔍 [ChatView] [轮询${pollCount}] ⏸️ 达到最大轮询次数(${maxPolls})，停止轮询`)
-              if (pollPendingKnowledgeRef.current) {
-                clearInterval(pollPendingKnowledgeRef.current)
-                pollPendingKnowledgeRef.current = null
-              }
-            }
-          }
-          
-          // 🔧 延迟启动轮询，给后台任务一些时间执行（线上服务器可能需要更长时间）
-          setTimeout(() => {
-            // 立即执行第一次轮询
-            pollOnce()
-            
-            // 然后设置定时轮询
-            pollPendingKnowledgeRef.current = setInterval(pollOnce, pollInterval)
-            console.log(`🔍 [ChatView] ✅ 轮询已设置，interval ID:`, pollPendingKnowledgeRef.current)
-          }, 500)  // 🔧 延迟 500ms 启动，确保后台任务有时间开始执行
-          
-          // 🔧 设置超时清理（双重保险）
-          setTimeout(() => {
-            if (pollPendingKnowledgeRef.current) {
-              clearInterval(pollPendingKnowledgeRef.current)
-              pollPendingKnowledgeRef.current = null
-              console.log(`🔍 [ChatView] ⏸️ 超时清理轮询`)
-            }
-          }, 500 + maxPolls * pollInterval)  // 🔧 加上延迟启动的时间
-        } else {
-          console.log(`🔍 [ChatView] ❌ textId无效(${textId})，无法启动轮询`)
-        }
-      } else {
-        console.log(`🔍 [ChatView] ⏸️ 不满足轮询条件（响应中有即时返回的新知识点或response为空），跳过轮询`)
-      }
+      // 新知识点由后台任务完成后通过 SSE 推送（见 knowledge-events 订阅 effect），不再轮询
     } catch (error) {
       console.error('❌ [ChatView] 发送消息失败:', error)
       // ⚠️ Language detection in error handler: Presentation-only, does NOT affect error handling logic
@@ -2068,200 +1702,7 @@ function ChatView({
         }
       }
       
-      // 🔧 轮询新知识点（与 handleSendMessage 相同的逻辑）
-      console.log(`🔍 [ChatView] handleSuggestedQuestionSelect - 检查轮询条件: response存在=${!!response}, grammar_to_add长度=${response?.grammar_to_add?.length || 0}, vocab_to_add长度=${response?.vocab_to_add?.length || 0}`)
-      
-      if (response && !response.grammar_to_add?.length && !response.vocab_to_add?.length) {
-        const textId = currentSelectionContext?.sentence?.text_id || articleId
-        const userId = parseInt(localStorage.getItem('user_id') || '2')
-        
-        console.log(`🔍 [ChatView] handleSuggestedQuestionSelect - ✅ 满足轮询条件，准备启动轮询`)
-        console.log(`🔍 [ChatView] handleSuggestedQuestionSelect - 启动轮询: textId=${textId}, userId=${userId}`)
-        console.log(`🔍 [ChatView] handleSuggestedQuestionSelect - currentSelectionContext:`, currentSelectionContext)
-        console.log(`🔍 [ChatView] handleSuggestedQuestionSelect - articleId:`, articleId)
-        
-        if (textId) {
-          console.log(`🔍 [ChatView] handleSuggestedQuestionSelect - ✅ textId有效，开始设置轮询`)
-          // 🔧 先清理之前的轮询（如果存在）
-          if (pollPendingKnowledgeRef.current) {
-            clearInterval(pollPendingKnowledgeRef.current)
-            pollPendingKnowledgeRef.current = null
-          }
-          
-          let pollCount = 0
-          const maxPolls = 15  // 🔧 增加最大轮询次数，适应线上服务器延迟
-          const pollInterval = 1500  // 🔧 缩短到1.5秒一次，加快响应速度（线上服务器需要更频繁的轮询）
-          
-          // 🔧 立即执行第一次轮询（不等待 pollInterval），减少延迟
-          const pollOnce = async () => {
-            pollCount++
-            try {
-              const { apiService } = await import('../../../services/api')
-              console.log(`🔍 [ChatView] handleSuggestedQuestionSelect - [轮询${pollCount}] 开始轮询 pending-knowledge: user_id=${userId}, text_id=${textId}`)
-              const resp = await apiService.getPendingKnowledge({ user_id: userId, text_id: textId })
-              console.log(`🔍 [ChatView] handleSuggestedQuestionSelect - [轮询${pollCount}] 原始响应:`, JSON.stringify(resp, null, 2))
-              
-              // 🔧 修复：API 响应拦截器已经返回 response.data，所以 resp 是 { success: true, data: {...} }
-              // 需要访问 resp.data，而不是 resp.data.data
-              const data = resp?.data || {}
-              console.log(`🔍 [ChatView] handleSuggestedQuestionSelect - [轮询${pollCount}] 提取的data:`, JSON.stringify(data, null, 2))
-              
-              // 🔧 修复：后端返回的字段名是 grammar_to_add 和 vocab_to_add
-              const pendingGrammar = data.grammar_to_add || []
-              const pendingVocab = data.vocab_to_add || []
-              
-              console.log(`🔍 [ChatView] handleSuggestedQuestionSelect - [轮询${pollCount}] 解析后的数据: grammar=${pendingGrammar.length} (${JSON.stringify(pendingGrammar)}), vocab=${pendingVocab.length} (${JSON.stringify(pendingVocab)})`)
-              
-              if (pendingGrammar.length > 0 || pendingVocab.length > 0) {
-                console.log(`🍞 [ChatView] handleSuggestedQuestionSelect - [轮询${pollCount}] ✅ 检测到知识点: grammar=${pendingGrammar.length}, vocab=${pendingVocab.length}`)
-                
-                // 🔧 根据类型生成不同的 toast 消息
-                const items = []
-                const seenItems = new Set()  // 🔧 用于去重
-                
-                // 处理语法知识点
-                pendingGrammar.forEach(g => {
-                  // 🔧 修复：后端返回的字段名是 'name'，不是 'display_name'
-                  const name = g.name || g.display_name || g.title || g.rule || tUI('语法')
-                  const type = g.type || 'new'  // 默认为新知识点
-                  
-                  // 🔧 去重：使用 name 作为唯一标识
-                  const itemKey = `grammar:${name}`
-                  if (seenItems.has(itemKey)) {
-                    console.log(`⚠️ [ChatView] handleSuggestedQuestionSelect - [轮询${pollCount}] 跳过重复的语法知识点: ${name}`)
-                    return
-                  }
-                  seenItems.add(itemKey)
-                  
-                  if (type === 'existing') {
-                    // 已有知识点：使用新文案
-                    const message = tUI('已有知识点：{type} {name} 加入新例句')
-                      .replace('{type}', tUI('语法'))
-                      .replace('{name}', name)
-                    items.push({ message, type: 'existing', key: itemKey })
-                  } else {
-                    // 新知识点：保持现状
-                    items.push({ 
-                      message: `🆕 ${tUI('语法')}: ${name} ${tUI('知识点已总结并加入列表')}`, 
-                      type: 'new',
-                      key: itemKey
-                    })
-                  }
-                })
-                
-                // 处理词汇知识点
-                pendingVocab.forEach(v => {
-                  const vocab = v.vocab || tUI('词汇')
-                  const type = v.type || 'new'  // 默认为新知识点
-                  
-                  // 🔧 去重：使用 vocab 作为唯一标识
-                  const itemKey = `vocab:${vocab}`
-                  if (seenItems.has(itemKey)) {
-                    console.log(`⚠️ [ChatView] handleSuggestedQuestionSelect - [轮询${pollCount}] 跳过重复的词汇知识点: ${vocab}`)
-                    return
-                  }
-                  seenItems.add(itemKey)
-                  
-                  if (type === 'existing') {
-                    // 已有知识点：使用新文案
-                    const message = tUI('已有知识点：{type} {name} 加入新例句')
-                      .replace('{type}', tUI('词汇'))
-                      .replace('{name}', vocab)
-                    items.push({ message, type: 'existing', key: itemKey })
-                  } else {
-                    // 新知识点：保持现状
-                    items.push({ 
-                      message: `🆕 ${tUI('词汇')}: ${vocab} ${tUI('知识点已总结并加入列表')}`, 
-                      type: 'new',
-                      key: itemKey
-                    })
-                  }
-                })
-                
-                console.log(`🍞 [ChatView] handleSuggestedQuestionSelect - [轮询${pollCount}] 准备创建 ${items.length} 个toast`)
-                console.log(`🍞 [ChatView] handleSuggestedQuestionSelect - [轮询${pollCount}] items:`, items)
-                console.log(`🍞 [ChatView] handleSuggestedQuestionSelect - [轮询${pollCount}] 当前toasts数量:`, toasts.length)
-                
-                // 🔧 修复：一次性创建所有 toast，确保所有知识点都能显示
-                setToasts(prev => {
-                  const baseSlot = prev.length
-                  const newToasts = items.map((item, idx) => {
-                    const id = Date.now() + Math.random() * 1000 + idx
-                    const newToast = { 
-                      id, 
-                      message: item.message, 
-                      slot: baseSlot + idx
-                    }
-                    console.log(`🍞 [ChatView] handleSuggestedQuestionSelect - [轮询${pollCount}] 创建toast ${idx + 1}/${items.length}:`, newToast)
-                    return newToast
-                  })
-                  const updated = [...prev, ...newToasts]
-                  console.log(`🍞 [ChatView] handleSuggestedQuestionSelect - [轮询${pollCount}] setToasts更新: 从${prev.length}个增加到${updated.length}个`)
-                  window.chatViewToastsRef = updated
-                  return updated
-                })
-                
-                // 🔧 刷新 notation 缓存，使 article view 自动更新
-                if (refreshGrammarNotations) {
-                  console.log('🔄 [ChatView] handleSuggestedQuestionSelect - 检测到新知识点，刷新 notation 缓存...')
-                  refreshGrammarNotations()
-                }
-                
-                // 🔧 找到数据后立即停止轮询
-                if (pollPendingKnowledgeRef.current) {
-                  clearInterval(pollPendingKnowledgeRef.current)
-                  pollPendingKnowledgeRef.current = null
-                  console.log(`🔍 [ChatView] handleSuggestedQuestionSelect - [轮询${pollCount}] ✅ 已停止轮询`)
-                }
-                return
-              } else {
-                console.log(`🔍 [ChatView] handleSuggestedQuestionSelect - [轮询${pollCount}] ⏸️ 暂无新知识点，继续轮询...`)
-              }
-            } catch (err) {
-              console.error(`⚠️ [ChatView] handleSuggestedQuestionSelect - [轮询${pollCount}] 轮询失败:`, err)
-              console.error(`⚠️ [ChatView] handleSuggestedQuestionSelect - [轮询${pollCount}] 错误详情:`, err.message, err.stack)
-              // 🔧 出错时也停止轮询，避免无限重试
-              if (pollPendingKnowledgeRef.current) {
-                clearInterval(pollPendingKnowledgeRef.current)
-                pollPendingKnowledgeRef.current = null
-                console.log(`🔍 [ChatView] handleSuggestedQuestionSelect - [轮询${pollCount}] ❌ 因错误停止轮询`)
-              }
-            }
-            
-            // 🔧 达到最大轮询次数后停止
-            if (pollCount >= maxPolls) {
-              console.log(`🔍 [ChatView] handleSuggestedQuestionSelect - [轮询${pollCount}] ⏸️ 达到最大轮询次数(${maxPolls})，停止轮询`)
-              if (pollPendingKnowledgeRef.current) {
-                clearInterval(pollPendingKnowledgeRef.current)
-                pollPendingKnowledgeRef.current = null
-              }
-            }
-          }
-          
-          // 🔧 延迟启动轮询，给后台任务一些时间执行（线上服务器可能需要更长时间）
-          setTimeout(() => {
-            // 立即执行第一次轮询
-            pollOnce()
-            
-            // 然后设置定时轮询
-            pollPendingKnowledgeRef.current = setInterval(pollOnce, pollInterval)
-            console.log(`🔍 [ChatView] handleSuggestedQuestionSelect - ✅ 轮询已设置，interval ID:`, pollPendingKnowledgeRef.current)
-          }, 500)  // 🔧 延迟 500ms 启动，确保后台任务有时间开始执行
-          
-          // 🔧 设置超时清理（双重保险）
-          setTimeout(() => {
-            if (pollPendingKnowledgeRef.current) {
-              clearInterval(pollPendingKnowledgeRef.current)
-              pollPendingKnowledgeRef.current = null
-              console.log(`🔍 [ChatView] handleSuggestedQuestionSelect - ⏸️ 超时清理轮询`)
-            }
-          }, 500 + maxPolls * pollInterval)  // 🔧 加上延迟启动的时间
-        } else {
-          console.log(`🔍 [ChatView] handleSuggestedQuestionSelect - ❌ textId无效(${textId})，无法启动轮询`)
-        }
-      } else {
-        console.log(`🔍 [ChatView] handleSuggestedQuestionSelect - ⏸️ 不满足轮询条件（响应中有即时返回的新知识点或response为空），跳过轮询`)
-      }
+      // 新知识点由后台任务完成后通过 SSE 推送（见 knowledge-events 订阅 effect），不再轮询
     } catch (error) {
       console.error('❌ [ChatView] 发送消息失败:', error)
       // ⚠️ Language detection in error handler: Presentation-only, does NOT affect error handling logic
@@ -317,6 +317,22 @@ function SentenceContainer({
       return
     }
 
+    // 导入时已预计算读音：[[sentence_token_id, reading], ...]，直接使用，不再请求
+    if (Array.isArray(sentence?.readings)) {
+      const readingById = {}
+      const alignedTokens = []
+      sentence.readings.forEach((item) => {
+        if (!Array.isArray(item) || item[0] == null || !item[1]) return
+        readingById[String(item[0])] = item[1]
+        alignedTokens.push({ token_id: item[0], reading: item[1], needs_ruby: true })
+      })
+      setFuriganaTokens(alignedTokens)
+      setTokenReadingById(readingById)
+      setIsLoadingFurigana(false)
+      setFuriganaError('')
+      return
+    }
+
     const cacheKey = `${sentenceId}:${pronunciationMode}:${sentenceText}`
     const cached = furiganaCacheRef.current.get(cacheKey)
     if (cached) {
@@ -364,7 +380,7 @@ function SentenceContainer({
         setIsLoadingFurigana(false)
       }
     })()
-  }, [isSentenceSelected, isJapaneseSentence, isChineseSentence, sentenceId, sentenceText, furiganaTokenInputs, furiganaTokenSignature])
+  }, [isSentenceSelected, isJapaneseSentence, isChineseSentence, sentenceId, sentenceText, furiganaTokenInputs, furiganaTokenSignature, sentence?.readings])
   
   // 🔧 检查是否有 token 被选中（在当前句子中）
   // selectedTokenIds 中的 uid 格式是 `${sentenceIdx}-${sentence_token_id}`
@@ -105,12 +105,6 @@ api.interceptors.response.use(
       return response.data;
     }
     
-    // 🔧 特殊处理：pending-knowledge API 需要保留完整结构
-    if (urlPath.includes('/api/chat/pending-knowledge')) {
-      console.log('🔍 [DEBUG] PendingKnowledge endpoint detected - returning full response.data');
-      return response.data;
-    }
-    
     // 数据库API返回格式: { success: true, data: {...} }
     // Mock API返回格式: 直接返回数据
     if (response.data && response.data.success !== undefined) {
@@ -644,6 +638,15 @@ export const apiService = {
     return api.get(`/api/v2/texts/${id}/pages`);
   },
 
+  // 按 sentence_id 游标分段获取句子（fields / tokenFields 为逗号分隔的字段列表，不传则返回完整结构）
+  getArticleSentenceRange: async (id, { cursor = 0, limit = 100, fields, tokenFields, wordTokenFields } = {}) => {
+    const params = { cursor, limit };
+    if (fields) params.fields = fields;
+    if (tokenFields) params.token_fields = tokenFields;
+    if (wordTokenFields) params.word_token_fields = wordTokenFields;
+    return api.get(`/api/v2/texts/${id}/sentence-range`, { params });
+  },
+
   // 获取文章指定分页（仅该页 segment 内容）
   getArticlePage: async (id, pageIndex = 1) => {
     try {
@@ -838,7 +841,7 @@ export const apiService = {
   },
 
   // 获取聊天历史（跨设备）
-  getChatHistory: ({ textId = null, sentenceId = null, userId = null, limit = 100, offset = 0 } = {}) => {
+  getChatHistory: ({ textId = null, sentenceId = null, userId = null, limit = 100, offset = 0, cursor = null } = {}) => {
     const params = {}
     // 🔧 确保 textId 和 sentenceId 是整数类型（如果提供）
     if (textId != null) {
@@ -855,17 +858,36 @@ export const apiService = {
     }
     if (userId != null) params.user_id = userId
     params.limit = limit
-    params.offset = offset
+    // 游标分页：传上一页响应的 next_cursor（此时后端忽略 offset）
+    if (cursor) params.cursor = cursor
+    else params.offset = offset
     console.log('💬 [Frontend] Fetching chat history params:', params)
     return api.get("/api/chat/history", { params })
   },
 
-  // 获取后台任务创建的新知识点（用于显示 toast）
-  getPendingKnowledge: ({ user_id, text_id }) => {
-    // 🔧 确保 text_id 是整数类型
-    const textIdInt = parseInt(text_id) || text_id
-    const userIdInt = parseInt(user_id) || user_id
-    return api.get(`/api/chat/pending-knowledge?user_id=${userIdInt}&text_id=${textIdInt}`);
+  // 订阅后台知识点推送（SSE），返回取消订阅函数
+  // onEvent 收到 { event_id, text_id, grammar_to_add, vocab_to_add }；至少送达一次，调用方按 event_id 去重
+  subscribeKnowledgeEvents: ({ text_id = null, last_event_id = null } = {}, onEvent, onError) => {
+    const token = localStorage.getItem('access_token')
+    if (!token || typeof EventSource === 'undefined') return () => {}
+    const params = new URLSearchParams({ token })
+    if (text_id !== null && text_id !== undefined) params.set('text_id', String(parseInt(text_id) || text_id))
+    if (last_event_id) params.set('last_event_id', String(last_event_id))
+    const source = new EventSource(`${BASE_URL}/api/chat/knowledge-events?${params.toString()}`)
+    source.addEventListener('knowledge_points', (e) => {
+      try {
+        onEvent && onEvent(JSON.parse(e.data))
+      } catch (err) {
+        console.warn('⚠️ [Frontend] 解析知识点事件失败:', err)
+      }
+    })
+    source.onerror = (err) => { onError && onError(err) }
+    return () => source.close()
+  },
+
+  // 确认已展示的知识点事件（之后不再推送）
+  ackKnowledgeEvents: ({ last_event_id, text_id = null }) => {
+    return api.post("/api/chat/knowledge-events/ack", { last_event_id, text_id });
   },
 
   // 按位置查找词汇例句
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+游标（keyset）分页所需的表结构调整：词汇 / 语法列表、聊天历史
+
+迁移内容：
+1. chat_messages.created_at 从 TEXT（ISO 时间字符串）改为 TIMESTAMP（UTC，不带时区）
+   - PostgreSQL: ALTER COLUMN ... TYPE TIMESTAMP USING (created_at::timestamptz AT TIME ZONE 'UTC')
+   - SQLite: 不支持修改列类型，重建表并逐行转换时间
+2. 创建复合索引（与列表的排序 (created_at, id) 一致）：
+   - chat_messages (user_id, text_id, created_at, id) / (user_id, created_at, id)
+   - vocab_expressions (user_id, created_at, vocab_id) / (user_id, language_code, created_at, vocab_id)
+   - grammar_rules (user_id, created_at, rule_id) / (user_id, language_code, created_at, rule_id)
+
+需先执行 migrate_add_language_code.py（索引包含 language_code 列）。
+迁移后需重启服务：ChatMessageManagerDB 在初始化时检测 created_at 的列类型。
+可重复执行：created_at 已是时间类型时跳过转换，索引已存在时跳过。
+"""
+
+import sys
+import os
+import io
+from datetime import datetime, timezone
+
+# 修复 Windows 控制台编码问题
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database_system.database_manager import DatabaseManager
+from sqlalchemy import inspect, text
+
+
+INDEXES = [
+    ('chat_messages', 'idx_chat_messages_user_text_created', 'user_id, text_id, created_at, id'),
+    ('chat_messages', 'idx_chat_messages_user_created', 'user_id, created_at, id'),
+    ('vocab_expressions', 'idx_vocab_user_created', 'user_id, created_at, vocab_id'),
+    ('vocab_expressions', 'idx_vocab_user_lang_created', 'user_id, language_code, created_at, vocab_id'),
+    ('grammar_rules', 'idx_grammar_user_created', 'user_id, created_at, rule_id'),
+    ('grammar_rules', 'idx_grammar_user_lang_created', 'user_id, language_code, created_at, rule_id'),
+]
+
+CHAT_COLUMNS = 'id, user_id, text_id, sentence_id, is_user, content, quote_sentence_id, quote_text, selected_token_json'
+
+
+def created_at_is_text(engine):
+    """chat_messages.created_at 是否仍为字符串列"""
+    for column in inspect(engine).get_columns('chat_messages'):
+        if column['name'] == 'created_at':
+            return getattr(column['type'], 'python_type', None) is str
+    return False
+
+
+def to_utc_timestamp(value):
+    """ISO 时间字符串 -> SQLite DATETIME 存储格式（UTC）；无时区的旧值按 UTC 处理"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def convert_chat_created_at_sqlite(session):
+    """SQLite：重建 chat_messages，created_at 改为 DATETIME"""
+    session.execute(text("DROP TABLE IF EXISTS chat_messages_new"))
+    session.execute(text("""
+        CREATE TABLE chat_messages_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id VARCHAR(255),
+            text_id INTEGER,
+            sentence_id INTEGER,
+            is_user INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            quote_sentence_id INTEGER,
+            quote_text TEXT,
+            selected_token_json TEXT,
+            created_at DATETIME NOT NULL
+        )
+    """))
+    session.execute(text(f"INSERT INTO chat_messages_new ({CHAT_COLUMNS}, created_at) SELECT {CHAT_COLUMNS}, created_at FROM chat_messages"))
+
+    rows = session.execute(text("SELECT id, created_at FROM chat_messages_new")).fetchall()
+    converted = 0
+    for row_id, value in rows:
+        session.execute(
+            text("UPDATE chat_messages_new SET created_at = :created_at WHERE id = :id"),
+            {"created_at": to_utc_timestamp(value), "id": row_id},
+        )
+        converted += 1
+
+    session.execute(text("DROP TABLE chat_messages"))
+    session.execute(text("ALTER TABLE chat_messages_new RENAME TO chat_messages"))
+    return converted
+
+
+def convert_chat_created_at_postgres(session):
+    """PostgreSQL：原地修改列类型"""
+    result = session.execute(text(
+        "ALTER TABLE chat_messages ALTER COLUMN created_at TYPE TIMESTAMP "
+        "USING (created_at::timestamptz AT TIME ZONE 'UTC')"
+    ))
+    return result.rowcount if result.rowcount and result.rowcount > 0 else 0
+
+
+def migrate():
+    """执行迁移"""
+    print("=" * 80)
+    print("迁移：游标分页（chat_messages.created_at 改为时间类型 + 复合索引）")
+    print("=" * 80)
+
+    # 从环境变量读取环境配置
+    try:
+        from backend.config import ENV
+        environment = ENV
+    except ImportError:
+        environment = os.getenv("ENV", "development")
+
+    print(f"\n📦 使用环境: {environment}")
+
+    db_manager = DatabaseManager(environment)
+    engine = db_manager.get_engine()
+    session = db_manager.get_session()
+    is_postgres = engine.dialect.name == 'postgresql'
+
+    try:
+        existing_tables = inspect(engine).get_table_names()
+
+        if 'chat_messages' not in existing_tables:
+            print("\n⚠️ chat_messages 表不存在，跳过类型转换（首次启动时会按新结构建表）")
+        elif not created_at_is_text(engine):
+            print("\n✅ chat_messages.created_at 已是时间类型，跳过转换")
+        else:
+            print("\n📝 转换 chat_messages.created_at: TEXT -> TIMESTAMP (UTC)...")
+            if is_postgres:
+                convert_chat_created_at_postgres(session)
+            else:
+                converted = convert_chat_created_at_sqlite(session)
+                print(f"   - 已转换 {converted} 行")
+            session.commit()
+            print("✅ chat_messages.created_at 转换完成")
+
+        for table_name, index_name, columns in INDEXES:
+            if table_name not in existing_tables:
+                print(f"\n⚠️ {table_name} 表不存在，跳过索引 {index_name}")
+                continue
+            print(f"\n📝 创建索引 {index_name}...")
+            session.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns})"))
+            session.commit()
+            print(f"✅ 索引 {index_name} 已就绪")
+
+        print("\n✅ 迁移完成！请重启服务使聊天记录按新的列类型读写。")
+
+    except Exception as e:
+        session.rollback()
+        print(f"\n❌ 迁移失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        session.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = migrate()
+    sys.exit(exit_code)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+添加 language_code 字段到 vocab_expressions / grammar_rules 表（规范语言代码，用于列表的语言过滤）
+
+迁移内容：
+1. 在两张表中添加 language_code 列（VARCHAR(50), nullable=True）
+2. 按 language 回填规范代码（"德文" / "German" / "de-DE" -> "de"，见 normalize_language_code）
+3. 创建复合索引 (user_id, language_code, learn_status, is_starred)
+
+模型已声明 language_code 列：所有读取 vocab_expressions / grammar_rules 的 ORM 查询都会选取该列，
+未执行迁移时这些查询都会失败。请在启动新版本服务之前执行本迁移。
+可重复执行：列 / 索引已存在时跳过，回填只更新代码不一致的行。
+"""
+
+import sys
+import os
+import io
+
+# 修复 Windows 控制台编码问题
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database_system.database_manager import DatabaseManager
+from database_system.business_logic.models import normalize_language_code
+from sqlalchemy import inspect, text
+
+
+def check_column_exists(engine, table_name, column_name):
+    """检查列是否存在"""
+    try:
+        inspector = inspect(engine)
+        columns = inspector.get_columns(table_name)
+        return any(col['name'] == column_name for col in columns)
+    except Exception as e:
+        print(f"[WARN] 检查列时出错: {e}")
+        return False
+
+
+TABLES = {
+    'vocab_expressions': 'idx_vocab_user_lang_status_starred',
+    'grammar_rules': 'idx_grammar_user_lang_status_starred',
+}
+
+
+def migrate():
+    """执行迁移"""
+    print("=" * 80)
+    print("迁移：添加 language_code 字段到 vocab_expressions / grammar_rules 表")
+    print("=" * 80)
+
+    # 从环境变量读取环境配置
+    try:
+        from backend.config import ENV
+        environment = ENV
+    except ImportError:
+        environment = os.getenv("ENV", "development")
+
+    print(f"\n📦 使用环境: {environment}")
+
+    db_manager = DatabaseManager(environment)
+    engine = db_manager.get_engine()
+    session = db_manager.get_session()
+
+    try:
+        inspector = inspect(engine)
+        existing_tables = inspector.get_table_names()
+        for table_name, index_name in TABLES.items():
+            if table_name not in existing_tables:
+                print(f"\n⚠️ {table_name} 表不存在，跳过")
+                continue
+
+            if check_column_exists(engine, table_name, 'language_code'):
+                print(f"\n✅ {table_name}.language_code 字段已存在，跳过添加")
+            else:
+                print(f"\n📝 添加 {table_name}.language_code 字段...")
+                session.execute(text(f"ALTER TABLE {table_name} ADD COLUMN language_code VARCHAR(50)"))
+                session.commit()
+                print(f"✅ {table_name}.language_code 字段添加成功")
+
+            print(f"📝 回填 {table_name}.language_code...")
+            languages = [row[0] for row in session.execute(
+                text(f"SELECT DISTINCT language FROM {table_name} WHERE language IS NOT NULL")
+            )]
+            updated = 0
+            for language in languages:
+                code = normalize_language_code(language)
+                result = session.execute(
+                    text(
+                        f"UPDATE {table_name} SET language_code = :code "
+                        "WHERE language = :language AND (language_code IS NULL OR language_code <> :code)"
+                    ),
+                    {"code": code, "language": language},
+                )
+                updated += result.rowcount or 0
+                print(f"   - {language!r} -> {code!r}")
+            session.commit()
+            print(f"✅ 回填完成: {updated} 行（{len(languages)} 种 language 取值）")
+
+            print(f"📝 创建索引 {index_name}...")
+            session.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {index_name} "
+                f"ON {table_name} (user_id, language_code, learn_status, is_starred)"
+            ))
+            session.commit()
+            print(f"✅ 索引 {index_name} 已就绪")
+
+        print("\n✅ 迁移完成！")
+
+    except Exception as e:
+        session.rollback()
+        print(f"\n❌ 迁移失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        session.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = migrate()
+    sys.exit(exit_code)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+添加预置文章预生成讲解表（preset_explanations）
+
+迁移内容：
+1. 创建 preset_explanations 表
+   - 唯一约束：uq_preset_explanation_key (sentence_hash, ui_language, kind, target, question_key)
+
+可重复执行：表已存在时跳过。
+"""
+
+import sys
+import os
+import io
+
+# 修复 Windows 控制台编码问题
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database_system.database_manager import DatabaseManager
+from database_system.business_logic.models import Base, PresetExplanation
+from sqlalchemy import inspect
+
+
+def check_table_exists(engine, table_name):
+    """检查表是否存在"""
+    try:
+        inspector = inspect(engine)
+        return table_name in inspector.get_table_names()
+    except Exception as e:
+        print(f"[WARN] 检查表时出错: {e}")
+        return False
+
+
+def migrate():
+    """执行迁移"""
+    print("=" * 80)
+    print("迁移：添加预置文章预生成讲解表（preset_explanations）")
+    print("=" * 80)
+
+    # 从环境变量读取环境配置
+    try:
+        from backend.config import ENV
+        environment = ENV
+    except ImportError:
+        environment = os.getenv("ENV", "development")
+
+    print(f"\n📦 使用环境: {environment}")
+
+    db_manager = DatabaseManager(environment)
+    engine = db_manager.get_engine()
+
+    try:
+        table = PresetExplanation.__table__
+        if check_table_exists(engine, table.name):
+            print(f"\n✅ {table.name} 表已存在，跳过创建")
+        else:
+            print(f"\n📝 创建 {table.name} 表...")
+            Base.metadata.create_all(engine, tables=[table])
+            print(f"✅ {table.name} 表创建成功")
+
+        print("\n✅ 迁移完成！")
+
+    except Exception as e:
+        print(f"\n❌ 迁移失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = migrate()
+    sys.exit(exit_code)
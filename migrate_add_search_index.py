@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+添加词汇 / 语法规则 / 文章的全文检索索引（search_documents，见 backend/services/fulltext_search.py）
+
+迁移内容：
+1. 创建索引表
+   - SQLite：FTS5 虚表 search_documents(scope, title_terms, body_terms)
+   - PostgreSQL：search_documents 表 + tsvector GIN 索引 + (user_id, entity_type) 索引
+     + 标题 pg_trgm GIN 索引（需要 CREATE EXTENSION 权限，失败时跳过）
+2. 用现有数据回填索引（每次执行都会全量重建）
+
+可重复执行：表已存在时跳过创建，只重建索引内容。
+"""
+
+import sys
+import os
+import io
+
+# 修复 Windows 控制台编码问题
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database_system.database_manager import DatabaseManager
+from backend.services import fulltext_search
+
+
+def migrate():
+    """执行迁移"""
+    print("=" * 80)
+    print("迁移：添加全文检索索引（search_documents）")
+    print("=" * 80)
+
+    # 从环境变量读取环境配置
+    try:
+        from backend.config import ENV
+        environment = ENV
+    except ImportError:
+        environment = os.getenv("ENV", "development")
+
+    print(f"\n📦 使用环境: {environment}")
+
+    db_manager = DatabaseManager(environment)
+    engine = db_manager.get_engine()
+
+    try:
+        print(f"\n📝 创建 {fulltext_search.TABLE} 索引表（已存在时跳过）...")
+        if not fulltext_search.ensure_schema(engine):
+            print("❌ 当前数据库不支持全文检索（SQLite 需要 FTS5），搜索接口将继续使用 LIKE")
+            return 1
+        print(f"✅ {fulltext_search.TABLE} 索引表已就绪")
+
+        print("\n📝 重建索引内容...")
+        session = db_manager.get_session()
+        try:
+            counts = fulltext_search.rebuild(session)
+        finally:
+            session.close()
+        for entity_type, count in counts.items():
+            print(f"   - {entity_type}: {count} 条")
+
+        print("\n✅ 迁移完成！（运行中的服务最多 60 秒后开始使用新索引）")
+
+    except Exception as e:
+        print(f"\n❌ 迁移失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = migrate()
+    sys.exit(exit_code)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+添加 readings 字段到 sentences 表（导入时预计算的拼音 / 假名）
+
+迁移内容：
+1. 在 sentences 表中添加 readings 列（JSON, nullable=True）
+   格式：[[sentence_token_id, reading], ...]，只包含需要显示读音的 token
+2. 可选回填（--backfill）：为已导入的中文 / 日文文章逐句计算读音
+   - 已有 readings 的句子跳过，可重复执行
+   - 未回填的句子前端会退回到逐句请求 /api/v2/furigana/*-align
+
+用法：
+    python migrate_add_sentence_readings.py            # 只加列
+    python migrate_add_sentence_readings.py --backfill # 加列并回填
+"""
+
+import sys
+import os
+import io
+
+# 修复 Windows 控制台编码问题
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database_system.database_manager import DatabaseManager
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import selectinload
+
+
+BACKFILL_BATCH_SIZE = 200
+
+
+def check_column_exists(engine, table_name, column_name):
+    """检查列是否存在"""
+    try:
+        inspector = inspect(engine)
+        columns = inspector.get_columns(table_name)
+        return any(col['name'] == column_name for col in columns)
+    except Exception as e:
+        print(f"[WARN] 检查列时出错: {e}")
+        return False
+
+
+def backfill(session, bump_version: bool = False):
+    """为中文 / 日文文章中还没有 readings 的句子计算读音"""
+    from database_system.business_logic.models import OriginalText, Sentence, new_content_version
+    from backend.services.reading_annotation import LANG_JA, LANG_ZH, enrich_sentences, normalize_language
+
+    texts = session.query(OriginalText.text_id, OriginalText.language).all()
+    target_texts = [(text_id, language) for text_id, language in texts
+                    if normalize_language(language) in (LANG_ZH, LANG_JA)]
+    print(f"   📚 需要检查的中文 / 日文文章: {len(target_texts)} 篇")
+
+    total = 0
+    for text_id, language in target_texts:
+        sentences = (
+            session.query(Sentence)
+            .options(selectinload(Sentence.tokens))
+            .filter(Sentence.text_id == text_id, Sentence.readings.is_(None))
+            .order_by(Sentence.sentence_id)
+            .all()
+        )
+        for start in range(0, len(sentences), BACKFILL_BATCH_SIZE):
+            batch = sentences[start:start + BACKFILL_BATCH_SIZE]
+            payload = [
+                {
+                    "sentence_body": s.sentence_body,
+                    "tokens": [
+                        {"sentence_token_id": t.sentence_token_id, "token_body": t.token_body}
+                        for t in sorted(s.tokens, key=lambda t: t.sentence_token_id)
+                    ],
+                }
+                for s in batch
+            ]
+            enrich_sentences(payload, language)
+            for sentence, item in zip(batch, payload):
+                if item.get("readings") is not None:
+                    sentence.readings = item["readings"]
+                    total += 1
+            if bump_version:
+                # 内容变了：换新版本号，让旧的 ETag / 缓存失效
+                session.execute(
+                    text("UPDATE original_texts SET content_version = :version WHERE text_id = :text_id"),
+                    {"version": new_content_version(), "text_id": text_id},
+                )
+            session.commit()
+        print(f"   ✅ text_id={text_id}: 回填 {len(sentences)} 个句子")
+    return total
+
+
+def migrate(run_backfill: bool = False):
+    """执行迁移"""
+    print("=" * 80)
+    print("迁移：添加 readings 字段到 sentences 表")
+    print("=" * 80)
+
+    # 从环境变量读取环境配置
+    try:
+        from backend.config import ENV
+        environment = ENV
+    except ImportError:
+        environment = os.getenv("ENV", "development")
+
+    print(f"\n📦 使用环境: {environment}")
+
+    db_manager = DatabaseManager(environment)
+    engine = db_manager.get_engine()
+    session = db_manager.get_session()
+
+    try:
+        inspector = inspect(engine)
+        if 'sentences' not in inspector.get_table_names():
+            print("\n❌ sentences 表不存在，跳过迁移")
+            return 1
+
+        if check_column_exists(engine, 'sentences', 'readings'):
+            print("\n✅ readings 字段已存在，跳过添加")
+        else:
+            print("\n📝 添加 readings 字段...")
+            column_type = "JSON" if engine.dialect.name == "postgresql" else "TEXT"
+            session.execute(text(f"ALTER TABLE sentences ADD COLUMN readings {column_type}"))
+            session.commit()
+            print("✅ readings 字段添加成功")
+
+        if run_backfill:
+            print("\n📝 回填已有句子的读音...")
+            total = backfill(session, bump_version=check_column_exists(engine, 'original_texts', 'content_version'))
+            print(f"✅ 回填完成: {total} 个句子")
+
+        session.commit()
+        print("\n✅ 迁移完成！")
+
+    except Exception as e:
+        session.rollback()
+        print(f"\n❌ 迁移失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        session.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = migrate(run_backfill="--backfill" in sys.argv[1:])
+    sys.exit(exit_code)
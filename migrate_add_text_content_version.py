@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+添加 content_version 字段到 original_texts 表（文章内容版本，用于 ETag / 序列化结果缓存）
+
+迁移内容：
+1. 在 original_texts 表中添加 content_version 列（VARCHAR(32), nullable=True）
+2. 为已有文章回填随机版本号（content_version 为空的文章不返回 ETag、不走缓存）
+"""
+
+import sys
+import os
+import io
+
+# 修复 Windows 控制台编码问题
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database_system.database_manager import DatabaseManager
+from database_system.business_logic.models import new_content_version
+from sqlalchemy import inspect, text
+
+
+def check_column_exists(engine, table_name, column_name):
+    """检查列是否存在"""
+    try:
+        inspector = inspect(engine)
+        columns = inspector.get_columns(table_name)
+        return any(col['name'] == column_name for col in columns)
+    except Exception as e:
+        print(f"[WARN] 检查列时出错: {e}")
+        return False
+
+
+def migrate():
+    """执行迁移"""
+    print("=" * 80)
+    print("迁移：添加 content_version 字段到 original_texts 表")
+    print("=" * 80)
+
+    # 从环境变量读取环境配置
+    try:
+        from backend.config import ENV
+        environment = ENV
+    except ImportError:
+        environment = os.getenv("ENV", "development")
+
+    print(f"\n📦 使用环境: {environment}")
+
+    db_manager = DatabaseManager(environment)
+    engine = db_manager.get_engine()
+    session = db_manager.get_session()
+
+    try:
+        inspector = inspect(engine)
+        if 'original_texts' not in inspector.get_table_names():
+            print("\n❌ original_texts 表不存在，跳过迁移")
+            return 1
+
+        if check_column_exists(engine, 'original_texts', 'content_version'):
+            print("\n✅ content_version 字段已存在，跳过添加")
+        else:
+            print("\n📝 添加 content_version 字段...")
+            session.execute(text("ALTER TABLE original_texts ADD COLUMN content_version VARCHAR(32)"))
+            session.commit()
+            print("✅ content_version 字段添加成功")
+
+        print("\n📝 回填已有文章的内容版本...")
+        text_ids = [row[0] for row in session.execute(
+            text("SELECT text_id FROM original_texts WHERE content_version IS NULL")
+        )]
+        for text_id in text_ids:
+            session.execute(
+                text("UPDATE original_texts SET content_version = :version WHERE text_id = :text_id"),
+                {"version": new_content_version(), "text_id": text_id},
+            )
+        session.commit()
+        print(f"✅ 回填完成: {len(text_ids)} 篇文章")
+
+        print("\n✅ 迁移完成！")
+
+    except Exception as e:
+        session.rollback()
+        print(f"\n❌ 迁移失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        session.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = migrate()
+    sys.exit(exit_code)
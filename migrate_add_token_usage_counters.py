@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+添加 token 用量计数表（滚动小时用量 / 累计用量）
+
+迁移内容：
+1. 创建 token_usage_buckets 表（每用户每 5 分钟一行）
+   - 唯一约束：uq_token_usage_bucket_user_start (user_id, bucket_start)
+2. 创建 token_usage_totals 表（每用户一行累计值）
+3. 从 token_logs 回填：
+   - token_usage_totals：按 user_id 汇总全部历史
+   - token_usage_buckets：只回填最近 2 小时（更早的桶不参与小时预算判断）
+
+可重复执行：回填前会清空两张计数表，再按 token_logs 重新计算。
+⚠️ 请在服务停止（或无 AI 调用）时执行，避免回填期间的新用量被覆盖。
+"""
+
+import sys
+import os
+import io
+from datetime import datetime, timedelta
+
+# 修复 Windows 控制台编码问题
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database_system.database_manager import DatabaseManager
+from database_system.business_logic.models import Base, TokenLog, TokenUsageBucket, TokenUsageTotal
+from sqlalchemy import inspect, func
+
+
+def check_table_exists(engine, table_name):
+    """检查表是否存在"""
+    try:
+        inspector = inspect(engine)
+        return table_name in inspector.get_table_names()
+    except Exception as e:
+        print(f"[WARN] 检查表时出错: {e}")
+        return False
+
+
+def backfill(session):
+    """从 token_logs 回填计数表"""
+    from backend.services.token_service import _bucket_start
+
+    session.query(TokenUsageBucket).delete()
+    session.query(TokenUsageTotal).delete()
+
+    # 1. 累计用量
+    totals = (
+        session.query(
+            TokenLog.user_id,
+            func.sum(TokenLog.total_tokens),
+            func.count(TokenLog.id),
+        )
+        .group_by(TokenLog.user_id)
+        .all()
+    )
+    for user_id, total_tokens, call_count in totals:
+        session.add(TokenUsageTotal(
+            user_id=user_id,
+            total_tokens=int(total_tokens or 0),
+            call_count=int(call_count or 0),
+        ))
+    print(f"   ✅ 回填 token_usage_totals: {len(totals)} 个用户")
+
+    # 2. 最近 2 小时的分桶用量（token_logs.created_at 为 UTC）
+    since = datetime.utcnow() - timedelta(hours=2)
+    buckets = {}
+    recent_logs = session.query(TokenLog).filter(TokenLog.created_at >= since).yield_per(1000)
+    for log in recent_logs:
+        key = (log.user_id, _bucket_start(log.created_at))
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = TokenUsageBucket(
+                user_id=log.user_id,
+                bucket_start=key[1],
+                total_tokens=0,
+                prompt_tokens=0,
+                completion_tokens=0,
+                call_count=0,
+            )
+            buckets[key] = bucket
+        bucket.total_tokens += log.total_tokens or 0
+        bucket.prompt_tokens += log.prompt_tokens or 0
+        bucket.completion_tokens += log.completion_tokens or 0
+        bucket.call_count += 1
+    session.add_all(buckets.values())
+    print(f"   ✅ 回填 token_usage_buckets: {len(buckets)} 个桶")
+
+
+def migrate():
+    """执行迁移"""
+    print("=" * 80)
+    print("迁移：添加 token 用量计数表（token_usage_buckets / token_usage_totals）")
+    print("=" * 80)
+
+    # 从环境变量读取环境配置
+    try:
+        from backend.config import ENV
+        environment = ENV
+    except ImportError:
+        environment = os.getenv("ENV", "development")
+
+    print(f"\n📦 使用环境: {environment}")
+
+    db_manager = DatabaseManager(environment)
+    engine = db_manager.get_engine()
+    session = db_manager.get_session()
+
+    try:
+        for table in (TokenUsageBucket.__table__, TokenUsageTotal.__table__):
+            if check_table_exists(engine, table.name):
+                print(f"\n✅ {table.name} 表已存在，跳过创建")
+            else:
+                print(f"\n📝 创建 {table.name} 表...")
+                Base.metadata.create_all(engine, tables=[table])
+                print(f"✅ {table.name} 表创建成功")
+
+        print("\n📝 从 token_logs 回填计数...")
+        backfill(session)
+
+        session.commit()
+        print("\n✅ 迁移完成！")
+
+    except Exception as e:
+        session.rollback()
+        print(f"\n❌ 迁移失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        session.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = migrate()
+    sys.exit(exit_code)
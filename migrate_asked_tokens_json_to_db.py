@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+asked_tokens：JSON 文件 -> 数据库（一次性迁移）
+
+迁移内容：
+1. 确保 asked_tokens 表及索引 idx_asked_tokens_user_text (user_id, text_id) 存在
+2. 读取 backend/data/current/asked_tokens/<user_id>.json，写入 asked_tokens 表
+   - user_id 取自文件名（非数字文件名如 default_user.json 跳过）
+   - 用户 / 句子不存在的记录跳过（外键约束）
+   - 已存在的记录跳过（可重复执行）
+
+JSON 文件不会被删除，迁移后 /api/user/asked-tokens 只读数据库。
+"""
+
+import sys
+import os
+import io
+import json
+
+# 修复 Windows 控制台编码问题
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database_system.database_manager import DatabaseManager
+from database_system.business_logic.models import Base, AskedToken, AskedTokenType, Sentence, User
+from sqlalchemy import inspect
+
+JSON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend", "data", "current", "asked_tokens")
+
+
+def check_table_exists(engine, table_name):
+    """检查表是否存在"""
+    try:
+        inspector = inspect(engine)
+        return table_name in inspector.get_table_names()
+    except Exception as e:
+        print(f"[WARN] 检查表时出错: {e}")
+        return False
+
+
+def load_json_records():
+    """读取所有用户的 JSON 文件 -> [(user_id, record), ...]"""
+    records = []
+    if not os.path.isdir(JSON_DIR):
+        print(f"⚠️ JSON 目录不存在: {JSON_DIR}")
+        return records
+    for filename in sorted(os.listdir(JSON_DIR)):
+        if not filename.endswith(".json") or filename.startswith("._"):
+            continue
+        stem = filename[:-len(".json")]
+        if not stem.isdigit():
+            print(f"   ⏭️  跳过非数字用户文件: {filename}")
+            continue
+        try:
+            with open(os.path.join(JSON_DIR, filename), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"   ⚠️ 读取 {filename} 失败: {e}")
+            continue
+        records.extend((int(stem), item) for item in data if isinstance(item, dict))
+    return records
+
+
+def import_records(session, records):
+    """写入数据库，返回 (新增数, 跳过数)"""
+    user_ids = {user_id for user_id, _ in records}
+    existing_users = {
+        row[0] for row in session.query(User.user_id).filter(User.user_id.in_(user_ids)).all()
+    } if user_ids else set()
+    text_ids = {item.get("text_id") for _, item in records if item.get("text_id") is not None}
+    existing_sentences = {
+        (t_id, s_id) for t_id, s_id in
+        session.query(Sentence.text_id, Sentence.sentence_id).filter(Sentence.text_id.in_(text_ids)).all()
+    } if text_ids else set()
+    existing_keys = {
+        (row.user_id, row.text_id, row.sentence_id, row.sentence_token_id, getattr(row.type, "value", row.type))
+        for row in session.query(AskedToken).filter(AskedToken.user_id.in_(existing_users)).all()
+    } if existing_users else set()
+
+    added = skipped = 0
+    for user_id, item in records:
+        text_id = item.get("text_id")
+        sentence_id = item.get("sentence_id")
+        sentence_token_id = item.get("sentence_token_id")
+        type_value = item.get("type") or ("token" if sentence_token_id is not None else "sentence")
+        key = (user_id, text_id, sentence_id, sentence_token_id, type_value)
+        if (
+            user_id not in existing_users
+            or (text_id, sentence_id) not in existing_sentences
+            or (type_value == "token" and sentence_token_id is None)
+            or key in existing_keys
+        ):
+            skipped += 1
+            continue
+        session.add(AskedToken(
+            user_id=user_id,
+            text_id=text_id,
+            sentence_id=sentence_id,
+            sentence_token_id=sentence_token_id,
+            type=AskedTokenType.TOKEN if type_value == "token" else AskedTokenType.SENTENCE,
+        ))
+        existing_keys.add(key)
+        added += 1
+    return added, skipped
+
+
+def migrate():
+    """执行迁移"""
+    print("=" * 80)
+    print("迁移：asked_tokens JSON 文件 -> 数据库")
+    print("=" * 80)
+
+    # 从环境变量读取环境配置
+    try:
+        from backend.config import ENV
+        environment = ENV
+    except ImportError:
+        environment = os.getenv("ENV", "development")
+
+    print(f"\n📦 使用环境: {environment}")
+
+    db_manager = DatabaseManager(environment)
+    engine = db_manager.get_engine()
+    session = db_manager.get_session()
+
+    try:
+        table = AskedToken.__table__
+        if check_table_exists(engine, table.name):
+            print(f"\n✅ {table.name} 表已存在")
+            for index in table.indexes:
+                index.create(engine, checkfirst=True)
+            print("✅ 索引已确认: " + ", ".join(index.name for index in table.indexes))
+        else:
+            print(f"\n📝 创建 {table.name} 表...")
+            Base.metadata.create_all(engine, tables=[table])
+            print(f"✅ {table.name} 表创建成功")
+
+        print(f"\n📝 读取 JSON 文件: {JSON_DIR}")
+        records = load_json_records()
+        print(f"   共 {len(records)} 条记录")
+
+        added, skipped = import_records(session, records)
+        session.commit()
+        print(f"\n✅ 迁移完成！新增 {added} 条，跳过 {skipped} 条（用户/句子不存在或已导入）")
+
+    except Exception as e:
+        session.rollback()
+        print(f"\n❌ 迁移失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        session.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = migrate()
+    sys.exit(exit_code)